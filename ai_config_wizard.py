@@ -8,7 +8,6 @@ import os
 import sys
 import json
 import requests
-from datetime import datetime
 
 def show_welcome():
     """显示欢迎信息"""
@@ -151,59 +150,15 @@ def configure_google():
     }
 
 def update_config_file(ai_config):
-    """更新配置文件"""
-    config_path = os.path.join('src', 'config.py')
-    
-    if not os.path.exists(config_path):
-        print(f"❌ 配置文件不存在: {config_path}")
-        return False
-    
+    """更新配置文件（写入配置存储，运行中的程序会自动应用）"""
     try:
-        # 读取现有配置
-        with open(config_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 查找AI_SPEECH_CONFIG的位置
-        start_marker = "AI_SPEECH_CONFIG = {"
-        end_marker = "}"
-        
-        start_pos = content.find(start_marker)
-        if start_pos == -1:
-            print("❌ 未找到AI_SPEECH_CONFIG配置段")
-            return False
-        
-        # 查找配置段的结束位置
-        brace_count = 0
-        end_pos = start_pos
-        in_config = False
-        
-        for i, char in enumerate(content[start_pos:], start_pos):
-            if char == '{':
-                brace_count += 1
-                in_config = True
-            elif char == '}':
-                brace_count -= 1
-                if in_config and brace_count == 0:
-                    end_pos = i + 1
-                    break
-        
-        # 生成新的配置内容
-        new_config = "AI_SPEECH_CONFIG = " + json.dumps(ai_config, indent=4, ensure_ascii=False)
-        
-        # 替换配置段
-        new_content = content[:start_pos] + new_config + content[end_pos:]
-        
-        # 备份原文件
-        backup_path = config_path + f".backup.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        with open(backup_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print(f"📋 原配置已备份到: {backup_path}")
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+        from config_store import get_config_store
         
-        # 写入新配置
-        with open(config_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
+        store = get_config_store()
+        store.update('AI_SPEECH_CONFIG', ai_config)
         
-        print(f"✅ 配置已更新到: {config_path}")
+        print(f"✅ 配置已更新到: {store.path}")
         return True
         
     except Exception as e:
@@ -229,7 +184,7 @@ def main():
             if config:
                 if update_config_file(config):
                     print("\n🎉 百度AI配置完成！")
-                    print("请重新启动程序以使用新配置")
+                    print("运行中的程序会自动应用新配置")
                 break
             else:
                 continue
@@ -239,7 +194,7 @@ def main():
             if config:
                 if update_config_file(config):
                     print("\n🎉 Whisper配置完成！")
-                    print("请重新启动程序以使用新配置")
+                    print("运行中的程序会自动应用新配置")
                 break
             else:
                 continue
@@ -248,7 +203,7 @@ def main():
             config = configure_google()
             if update_config_file(config):
                 print("\n🎉 Google配置完成！")
-                print("请重新启动程序以使用新配置")
+                print("运行中的程序会自动应用新配置")
             break
             
         elif choice == '4':
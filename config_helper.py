@@ -87,45 +87,20 @@ def configure_traditional_login():
     return config
 
 def update_config_file(config):
-    """更新配置文件"""
-    config_path = os.path.join('src', 'config.py')
-    
-    if not os.path.exists(config_path):
-        print(f"❌ 配置文件不存在: {config_path}")
-        return False
-    
+    """更新配置文件（写入配置存储，运行中的程序会自动应用）"""
     try:
-        # 读取原始配置文件
-        with open(config_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 更新MQTT配置部分
-        lines = content.split('\n')
-        new_lines = []
-        in_mqtt_config = False
-        
-        for line in lines:
-            if 'MQTT_CONFIG = {' in line:
-                in_mqtt_config = True
-                new_lines.append(line)
-                new_lines.append("    'broker': 'bemfa.com',  # 巴法云MQTT服务器地址")
-                new_lines.append("    'port': 9501,           # 巴法云MQTT端口")
-                new_lines.append(f"    'client_id': '{config['client_id']}',  # 巴法云私钥或客户端ID")
-                new_lines.append(f"    'username': '{config['username']}',    # 用户名")
-                new_lines.append(f"    'password': '{config['password']}',    # 密码")
-                new_lines.append("    'keep_alive': 60,")
-                new_lines.append(f"    'use_private_key': {config['use_private_key']}  # 是否使用私钥登录")
-            elif in_mqtt_config and line.strip() == '}':
-                in_mqtt_config = False
-                new_lines.append(line)
-            elif not in_mqtt_config:
-                new_lines.append(line)
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+        from config_store import get_config_store
         
-        # 写入更新后的配置
-        with open(config_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(new_lines))
+        store = get_config_store()
+        store.update('MQTT_CONFIG', {
+            'client_id': config['client_id'],
+            'username': config['username'],
+            'password': config['password'],
+            'use_private_key': config['use_private_key'],
+        })
         
-        print(f"✅ 配置文件已更新: {config_path}")
+        print(f"✅ 配置文件已更新: {store.path}")
         return True
         
     except Exception as e:
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+本地意图分类器训练与基准测试工具
+用法:
+    python intent_classifier_tool.py train --generate 20000
+    python intent_classifier_tool.py train --corpus logs/commands.jsonl --generate 5000
+    python intent_classifier_tool.py bench --count 5000
+"""
+
+import sys
+import os
+import time
+import argparse
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from command_corpus import CommandCorpusGenerator, load_corpus
+from intent_recognition import IntentClassifier, IntentRecognizer, PROJECT_ROOT
+from config import INTENT_CLASSIFIER_CONFIG
+
+
+def default_model_path():
+    """配置中的模型路径"""
+    model_path = INTENT_CLASSIFIER_CONFIG.get('model_path', 'models/intent_classifier.npz')
+    return model_path if os.path.isabs(model_path) else os.path.join(PROJECT_ROOT, model_path)
+
+
+def collect_samples(corpus_paths, generate, seed):
+    """汇总语料文件（生成的或记录的）与现场生成的合成样本"""
+    samples = []
+    for path in corpus_paths:
+        loaded = list(load_corpus(path))
+        samples.extend(loaded)
+        print(f"📁 读取语料 {path}: {len(loaded)} 条")
+
+    if generate:
+        generator = CommandCorpusGenerator(seed=seed, noise_rate=0.2, implicit_rate=0.25,
+                                           negative_rate=0.1)
+        samples.extend(generator.iter_samples(generate))
+        print(f"🧪 生成合成语料: {generate} 条")
+    return samples
+
+
+def train(args):
+    """训练并保存模型"""
+    samples = collect_samples(args.corpus, args.generate, args.seed)
+    if not samples:
+        print("❌ 没有训练样本，请指定 --corpus 或 --generate")
+        return 1
+
+    texts = [sample['text'] for sample in samples]
+    labels = [IntentClassifier.make_label(sample.get('device'), sample.get('action')) for sample in samples]
+
+    classifier = IntentClassifier(n_features=2 ** args.hash_bits)
+    start = time.perf_counter()
+    losses = classifier.fit(texts, labels, epochs=args.epochs, learning_rate=args.learning_rate,
+                            seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"✅ 训练完成: {len(texts)} 条样本, {len(classifier.classes)} 个类别, "
+          f"耗时 {elapsed:.1f}s, 最终损失 {losses[-1]:.4f}")
+
+    output = args.output or default_model_path()
+    classifier.save(output)
+    print(f"📁 模型已保存到: {output}")
+    return 0
+
+
+def bench(args):
+    """在合成语料上对比关键词匹配与分类器的准确率和吞吐量"""
+    model_path = args.model or default_model_path()
+    if not os.path.exists(model_path):
+        print(f"❌ 模型不存在: {model_path}，请先运行 train")
+        return 1
+    classifier = IntentClassifier.load(model_path)
+
+    generator = CommandCorpusGenerator(seed=args.seed + 1, noise_rate=0.2, implicit_rate=0.25,
+                                       negative_rate=0.1)
+    samples = list(generator.iter_samples(args.count))
+    texts = [sample['text'] for sample in samples]
+    expected = [IntentClassifier.make_label(sample['device'], sample['action']) for sample in samples]
+
+    # 关键词匹配路径
+    keyword_recognizer = IntentRecognizer()
+    keyword_recognizer.classifier = None
+    start = time.perf_counter()
+    keyword_results = [keyword_recognizer.recognize_intent(text) for text in texts]
+    keyword_time = time.perf_counter() - start
+
+    # 分类器批量推理
+    start = time.perf_counter()
+    predicted, _ = classifier.predict_batch(texts)
+    classifier_time = time.perf_counter() - start
+
+    # 分类器 + 低置信度回退
+    hybrid_recognizer = IntentRecognizer()
+    hybrid_recognizer.classifier = classifier
+    start = time.perf_counter()
+    hybrid_results = hybrid_recognizer.recognize_batch(texts)
+    hybrid_time = time.perf_counter() - start
+
+    def accuracy(labels):
+        return sum(1 for got, want in zip(labels, expected) if got == want) / max(1, len(expected))
+
+    keyword_labels = [IntentClassifier.make_label(r['device'], r['action']) for r in keyword_results]
+    hybrid_labels = [IntentClassifier.make_label(r['device'], r['action']) for r in hybrid_results]
+
+    print(f"📊 基准测试 ({len(texts)} 条样本，含噪声、隐含意图与无意图语句)")
+    print(f"{'方式':<16}{'准确率':<10}{'总耗时(ms)':<12}{'每条(μs)':<10}")
+    for name, labels, elapsed in (
+        ("关键词匹配", keyword_labels, keyword_time),
+        ("分类器批量推理", predicted, classifier_time),
+        ("分类器+回退", hybrid_labels, hybrid_time),
+    ):
+        print(f"{name:<14}{accuracy(labels):<10.2%}{elapsed * 1000:<12.1f}"
+              f"{elapsed / max(1, len(texts)) * 1e6:<10.1f}")
+    return 0
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="本地意图分类器训练与基准测试")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help="训练模型")
+    train_parser.add_argument('--corpus', action='append', default=[], help="语料文件 (JSON Lines)，可重复")
+    train_parser.add_argument('--generate', type=int, default=20000, help="额外生成的合成样本数")
+    train_parser.add_argument('--epochs', type=int, default=10, help="训练轮数")
+    train_parser.add_argument('--learning-rate', type=float, default=5.0, help="学习率")
+    train_parser.add_argument('--hash-bits', type=int, default=14, help="哈希特征维度的位数")
+    train_parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    train_parser.add_argument('-o', '--output', default=None, help="模型输出路径")
+
+    bench_parser = subparsers.add_parser('bench', help="与关键词匹配对比基准测试")
+    bench_parser.add_argument('--model', default=None, help="模型路径")
+    bench_parser.add_argument('--count', type=int, default=5000, help="测试样本数")
+    bench_parser.add_argument('--seed', type=int, default=0, help="随机种子")
+
+    args = parser.parse_args()
+    return train(args) if args.command == 'train' else bench(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
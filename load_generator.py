@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+MQTT负载生成工具
+模拟 N 个家庭、每个家庭 M 个设备：每个家庭一个连接（共用一个selector线程），设备收到指令后在状态主题上报；
+按目标速率经 MQTTClient.publish_confirmed（指令合并 → 限速 → 发布 → 等待上报确认）发送指令，
+统计吞吐量、发布到设备确认的延迟分位数、CPU和内存
+用法:
+    python load_generator.py --homes 20 --devices 10 --rate 200 --duration 30
+    python load_generator.py --broker 192.168.1.10:1883 --rate 50 --keep-rate-limit
+未指定 --broker 时在进程内启动本地MQTT服务器
+"""
+
+import sys
+import os
+import time
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from config import (MQTT_CONFIG, MQTT_TLS_CONFIG, MQTT_V5_CONFIG, RATE_LIMIT_CONFIG, COMMAND_CONFIRM_CONFIG,
+                    INBOUND_DISPATCH_CONFIG, LINK_MONITOR_CONFIG)
+from mqtt_client import MQTTClient
+from mqtt_multiplexer import MultiHomeMQTTManager
+from mqtt_broker import BrokerThread
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else 0.0
+
+
+@contextlib.contextmanager
+def config_overrides(overrides):
+    """临时修改配置字典（overrides 为 [(配置字典, 覆盖值), ...]），退出时恢复"""
+    saved = [(section, dict(section)) for section, _ in overrides]
+    for section, values in overrides:
+        section.update(values)
+    try:
+        yield
+    finally:
+        for section, values in saved:
+            section.clear()
+            section.update(values)
+
+
+class ResourceSampler:
+    """后台采样本进程的CPU占用和内存（有psutil时采样RSS，否则使用峰值RSS）"""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.rss_samples = []
+        self.thread = None
+        self.start_wall = self.start_cpu = 0.0
+
+    def start(self):
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        if PSUTIL_AVAILABLE:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        process = psutil.Process()
+        while not self.stop_event.wait(self.interval):
+            self.rss_samples.append(process.memory_info().rss)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        wall = time.perf_counter() - self.start_wall
+        result = {'cpu_percent': (time.process_time() - self.start_cpu) / wall * 100 if wall else 0.0}
+        if self.rss_samples:
+            result['rss_mb'] = self.rss_samples[-1] / 1024 / 1024
+            result['peak_rss_mb'] = max(self.rss_samples) / 1024 / 1024
+        elif resource is not None:
+            # Linux上ru_maxrss单位为KB，macOS为字节
+            scale = 1 if sys.platform == 'darwin' else 1024
+            result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 / 1024
+        return result
+
+
+class SimulatedHomes:
+    """模拟家庭与设备：设备收到指令后延迟 report_delay 秒在 {topic}/state 上报同样的内容"""
+
+    def __init__(self, host, port, homes, devices, report_delay=0.0):
+        self.manager = MultiHomeMQTTManager()
+        self.report_delay = report_delay
+        self.topics = []
+        self.commands_received = 0
+        for i in range(homes):
+            home_topics = [f'h{i}d{j}' for j in range(devices)]
+            self.topics.extend(home_topics)
+            self.manager.add_home(f'home{i}', f'load_home_{os.getpid()}_{i}', host, port,
+                                  topics=home_topics, handler=self._on_command)
+
+    def _on_command(self, home_id, record):
+        self.commands_received += 1
+        report = (home_id, f'{record.topic}/state', record.payload)
+        if self.report_delay:
+            threading.Timer(self.report_delay, self.manager.publish, report).start()
+        else:
+            self.manager.publish(*report)
+
+    def start(self, timeout=30.0):
+        self.manager.start()
+        deadline = time.time() + timeout
+        while self.manager.get_stats()['connected'] < len(self.manager.homes) and time.time() < deadline:
+            time.sleep(0.05)
+        return self.manager.get_stats()['connected']
+
+    def stop(self):
+        self.manager.stop()
+
+
+def drive(client, topics, rate, duration, workers, timeout, attempts):
+    """按目标速率轮流向各设备发送开/关指令，返回每条指令的 ConfirmationResult 与实际发送耗时"""
+    total = max(1, int(rate * duration))
+    states = {}
+    results = []
+    results_lock = threading.Lock()
+
+    def send(topic, command):
+        result = client.publish_confirmed(topic, command, timeout=timeout, max_attempts=attempts)
+        with results_lock:
+            results.append(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for index in range(total):
+            delay = start + index / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            topic = topics[index % len(topics)]
+            # 每次切换状态，避免被状态影子当作重复指令跳过
+            states[topic] = 'off' if states.get(topic) == 'on' else 'on'
+            pool.submit(send, topic, states[topic])
+        offered_elapsed = time.perf_counter() - start
+    return results, offered_elapsed, time.perf_counter() - start
+
+
+def report(args, results, offered_elapsed, elapsed, resources, client, homes):
+    confirmed = sorted(result.latency * 1000 for result in results if result.confirmed)
+    unconfirmed = sum(1 for result in results if result.sent and not result.confirmed)
+    not_sent = sum(1 for result in results if not result.sent)
+    retries = sum(max(0, result.attempts - 1) for result in results)
+    inbound = client.get_inbound_stats()
+    print("=" * 80)
+    print(f"家庭 {args.homes} × 设备 {args.devices}，目标 {args.rate:.0f} 条/秒，持续 {args.duration:.0f} 秒")
+    print(f"发送指令: {len(results)} 条，实际发出速率 {len(results) / offered_elapsed:.1f} 条/秒")
+    print(f"确认: {len(confirmed)} 条 ({len(confirmed) / elapsed:.1f} 条/秒)，未确认 {unconfirmed} 条，"
+          f"未发出 {not_sent} 条，重发 {retries} 次")
+    if confirmed:
+        print(f"发布→确认延迟: p50 {percentile(confirmed, 0.5):.1f} ms  p90 {percentile(confirmed, 0.9):.1f} ms  "
+              f"p99 {percentile(confirmed, 0.99):.1f} ms  最大 {confirmed[-1]:.1f} ms")
+    print(f"设备收到指令: {homes.commands_received} 条；接收队列处理 {inbound.get('processed', 0)} 条，"
+          f"丢弃 {inbound.get('dropped', 0)} 条")
+    for lane, stats in client.get_rate_limit_stats().items():
+        print(f"限速通道 {lane}: 平均排队 {stats['avg_wait_ms']:.1f} ms，p95 {stats['p95_wait_ms']:.1f} ms")
+    line = f"CPU {resources['cpu_percent']:.0f}%"
+    if 'rss_mb' in resources:
+        line += f"，内存 {resources['rss_mb']:.1f} MB"
+    if 'peak_rss_mb' in resources:
+        line += f"，峰值内存 {resources['peak_rss_mb']:.1f} MB"
+    if not PSUTIL_AVAILABLE:
+        line += "（安装 psutil 可采样实时内存）"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT负载生成工具")
+    parser.add_argument('--broker', default='', help="服务器地址 host:port，默认在进程内启动本地服务器")
+    parser.add_argument('--homes', type=int, default=10, help="模拟的家庭数")
+    parser.add_argument('--devices', type=int, default=5, help="每个家庭的设备数")
+    parser.add_argument('--rate', type=float, default=50.0, help="目标指令速率（条/秒）")
+    parser.add_argument('--duration', type=float, default=10.0, help="持续时间（秒）")
+    parser.add_argument('--workers', type=int, default=64, help="同时等待确认的指令数上限")
+    parser.add_argument('--timeout', type=float, default=COMMAND_CONFIRM_CONFIG.get('timeout', 2.0),
+                        help="等待设备确认的时间（秒）")
+    parser.add_argument('--attempts', type=int, default=1, help="每条指令最多发送次数")
+    parser.add_argument('--report-delay', type=float, default=0.0, help="模拟设备执行指令的耗时（秒）")
+    parser.add_argument('--keep-rate-limit', action='store_true', help="保留配置中的发布限速（默认关闭以测量上限）")
+    parser.add_argument('--verbose', action='store_true', help="输出客户端的逐条日志")
+    args = parser.parse_args()
+
+    broker = None
+    if args.broker:
+        host, _, port = args.broker.partition(':')
+        port = int(port or 1883)
+    else:
+        broker = BrokerThread('127.0.0.1', 0)
+        host, port = broker.start()
+    print(f"🏭 MQTT负载测试: {host}:{port}，{args.homes} 个家庭 × {args.devices} 个设备")
+
+    homes = SimulatedHomes(host, port, args.homes, args.devices, args.report_delay)
+    connected = homes.start()
+    if connected < args.homes:
+        print(f"❌ 只有 {connected}/{args.homes} 个家庭连接成功")
+        homes.stop()
+        return 1
+
+    overrides = [
+        (MQTT_CONFIG, {'broker': host, 'port': port, 'client_id': f'load_controller_{os.getpid()}',
+                       'use_private_key': True, 'username': '', 'password': ''}),
+        (MQTT_TLS_CONFIG, {'enabled': False}),
+        (MQTT_V5_CONFIG, {'enabled': False}),
+        (COMMAND_CONFIRM_CONFIG, {'enabled': True, 'state_topic': '{topic}/state'}),
+        (INBOUND_DISPATCH_CONFIG, {'log_each_message': args.verbose}),
+        (LINK_MONITOR_CONFIG, {'enabled': False}),
+    ]
+    if not args.keep_rate_limit:
+        overrides.append((RATE_LIMIT_CONFIG, {'enabled': False}))
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with config_overrides(overrides):
+        with output:
+            client = MQTTClient(queue_path=':memory:', archive_dir='')
+            client.connect()
+    with output:
+        deadline = time.time() + 10
+        while (not client.is_connected or client.pending_subscribes) and time.time() < deadline:
+            time.sleep(0.01)
+    if not client.is_connected:
+        print("❌ 控制端连接失败")
+        homes.stop()
+        return 1
+
+    sampler = ResourceSampler()
+    sampler.start()
+    try:
+        with output:
+            results, offered_elapsed, elapsed = drive(client, homes.topics, args.rate, args.duration,
+                                                      args.workers, args.timeout, args.attempts)
+        resources = sampler.stop()
+        report(args, results, offered_elapsed, elapsed, resources, client, homes)
+    finally:
+        with output:
+            client.disconnect()
+        homes.stop()
+        if broker is not None:
+            broker.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
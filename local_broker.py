@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+本地MQTT服务器
+没有外网时代替巴法云：程序和局域网内的设备都连接本机运行的服务器
+用法:
+    python local_broker.py --host 0.0.0.0 --port 1883
+    （config.py 中 MQTT_CONFIG['broker'] 改为本机地址，或启用 LOCAL_BROKER_CONFIG 由界面程序自动启动）
+"""
+
+import sys
+import os
+import asyncio
+import argparse
+from datetime import datetime
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from config import LOCAL_BROKER_CONFIG
+from mqtt_broker import MQTTBroker
+
+
+async def run(host, port, stats_interval):
+    broker = MQTTBroker(host, port)
+    port = await broker.start()
+    print(f"📡 本地MQTT服务器已启动: {host}:{port} (Ctrl+C 停止)")
+    try:
+        if stats_interval <= 0:
+            await broker.serve_forever()
+            return
+        while True:
+            await asyncio.sleep(stats_interval)
+            stats = broker.get_stats()
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 客户端 {stats['clients']}，订阅 {stats['subscriptions']}，"
+                  f"保留消息 {stats['retained']}，收到 {stats['messages_received']} 条，"
+                  f"转发 {stats['messages_sent']} 条，丢弃 {stats['messages_dropped']} 条")
+    finally:
+        await broker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地MQTT服务器")
+    parser.add_argument('--host', default=LOCAL_BROKER_CONFIG.get('host', '0.0.0.0'), help="监听地址")
+    parser.add_argument('--port', type=int, default=LOCAL_BROKER_CONFIG.get('port', 1883), help="监听端口")
+    parser.add_argument('--stats-interval', type=float, default=60.0, help="统计输出间隔（秒），0表示不输出")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.host, args.port, args.stats_interval))
+    except KeyboardInterrupt:
+        print("\n本地MQTT服务器已停止")
+    except OSError as e:
+        print(f"❌ 无法监听 {args.host}:{args.port}: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
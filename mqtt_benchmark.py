@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+MQTT发布吞吐量基准测试工具
+对比 paho 线程版 MQTTClient.publish_async 与 asyncio 版 AsyncMQTTClient.publish
+用法:
+    python mqtt_benchmark.py --broker 127.0.0.1:1883 --count 5000 --qos 1
+"""
+
+import sys
+import os
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import wait
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from config import MQTT_CONFIG
+from mqtt_client import MQTTClient
+from async_mqtt_client import AsyncMQTTClient
+
+
+def summarize(name, count, elapsed, latencies):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000 if latencies else 0.0
+    print(f"{name:<10} {count:>7} 条  {elapsed:7.2f} 秒  {count / elapsed:9.0f} 条/秒  "
+          f"p50 {p50:6.2f} ms  p95 {p95:6.2f} ms  线程 {threading.active_count()}")
+    return {'name': name, 'count': count, 'elapsed': elapsed, 'rate': count / elapsed, 'p50_ms': p50, 'p95_ms': p95}
+
+
+def bench_threaded(host, port, count, qos, topic):
+    """paho线程版：publish_async 流水线发布"""
+    saved = dict(MQTT_CONFIG)
+    MQTT_CONFIG.update({'broker': host, 'port': port, 'client_id': f'bench_threaded_{os.getpid()}',
+                        'use_private_key': True, 'username': '', 'password': ''})
+    try:
+        client = MQTTClient(queue_path=':memory:', archive_dir='')
+    finally:
+        MQTT_CONFIG.clear()
+        MQTT_CONFIG.update(saved)
+    client.client.connect(host, port, 60)
+    client.network_thread = threading.Thread(target=client._network_loop, daemon=True)
+    client.network_thread.start()
+    deadline = time.time() + 10
+    while not client.is_connected and time.time() < deadline:
+        time.sleep(0.01)
+    if not client.is_connected:
+        raise ConnectionError(f"无法连接 {host}:{port}")
+    try:
+        start = time.perf_counter()
+        futures = [client.publish_async(topic, str(i), qos) for i in range(count)]
+        wait(futures, timeout=120)
+        elapsed = time.perf_counter() - start
+        latencies = [future.result()['latency'] for future in futures if future.done() and not future.exception()]
+        return summarize('threaded', len(latencies), elapsed, latencies)
+    finally:
+        client.disconnect()
+
+
+async def bench_asyncio(host, port, count, qos, topic):
+    """asyncio版：在一个事件循环上并发 publish"""
+    client = AsyncMQTTClient(client_id=f'bench_asyncio_{os.getpid()}', broker=host, port=port, topics=[])
+    await client.connect()
+    try:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(client.publish(topic, str(i), qos, timeout=120) for i in range(count)),
+                                       return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        latencies = [result['latency'] for result in results if isinstance(result, dict)]
+        return summarize('asyncio', len(latencies), elapsed, latencies)
+    finally:
+        await client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT发布吞吐量基准测试")
+    parser.add_argument('--broker', default='127.0.0.1:1883', help="服务器地址 host:port")
+    parser.add_argument('--count', type=int, default=5000, help="每种方式发布的消息数")
+    parser.add_argument('--qos', type=int, default=1, choices=(0, 1))
+    parser.add_argument('--topic', default='bench/publish')
+    args = parser.parse_args()
+
+    host, _, port = args.broker.partition(':')
+    port = int(port or 1883)
+    print(f"📊 MQTT发布基准测试: {host}:{port}, {args.count} 条, QoS{args.qos}")
+    print("=" * 80)
+    threaded = bench_threaded(host, port, args.count, args.qos, args.topic)
+    async_result = asyncio.run(bench_asyncio(host, port, args.count, args.qos, args.topic))
+    print("=" * 80)
+    print(f"asyncio / threaded 吞吐量: {async_result['rate'] / threaded['rate']:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
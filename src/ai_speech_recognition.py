@@ -13,6 +13,7 @@ import requests
 import base64
 from datetime import datetime
 from config import SPEECH_CONFIG, AI_SPEECH_CONFIG, WAKE_WORD_CONFIG
+from phonetic_index import WakeWordMatcher
 
 class AISpeechRecognizer:
     def __init__(self, status_callback=None):
@@ -35,6 +36,7 @@ class AISpeechRecognizer:
             self.wake_word_timeout = WAKE_WORD_CONFIG.get('timeout', 3)
             self.command_timeout = WAKE_WORD_CONFIG.get('command_timeout', 10)
             self.wake_sensitivity = WAKE_WORD_CONFIG.get('sensitivity', 0.7)
+            self.wake_word_matcher = WakeWordMatcher(self.wake_words, self.wake_sensitivity)
             
             # 高级唤醒词配置
             self.fallback_detection = WAKE_WORD_CONFIG.get('fallback_detection', True)
@@ -114,6 +116,40 @@ class AISpeechRecognizer:
             self._update_status(f"Whisper加载失败: {e}")
             self.engine = 'google'
     
+    def apply_config_changes(self, changes):
+        """
+        应用配置热更新
+        唤醒词参数直接替换，无需重新校准麦克风；只有AI引擎配置变化时才重新初始化引擎
+        """
+        if 'WAKE_WORD_CONFIG' in changes:
+            old, new = changes['WAKE_WORD_CONFIG']
+            self.wake_word_enabled = new.get('enabled', True)
+            self.wake_word_timeout = new.get('timeout', 3)
+            self.command_timeout = new.get('command_timeout', 10)
+            self.wake_sensitivity = new.get('sensitivity', 0.7)
+            self.fallback_detection = new.get('fallback_detection', True)
+            self.confidence_threshold = new.get('confidence_threshold', 0.6)
+            self.retry_count = new.get('retry_count', 3)
+            self.audio_feedback = new.get('audio_feedback', True)
+            self.adaptive_threshold = new.get('adaptive_threshold', True)
+            self.noise_reduction = new.get('noise_reduction', True)
+            if old.get('keywords') != new.get('keywords'):
+                self.wake_words = new.get('keywords', ['小智'])
+                self.wake_word_matcher.set_wake_words(self.wake_words)
+            if old.get('energy_threshold') != new.get('energy_threshold'):
+                self.dynamic_energy_threshold = new.get('energy_threshold', 300)
+                self.recognizer.energy_threshold = self.dynamic_energy_threshold
+            self._update_status(f"唤醒词配置已更新，支持唤醒词：{'、'.join(self.wake_words)}")
+
+        if 'AI_SPEECH_CONFIG' in changes:
+            old, new = changes['AI_SPEECH_CONFIG']
+            engine = new.get('engine', 'baidu')
+            # 只比较配置前后的值：引擎回退（如百度未配置改用google）后，修改其他配置项不应重建可用的引擎；
+            # 同一Whisper模型也无需重新加载
+            if engine != old.get('engine', 'baidu') or old.get(engine) != new.get(engine):
+                self.engine = engine
+                self._init_ai_engine()
+
     def _update_status(self, message):
         """更新状态显示"""
         if self.status_callback:
@@ -329,12 +365,15 @@ class AISpeechRecognizer:
                     phrase_time_limit=WAKE_WORD_CONFIG.get('phrase_timeout', 2)
                 )
             
-            # 使用轻量级识别检测唤醒词（使用Google引擎，速度快）
+            # 使用轻量级识别检测唤醒词（使用Google引擎，速度快），取全部候选结果
             try:
-                text = self.recognizer.recognize_google(audio, language=SPEECH_CONFIG['language'])
-                if text:
-                    self._update_status(f"🔍 检测内容: {text}")
-                    return self._check_wake_word_match(text)
+                hypotheses = self._extract_hypotheses(
+                    self.recognizer.recognize_google(audio, language=SPEECH_CONFIG['language'], show_all=True)
+                )
+                if hypotheses:
+                    self._update_status(f"🔍 检测内容: {hypotheses[0]}")
+                    return self._check_wake_word_match(hypotheses)
+                return False
             except sr.UnknownValueError:
                 # 无法识别，继续等待
                 return False
@@ -349,23 +388,35 @@ class AISpeechRecognizer:
             self._update_status(f"⚠️ 唤醒词检测出错: {e}")
             return False
     
+    def _extract_hypotheses(self, result):
+        """从识别引擎的完整返回结果中提取n-best候选文本"""
+        if isinstance(result, str):
+            return [result] if result else []
+        if not isinstance(result, dict):
+            return []
+        return [alt['transcript'] for alt in result.get('alternative', []) if alt.get('transcript')]
+    
     def _check_wake_word_match(self, text):
-        """检查文本是否包含唤醒词"""
-        text_lower = text.lower()
-        for wake_word in self.wake_words:
-            if wake_word.lower() in text_lower:
-                self._update_status(f"✅ 检测到唤醒词: {wake_word}")
-                self.wake_word_detections += 1
-                self._adaptive_threshold_adjustment(True)
-                
-                # 音频反馈
-                if self.audio_feedback:
-                    self._play_wake_word_feedback()
-                
-                return True
+        """检查文本（或n-best候选列表）是否包含唤醒词，按拼音容忍同音/近音"""
+        hypotheses = [text] if isinstance(text, str) else list(text)
+        match = self.wake_word_matcher.match(hypotheses, self.wake_sensitivity)
+        if match:
+            if match['similarity'] < 1.0 or match['hypothesis_index'] > 0:
+                self._update_status(f"✅ 检测到唤醒词: {match['wake_word']} "
+                                    f"(候选: {match['text']}, 相似度: {match['similarity']:.2f})")
+            else:
+                self._update_status(f"✅ 检测到唤醒词: {match['wake_word']}")
+            self.wake_word_detections += 1
+            self._adaptive_threshold_adjustment(True)
+            
+            # 音频反馈
+            if self.audio_feedback:
+                self._play_wake_word_feedback()
+            
+            return True
         
         # 如果没有检测到唤醒词，可能是误检
-        if len(text_lower) > 0:
+        if any(hypotheses):
             self.false_positives += 1
             self._adaptive_threshold_adjustment(False)
             
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio MQTT通信模块
+与 MQTTClient 功能对应的asyncio版本：连接、批量订阅、等待确认的发布、异步迭代接收消息和自动重连。
+网络收发通过 loop.add_reader/add_writer 挂在事件循环上，不为每个连接创建后台线程，
+便于和异步语音识别引擎、HTTP接口或定时任务组合使用
+"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+
+from config import MQTT_CONFIG, MQTT_TOPICS, MQTT_PUBLISH_CONFIG, MQTT_RECONNECT_CONFIG
+from mqtt_client import ReconnectBackoff
+from message_log import MessageRecord, DIRECTION_RECEIVED
+from topic_router import TopicRouter, validate_filter
+
+
+class AsyncMQTTClient:
+    """基于asyncio事件循环的MQTT客户端"""
+
+    def __init__(self, client_id=None, broker=None, port=None, keep_alive=None, username=None, password=None,
+                 auto_reconnect=None, queue_size=1000, topics=None, connect_timeout=10.0):
+        """
+        未指定的参数取 MQTT_CONFIG 中的值；使用私钥登录时不设置用户名密码
+        topics: 连接后订阅的主题，默认为 MQTT_TOPICS 中的所有主题
+        queue_size: 等待异步迭代读取的消息上限，超出时丢弃最早的消息
+        connect_timeout: 重连时等待CONNACK的时间（秒），超时后继续按退避策略重连
+        """
+        self.client_id = client_id if client_id is not None else MQTT_CONFIG['client_id']
+        self.broker = broker or MQTT_CONFIG['broker']
+        self.port = port or MQTT_CONFIG['port']
+        self.keep_alive = keep_alive or MQTT_CONFIG.get('keep_alive', 60)
+        if username is None and not MQTT_CONFIG.get('use_private_key', True):
+            username, password = MQTT_CONFIG.get('username'), MQTT_CONFIG.get('password')
+        self.auto_reconnect = MQTT_RECONNECT_CONFIG.get('enabled', True) if auto_reconnect is None else auto_reconnect
+        self.backoff = ReconnectBackoff(MQTT_RECONNECT_CONFIG.get('min_delay', 1.0),
+                                        MQTT_RECONNECT_CONFIG.get('max_delay', 60.0),
+                                        MQTT_RECONNECT_CONFIG.get('jitter', 0.5))
+
+        self.client = mqtt.Client(self.client_id)
+        if username:
+            self.client.username_pw_set(username, password)
+        self.client.max_inflight_messages_set(MQTT_PUBLISH_CONFIG.get('max_inflight', 20))
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        self.client.on_publish = self._on_publish
+        self.client.on_subscribe = self._on_subscribe
+        self.client.on_unsubscribe = self._on_unsubscribe
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+        self.subscriptions = {topic: 0 for topic in (MQTT_TOPICS.values() if topics is None else topics)}
+        self.router = TopicRouter()
+        self.queue_size = queue_size
+        self.connect_timeout = connect_timeout
+        self.loop = None
+        self.loop_thread = None
+        self.messages_queue = None
+        self.connected_event = None
+        self.connect_waiter = None
+        self.disconnect_waiter = None
+        self.misc_task = None
+        self.reconnect_task = None
+        self.closing = False
+        self.is_connected = False
+
+        self.pending_publishes = {}  # mid -> (Future, 发布时间, 主题, QoS)
+        self.pending_acks = {}  # mid -> Future（SUBACK/UNSUBACK）
+        self.ack_latencies = deque(maxlen=MQTT_PUBLISH_CONFIG.get('latency_samples', 1000))
+        self.received = 0
+        self.dropped = 0
+        self.reconnect_count = 0
+
+    # ---- 连接 ----
+
+    async def connect(self, timeout=10.0):
+        """连接服务器并等待CONNACK，成功后订阅 subscriptions 中的主题"""
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        if self.messages_queue is None:
+            self.messages_queue = asyncio.Queue()
+            self.connected_event = asyncio.Event()
+        self.closing = False
+        await asyncio.wait_for(self._connect_once(), timeout)
+        return True
+
+    async def _connect_once(self):
+        self.connect_waiter = self.loop.create_future()
+        # TCP连接和DNS解析是阻塞调用，放到默认线程池中执行，不阻塞事件循环
+        await self.loop.run_in_executor(None, self.client.connect, self.broker, self.port, self.keep_alive)
+        rc = await asyncio.wait_for(self.connect_waiter, self.connect_timeout)
+        if rc != 0:
+            raise ConnectionError(f"MQTT连接失败: {mqtt.connack_string(rc)}")
+
+    async def disconnect(self):
+        """断开连接，不再自动重连"""
+        self.closing = True
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
+            self.reconnect_task = None
+        if self.client.socket() is not None:
+            self.disconnect_waiter = self.loop.create_future()
+            self.client.disconnect()
+            try:
+                await asyncio.wait_for(self.disconnect_waiter, 2.0)
+            except asyncio.TimeoutError:
+                pass
+        self.is_connected = False
+
+    async def wait_connected(self, timeout=None):
+        """等待连接（或重连）成功"""
+        await asyncio.wait_for(self.connected_event.wait(), timeout)
+
+    # ---- 订阅与发布 ----
+
+    async def subscribe(self, *topics, qos=0, handler=None, timeout=10.0):
+        """
+        在一个SUBSCRIBE报文中订阅多个主题（支持通配符），返回服务器授予的QoS列表
+        handler(record): 可选的消息处理函数，注册到所有这些主题
+        """
+        for topic in topics:
+            validate_filter(topic)
+            self.subscriptions[topic] = qos
+            if handler is not None:
+                self.router.add(topic, handler)
+        if not self.is_connected:
+            return None
+        result, mid = self.client.subscribe([(topic, qos) for topic in topics])
+        if result != mqtt.MQTT_ERR_SUCCESS:
+            raise ConnectionError(f"订阅失败，错误代码: {result}")
+        return await self._wait_ack(mid, timeout)
+
+    async def unsubscribe(self, *topics, timeout=10.0):
+        for topic in topics:
+            self.subscriptions.pop(topic, None)
+            self.router.remove(topic)
+        if not self.is_connected:
+            return None
+        result, mid = self.client.unsubscribe(list(topics))
+        if result != mqtt.MQTT_ERR_SUCCESS:
+            raise ConnectionError(f"退订失败，错误代码: {result}")
+        return await self._wait_ack(mid, timeout)
+
+    async def _wait_ack(self, mid, timeout):
+        future = self.loop.create_future()
+        self.pending_acks[mid] = future
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending_acks.pop(mid, None)
+
+    async def publish(self, topic, payload, qos=None, timeout=10.0):
+        """
+        发布消息并等待确认：QoS0在写入网络后返回，QoS1在收到PUBACK后返回
+        断线重连期间等待连接恢复（总时间不超过timeout），返回 {mid, topic, qos, latency}
+        """
+        if qos is None:
+            qos = MQTT_PUBLISH_CONFIG.get('default_qos', 0)
+        deadline = time.monotonic() + timeout
+        if not self.is_connected:
+            if not self.auto_reconnect or self.closing:
+                raise ConnectionError("MQTT未连接，无法发送消息")
+            await self.wait_connected(timeout)
+        future = self.loop.create_future()
+        published_at = time.perf_counter()
+        info = self.client.publish(topic, payload, qos)
+        if info.rc not in (mqtt.MQTT_ERR_SUCCESS, mqtt.MQTT_ERR_NO_CONN):
+            raise ConnectionError(f"发布失败: {mqtt.error_string(info.rc)}")
+        self.pending_publishes[info.mid] = (future, published_at, topic, qos)
+        try:
+            return await asyncio.wait_for(future, max(0.0, deadline - time.monotonic()))
+        finally:
+            self.pending_publishes.pop(info.mid, None)
+
+    def add_message_handler(self, topic_filter, handler):
+        """注册消息处理函数（不改变订阅），handler(record) 在事件循环中调用"""
+        self.router.add(topic_filter, handler)
+
+    # ---- 接收消息 ----
+
+    def __aiter__(self):
+        return self.messages()
+
+    async def messages(self):
+        """异步迭代接收到的消息：async for record in client.messages()"""
+        while True:
+            yield await self.messages_queue.get()
+
+    async def next_message(self, timeout=None):
+        return await asyncio.wait_for(self.messages_queue.get(), timeout)
+
+    def get_stats(self):
+        samples = sorted(self.ack_latencies)
+        return {
+            'connected': self.is_connected,
+            'received': self.received,
+            'dropped': self.dropped,
+            'queued': self.messages_queue.qsize() if self.messages_queue is not None else 0,
+            'in_flight': len(self.pending_publishes),
+            'reconnect_count': self.reconnect_count,
+            'ack_count': len(samples),
+            'p50_ms': samples[len(samples) // 2] * 1000 if samples else 0.0,
+            'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000 if samples else 0.0,
+        }
+
+    # ---- paho回调（在事件循环线程中调用）----
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if self.connect_waiter is not None and not self.connect_waiter.done():
+            self.connect_waiter.set_result(rc)
+        if rc != 0:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT连接失败，错误代码: {rc}")
+            return
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT连接成功 (asyncio)")
+        self.is_connected = True
+        self.backoff.reset()
+        self.connected_event.set()
+        if self.subscriptions:
+            client.subscribe(list(self.subscriptions.items()))
+
+    def _on_disconnect(self, client, userdata, rc):
+        was_connected = self.is_connected
+        self.is_connected = False
+        self.connected_event.clear()
+        if self.disconnect_waiter is not None and not self.disconnect_waiter.done():
+            self.disconnect_waiter.set_result(rc)
+        if self.connect_waiter is not None and not self.connect_waiter.done():
+            # 收到CONNACK之前连接被关闭（如服务器正在重启）：本次连接失败，由调用方或重连任务继续处理
+            self.connect_waiter.set_exception(ConnectionError("MQTT连接在收到CONNACK之前断开"))
+            if not was_connected:
+                return
+        if self.closing or not self.auto_reconnect:
+            self._fail_pending(ConnectionError("MQTT连接已断开"))
+            return
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT连接断开 (rc={rc})，准备重连")
+        if self.reconnect_task is None or self.reconnect_task.done():
+            self.reconnect_task = self.loop.create_task(self._reconnect())
+
+    def _fail_pending(self, error):
+        for future, _, _, _ in list(self.pending_publishes.values()):
+            if not future.done():
+                future.set_exception(error)
+
+    async def _reconnect(self):
+        while not self.closing:
+            delay = self.backoff.next_delay()
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] {delay:.1f} 秒后尝试第 {self.backoff.attempts} 次重连")
+            await asyncio.sleep(delay)
+            try:
+                await self._connect_once()
+                self.reconnect_count += 1
+                return
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT重连失败: {e}")
+
+    def _on_message(self, client, userdata, msg):
+        self.received += 1
+        try:
+            payload = msg.payload.decode('utf-8')
+        except UnicodeDecodeError:
+            payload = msg.payload.decode('utf-8', errors='replace')
+        record = MessageRecord(time.time(), msg.topic, payload, DIRECTION_RECEIVED)
+        self.router.dispatch(record.topic, record)
+        if self.messages_queue.qsize() >= self.queue_size:
+            self.messages_queue.get_nowait()
+            self.dropped += 1
+        self.messages_queue.put_nowait(record)
+
+    def _on_publish(self, client, userdata, mid):
+        pending = self.pending_publishes.get(mid)
+        if pending is None:
+            return
+        future, published_at, topic, qos = pending
+        latency = time.perf_counter() - published_at
+        self.ack_latencies.append(latency)
+        if not future.done():
+            future.set_result({'mid': mid, 'topic': topic, 'qos': qos, 'latency': latency})
+
+    def _on_subscribe(self, client, userdata, mid, granted_qos):
+        future = self.pending_acks.get(mid)
+        if future is not None and not future.done():
+            future.set_result(list(granted_qos))
+
+    def _on_unsubscribe(self, client, userdata, mid):
+        future = self.pending_acks.get(mid)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    # ---- 把paho的socket挂到事件循环上 ----
+
+    def _in_loop(self, func, *args):
+        """在事件循环线程中执行（connect 在线程池中运行时会触发socket回调）"""
+        if threading.get_ident() == self.loop_thread:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        def register():
+            self.loop.add_reader(sock, client.loop_read)
+            if self.misc_task is None or self.misc_task.done():
+                self.misc_task = self.loop.create_task(self._misc_loop())
+        self._in_loop(register)
+
+    def _on_socket_close(self, client, userdata, sock):
+        def unregister():
+            self.loop.remove_reader(sock)
+            self.loop.remove_writer(sock)
+        self._in_loop(unregister)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._in_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._in_loop(self.loop.remove_writer, sock)
+
+    async def _misc_loop(self):
+        """处理心跳，连接断开后结束"""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1.0)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+指令执行确认模块
+发出指令后等待设备在状态主题上报的实际状态，与指令的目标状态一致才算执行成功；
+指令主题上会收到本机指令的回显，无法与设备上报区分，所以设备需要在单独的状态主题上报；
+MQTT v5 设备按指令中的关联数据回复时，直接按关联数据找到等待中的指令
+"""
+
+import time
+import itertools
+import threading
+from collections import deque
+
+from device_shadow import parse_payload
+
+TOPIC_PLACEHOLDER = '{topic}'
+
+
+class ConfirmationResult:
+    """一次带确认的指令发送结果；布尔值表示指令是否已发出（与未确认的发送结果兼容）"""
+    __slots__ = ('topic', 'command', 'sent', 'confirmed', 'attempts', 'latency', 'reported')
+
+    def __init__(self, topic, command, sent, confirmed, attempts, latency, reported=None):
+        self.topic = topic
+        self.command = command
+        self.sent = sent
+        self.confirmed = confirmed
+        self.attempts = attempts
+        self.latency = latency  # 从第一次发送到确认（或放弃）的时间（秒）
+        self.reported = reported  # 设备上报的内容
+
+    def __bool__(self):
+        return self.sent
+
+    def __repr__(self):
+        return (f"ConfirmationResult(topic={self.topic!r}, command={self.command!r}, sent={self.sent}, "
+                f"confirmed={self.confirmed}, attempts={self.attempts}, latency={self.latency:.3f})")
+
+
+class PendingConfirmation:
+    """等待设备上报的一条指令"""
+    __slots__ = ('command', 'power', 'values', 'event', 'reported', 'correlation')
+
+    def __init__(self, command, correlation=None):
+        self.command = command
+        self.correlation = correlation
+        self.power, self.values = parse_payload(command)
+        self.event = threading.Event()
+        self.reported = None
+
+    def matches(self, payload):
+        power, values = parse_payload(payload)
+        if self.power is not None and power != self.power:
+            return False
+        return not self.values or values == self.values
+
+
+class ConfirmationTracker:
+    """按设备主题跟踪等待确认的指令，并统计确认与未确认的执行耗时"""
+
+    def __init__(self, state_topic='{topic}/state', sample_size=1000):
+        """state_topic: 设备上报状态的主题模板，{topic} 为设备的指令主题"""
+        if state_topic.count(TOPIC_PLACEHOLDER) != 1:
+            raise ValueError(f"状态主题模板必须包含一个 {TOPIC_PLACEHOLDER}: {state_topic}")
+        self.state_topic = state_topic
+        self.prefix, self.suffix = state_topic.split(TOPIC_PLACEHOLDER)
+        self.lock = threading.Lock()
+        self.waiters = {}  # 设备主题 -> [PendingConfirmation]
+        self.correlations = {}  # 关联数据 -> PendingConfirmation
+        self.correlation_ids = itertools.count(1)
+        self.confirmed_latencies = deque(maxlen=sample_size)
+        self.unconfirmed_latencies = deque(maxlen=sample_size)
+        self.confirmed = 0
+        self.unconfirmed = 0
+        self.retries = 0
+        self.correlated = 0
+
+    def state_topic_for(self, topic):
+        return self.prefix + topic + self.suffix
+
+    def device_topic_for(self, state_topic):
+        """由状态主题得到设备主题，不是状态主题时返回None"""
+        if len(state_topic) <= len(self.prefix) + len(self.suffix):
+            return None
+        if not (state_topic.startswith(self.prefix) and state_topic.endswith(self.suffix)):
+            return None
+        return state_topic[len(self.prefix):len(state_topic) - len(self.suffix)]
+
+    def subscription_filter(self):
+        """订阅所有设备状态主题的过滤器，如 '+/state'"""
+        return self.state_topic.replace(TOPIC_PLACEHOLDER, '+')
+
+    def expect(self, topic, command):
+        """登记一条等待确认的指令（应在发送前调用，避免错过很快到达的上报）"""
+        with self.lock:
+            pending = PendingConfirmation(command, str(next(self.correlation_ids)).encode('ascii'))
+            self.waiters.setdefault(topic, []).append(pending)
+            self.correlations[pending.correlation] = pending
+        return pending
+
+    def cancel(self, topic, pending):
+        with self.lock:
+            self.correlations.pop(pending.correlation, None)
+            waiters = self.waiters.get(topic)
+            if waiters and pending in waiters:
+                waiters.remove(pending)
+                if not waiters:
+                    del self.waiters[topic]
+
+    def correlation_for(self, topic, command):
+        """发送指令时查询等待确认的关联数据，没有等待中的该指令时返回None"""
+        with self.lock:
+            for pending in reversed(self.waiters.get(topic, ())):
+                if pending.command == command:
+                    return pending.correlation
+        return None
+
+    def on_response(self, correlation, payload):
+        """处理带关联数据的设备回复（MQTT v5），返回是否确认了指令"""
+        with self.lock:
+            pending = self.correlations.get(bytes(correlation))
+            if pending is None or not pending.matches(payload):
+                return False
+            self.correlated += 1
+        pending.reported = payload
+        pending.event.set()
+        return True
+
+    def on_report(self, topic, payload):
+        """处理设备上报，返回确认的指令数"""
+        with self.lock:
+            waiters = self.waiters.get(topic)
+            if not waiters:
+                return 0
+            matched = [pending for pending in waiters if pending.matches(payload)]
+        for pending in matched:
+            pending.reported = payload
+            pending.event.set()
+        return len(matched)
+
+    def record(self, result):
+        with self.lock:
+            if result.confirmed:
+                self.confirmed += 1
+                self.confirmed_latencies.append(result.latency)
+            elif result.sent:
+                self.unconfirmed += 1
+                self.unconfirmed_latencies.append(result.latency)
+            self.retries += max(0, result.attempts - 1)
+
+    def get_stats(self):
+        """确认统计与耗时（毫秒）"""
+        def summary(samples):
+            samples = sorted(samples)
+            if not samples:
+                return {'avg_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+            return {
+                'avg_ms': sum(samples) / len(samples) * 1000,
+                'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+                'max_ms': samples[-1] * 1000,
+            }
+
+        with self.lock:
+            return {
+                'confirmed': self.confirmed,
+                'unconfirmed': self.unconfirmed,
+                'retries': self.retries,
+                'correlated': self.correlated,
+                'waiting': sum(len(waiters) for waiters in self.waiters.values()),
+                'confirmed_latency': summary(self.confirmed_latencies),
+                'unconfirmed_latency': summary(self.unconfirmed_latencies),
+            }
+
+
+def wait_for_confirmation(tracker, topic, command, send, timeout=2.0, max_attempts=3, before_retry=None):
+    """
+    发送指令并等待设备上报确认，超时后重发，最多 max_attempts 次
+    send(): 发送一次指令，返回是否已发出
+    before_retry(): 重发前调用（如使设备状态影子失效，避免重发被当作重复指令跳过）
+    """
+    start = time.perf_counter()
+    sent = False
+    attempts = 0
+    pending = None
+    for attempts in range(1, max_attempts + 1):
+        if attempts > 1 and before_retry is not None:
+            before_retry()
+        pending = tracker.expect(topic, command)
+        try:
+            if not send():
+                break
+            sent = True
+            if pending.event.wait(timeout):
+                result = ConfirmationResult(topic, command, True, True, attempts,
+                                            time.perf_counter() - start, pending.reported)
+                tracker.record(result)
+                return result
+        finally:
+            tracker.cancel(topic, pending)
+    result = ConfirmationResult(topic, command, sent, False, attempts, time.perf_counter() - start)
+    tracker.record(result)
+    return result
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+合成指令语料生成模块
+根据 DEVICE_COMMANDS × ACTION_KEYWORDS × ROOM_KEYWORDS 展开带标注的指令语料，
+可选注入语音识别常见噪声（同音字、丢字），用于意图识别的基准测试和准确率回归
+"""
+
+import json
+import random
+import time
+from config import DEVICE_COMMANDS, ACTION_KEYWORDS, ROOM_KEYWORDS
+
+# 指令模板：{prefix}/{suffix} 为填充词，{room} 为房间（可为空）
+COMMAND_TEMPLATES = [
+    "{action}{room}{device}",
+    "{prefix}{action}{room}{device}",
+    "{prefix}{action}一下{room}{device}",
+    "{action}{room}{device}{suffix}",
+    "{prefix}把{room}{device}{action}",
+    "{prefix}把{room}{device}给{action}",
+    "把{room}{device}{action}一下",
+]
+
+# 填充词
+FILLER_PREFIXES = ['帮我', '请', '麻烦', '给我', '']
+FILLER_SUFFIXES = ['吧', '一下', '好吗', '']
+
+# 隐含意图表达（没有明确的设备/动作关键词）
+IMPLICIT_COMMANDS = [
+    ('太黑了', '灯', 'on'),
+    ('好暗啊', '灯', 'on'),
+    ('看不清楚', '灯', 'on'),
+    ('太亮了', '灯', 'off'),
+    ('我要睡觉了', '灯', 'off'),
+    ('有点热', '空调', 'on'),
+    ('热死了', '空调', 'on'),
+    ('好冷啊', '空调', 'off'),
+    ('有点凉', '空调', 'off'),
+    ('好闷啊', '风扇', 'on'),
+    ('想吹吹风', '风扇', 'on'),
+    ('风太大了', '风扇', 'off'),
+    ('我想看节目', '电视', 'on'),
+    ('太吵了', '电视', 'off'),
+    ('阳光太刺眼', '窗帘', 'off'),
+    ('让阳光进来', '窗帘', 'on'),
+    ('想看看外面', '窗帘', 'on'),
+]
+
+# 与设备控制无关的语句，标注为无意图
+NEGATIVE_EXAMPLES = [
+    '今天天气怎么样', '现在几点了', '你好', '谢谢', '讲个笑话', '明天早上叫我',
+    '你叫什么名字', '播放音乐', '今天星期几', '晚饭吃什么', '没事了', '算了',
+    '我回来了', '帮我查一下快递', '好的', '再见',
+]
+
+# 隐含意图的修饰前缀
+IMPLICIT_PREFIXES = ['', '屋里', '房间里', '感觉', '我觉得', '']
+
+# 语音识别常见同音/近音字替换表
+HOMOPHONES = {
+    '灯': ['等', '登', '邓'],
+    '光': ['广', '逛'],
+    '空': ['控', '孔'],
+    '调': ['掉', '条'],
+    '电': ['点', '店'],
+    '视': ['是', '事'],
+    '窗': ['床', '创'],
+    '帘': ['连', '莲'],
+    '风': ['封', '疯'],
+    '扇': ['善', '山'],
+    '开': ['凯', '该'],
+    '关': ['官', '观'],
+    '闭': ['必', '避'],
+    '打': ['大', '达'],
+    '启': ['起', '企'],
+    '客': ['可', '课'],
+    '厅': ['听', '庭'],
+    '卧': ['我', '握'],
+    '室': ['是', '市'],
+    '厨': ['除', '出'],
+}
+
+
+class CommandCorpusGenerator:
+    """合成指令语料生成器"""
+
+    def __init__(self, seed=None, noise_rate=0.0, homophone_rate=0.15, drop_rate=0.05,
+                 room_rate=0.5, implicit_rate=0.0, negative_rate=0.0,
+                 device_commands=None, action_keywords=None, room_keywords=None):
+        """
+        Args:
+            seed: 随机种子，相同种子生成相同语料
+            noise_rate: 样本被注入噪声的概率 (0-1)
+            homophone_rate: 噪声样本中每个字被同音字替换的概率
+            drop_rate: 噪声样本中每个字被丢弃的概率
+            room_rate: 样本带房间信息的概率
+            implicit_rate: 生成隐含意图样本（如"屋里太黑了"）的概率
+            negative_rate: 生成无意图样本（device/action为None）的概率
+        """
+        self.random = random.Random(seed)
+        self.noise_rate = noise_rate
+        self.homophone_rate = homophone_rate
+        self.drop_rate = drop_rate
+        self.room_rate = room_rate
+        self.implicit_rate = implicit_rate
+        self.negative_rate = negative_rate
+
+        device_commands = device_commands if device_commands is not None else DEVICE_COMMANDS
+        action_keywords = action_keywords if action_keywords is not None else ACTION_KEYWORDS
+        room_keywords = room_keywords if room_keywords is not None else ROOM_KEYWORDS
+
+        self.action_keywords = {action: list(keywords) for action, keywords in action_keywords.items()}
+        self.device_keywords = self._build_device_keywords(device_commands)
+        self.room_keywords = [(room, keyword) for room, keywords in room_keywords.items()
+                              for keyword in keywords]
+
+    def _build_device_keywords(self, device_commands):
+        """整理设备关键词，去掉本身包含动作词的关键词（如'拉开窗帘'）以免标注冲突"""
+        all_actions = [kw for keywords in self.action_keywords.values() for kw in keywords]
+        device_keywords = []
+        for device, config in device_commands.items():
+            for keyword in config['keywords']:
+                if any(action in keyword for action in all_actions):
+                    continue
+                device_keywords.append((device, keyword))
+        return device_keywords
+
+    def generate_one(self):
+        """
+        生成一条带标注的样本
+        返回: {
+            'text': 指令文本,
+            'device': 设备类型,
+            'action': 操作类型,
+            'room': 房间 (可能为None),
+            'noisy': 是否注入了噪声
+        }
+        """
+        rnd = self.random
+        kind = rnd.random()
+        if kind < self.negative_rate:
+            text, device, action, room = rnd.choice(NEGATIVE_EXAMPLES), None, None, None
+        elif kind < self.negative_rate + self.implicit_rate:
+            text, device, action, room = self._generate_implicit()
+        else:
+            text, device, action, room = self._generate_explicit()
+
+        noisy = False
+        if self.noise_rate > 0 and rnd.random() < self.noise_rate:
+            noisy_text = self._inject_noise(text)
+            noisy = noisy_text != text
+            text = noisy_text
+
+        return {
+            'text': text,
+            'device': device,
+            'action': action,
+            'room': room,
+            'noisy': noisy
+        }
+
+    def _pick_room(self):
+        """按概率选择房间，返回 (房间, 房间文本)"""
+        rnd = self.random
+        if self.room_keywords and rnd.random() < self.room_rate:
+            room, room_keyword = rnd.choice(self.room_keywords)
+            return room, room_keyword + rnd.choice(['的', ''])
+        return None, ''
+
+    def _generate_explicit(self):
+        """按模板生成带明确设备和动作关键词的指令"""
+        rnd = self.random
+        device, device_keyword = rnd.choice(self.device_keywords)
+        action = rnd.choice(list(self.action_keywords))
+        action_keyword = rnd.choice(self.action_keywords[action])
+        room, room_text = self._pick_room()
+
+        template = rnd.choice(COMMAND_TEMPLATES)
+        text = template.format(
+            prefix=rnd.choice(FILLER_PREFIXES),
+            suffix=rnd.choice(FILLER_SUFFIXES),
+            action=action_keyword,
+            room=room_text,
+            device=device_keyword,
+        )
+        return text, device, action, room
+
+    def _generate_implicit(self):
+        """生成隐含意图的表达"""
+        rnd = self.random
+        phrase, device, action = rnd.choice(IMPLICIT_COMMANDS)
+        room, room_text = self._pick_room()
+        prefix = room_text.rstrip('的') + '里' if room else rnd.choice(IMPLICIT_PREFIXES)
+        return prefix + phrase, device, action, room
+
+    def _inject_noise(self, text):
+        """注入ASR风格噪声：同音字替换和丢字"""
+        rnd = self.random
+        chars = []
+        for char in text:
+            roll = rnd.random()
+            if roll < self.drop_rate and len(text) > 2:
+                continue
+            if char in HOMOPHONES and roll < self.drop_rate + self.homophone_rate:
+                char = rnd.choice(HOMOPHONES[char])
+            chars.append(char)
+        return ''.join(chars) or text
+
+    def iter_samples(self, count=None):
+        """惰性生成样本，count为None时无限生成"""
+        generated = 0
+        while count is None or generated < count:
+            yield self.generate_one()
+            generated += 1
+
+    def write_jsonl(self, path, count):
+        """以JSON Lines格式流式写入语料文件，返回写入的样本数"""
+        written = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for sample in self.iter_samples(count):
+                f.write(json.dumps(sample, ensure_ascii=False))
+                f.write('\n')
+                written += 1
+        return written
+
+
+def load_corpus(path):
+    """惰性读取JSON Lines语料文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def evaluate_intent_recognizer(recognizer, samples):
+    """
+    在标注语料上评估意图识别器
+    返回准确率和吞吐量统计
+    """
+    stats = {
+        'total': 0,
+        'device_correct': 0,
+        'action_correct': 0,
+        'intent_correct': 0,
+        'room_correct': 0,
+        'unrecognized': 0,
+        'noisy_total': 0,
+        'noisy_correct': 0,
+    }
+
+    elapsed = 0.0
+    for sample in samples:
+        start = time.perf_counter()
+        intent = recognizer.recognize_intent(sample['text'])
+        elapsed += time.perf_counter() - start
+
+        stats['total'] += 1
+        device_ok = intent['device'] == sample['device']
+        action_ok = intent['action'] == sample['action']
+        if intent['device'] is None:
+            stats['unrecognized'] += 1
+        if device_ok:
+            stats['device_correct'] += 1
+        if action_ok:
+            stats['action_correct'] += 1
+        if device_ok and action_ok:
+            stats['intent_correct'] += 1
+        if intent['room'] == sample.get('room'):
+            stats['room_correct'] += 1
+        if sample.get('noisy'):
+            stats['noisy_total'] += 1
+            if device_ok and action_ok:
+                stats['noisy_correct'] += 1
+
+    total = max(1, stats['total'])
+    stats['intent_accuracy'] = stats['intent_correct'] / total
+    stats['device_accuracy'] = stats['device_correct'] / total
+    stats['action_accuracy'] = stats['action_correct'] / total
+    stats['room_accuracy'] = stats['room_correct'] / total
+    stats['noisy_accuracy'] = stats['noisy_correct'] / max(1, stats['noisy_total'])
+    stats['elapsed'] = elapsed
+    stats['per_sample_us'] = elapsed / total * 1e6
+    return stats
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="生成合成指令语料")
+    parser.add_argument('-n', '--count', type=int, default=1000, help="样本数量")
+    parser.add_argument('-o', '--output', default='command_corpus.jsonl', help="输出文件路径")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子")
+    parser.add_argument('--noise', type=float, default=0.0, help="噪声样本比例 (0-1)")
+    parser.add_argument('--implicit', type=float, default=0.0, help="隐含意图样本比例 (0-1)")
+    parser.add_argument('--negative', type=float, default=0.0, help="无意图样本比例 (0-1)")
+    parser.add_argument('--evaluate', action='store_true', help="生成后评估意图识别准确率")
+    args = parser.parse_args()
+
+    generator = CommandCorpusGenerator(seed=args.seed, noise_rate=args.noise,
+                                       implicit_rate=args.implicit, negative_rate=args.negative)
+    written = generator.write_jsonl(args.output, args.count)
+    print(f"✅ 已生成 {written} 条样本: {args.output}")
+
+    if args.evaluate:
+        from intent_recognition import IntentRecognizer
+        stats = evaluate_intent_recognizer(IntentRecognizer(), load_corpus(args.output))
+        print("📊 意图识别评估结果:")
+        print(f"   - 意图准确率: {stats['intent_accuracy']:.2%}")
+        print(f"   - 设备准确率: {stats['device_accuracy']:.2%}")
+        print(f"   - 动作准确率: {stats['action_accuracy']:.2%}")
+        print(f"   - 房间准确率: {stats['room_accuracy']:.2%}")
+        print(f"   - 噪声样本准确率: {stats['noisy_accuracy']:.2%} ({stats['noisy_total']} 条)")
+        print(f"   - 平均耗时: {stats['per_sample_us']:.1f} μs/条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+指令合并分发模块
+每个主题窗口内的第一条指令立即发送，之后窗口内的多条指令只在窗口结束时发送最后一条
+（如误识别或连续点击产生的 开/关/开）；排队的指令按首次进入队列的顺序发送
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+class CoalescingDispatcher:
+    """按主题合并指令的分发器"""
+
+    def __init__(self, send, default_window=0.2, topic_windows=None):
+        """
+        send(topic, payload, qos, priority): 实际发送函数
+        default_window: 默认合并窗口（秒），0表示不合并
+        topic_windows: 按主题覆盖的合并窗口
+        """
+        self.send = send
+        self.default_window = default_window
+        self.topic_windows = dict(topic_windows or {})
+        self.pending = OrderedDict()  # 主题 -> [payload, qos, 发送时间, 被合并条数, 优先级]
+        self.window_ends = {}  # 主题 -> 上一条指令发出后合并窗口的结束时间
+        self.condition = threading.Condition()
+        self.worker = None
+        self.stopped = False
+        self.worker_sending = False  # 后台线程正在发送已出队的指令
+
+        # 统计
+        self.submitted = 0
+        self.sent = 0
+        self.collapsed = 0
+        self.collapsed_by_topic = {}
+
+    def window_for(self, topic):
+        return self.topic_windows.get(topic, self.default_window)
+
+    def submit(self, topic, payload, qos=None, priority=None):
+        """
+        提交一条指令：窗口内的第一条在调用线程中直接发送并返回发送结果；
+        其余返回True表示已接受（窗口结束时异步发送最后一条）
+        """
+        now = time.monotonic()
+        with self.condition:
+            self.submitted += 1
+            entry = self.pending.get(topic)
+            if entry is not None:
+                # 已有待发送指令：替换为最新的，保留其在队列中的位置
+                entry[0], entry[1], entry[4] = payload, qos, priority
+                entry[3] += 1
+                self.collapsed += 1
+                self.collapsed_by_topic[topic] = self.collapsed_by_topic.get(topic, 0) + 1
+                return True
+            window_end = self.window_ends.get(topic, 0.0)
+            if window_end <= now and not self.pending and not self.worker_sending:
+                # 不在该主题的合并窗口内，且没有排在前面的指令，直接发送
+                self.sent += 1
+                self._start_window(topic, now)
+                send_now = True
+            else:
+                self.pending[topic] = [payload, qos, max(window_end, now), 0, priority]
+                self._ensure_worker()
+                self.condition.notify()
+                send_now = False
+        if send_now:
+            return self.send(topic, payload, qos, priority)
+        return True
+
+    def _start_window(self, topic, now):
+        """指令发出后开始该主题的合并窗口（调用方持有锁）"""
+        window = self.window_for(topic)
+        if window > 0:
+            self.window_ends[topic] = now + window
+        else:
+            self.window_ends.pop(topic, None)
+
+    def flush(self):
+        """立即发送所有待发送的指令"""
+        with self.condition:
+            items = list(self.pending.items())
+            self.pending.clear()
+            self.sent += len(items)
+        for topic, (payload, qos, _, _, priority) in items:
+            self._send(topic, payload, qos, priority)
+
+    def stop(self, flush=True):
+        """停止后台线程"""
+        if flush:
+            self.flush()
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.worker and self.worker is not threading.current_thread():
+            self.worker.join(timeout=2)
+        self.worker = None
+
+    def get_stats(self):
+        """合并统计"""
+        with self.condition:
+            return {
+                'submitted': self.submitted,
+                'sent': self.sent,
+                'collapsed': self.collapsed,
+                'pending': len(self.pending),
+                'collapsed_by_topic': dict(self.collapsed_by_topic),
+            }
+
+    def _ensure_worker(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.stopped = False
+            self.worker = threading.Thread(target=self._run, daemon=True)
+            self.worker.start()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and not self.pending:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                # 队首指令到发送时间后才发送，保证后面的主题不会越过它
+                topic, entry = next(iter(self.pending.items()))
+                now = time.monotonic()
+                remaining = entry[2] - now
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+                del self.pending[topic]
+                self.sent += 1
+                self._start_window(topic, now)
+                self.worker_sending = True
+            self._send(topic, entry[0], entry[1], entry[4])
+            with self.condition:
+                self.worker_sending = False
+
+    def _send(self, topic, payload, qos, priority):
+        try:
+            self.send(topic, payload, qos, priority)
+        except Exception as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 发送合并指令出错: {e}")
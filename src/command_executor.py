@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+设备指令执行器模块
+每个设备主题一条有序通道，同一设备的指令按提交顺序执行，不同设备之间并行执行；
+通道队列有上限，指令带截止时间，完成回调可交给界面线程执行
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+# 指令来源
+SOURCE_VOICE = 'voice'
+SOURCE_MANUAL = 'manual'
+SOURCE_AUTOMATION = 'automation'
+
+
+class CommandRejected(Exception):
+    """通道队列已满，指令被拒绝"""
+
+
+class CommandExpired(Exception):
+    """指令在截止时间前未能开始执行"""
+
+
+class _Command:
+    __slots__ = ('func', 'args', 'future', 'deadline', 'source', 'submitted_at')
+
+    def __init__(self, func, args, future, deadline, source, submitted_at):
+        self.func = func
+        self.args = args
+        self.future = future
+        self.deadline = deadline
+        self.source = source
+        self.submitted_at = submitted_at
+
+
+class CommandExecutor:
+    """按设备分通道的指令执行器"""
+
+    def __init__(self, max_workers=4, lane_capacity=16, default_deadline=5.0, callback_scheduler=None):
+        """
+        max_workers: 同时执行的设备通道数
+        lane_capacity: 每个通道最多排队的指令数
+        default_deadline: 默认截止时间（秒），超时未开始执行的指令被丢弃
+        callback_scheduler: 调度完成回调的函数，如 lambda fn: root.after(0, fn)；为None时在执行线程中回调
+        """
+        self.lane_capacity = lane_capacity
+        self.default_deadline = default_deadline
+        self.callback_scheduler = callback_scheduler
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='command')
+        self.lock = threading.Lock()
+        self.lanes = {}  # 通道键（设备主题） -> deque[_Command]
+        self.active = set()  # 正在执行的通道
+
+        # 统计
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.expired = 0
+        self.rejected = 0
+
+    def submit(self, key, func, *args, deadline=None, callback=None, source=SOURCE_MANUAL):
+        """
+        提交指令，返回 concurrent.futures.Future
+        key: 通道键（通常为设备主题），同一通道内按顺序执行
+        callback(future): 完成回调，经 callback_scheduler 调度
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: self._schedule_callback(callback, f))
+        now = time.monotonic()
+        timeout = self.default_deadline if deadline is None else deadline
+        command = _Command(func, args, future, now + timeout, source, now)
+        with self.lock:
+            self.submitted += 1
+            lane = self.lanes.setdefault(key, deque())
+            if len(lane) >= self.lane_capacity:
+                self.rejected += 1
+                rejected = True
+            else:
+                rejected = False
+                lane.append(command)
+                start_lane = key not in self.active
+                if start_lane:
+                    self.active.add(key)
+        if rejected:
+            future.set_exception(CommandRejected(f"设备 {key} 的指令队列已满"))
+            return future
+        if start_lane:
+            self.pool.submit(self._run_lane, key)
+        return future
+
+    def _run_lane(self, key):
+        """依次执行一个通道中的指令，直到通道为空"""
+        while True:
+            with self.lock:
+                lane = self.lanes.get(key)
+                if not lane:
+                    self.active.discard(key)
+                    self.lanes.pop(key, None)
+                    return
+                command = lane.popleft()
+            if not command.future.set_running_or_notify_cancel():
+                continue
+            if time.monotonic() > command.deadline:
+                with self.lock:
+                    self.expired += 1
+                command.future.set_exception(CommandExpired(f"指令在 {key} 通道中等待超时"))
+                continue
+            try:
+                result = command.func(*command.args)
+            except Exception as e:
+                with self.lock:
+                    self.failed += 1
+                command.future.set_exception(e)
+            else:
+                with self.lock:
+                    self.completed += 1
+                command.future.set_result(result)
+
+    def _schedule_callback(self, callback, future):
+        if self.callback_scheduler is None:
+            self._run_callback(callback, future)
+        else:
+            self.callback_scheduler(lambda: self._run_callback(callback, future))
+
+    @staticmethod
+    def _run_callback(callback, future):
+        try:
+            callback(future)
+        except Exception as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 指令完成回调出错: {e}")
+
+    def get_stats(self):
+        """执行统计与各通道排队数"""
+        with self.lock:
+            return {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'expired': self.expired,
+                'rejected': self.rejected,
+                'active_lanes': len(self.active),
+                'queued': {key: len(lane) for key, lane in self.lanes.items() if lane},
+            }
+
+    def shutdown(self, wait=True):
+        """停止执行器，未开始的指令被取消"""
+        with self.lock:
+            pending = [command for lane in self.lanes.values() for command in lane]
+            self.lanes.clear()
+        for command in pending:
+            command.future.cancel()
+        self.pool.shutdown(wait=wait)
@@ -20,6 +20,33 @@ MQTT_CONFIG = {
     'use_private_key': True  # 是否使用私钥登录
 }
 
+# MQTT TLS配置（启用后连接 port 指定的TLS端口，私钥和消息加密传输）
+MQTT_TLS_CONFIG = {
+    'enabled': False,
+    'port': 9503,  # TLS端口，启用后替代 MQTT_CONFIG['port']
+    'ca_certs': '',  # CA证书文件，为空时使用系统证书；自签名服务器填自己的CA
+    'certfile': '',  # 客户端证书（服务器要求双向认证时填写）
+    'keyfile': '',
+    'min_version': 'TLSv1.2',  # TLSv1.2 或 TLSv1.3
+    'insecure': False,  # 不校验服务器证书，仅用于调试
+    'session_resumption': True,  # 重连时复用TLS会话，跳过完整握手
+}
+
+# MQTT v5配置（需要服务器支持MQTT 5.0；巴法云等只支持3.1.1的服务器请保持关闭）
+MQTT_V5_CONFIG = {
+    'enabled': False,
+    'topic_alias_maximum': 16,  # 最多使用的主题别名数，实际取与服务器通告值的较小者
+    'message_expiry': 30,  # 指令在服务器中的有效期（秒），过期未投递的旧指令由服务器丢弃；0表示不限
+    'response_correlation': True,  # 带确认的指令附带响应主题与关联数据，设备按关联数据回复
+}
+
+# 本地MQTT服务器配置（没有外网时在本机运行服务器，程序和局域网内的设备都连接本机）
+LOCAL_BROKER_CONFIG = {
+    'enabled': False,  # 启动界面时在后台运行本地服务器，MQTT客户端改为连接本机（本地服务器不支持TLS）
+    'host': '0.0.0.0',  # 监听地址，只供本机使用时可改为 127.0.0.1
+    'port': 1883,
+}
+
 # 主题配置
 MQTT_TOPICS = {
     'light_living_room': 'light001',    # 客厅灯光
@@ -30,6 +57,98 @@ MQTT_TOPICS = {
     'fan': 'fan001',                    # 风扇
 }
 
+# MQTT发布配置
+MQTT_PUBLISH_CONFIG = {
+    'default_qos': 0,  # 未在下面列出的设备类型使用的QoS
+    'device_qos': {  # 按设备类型设置QoS，1表示等待服务器PUBACK确认
+        '空调': 1,
+        '窗帘': 1,
+    },
+    'max_inflight': 20,  # 同时等待确认的QoS1消息上限，超出的在本地排队
+    'latency_samples': 1000,  # 保留的发布确认延迟样本数
+}
+
+# MQTT断线重连与离线指令队列配置
+MQTT_RECONNECT_CONFIG = {
+    'enabled': True,  # 连接意外断开时自动重连
+    'min_delay': 1.0,  # 首次重连等待时间（秒），之后指数增长
+    'max_delay': 60.0,  # 最长等待时间（秒）
+    'jitter': 0.5,  # 随机抖动比例，避免多台设备同时重连
+    'queue_path': 'data/outbound.db',  # 离线指令队列（相对于项目根目录）
+    'queue_max_size': 1000,  # 队列上限，满时丢弃最旧的指令
+    'command_ttl': 300,  # 离线指令的有效期（秒），过期后不再补发
+}
+
+# MQTT消息日志配置
+MESSAGE_LOG_CONFIG = {
+    'capacity': 10000,  # 内存中保留的消息条数
+    'archive_dir': 'data/message_log',  # 被挤出内存的消息归档目录（相对于项目根目录），None表示不归档
+    'segment_size': 50000,  # 每个归档分段的消息条数
+    'max_segments': 10,  # 保留的归档分段数量
+}
+
+# 设备状态影子配置（根据设备上报消息和已发送指令记录每个主题的状态）
+DEVICE_SHADOW_CONFIG = {
+    'suppress_redundant': False,  # 跳过不会改变设备状态的指令（如灯已开时再次开灯）
+    'max_age': 300,  # 状态超过该时间（秒）未更新则不再据此跳过指令
+}
+
+# 指令合并配置（误识别、连续点击产生的 开/关/开 只发送最后一条）
+COMMAND_COALESCE_CONFIG = {
+    'enabled': True,
+    'default_window': 0.2,  # 合并窗口（秒），0表示不合并
+    'topic_windows': {  # 按主题覆盖合并窗口
+        'curtain001': 0.5,  # 窗帘电机频繁换向容易损坏
+    },
+}
+
+# 链路探测配置（定时向回显主题发布探测消息，测量RTT并快速发现半开连接）
+# 使用巴法云时需要先在控制台创建该主题；从未收到回显时只统计不判定断链
+LINK_MONITOR_CONFIG = {
+    'enabled': False,  # 默认关闭：探测消息不经过发布限速，开启前确认服务器的消息配额并创建回显主题
+    'topic': 'linkping',
+    'interval': 2.0,  # 探测间隔（秒）
+    'dead_after': 6.0,  # 超过该时间收不到回显则断开重连（秒）
+}
+
+# 接收消息处理配置（网络线程只负责入队，后台线程批量解码、记录并分发）
+# overflow: drop_oldest 丢弃最早的消息 / drop_newest 丢弃新消息 / block 阻塞网络线程至多 block_timeout 秒
+INBOUND_DISPATCH_CONFIG = {
+    'queue_size': 5000,
+    'batch_size': 100,
+    'batch_interval': 0.02,  # 秒
+    'overflow': 'drop_oldest',
+    'block_timeout': 0.5,
+    'log_each_message': True,  # 在控制台打印每条收到的消息
+}
+
+# 指令执行确认配置
+# 启用后设备控制会等待设备在状态主题上报实际状态，超时未确认则重发
+# 指令主题上会收到本机指令的回显，设备需要把执行后的状态发布到单独的状态主题（{topic} 为指令主题）
+COMMAND_CONFIRM_CONFIG = {
+    'enabled': False,
+    'state_topic': '{topic}/state',
+    'timeout': 2.0,  # 每次发送后等待上报的时间（秒）
+    'max_attempts': 3,  # 含第一次发送
+}
+
+# 发布限速配置（令牌桶：rate为每秒条数，burst为允许的突发条数）
+# 语音和手动指令优先于自动化指令发送
+RATE_LIMIT_CONFIG = {
+    'enabled': True,
+    'connection_rate': 10.0,  # 整个连接
+    'connection_burst': 20,
+    'topic_rate': 2.0,  # 单个主题
+    'topic_burst': 5,
+}
+
+# 设备指令执行器配置（同一设备按顺序执行，不同设备并行）
+COMMAND_EXECUTOR_CONFIG = {
+    'max_workers': 4,  # 同时执行的设备数
+    'lane_capacity': 16,  # 每个设备最多排队的指令数，超出时拒绝
+    'deadline': 5.0,  # 指令提交后超过该时间（秒）仍未开始执行则丢弃
+}
+
 # 语音识别配置
 SPEECH_CONFIG = {
     'language': 'zh-CN',  # 中文语音识别
@@ -122,11 +241,72 @@ ACTION_KEYWORDS = {
     'off': ['关闭', '关', '熄灭', '停止', '灭']
 }
 
+# 房间关键词
+ROOM_KEYWORDS = {
+    'living_room': ['客厅', '大厅', '起居室'],
+    'bedroom': ['卧室', '睡房', '房间'],
+    'kitchen': ['厨房'],
+    'bathroom': ['浴室', '卫生间', '厕所'],
+    'study': ['书房', '工作室']
+}
+
+# 拼音模糊匹配配置（需要安装pypinyin）
+PHONETIC_MATCH_CONFIG = {
+    'enabled': True,  # 关键词精确匹配失败时启用拼音模糊匹配
+    'max_distance': 1,  # 允许的最大音节编辑距离
+    'homophone_penalty': 0.1,  # 同音字匹配的置信度惩罚
+    'edit_penalty': 0.15,  # 每个音节编辑距离的置信度惩罚
+    'min_confidence': 0.7,  # 拼音模糊匹配的结果达到该置信度才执行（有编辑距离的匹配还需房间等信息佐证）
+}
+
+# 本地意图分类器配置（需要numpy，模型通过 intent_classifier_tool.py 训练）
+INTENT_CLASSIFIER_CONFIG = {
+    'enabled': True,  # 模型文件存在时优先使用分类器
+    'model_path': 'models/intent_classifier.npz',  # 相对于项目根目录
+    'confidence_threshold': 0.7,  # 低于该置信度时回退到关键词匹配
+}
+
+# 设备注册表配置（大规模部署时替代上面手写的设备字典）
+# 启用后意图识别和设备控制都通过注册表解析；数据库为空时自动从 DEVICE_COMMANDS/MQTT_TOPICS 导入
+# 批量导入: python src/device_registry.py --import-csv devices.csv
+DEVICE_REGISTRY_CONFIG = {
+    'enabled': False,
+    'db_path': 'data/devices.db',  # 相对于项目根目录
+}
+
+# 配置存储（config_helper.py 等工具写入的覆盖项，修改后运行中的程序自动热更新）
+# 文件中按配置段保存与上面默认值不同的部分，值为null表示删除该键；后缀为 .yaml/.yml 时使用YAML格式
+CONFIG_STORE = {
+    'path': 'settings.json',  # 相对于项目根目录
+    'watch_interval': 1.0,  # 检查文件变化的间隔（秒）
+}
+
 # GUI配置
 GUI_CONFIG = {
     'title': '智能语音控制家居系统',
     'width': 800,
     'height': 600,
     'font_family': 'Microsoft YaHei',
-    'font_size': 10
+    'font_size': 10,
+    # 界面更新队列：后台线程的日志和状态更新按此间隔批量刷新到界面
+    'update_interval': 0.05,  # 秒
+    'update_batch': 500,  # 每次最多处理的更新数
+    'update_max_pending': 5000,  # 积压日志行上限，超出丢弃最早的
+    # 系统日志：全部日志保存在内存中，日志控件只显示有限行数，向上滚动时按页取出更早的日志
+    'log_capacity': 20000,  # 内存中保留的日志条数
+    'log_view_lines': 500,  # 日志控件中最多显示的行数
+    'log_page_size': 100,  # 每次翻页取出的条数
 }
+
+
+def _apply_config_store():
+    """应用配置存储文件（CONFIG_STORE['path']）中保存的覆盖项，所有导入 config 的程序读到同一份配置"""
+    import sys
+    try:
+        from config_store import apply_saved_overrides
+    except ImportError:
+        return
+    apply_saved_overrides(sys.modules[__name__])
+
+
+_apply_config_store()
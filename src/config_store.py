@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+配置存储模块
+把运行时可修改的配置保存在独立的 JSON/YAML 文件中（覆盖 config.py 的默认值），
+原子写入、监视文件变化，并通知各组件只重建发生变化的部分
+"""
+
+import os
+import copy
+import json
+import time
+import threading
+import tempfile
+from datetime import datetime
+
+import config
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# 项目根目录，用于解析相对的配置文件路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 可由配置存储覆盖的配置段（config.py 中同名的字典）
+CONFIG_SECTIONS = [
+    'MQTT_CONFIG',
+    'MQTT_TLS_CONFIG',
+    'MQTT_V5_CONFIG',
+    'LOCAL_BROKER_CONFIG',
+    'MQTT_TOPICS',
+    'MQTT_PUBLISH_CONFIG',
+    'MQTT_RECONNECT_CONFIG',
+    'MESSAGE_LOG_CONFIG',
+    'DEVICE_SHADOW_CONFIG',
+    'COMMAND_COALESCE_CONFIG',
+    'RATE_LIMIT_CONFIG',
+    'COMMAND_CONFIRM_CONFIG',
+    'INBOUND_DISPATCH_CONFIG',
+    'LINK_MONITOR_CONFIG',
+    'COMMAND_EXECUTOR_CONFIG',
+    'SPEECH_CONFIG',
+    'WAKE_WORD_CONFIG',
+    'AI_SPEECH_CONFIG',
+    'DEVICE_COMMANDS',
+    'ACTION_KEYWORDS',
+    'ROOM_KEYWORDS',
+    'PHONETIC_MATCH_CONFIG',
+    'INTENT_CLASSIFIER_CONFIG',
+    'DEVICE_REGISTRY_CONFIG',
+    'GUI_CONFIG',
+]
+
+
+def deep_merge(base, overrides):
+    """递归合并覆盖项，覆盖值为None表示删除该键"""
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def apply_in_place(target, values):
+    """原地更新配置字典，使 `from config import X` 得到的引用也能看到新值"""
+    for key in list(target):
+        if key not in values:
+            del target[key]
+    target.update(values)
+
+
+class ConfigStore:
+    """可热更新的配置存储"""
+
+    def __init__(self, path, watch_interval=1.0):
+        self.path = path
+        self.watch_interval = watch_interval
+        self.lock = threading.RLock()
+        self.overrides = {}
+        self.listeners = []
+        self.watch_thread = None
+        self.watching = False
+        self.last_stat = None
+
+        # 记录 config.py 中的默认值，覆盖项始终基于默认值合并
+        # （config 导入时已应用过覆盖项，默认值取应用前记录的 CONFIG_DEFAULTS）
+        defaults = getattr(config, 'CONFIG_DEFAULTS', None) or {
+            section: getattr(config, section) for section in CONFIG_SECTIONS if hasattr(config, section)}
+        self.defaults = copy.deepcopy(defaults)
+
+    # ---------------------------------------------------------------- 读写文件
+
+    def _is_yaml(self):
+        return self.path.lower().endswith(('.yaml', '.yml'))
+
+    def _read_file(self):
+        """读取覆盖项文件，不存在时返回空字典"""
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        if not content.strip():
+            return {}
+        if self._is_yaml():
+            if yaml is None:
+                raise RuntimeError("读取YAML配置需要PyYAML，请运行: pip install PyYAML")
+            data = yaml.safe_load(content) or {}
+        else:
+            data = json.loads(content)
+        if not isinstance(data, dict):
+            raise ValueError(f"配置文件格式错误: {self.path}")
+        return {section: value for section, value in data.items() if section in self.defaults}
+
+    def _write_file(self, data):
+        """原子写入：先写临时文件并刷盘，再替换正式文件"""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.settings_', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                if self._is_yaml():
+                    if yaml is None:
+                        raise RuntimeError("写入YAML配置需要PyYAML，请运行: pip install PyYAML")
+                    yaml.safe_dump(data, f, allow_unicode=True, sort_keys=False)
+                else:
+                    json.dump(data, f, ensure_ascii=False, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    # ---------------------------------------------------------------- 加载与应用
+
+    def load(self):
+        """读取文件并应用到 config 模块，返回发生变化的配置段"""
+        with self.lock:
+            self.last_stat = self._stat()
+            self.overrides = self._read_file()
+            return self._apply()
+
+    def _apply(self):
+        """把默认值与覆盖项合并后原地写入 config 模块，并通知监听者"""
+        changes = {}
+        for section, default in self.defaults.items():
+            effective = deep_merge(default, self.overrides.get(section, {}))
+            target = getattr(config, section)
+            if effective != target:
+                changes[section] = (copy.deepcopy(target), copy.deepcopy(effective))
+                apply_in_place(target, effective)
+        if changes:
+            self._notify(changes)
+        return changes
+
+    def get(self, section):
+        """获取当前生效的配置段（副本）"""
+        return copy.deepcopy(getattr(config, section))
+
+    def update(self, section, values):
+        """
+        合并更新一个配置段并持久化
+        values中值为None的键会被删除
+        返回发生变化的配置段
+        """
+        if section not in self.defaults:
+            raise KeyError(f"未知的配置段: {section}")
+        with self.lock:
+            # 以磁盘内容为准，避免覆盖其他进程刚写入的修改
+            try:
+                self.overrides = self._read_file()
+            except (ValueError, RuntimeError) as e:
+                print(f"⚠️ 配置文件读取失败，将以内存中的配置为准: {e}")
+            current = self.overrides.get(section, {})
+            self.overrides[section] = deep_merge(current, values)
+            # 保留删除标记，合并时才能去掉 config.py 中的默认键
+            for key, value in values.items():
+                if value is None:
+                    self.overrides[section][key] = None
+            self._write_file(self.overrides)
+            self.last_stat = self._stat()
+            return self._apply()
+
+    def reset(self, section):
+        """清除某配置段的全部覆盖项，恢复 config.py 中的默认值"""
+        with self.lock:
+            self.overrides.pop(section, None)
+            self._write_file(self.overrides)
+            self.last_stat = self._stat()
+            return self._apply()
+
+    # ---------------------------------------------------------------- 变更通知
+
+    def subscribe(self, callback, sections=None):
+        """
+        订阅配置变化
+        callback(changes)，changes为 {配置段: (旧值, 新值)}，只包含关心的配置段
+        """
+        with self.lock:
+            self.listeners.append((callback, set(sections) if sections else None))
+
+    def unsubscribe(self, callback):
+        """取消订阅"""
+        with self.lock:
+            self.listeners = [(cb, sections) for cb, sections in self.listeners if cb != callback]
+
+    def _notify(self, changes):
+        for callback, sections in list(self.listeners):
+            relevant = {section: change for section, change in changes.items()
+                        if sections is None or section in sections}
+            if not relevant:
+                continue
+            try:
+                callback(relevant)
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] 配置变更回调出错: {e}")
+
+    # ---------------------------------------------------------------- 文件监视
+
+    def start_watching(self):
+        """启动后台线程监视配置文件变化"""
+        if self.watching:
+            return
+        self.watching = True
+        self.watch_thread = threading.Thread(target=self._watch_loop, daemon=True)
+        self.watch_thread.start()
+
+    def stop_watching(self):
+        """停止监视"""
+        self.watching = False
+        if self.watch_thread and self.watch_thread.is_alive():
+            self.watch_thread.join(timeout=self.watch_interval * 2)
+
+    def check_for_changes(self):
+        """检查文件是否被外部修改，修改则重新加载；返回发生变化的配置段"""
+        stat = self._stat()
+        if stat == self.last_stat:
+            return {}
+        try:
+            changes = self.load()
+            if changes:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] 配置已热更新: {', '.join(changes)}")
+            return changes
+        except Exception as e:
+            # 文件可能正被编辑，记录状态后等待下一次修改
+            self.last_stat = stat
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 配置文件加载失败: {e}")
+            return {}
+
+    def _watch_loop(self):
+        while self.watching:
+            time.sleep(self.watch_interval)
+            self.check_for_changes()
+
+
+def store_path(module):
+    """配置模块中 CONFIG_STORE 指定的配置文件路径"""
+    path = getattr(module, 'CONFIG_STORE', {}).get('path', 'settings.json')
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+
+def apply_saved_overrides(module):
+    """
+    config 模块导入时调用：记录 config.py 中的默认值，并把配置文件中保存的覆盖项应用到配置字典
+    使直接创建 MQTTClient、AISpeechRecognizer 的脚本和测试也读到 config_helper.py 等工具保存的配置
+    """
+    defaults = {section: copy.deepcopy(getattr(module, section))
+                for section in CONFIG_SECTIONS if hasattr(module, section)}
+    module.CONFIG_DEFAULTS = defaults
+    store = ConfigStore(store_path(module))
+    store.defaults = defaults
+    try:
+        overrides = store._read_file()
+    except Exception as e:
+        print(f"⚠️ 配置文件加载失败，使用默认配置: {e}")
+        return
+    for section, values in overrides.items():
+        apply_in_place(getattr(module, section), deep_merge(defaults[section], values))
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_config_store():
+    """获取全局配置存储（首次调用时加载配置文件）"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            store = ConfigStore(store_path(config), getattr(config, 'CONFIG_STORE', {}).get('watch_interval', 1.0))
+            try:
+                store.load()
+            except Exception as e:
+                print(f"⚠️ 配置文件加载失败，使用默认配置: {e}")
+            _default_store = store
+    return _default_store
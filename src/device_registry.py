@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+"""
+设备注册表模块
+以SQLite持久化设备信息，启动时加载为紧凑的内存索引（按设备类型、房间、主题），
+并缓存序列化后的关键词自动机，避免每次启动重建匹配模式
+"""
+
+import os
+import sys
+import csv
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import deque
+from config import DEVICE_COMMANDS, MQTT_TOPICS, ROOM_KEYWORDS, DEVICE_REGISTRY_CONFIG
+
+# 项目根目录，用于解析相对的数据库路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    device_id   TEXT PRIMARY KEY,
+    device_type TEXT NOT NULL,
+    room        TEXT,
+    topic       TEXT NOT NULL,
+    on_command  TEXT NOT NULL,
+    off_command TEXT NOT NULL,
+    keywords    TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS idx_devices_type ON devices (device_type);
+CREATE INDEX IF NOT EXISTS idx_devices_room ON devices (room);
+CREATE INDEX IF NOT EXISTS idx_devices_topic ON devices (topic);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value BLOB
+);
+"""
+
+CSV_FIELDS = ['device_id', 'device_type', 'room', 'topic', 'on_command', 'off_command', 'keywords']
+
+
+def _intern(value):
+    """驻留字符串，大量重复的设备类型/房间名只保留一份"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class DeviceRecord:
+    """单个设备记录（__slots__ 紧凑存储）"""
+
+    __slots__ = ('device_id', 'device_type', 'room', 'topic', 'on_command', 'off_command', 'keywords')
+
+    def __init__(self, device_id, device_type, room, topic, on_command='on', off_command='off', keywords=()):
+        self.device_id = _intern(device_id)
+        self.device_type = _intern(device_type)
+        self.room = _intern(room) if room else None
+        self.topic = _intern(topic)
+        self.on_command = _intern(on_command)
+        self.off_command = _intern(off_command)
+        self.keywords = tuple(_intern(keyword) for keyword in keywords)
+
+    def command_for(self, action):
+        """获取动作对应的指令"""
+        if action == 'on':
+            return self.on_command
+        if action == 'off':
+            return self.off_command
+        return None
+
+    def to_row(self):
+        """转换为数据库行"""
+        return (self.device_id, self.device_type, self.room, self.topic,
+                self.on_command, self.off_command, json.dumps(list(self.keywords), ensure_ascii=False))
+
+    def to_dict(self):
+        """转换为字典"""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"DeviceRecord({self.device_id!r}, {self.device_type!r}, room={self.room!r}, topic={self.topic!r})"
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick关键词自动机
+    一次扫描找出文本中所有关键词，耗时与关键词数量无关
+    """
+
+    def __init__(self, goto=None, fail=None, outputs=None):
+        self.goto = goto or [{}]
+        self.fail = fail or [0]
+        self.outputs = outputs or [[]]
+
+    @classmethod
+    def build(cls, keywords):
+        """
+        根据 [(关键词, 类别, 标签)] 构建自动机
+        """
+        automaton = cls()
+        goto, outputs = automaton.goto, automaton.outputs
+        for keyword, kind, label in keywords:
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword.lower():
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            entry = [len(keyword), kind, label]
+            if entry not in outputs[state]:
+                outputs[state].append(entry)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                outputs[next_state].extend(outputs[fail[next_state]])
+        automaton.fail = fail
+        return automaton
+
+    def find_all(self, text):
+        """返回文本中所有匹配 [(起始位置, 结束位置, 类别, 标签)]"""
+        matches = []
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        state = 0
+        for position, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, kind, label in outputs[state]:
+                matches.append((position - length + 1, position + 1, kind, label))
+        return matches
+
+    def dumps(self):
+        """序列化为紧凑的JSON字节串"""
+        return json.dumps([self.goto, self.fail, self.outputs], ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def loads(cls, data):
+        """从序列化数据恢复"""
+        goto, fail, outputs = json.loads(data.decode('utf-8') if isinstance(data, bytes) else data)
+        return cls(goto=goto, fail=fail, outputs=outputs)
+
+
+class DeviceRegistry:
+    """设备注册表"""
+
+    def __init__(self, db_path=':memory:'):
+        self.db_path = db_path
+        if db_path != ':memory:':
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+        self.records = {}
+        self.by_type = {}
+        self.by_room = {}
+        self.by_topic = {}
+        self.automaton = KeywordAutomaton()
+        self.reload()
+
+    # ---------------------------------------------------------------- 加载与索引
+
+    def reload(self):
+        """从数据库重新加载内存索引和关键词自动机"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT device_id, device_type, room, topic, on_command, off_command, keywords FROM devices"
+            ).fetchall()
+            records = {}
+            for device_id, device_type, room, topic, on_command, off_command, keywords in rows:
+                records[device_id] = DeviceRecord(device_id, device_type, room, topic,
+                                                  on_command, off_command, json.loads(keywords or '[]'))
+            self._index(records)
+            self.automaton = self._load_or_build_automaton()
+
+    def _index(self, records):
+        """建立按设备类型、房间、主题的索引"""
+        by_type, by_room, by_topic = {}, {}, {}
+        for record in sorted(records.values(), key=lambda r: r.device_id):
+            by_type.setdefault(record.device_type, []).append(record)
+            if record.room:
+                by_room.setdefault(record.room, []).append(record)
+            by_topic.setdefault(record.topic, record)
+        self.records = records
+        self.by_type = {key: tuple(value) for key, value in by_type.items()}
+        self.by_room = {key: tuple(value) for key, value in by_room.items()}
+        self.by_topic = by_topic
+
+    def _keyword_entries(self):
+        """汇总自动机需要的关键词：设备类型名、设备关键词、房间关键词"""
+        entries = set()
+        for device_type, records in self.by_type.items():
+            entries.add((device_type, 'device', device_type))
+            for record in records:
+                for keyword in record.keywords:
+                    entries.add((keyword, 'device', device_type))
+        for room, keywords in ROOM_KEYWORDS.items():
+            for keyword in keywords:
+                entries.add((keyword, 'room', room))
+        return sorted(entries)
+
+    def _load_or_build_automaton(self):
+        """关键词未变化时直接加载缓存的自动机，否则重建并写回数据库"""
+        entries = self._keyword_entries()
+        signature = hashlib.sha1(json.dumps(entries, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+        cached = dict(self.conn.execute(
+            "SELECT key, value FROM meta WHERE key IN ('automaton', 'automaton_signature')"
+        ).fetchall())
+        if cached.get('automaton_signature') == signature and cached.get('automaton'):
+            try:
+                return KeywordAutomaton.loads(cached['automaton'])
+            except (ValueError, TypeError):
+                pass
+
+        automaton = KeywordAutomaton.build(entries)
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                ('automaton', automaton.dumps()),
+                ('automaton_signature', signature),
+            ])
+        return automaton
+
+    # ---------------------------------------------------------------- 导入
+
+    def add_records(self, records, replace=True):
+        """批量写入设备记录并刷新索引，返回写入数量"""
+        rows = [record.to_row() for record in records]
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    f"{verb} INTO devices (device_id, device_type, room, topic, on_command, off_command, keywords) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.reload()
+        return len(rows)
+
+    def remove_device(self, device_id):
+        """删除设备"""
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM devices WHERE device_id = ?", (device_id,))
+            self.reload()
+
+    def import_csv(self, path):
+        """
+        从CSV批量导入
+        列: device_id, device_type, room, topic, on_command, off_command, keywords（关键词用 | 分隔）
+        """
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            records = [self._record_from_dict(row) for row in csv.DictReader(f)]
+        return self.add_records(records)
+
+    def import_json(self, path):
+        """从JSON数组（或JSON Lines）批量导入，字段同CSV"""
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read().strip()
+        if content.startswith('['):
+            items = json.loads(content)
+        else:
+            items = [json.loads(line) for line in content.splitlines() if line.strip()]
+        return self.add_records(self._record_from_dict(item) for item in items)
+
+    def export_csv(self, path):
+        """导出为CSV"""
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for record in self.records.values():
+                row = record.to_dict()
+                row['keywords'] = '|'.join(record.keywords)
+                writer.writerow(row)
+
+    @staticmethod
+    def _record_from_dict(item):
+        """由CSV行或JSON对象创建记录"""
+        keywords = item.get('keywords') or []
+        if isinstance(keywords, str):
+            keywords = [keyword for keyword in keywords.split('|') if keyword]
+        return DeviceRecord(
+            device_id=item['device_id'],
+            device_type=item['device_type'],
+            room=item.get('room') or None,
+            topic=item['topic'],
+            on_command=item.get('on_command') or 'on',
+            off_command=item.get('off_command') or 'off',
+            keywords=keywords,
+        )
+
+    @staticmethod
+    def _config_records(device_commands):
+        """由设备指令配置和 MQTT_TOPICS 生成设备记录（设备ID即主题）"""
+        topic_rooms = {}
+        for name, topic in MQTT_TOPICS.items():
+            for room in ROOM_KEYWORDS:
+                if name.endswith(room):
+                    topic_rooms[topic] = room
+                    break
+
+        records = []
+        for device_type, config in device_commands.items():
+            for topic in config['topics']:
+                records.append(DeviceRecord(
+                    device_id=topic,
+                    device_type=device_type,
+                    room=topic_rooms.get(topic),
+                    topic=topic,
+                    on_command=config['on_commands'][0],
+                    off_command=config['off_commands'][0],
+                    keywords=config['keywords'],
+                ))
+        return records
+
+    def import_from_config(self):
+        """由 DEVICE_COMMANDS 和 MQTT_TOPICS 生成初始设备记录"""
+        return self.add_records(self._config_records(DEVICE_COMMANDS), replace=False)
+
+    def sync_config(self, old_commands, new_commands):
+        """
+        DEVICE_COMMANDS 热更新后同步由配置生成的设备
+        只处理配置有变化的设备类型：删除旧配置中的主题，再按新配置写入；导入的其他设备不受影响
+        返回按新配置写入的设备数
+        """
+        changed = {device_type for device_type in old_commands.keys() | new_commands.keys()
+                   if old_commands.get(device_type) != new_commands.get(device_type)}
+        if not changed:
+            return 0
+        stale = [(topic,) for device_type in changed if device_type in old_commands
+                 for topic in old_commands[device_type].get('topics', [])]
+        records = self._config_records({device_type: new_commands[device_type]
+                                        for device_type in changed if device_type in new_commands})
+        with self.lock:
+            with self.conn:
+                self.conn.executemany("DELETE FROM devices WHERE device_id = ?", stale)
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO devices (device_id, device_type, room, topic, on_command, off_command, "
+                    "keywords) VALUES (?, ?, ?, ?, ?, ?, ?)", [record.to_row() for record in records])
+            self.reload()
+        return len(records)
+
+    # ---------------------------------------------------------------- 查询
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, device_id):
+        """按设备ID查询"""
+        return self.records.get(device_id)
+
+    def find_by_type(self, device_type):
+        """按设备类型查询"""
+        return self.by_type.get(device_type, ())
+
+    def find_by_room(self, room):
+        """按房间查询"""
+        return self.by_room.get(room, ())
+
+    def find_by_topic(self, topic):
+        """按主题查询"""
+        return self.by_topic.get(topic)
+
+    def topics(self):
+        """所有设备主题"""
+        return list(self.by_topic)
+
+    def resolve(self, device_type, room=None):
+        """
+        解析控制目标
+        指定房间时只返回该房间内的设备，该房间没有此类设备时返回None（不能控制其他房间/住户的设备）；
+        未指定房间时只有该类型的设备都在同一个房间才返回第一个设备，分布在多个房间时返回None（由调用方追问或使用默认配置）
+        """
+        records = self.by_type.get(device_type, ())
+        if not room:
+            if len({record.room for record in records}) > 1:
+                return None
+            return records[0] if records else None
+        for record in records:
+            if record.room == room:
+                return record
+        return None
+
+    def match_text(self, text):
+        """
+        在文本中查找设备与房间关键词
+        返回: {'devices': [设备类型...], 'rooms': [房间...]}，按出现顺序去重，较长的关键词优先
+        """
+        matches = sorted(self.automaton.find_all(text), key=lambda m: (m[0], -(m[1] - m[0])))
+        devices, rooms = [], []
+        for _, _, kind, label in matches:
+            target = devices if kind == 'device' else rooms
+            if label not in target:
+                target.append(label)
+        return {'devices': devices, 'rooms': rooms}
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def get_default_registry():
+    """获取配置指定的全局设备注册表（未启用时返回None）"""
+    global _default_registry
+    if not DEVICE_REGISTRY_CONFIG.get('enabled', False):
+        return None
+    with _default_lock:
+        if _default_registry is None:
+            db_path = DEVICE_REGISTRY_CONFIG.get('db_path', 'data/devices.db')
+            if db_path != ':memory:' and not os.path.isabs(db_path):
+                db_path = os.path.join(PROJECT_ROOT, db_path)
+            registry = DeviceRegistry(db_path)
+            if not len(registry):
+                registry.import_from_config()
+            _default_registry = registry
+    return _default_registry
+
+
+def main():
+    """命令行入口：导入设备清单"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="设备注册表管理")
+    db_path = DEVICE_REGISTRY_CONFIG.get('db_path', 'data/devices.db')
+    if db_path != ':memory:' and not os.path.isabs(db_path):
+        db_path = os.path.join(PROJECT_ROOT, db_path)
+    parser.add_argument('--db', default=db_path, help="数据库路径")
+    parser.add_argument('--import-csv', dest='csv_path', help="从CSV导入")
+    parser.add_argument('--import-json', dest='json_path', help="从JSON导入")
+    parser.add_argument('--from-config', action='store_true', help="从config.py导入初始设备")
+    parser.add_argument('--export-csv', dest='export_path', help="导出为CSV")
+    args = parser.parse_args()
+
+    registry = DeviceRegistry(args.db)
+    if args.from_config:
+        print(f"✅ 从配置导入 {registry.import_from_config()} 个设备")
+    if args.csv_path:
+        print(f"✅ 从CSV导入 {registry.import_csv(args.csv_path)} 个设备")
+    if args.json_path:
+        print(f"✅ 从JSON导入 {registry.import_json(args.json_path)} 个设备")
+    if args.export_path:
+        registry.export_csv(args.export_path)
+        print(f"📁 已导出到: {args.export_path}")
+
+    print(f"📊 设备总数: {len(registry)}, 设备类型: {len(registry.by_type)}, "
+          f"房间: {len(registry.by_room)}, 主题: {len(registry.by_topic)}")
+
+
+if __name__ == "__main__":
+    main()
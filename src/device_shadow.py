@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+设备状态影子模块
+根据设备上报的消息和本机发出的指令记录每个主题的最新状态，
+用于O(1)查询设备状态以及跳过不会改变状态的重复指令
+"""
+
+import sys
+import time
+import threading
+
+# 巴法云开关指令到电源状态的映射
+POWER_VALUES = {
+    'on': True, '1': True, 'open': True,
+    'off': False, '0': False, 'close': False,
+}
+
+
+def parse_payload(payload):
+    """
+    解析巴法云消息格式，如 'on'、'off'、'on#26'、'on#2#26'
+    返回 (电源状态, 附加参数元组)，无法识别的电源状态为None
+    """
+    parts = str(payload).strip().split('#')
+    power = POWER_VALUES.get(parts[0].strip().lower())
+    return power, tuple(part.strip() for part in parts[1:])
+
+
+class DeviceState:
+    """单个主题的设备状态"""
+    __slots__ = ('topic', 'power', 'values', 'payload', 'updated_at', 'source')
+
+    def __init__(self, topic, power, values, payload, updated_at, source):
+        self.topic = topic
+        self.power = power
+        self.values = values
+        self.payload = payload
+        self.updated_at = updated_at
+        self.source = source  # 'reported'（设备上报）或 'desired'（本机发出的指令）
+
+    def to_dict(self):
+        return {
+            'topic': self.topic,
+            'power': self.power,
+            'values': list(self.values),
+            'payload': self.payload,
+            'updated_at': self.updated_at,
+            'source': self.source,
+        }
+
+
+class DeviceShadow:
+    """按主题保存设备状态"""
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age  # 状态超过该时间（秒）视为不可信，不据此跳过指令
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.states)
+
+    def update(self, topic, payload, source='reported'):
+        """用一条消息更新状态，返回新状态；无法解析的消息返回None"""
+        power, values = parse_payload(payload)
+        with self.lock:
+            previous = self.states.get(topic)
+            if power is None:
+                if previous is None or not values:
+                    return None
+                # 只带参数的消息（如 '#26'）沿用原来的电源状态
+                power = previous.power
+            if not values and previous is not None and previous.power == power:
+                # 'on' 不清除之前记录的参数（如亮度）
+                values = previous.values
+            state = DeviceState(sys.intern(topic), power, values, str(payload), time.time(), source)
+            self.states[state.topic] = state
+        return state
+
+    def get(self, topic):
+        """获取设备状态（O(1)），未知时返回None"""
+        return self.states.get(topic)
+
+    def power(self, topic):
+        """获取设备电源状态：True/False，未知时返回None"""
+        state = self.states.get(topic)
+        return state.power if state else None
+
+    def would_change(self, topic, payload):
+        """判断指令是否会改变设备状态；状态未知或已过期时返回True"""
+        state = self.states.get(topic)
+        if state is None or time.time() - state.updated_at > self.max_age:
+            return True
+        power, values = parse_payload(payload)
+        if power is None or power != state.power:
+            return True
+        return bool(values) and values != state.values
+
+    def invalidate(self, topic):
+        """忘记设备状态（如指令未得到设备确认时），之后的指令不会被当作重复指令跳过"""
+        with self.lock:
+            self.states.pop(topic, None)
+
+    def snapshot(self):
+        """所有设备状态的字典副本"""
+        with self.lock:
+            return {topic: state.to_dict() for topic, state in self.states.items()}
+
+    def clear(self):
+        with self.lock:
+            self.states.clear()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+接收消息分发模块
+MQTT网络线程只把收到的消息放入有界队列，解码、记录日志和调用处理函数都在后台线程中按批进行，
+避免处理慢的消费者拖住心跳和后续消息的接收
+"""
+
+import threading
+from collections import deque
+from datetime import datetime
+
+# 队列满时的处理方式
+OVERFLOW_DROP_OLDEST = 'drop_oldest'  # 丢弃最早的消息，保留最新状态
+OVERFLOW_DROP_NEWEST = 'drop_newest'  # 丢弃新到的消息
+OVERFLOW_BLOCK = 'block'  # 阻塞网络线程至多 block_timeout 秒，仍满则丢弃新消息
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_BLOCK)
+
+
+class InboundDispatcher:
+    """有界队列 + 后台线程的批量消息分发器"""
+
+    def __init__(self, handle_batch, capacity=5000, batch_size=100, batch_interval=0.02,
+                 overflow=OVERFLOW_DROP_OLDEST, block_timeout=0.5):
+        """
+        handle_batch(items): 处理一批消息的函数，items为 put() 放入的对象列表
+        capacity: 队列容量
+        batch_size: 每批最多处理的消息数
+        batch_interval: 收到第一条消息后最多等待多久凑成一批（秒）
+        overflow: 队列满时的处理方式，见 OVERFLOW_POLICIES
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的队列溢出策略: {overflow}")
+        self.handle_batch = handle_batch
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.worker = None
+        self.stopped = False
+        self.busy = False  # 后台线程正在处理已出队的一批
+        self.flushing = 0  # 等待队列清空的调用数，非零时不再凑批等待
+
+        # 统计
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self.batches = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self.queue)
+
+    def put(self, item):
+        """放入一条消息，返回False表示因队列已满被丢弃"""
+        with self.condition:
+            self.received += 1
+            if len(self.queue) >= self.capacity:
+                if self.overflow == OVERFLOW_DROP_OLDEST:
+                    self.queue.popleft()
+                    self.dropped += 1
+                elif self.overflow == OVERFLOW_BLOCK:
+                    self.condition.wait_for(lambda: len(self.queue) < self.capacity or self.stopped,
+                                            self.block_timeout)
+                if len(self.queue) >= self.capacity:
+                    self.dropped += 1
+                    return False
+            self.queue.append(item)
+            depth = len(self.queue)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            if depth == 1 or depth >= self.batch_size:
+                # 第一条唤醒后台线程开始计时，凑满一批时提前唤醒
+                self._ensure_worker()
+                self.condition.notify_all()
+        return True
+
+    def _ensure_worker(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.stopped = False
+            self.worker = threading.Thread(target=self._run, daemon=True)
+            self.worker.start()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and not self.queue:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                self.condition.wait_for(
+                    lambda: len(self.queue) >= self.batch_size or self.stopped or self.flushing,
+                    self.batch_interval)
+                count = min(self.batch_size, len(self.queue))
+                batch = [self.queue.popleft() for _ in range(count)]
+                self.busy = True
+                # 唤醒因队列满而阻塞的生产者
+                self.condition.notify_all()
+            try:
+                self.handle_batch(batch)
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] 处理接收消息时出错: {e}")
+            with self.condition:
+                self.busy = False
+                self.processed += len(batch)
+                self.batches += 1
+                self.condition.notify_all()
+
+    def flush(self, timeout=5.0):
+        """等待队列中的消息处理完，返回是否在超时前处理完"""
+        with self.condition:
+            if self.queue:
+                self._ensure_worker()
+            self.flushing += 1
+            self.condition.notify_all()
+            try:
+                return self.condition.wait_for(lambda: not self.queue and not self.busy, timeout)
+            finally:
+                self.flushing -= 1
+
+    def get_stats(self):
+        """队列与批处理统计"""
+        with self.condition:
+            return {
+                'queued': len(self.queue),
+                'max_depth': self.max_depth,
+                'received': self.received,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'batches': self.batches,
+                'avg_batch_size': self.processed / self.batches if self.batches else 0.0,
+                'overflow': self.overflow,
+            }
+
+    def stop(self, flush=True):
+        """停止后台线程；flush为True时先处理完队列中的消息"""
+        if flush:
+            self.flush()
+        with self.condition:
+            self.stopped = True
+            if not flush:
+                self.dropped += len(self.queue)
+                self.queue.clear()
+            self.condition.notify_all()
+        if self.worker and self.worker is not threading.current_thread():
+            self.worker.join(timeout=2)
+        self.worker = None
@@ -4,13 +4,220 @@
 分析用户语音指令并识别意图
 """
 
+import os
 import re
-from config import DEVICE_COMMANDS, ACTION_KEYWORDS
+from config import (DEVICE_COMMANDS, ACTION_KEYWORDS, ROOM_KEYWORDS, PHONETIC_MATCH_CONFIG,
+                    INTENT_CLASSIFIER_CONFIG)
+from phonetic_index import PhoneticKeywordIndex, is_available as phonetic_available
+from device_registry import get_default_registry
+
+try:
+    import numpy as np
+except ImportError:
+    # 未安装numpy时仅使用关键词匹配
+    np = None
+
+# 项目根目录，用于解析相对的模型路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 无意图类别标签
+NO_INTENT_LABEL = 'none'
+
+
+class IntentClassifier:
+    """
+    轻量级本地意图分类器
+    字符n-gram哈希特征 + NumPy softmax线性模型，完全离线运行，支持批量向量化推理
+    类别标签形如 "灯:on"，无意图为 "none"
+    """
+
+    FNV_PRIME = 0x100000001B3
+    FMIX_MULTIPLIER = 0xFF51AFD7ED558CCD
+
+    def __init__(self, n_features=2 ** 14, ngram_range=(1, 3), classes=None):
+        if np is None:
+            raise RuntimeError("意图分类器需要numpy，请运行: pip install numpy")
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.classes = list(classes or [])
+        self.weights = np.zeros((n_features, len(self.classes)), dtype=np.float32)
+        self.bias = np.zeros(len(self.classes), dtype=np.float32)
+
+    @staticmethod
+    def make_label(device, action):
+        """由设备和动作生成类别标签"""
+        if device is None or action is None:
+            return NO_INTENT_LABEL
+        return f"{device}:{action}"
+
+    @staticmethod
+    def split_label(label):
+        """把类别标签拆分为 (设备, 动作)"""
+        if label == NO_INTENT_LABEL:
+            return None, None
+        device, _, action = label.rpartition(':')
+        return device, action
+
+    def _extract_features(self, texts):
+        """
+        批量提取字符n-gram哈希特征
+        返回: (样本序号数组, 特征序号数组, 特征值数组)
+        所有文本拼接后一次性在NumPy中计算滚动哈希，避免逐条Python循环
+        """
+        joined = '\x00'.join(text.lower().replace('\x00', '') for text in texts) + '\x00'
+        codes = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        is_sep = codes == 0
+        sample_ids = np.cumsum(is_sep) - is_sep
+
+        rows = []
+        cols = []
+        prime = np.uint64(self.FNV_PRIME)
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            count = len(codes) - n + 1
+            if count <= 0:
+                continue
+            hashes = np.full(count, 0xCBF29CE484222325 ^ n, dtype=np.uint64)
+            valid = np.ones(count, dtype=bool)
+            for offset in range(n):
+                hashes = (hashes ^ codes[offset:offset + count]) * prime
+                valid &= ~is_sep[offset:offset + count]
+            # murmur3 fmix64 末端混合，保证低位分布均匀
+            hashes ^= hashes >> np.uint64(33)
+            hashes *= np.uint64(self.FMIX_MULTIPLIER)
+            hashes ^= hashes >> np.uint64(33)
+            rows.append(sample_ids[:count][valid])
+            cols.append(hashes[valid] % np.uint64(self.n_features))
+
+        rows = np.concatenate(rows).astype(np.int64) if rows else np.zeros(0, dtype=np.int64)
+        cols = np.concatenate(cols).astype(np.int64) if cols else np.zeros(0, dtype=np.int64)
+
+        # 按样本特征数做L2归一化，长短句权重一致
+        counts = np.bincount(rows, minlength=len(texts)).astype(np.float32)
+        values = 1.0 / np.sqrt(np.maximum(counts, 1.0))[rows]
+        return rows, cols, values
+
+    def _logits(self, texts, features=None):
+        """计算批量样本的logits"""
+        rows, cols, values = features if features is not None else self._extract_features(texts)
+        contributions = self.weights[cols] * values[:, None]
+        logits = np.empty((len(texts), len(self.classes)), dtype=np.float32)
+        for index in range(len(self.classes)):
+            logits[:, index] = np.bincount(rows, weights=contributions[:, index], minlength=len(texts))
+        return logits + self.bias
+
+    @staticmethod
+    def _softmax(logits):
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, texts):
+        """批量预测各类别概率"""
+        if not texts:
+            return np.zeros((0, len(self.classes)), dtype=np.float32)
+        return self._softmax(self._logits(texts))
+
+    def predict_batch(self, texts):
+        """批量预测，返回 (标签列表, 置信度数组)"""
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        return [self.classes[index] for index in best], probabilities[np.arange(len(texts)), best]
+
+    def predict(self, text):
+        """预测单条文本，返回 (标签, 置信度)"""
+        labels, confidences = self.predict_batch([text])
+        return labels[0], float(confidences[0])
+
+    def fit(self, texts, labels, epochs=10, batch_size=256, learning_rate=5.0, l2=1e-5, seed=0):
+        """
+        使用小批量梯度下降训练softmax模型
+        返回每轮的平均交叉熵损失
+        """
+        texts = list(texts)
+        labels = list(labels)
+        self.classes = sorted(set(labels) | {NO_INTENT_LABEL})
+        class_index = {label: index for index, label in enumerate(self.classes)}
+        targets = np.array([class_index[label] for label in labels], dtype=np.int64)
+        self.weights = np.zeros((self.n_features, len(self.classes)), dtype=np.float32)
+        self.bias = np.zeros(len(self.classes), dtype=np.float32)
+
+        rng = np.random.default_rng(seed)
+        losses = []
+        for _ in range(epochs):
+            order = rng.permutation(len(texts))
+            epoch_loss = 0.0
+            for start in range(0, len(texts), batch_size):
+                batch = order[start:start + batch_size]
+                batch_texts = [texts[index] for index in batch]
+                batch_targets = targets[batch]
+                rows, cols, values = features = self._extract_features(batch_texts)
+
+                probabilities = self._softmax(self._logits(batch_texts, features))
+                epoch_loss += -np.log(probabilities[np.arange(len(batch)), batch_targets] + 1e-9).sum()
+
+                delta = probabilities
+                delta[np.arange(len(batch)), batch_targets] -= 1.0
+                delta /= len(batch)
+
+                gradient = np.zeros_like(self.weights)
+                np.add.at(gradient, cols, delta[rows] * values[:, None])
+                self.weights -= learning_rate * (gradient + l2 * self.weights)
+                self.bias -= learning_rate * delta.sum(axis=0)
+            losses.append(epoch_loss / max(1, len(texts)))
+        return losses
+
+    def save(self, path):
+        """保存模型到 .npz 文件"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez_compressed(path, weights=self.weights, bias=self.bias,
+                            classes=np.array(self.classes), n_features=self.n_features,
+                            ngram_range=np.array(self.ngram_range))
+
+    @classmethod
+    def load(cls, path):
+        """从 .npz 文件加载模型"""
+        with np.load(path, allow_pickle=False) as data:
+            model = cls(n_features=int(data['n_features']),
+                        ngram_range=tuple(int(n) for n in data['ngram_range']),
+                        classes=[str(label) for label in data['classes']])
+            model.weights = data['weights'].astype(np.float32)
+            model.bias = data['bias'].astype(np.float32)
+        return model
+
 
 class IntentRecognizer:
-    def __init__(self):
+    def __init__(self, registry=None):
+        # 设备注册表（启用时设备和房间通过注册表的关键词自动机识别）
+        self.registry = registry if registry is not None else get_default_registry()
         self.device_patterns = self._build_device_patterns()
         self.action_patterns = self._build_action_patterns()
+        self.phonetic_index = self._build_phonetic_index()
+        self.classifier = self._load_classifier()
+        # 设备状态影子（由MQTT客户端提供），用于在分析结果中附带设备当前状态
+        self.device_shadow = None
+    
+    def _load_classifier(self):
+        """加载本地意图分类模型（未启用、未训练或缺少numpy时返回None）"""
+        if not INTENT_CLASSIFIER_CONFIG.get('enabled', True) or np is None:
+            return None
+        model_path = INTENT_CLASSIFIER_CONFIG.get('model_path', '')
+        if model_path and not os.path.isabs(model_path):
+            model_path = os.path.join(PROJECT_ROOT, model_path)
+        if not model_path or not os.path.exists(model_path):
+            return None
+        try:
+            return IntentClassifier.load(model_path)
+        except Exception as e:
+            print(f"意图分类模型加载失败，将使用关键词匹配: {e}")
+            return None
+    
+    def _build_phonetic_index(self):
+        """构建拼音模糊匹配索引"""
+        if not PHONETIC_MATCH_CONFIG.get('enabled', True) or not phonetic_available():
+            return None
+        return PhoneticKeywordIndex()
     
     def _build_device_patterns(self):
         """构建设备识别模式"""
@@ -28,7 +235,48 @@ class IntentRecognizer:
             pattern = '|'.join(keywords)
             patterns[action] = re.compile(f'({pattern})', re.IGNORECASE)
         return patterns
-    
+
+    def apply_config_changes(self, changes):
+        """
+        应用配置热更新，只重建受影响的部分
+        changes: {配置段: (旧值, 新值)}，由 ConfigStore 提供
+        """
+        if 'DEVICE_COMMANDS' in changes:
+            old, new = changes['DEVICE_COMMANDS']
+            # 按新配置的顺序重排，关键词未变化的设备复用已编译的正则
+            patterns = {}
+            for device, device_config in new.items():
+                if device in self.device_patterns and old.get(device, {}).get('keywords') == device_config['keywords']:
+                    patterns[device] = self.device_patterns[device]
+                else:
+                    pattern = '|'.join(device_config['keywords'])
+                    patterns[device] = re.compile(f'({pattern})', re.IGNORECASE)
+            self.device_patterns = patterns
+
+        if 'ACTION_KEYWORDS' in changes:
+            old, new = changes['ACTION_KEYWORDS']
+            patterns = {}
+            for action, keywords in new.items():
+                if action in self.action_patterns and old.get(action) == keywords:
+                    patterns[action] = self.action_patterns[action]
+                else:
+                    patterns[action] = re.compile(f"({'|'.join(keywords)})", re.IGNORECASE)
+            self.action_patterns = patterns
+
+        if 'DEVICE_COMMANDS' in changes and self.registry:
+            # 设备注册表中由配置生成的设备随配置更新，关键词自动机随之重建
+            self.registry.sync_config(*changes['DEVICE_COMMANDS'])
+
+        if changes.keys() & {'DEVICE_COMMANDS', 'ACTION_KEYWORDS', 'PHONETIC_MATCH_CONFIG'}:
+            self.phonetic_index = self._build_phonetic_index()
+
+        if 'INTENT_CLASSIFIER_CONFIG' in changes:
+            old, new = changes['INTENT_CLASSIFIER_CONFIG']
+            # 只调整阈值时无需重新加载模型
+            if {k: v for k, v in old.items() if k != 'confidence_threshold'} != \
+                    {k: v for k, v in new.items() if k != 'confidence_threshold'}:
+                self.classifier = self._load_classifier()
+
     def recognize_intent(self, text):
         """
         识别用户意图
@@ -37,22 +285,79 @@ class IntentRecognizer:
             'action': 操作类型,
             'room': 房间 (可选),
             'confidence': 置信度,
+            'match_type': 匹配方式 ('classifier'、'exact' 或 'phonetic'),
             'original_text': 原始文本
         }
         """
+        if self.classifier:
+            label, confidence = self.classifier.predict(text)
+            intent = self._classifier_intent(text, label, confidence)
+            if intent:
+                return intent
+        return self._recognize_with_keywords(text)
+    
+    def recognize_batch(self, texts):
+        """
+        批量识别意图
+        分类器对整批文本做一次向量化推理，置信度不足的样本回退到关键词匹配（与 recognize_intent 一致）
+        """
+        texts = list(texts)
+        if not self.classifier or not texts:
+            return [self._recognize_with_keywords(text) for text in texts]
+        
+        labels, confidences = self.classifier.predict_batch(texts)
+        results = []
+        for text, label, confidence in zip(texts, labels, confidences):
+            intent = self._classifier_intent(text, label, float(confidence))
+            results.append(intent or self._recognize_with_keywords(text))
+        return results
+    
+    def _classifier_intent(self, text, label, confidence):
+        """
+        把分类结果转换为意图，置信度不足时返回None（回退到关键词匹配）
+        置信度足够的无意图预测返回设备和动作为空的意图，不再被关键词和拼音匹配补全成设备指令
+        """
+        if confidence < INTENT_CLASSIFIER_CONFIG.get('confidence_threshold', 0.7):
+            return None
+        device, action = IntentClassifier.split_label(label)
+        if device is None:
+            return {
+                'device': None,
+                'action': None,
+                'room': None,
+                'confidence': confidence,
+                'match_type': 'classifier',
+                'original_text': text
+            }
+        return {
+            'device': device,
+            'action': action,
+            'room': self._recognize_room(text),
+            'confidence': confidence,
+            'match_type': 'classifier',
+            'original_text': text
+        }
+    
+    def _recognize_with_keywords(self, text):
+        """关键词（及拼音模糊）匹配识别意图"""
         result = {
             'device': None,
             'action': None,
             'room': None,
             'confidence': 0.0,
+            'match_type': None,
             'original_text': text
         }
         
-        # 识别设备
-        device_matches = []
-        for device, pattern in self.device_patterns.items():
-            if pattern.search(text):
-                device_matches.append(device)
+        # 识别设备（注册表自动机一次扫描同时得到设备和房间）
+        registry_matches = self.registry.match_text(text) if self.registry else None
+        if registry_matches:
+            device_matches = list(registry_matches['devices'])
+        else:
+            device_matches = []
+            for device, pattern in self.device_patterns.items():
+                if pattern.search(text):
+                    device_matches.append(device)
         
         # 识别动作
         action_matches = []
@@ -60,36 +365,53 @@ class IntentRecognizer:
             if pattern.search(text):
                 action_matches.append(action)
         
+        # 精确匹配失败时，按拼音模糊匹配补全缺失的设备或动作
+        penalty = 0.0
+        if self.phonetic_index and (not device_matches or not action_matches):
+            phonetic = self.phonetic_index.match(text)
+            if not device_matches and phonetic['device']:
+                device, distance, keyword, _ = phonetic['device'][0]
+                device_matches.append(device)
+                penalty += self.phonetic_index.penalty(text, keyword, distance)
+            if not action_matches and phonetic['action']:
+                action, distance, keyword, _ = phonetic['action'][0]
+                action_matches.append(action)
+                penalty += self.phonetic_index.penalty(text, keyword, distance)
+        
         # 识别房间
-        room = self._recognize_room(text)
+        if registry_matches:
+            room = registry_matches['rooms'][0] if registry_matches['rooms'] else None
+        else:
+            room = self._recognize_room(text)
         
         # 确定最终意图
         if device_matches and action_matches:
             result['device'] = device_matches[0]  # 取第一个匹配的设备
             result['action'] = action_matches[0]  # 取第一个匹配的动作
             result['room'] = room
-            result['confidence'] = self._calculate_confidence(text, device_matches, action_matches, room)
+            result['match_type'] = 'phonetic' if penalty > 0 else 'exact'
+            result['confidence'] = self._calculate_confidence(text, device_matches, action_matches, room, penalty)
         
         return result
     
+    def should_execute(self, intent):
+        """意图是否足以执行：需要设备和动作，拼音模糊匹配的结果还需达到最低置信度"""
+        if not intent or not intent.get('device') or not intent.get('action'):
+            return False
+        if intent.get('match_type') == 'phonetic':
+            return intent['confidence'] >= PHONETIC_MATCH_CONFIG.get('min_confidence', 0.7)
+        return True
+    
     def _recognize_room(self, text):
         """识别房间"""
-        room_keywords = {
-            'living_room': ['客厅', '大厅', '起居室'],
-            'bedroom': ['卧室', '睡房', '房间'],
-            'kitchen': ['厨房'],
-            'bathroom': ['浴室', '卫生间', '厕所'],
-            'study': ['书房', '工作室']
-        }
-        
-        for room, keywords in room_keywords.items():
+        for room, keywords in ROOM_KEYWORDS.items():
             for keyword in keywords:
                 if keyword in text:
                     return room
         return None
     
-    def _calculate_confidence(self, text, device_matches, action_matches, room):
-        """计算置信度"""
+    def _calculate_confidence(self, text, device_matches, action_matches, room, penalty=0.0):
+        """计算置信度，penalty为拼音模糊匹配带来的惩罚"""
         base_confidence = 0.5
         
         # 有设备和动作匹配
@@ -104,13 +426,22 @@ class IntentRecognizer:
         if 3 <= len(text) <= 20:
             base_confidence += 0.1
         
-        return min(base_confidence, 1.0)
+        return max(min(base_confidence, 1.0) - penalty, 0.0)
     
-    def get_device_command(self, device, action):
+    def get_device_command(self, device, action, room=None):
         """
         获取设备控制指令
         返回主题和指令内容
         """
+        if self.registry:
+            record = self.registry.resolve(device, room)
+            command = record.command_for(action) if record else None
+            if command:
+                return record.topic, command
+            # 指定了房间却没有匹配的设备时不回退；未指定房间且设备分布在多个房间时使用默认配置
+            if room or device not in DEVICE_COMMANDS:
+                return None, None
+        
         if device not in DEVICE_COMMANDS:
             return None, None
         
@@ -140,13 +471,18 @@ class IntentRecognizer:
             'is_valid': intent['device'] is not None and intent['action'] is not None,
             'device_topic': None,
             'command': None,
+            'current_power': None,
+            'redundant': False,
             'description': self._generate_description(intent)
         }
         
         if analysis['is_valid']:
-            topic, command = self.get_device_command(intent['device'], intent['action'])
+            topic, command = self.get_device_command(intent['device'], intent['action'], intent['room'])
             analysis['device_topic'] = topic
             analysis['command'] = command
+            if self.device_shadow is not None and topic:
+                analysis['current_power'] = self.device_shadow.power(topic)
+                analysis['redundant'] = command is not None and not self.device_shadow.would_change(topic, command)
         
         return analysis
     
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+链路探测模块
+定时向专用回显主题发布探测消息，服务器转发回本机后计算往返时间（RTT）；
+探测发出后超过 dead_after 秒仍收不到回显即判定链路已断开，不必等待 keep_alive 超时（最长约90秒）
+"""
+
+import os
+import time
+import threading
+from collections import deque
+
+# RTT直方图的桶上限（毫秒），最后一个桶收集更慢的样本
+RTT_BUCKETS_MS = (10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+def bucket_label(index):
+    if index < len(RTT_BUCKETS_MS):
+        return f"<={RTT_BUCKETS_MS[index]}ms"
+    return f">{RTT_BUCKETS_MS[-1]}ms"
+
+
+class LinkMonitor:
+    """应用层RTT探测与断链判定"""
+
+    def __init__(self, send_probe, interval=2.0, dead_after=6.0, sample_size=1000):
+        """
+        send_probe(payload): 发布一条探测消息，返回是否已发出
+        interval: 探测间隔（秒）
+        dead_after: 探测发出后超过该时间没有收到回显则判定链路断开（秒）
+        """
+        self.send_probe = send_probe
+        self.interval = interval
+        self.dead_after = dead_after
+        # 区分同一回显主题上其它客户端的探测
+        self.token = f"{os.getpid():x}{id(self) & 0xffff:04x}"
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.outstanding = {}  # 序号 -> 发送时间（perf_counter）
+        self.samples = deque(maxlen=sample_size)
+        self.histogram = [0] * (len(RTT_BUCKETS_MS) + 1)
+        self.verified = False  # 收到过回显；回显主题不可用时只统计，不判定断链
+        self.last_alive = time.perf_counter()
+        self.next_probe = 0.0
+        self.probes_sent = 0
+        self.echoes = 0
+        self.dead_count = 0
+        self.last_rtt = None
+
+    def reset(self):
+        """连接（重连）成功时调用"""
+        now = time.perf_counter()
+        with self.lock:
+            self.outstanding.clear()
+            self.last_alive = now
+            self.next_probe = now
+
+    def tick(self):
+        """
+        由网络线程周期调用：到时间就发送探测
+        返回False表示链路已判定断开
+        """
+        now = time.perf_counter()
+        with self.lock:
+            # 以最早一个未回显探测的发送时间判断，网络线程调用不及时也不会误判
+            if self.verified and self.outstanding and now - next(iter(self.outstanding.values())) > self.dead_after:
+                self.dead_count += 1
+                self.outstanding.clear()
+                return False
+            if now < self.next_probe:
+                return True
+            self.next_probe = now + self.interval
+            self.sequence += 1
+            sequence = self.sequence
+            self.outstanding[sequence] = time.perf_counter()
+            # 只保留最近的探测，长时间无回显时不无限增长
+            while len(self.outstanding) > 16:
+                self.outstanding.pop(next(iter(self.outstanding)))
+            self.probes_sent += 1
+        self.send_probe(f"{self.token}:{sequence}")
+        return True
+
+    def on_echo(self, payload):
+        """收到回显主题上的消息，返回测得的RTT（秒），不是本机的探测时返回None"""
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8', errors='replace')
+        token, _, sequence = payload.partition(':')
+        if token != self.token or not sequence.isdigit():
+            return None
+        now = time.perf_counter()
+        with self.lock:
+            sent_at = self.outstanding.pop(int(sequence), None)
+            if sent_at is None:
+                return None
+            # 更早的探测视为丢失
+            for earlier in [seq for seq in self.outstanding if seq < int(sequence)]:
+                del self.outstanding[earlier]
+            rtt = now - sent_at
+            self.samples.append(rtt)
+            self.histogram[self._bucket(rtt)] += 1
+            self.echoes += 1
+            self.last_rtt = rtt
+            self.verified = True
+            self.last_alive = now
+        return rtt
+
+    @staticmethod
+    def _bucket(rtt):
+        rtt_ms = rtt * 1000
+        for index, limit in enumerate(RTT_BUCKETS_MS):
+            if rtt_ms <= limit:
+                return index
+        return len(RTT_BUCKETS_MS)
+
+    def get_stats(self):
+        """RTT统计（毫秒）与直方图"""
+        with self.lock:
+            samples = sorted(self.samples)
+            return {
+                'verified': self.verified,
+                'last_echo_age': time.perf_counter() - self.last_alive,
+                'probes_sent': self.probes_sent,
+                'echoes': self.echoes,
+                'lost': self.probes_sent - self.echoes - len(self.outstanding),
+                'dead_count': self.dead_count,
+                'last_rtt_ms': self.last_rtt * 1000 if self.last_rtt is not None else None,
+                'avg_rtt_ms': sum(samples) / len(samples) * 1000 if samples else None,
+                'p50_rtt_ms': samples[len(samples) // 2] * 1000 if samples else None,
+                'p95_rtt_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000 if samples else None,
+                'histogram': {bucket_label(index): count for index, count in enumerate(self.histogram)},
+            }
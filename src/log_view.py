@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+系统日志视图模块
+全部日志条目保存在固定容量的环形缓冲区（LogStore）中，日志控件只显示其中一个有界的窗口（LogViewport）：
+跟随最新时追加并裁掉顶部，向上滚动时从存储中按页取出更早的条目；
+切换过滤条件只渲染一页，不重绘全部历史
+"""
+
+import sys
+import time
+import threading
+from datetime import datetime
+
+# 日志级别（数值越大越严重）
+LEVEL_INFO = 0
+LEVEL_WARNING = 1
+LEVEL_ERROR = 2
+LEVEL_NAMES = {LEVEL_INFO: '信息', LEVEL_WARNING: '警告', LEVEL_ERROR: '错误'}
+
+
+def infer_level(sender, message):
+    """根据来源和内容推断日志级别"""
+    if '错误' in sender or '❌' in message:
+        return LEVEL_ERROR
+    if '⚠️' in message:
+        return LEVEL_WARNING
+    return LEVEL_INFO
+
+
+class LogEntry:
+    """一条日志（seq为存储内递增的序号，来源与主题为驻留字符串）"""
+    __slots__ = ('seq', 'timestamp', 'sender', 'message', 'level', 'topic')
+
+    def __init__(self, seq, timestamp, sender, message, level, topic):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.sender = sender
+        self.message = message
+        self.level = level
+        self.topic = topic
+
+    def format(self):
+        """显示文本：一条日志固定占日志控件的一行"""
+        timestamp = datetime.fromtimestamp(self.timestamp).strftime('%H:%M:%S')
+        return f"[{timestamp}] {self.sender}: {self.message.replace(chr(10), ' ')}\n"
+
+
+class LogFilter:
+    """按来源、主题（子串）和最低级别过滤，条件为None表示不限"""
+    __slots__ = ('sender', 'topic', 'level')
+
+    def __init__(self, sender=None, topic=None, level=None):
+        self.sender = sender or None
+        self.topic = topic or None
+        self.level = level
+
+    def matches(self, entry):
+        return ((self.sender is None or entry.sender == self.sender) and
+                (self.level is None or entry.level >= self.level) and
+                (self.topic is None or (entry.topic is not None and self.topic in entry.topic)))
+
+
+NO_FILTER = LogFilter()
+
+
+class LogStore:
+    """固定容量的日志存储（线程安全），按序号直接定位，分页查询不扫描整个历史"""
+
+    def __init__(self, capacity=20000):
+        self.capacity = capacity
+        self.lock = threading.RLock()
+        self.entries = [None] * capacity
+        self.head = 0  # 下一条写入的位置
+        self.count = 0
+        self.next_seq = 1
+        self.sender_counts = {}
+
+    def __len__(self):
+        return self.count
+
+    def append(self, sender, message, level=None, topic=None, timestamp=None):
+        """追加一条日志，返回该条目"""
+        sender = sys.intern(sender)
+        with self.lock:
+            entry = LogEntry(self.next_seq, time.time() if timestamp is None else timestamp, sender, message,
+                             infer_level(sender, message) if level is None else level,
+                             None if topic is None else sys.intern(topic))
+            evicted = self.entries[self.head]
+            if evicted is not None and self.count == self.capacity:
+                self._forget_sender(evicted.sender)
+            self.entries[self.head] = entry
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.next_seq += 1
+            self.sender_counts[sender] = self.sender_counts.get(sender, 0) + 1
+        return entry
+
+    def _forget_sender(self, sender):
+        remaining = self.sender_counts[sender] - 1
+        if remaining:
+            self.sender_counts[sender] = remaining
+        else:
+            del self.sender_counts[sender]
+
+    def senders(self):
+        """存储中出现过的来源"""
+        with self.lock:
+            return sorted(self.sender_counts)
+
+    @property
+    def oldest_seq(self):
+        return self.next_seq - self.count
+
+    def _index(self, seq):
+        """序号对应的缓冲区位置（调用方持有锁）"""
+        return (self.head - (self.next_seq - seq)) % self.capacity
+
+    def before(self, seq, limit, log_filter=NO_FILTER):
+        """序号小于seq的最近limit条匹配条目（从旧到新）"""
+        results = []
+        with self.lock:
+            seq = min(seq, self.next_seq)
+            oldest = self.oldest_seq
+            while seq > oldest and len(results) < limit:
+                seq -= 1
+                entry = self.entries[self._index(seq)]
+                if log_filter.matches(entry):
+                    results.append(entry)
+        results.reverse()
+        return results
+
+    def tail(self, limit, log_filter=NO_FILTER):
+        """最新的limit条匹配条目（从旧到新）与查询时最新条目的序号"""
+        with self.lock:
+            newest = self.next_seq - 1
+            return self.before(newest + 1, limit, log_filter), newest
+
+    def after(self, seq, limit, log_filter=NO_FILTER):
+        """
+        序号大于seq的最早limit条匹配条目（从旧到新）与已检查到的序号
+        下次从返回的序号继续查询，不会漏掉查询期间追加的条目
+        """
+        results = []
+        with self.lock:
+            seq = max(seq, self.oldest_seq - 1)
+            while seq + 1 < self.next_seq and len(results) < limit:
+                seq += 1
+                entry = self.entries[self._index(seq)]
+                if log_filter.matches(entry):
+                    results.append(entry)
+        return results, seq
+
+    def clear(self):
+        """清空存储（序号继续递增，视图中的旧序号不会与新条目混淆）"""
+        with self.lock:
+            self.entries = [None] * self.capacity
+            self.head = 0
+            self.count = 0
+            self.sender_counts.clear()
+
+
+class LogViewport:
+    """
+    日志控件中显示的有界窗口（只在界面线程中使用）
+    各方法返回需要对控件做的修改，由界面代码执行：
+        ('reset', entries)         清空后显示entries
+        ('append', entries, n)     末尾追加entries，再删除顶部n行
+        ('prepend', entries, n)    顶部插入entries，再删除底部n行
+    没有变化时返回None
+    """
+
+    def __init__(self, store, max_lines=500, page_size=100):
+        self.store = store
+        self.max_lines = max_lines
+        self.page_size = page_size
+        self.filter = NO_FILTER
+        self.first_seq = None  # 窗口中第一条的序号
+        self.last_seq = 0  # 已检查到的序号：窗口之后、此序号之前没有匹配的条目
+        self.lines = 0
+        self.follow = True  # 窗口是否停在最新位置
+        self.at_oldest = True  # 窗口之前是否没有更早的匹配条目
+
+    def set_filter(self, sender=None, topic=None, level=None):
+        """切换过滤条件，显示最新的一屏匹配条目"""
+        self.filter = LogFilter(sender, topic, level)
+        return self.reset()
+
+    def reset(self):
+        """回到最新位置重新显示"""
+        entries, self.last_seq = self.store.tail(self.max_lines, self.filter)
+        self.follow = True
+        self.lines = len(entries)
+        self.first_seq = entries[0].seq if entries else None
+        self.at_oldest = not entries or not self.store.before(self.first_seq, 1, self.filter)
+        return ('reset', entries)
+
+    def on_new_entries(self):
+        """有新日志时调用：跟随最新时追加新条目并裁掉顶部；用户在查看旧日志时不改动控件"""
+        if not self.follow:
+            return None
+        entries, checked = self.store.after(self.last_seq, self.max_lines + 1, self.filter)
+        if len(entries) > self.max_lines:
+            # 新条目超过一屏（积压或队列丢弃），直接显示最新一屏
+            return self.reset()
+        self.last_seq = checked
+        return self._append(entries) if entries else None
+
+    def page_older(self):
+        """滚动到顶部时调用：取出更早的一页，超出上限时删除底部，窗口不再跟随最新"""
+        if self.at_oldest or self.first_seq is None:
+            return None
+        entries = self.store.before(self.first_seq, self.page_size, self.filter)
+        if not entries:
+            self.at_oldest = True
+            return None
+        trimmed = max(0, self.lines + len(entries) - self.max_lines)
+        if trimmed:
+            # 底部删除trimmed条后，窗口最后一条之后的条目需要重新翻页取回
+            self.last_seq = self.store.before(self.last_seq + 1, trimmed + 1, self.filter)[0].seq
+            self.follow = False
+        self.lines += len(entries) - trimmed
+        self.first_seq = entries[0].seq
+        self.at_oldest = not self.store.before(self.first_seq, 1, self.filter)
+        return ('prepend', entries, trimmed)
+
+    def page_newer(self):
+        """离开最新位置后滚动到底部时调用：取出较新的一页并删除顶部，追上最新后恢复跟随"""
+        if self.follow:
+            return None
+        entries, self.last_seq = self.store.after(self.last_seq, self.page_size, self.filter)
+        if len(entries) < self.page_size:
+            self.follow = True
+        return self._append(entries) if entries else None
+
+    def _append(self, entries):
+        if self.first_seq is None:
+            self.first_seq = entries[0].seq
+        trimmed = max(0, self.lines + len(entries) - self.max_lines)
+        if trimmed:
+            # 顶部删除trimmed条后的第一条：原第一条之后的第trimmed条匹配条目
+            self.first_seq = self.store.after(self.first_seq, trimmed, self.filter)[0][-1].seq
+            self.at_oldest = False
+        self.lines += len(entries) - trimmed
+        return ('append', entries, trimmed)
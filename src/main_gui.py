@@ -6,38 +6,87 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import threading
-from datetime import datetime
 
 from mqtt_client import MQTTClient, control_device
 from ai_speech_recognition import AISpeechRecognizer
 from intent_recognition import IntentRecognizer, EXAMPLE_COMMANDS
-from config import GUI_CONFIG, MQTT_TOPICS, DEVICE_COMMANDS
+from config_store import get_config_store
+from command_executor import (CommandExecutor, CommandExpired, CommandRejected, SOURCE_VOICE, SOURCE_MANUAL,
+                              SOURCE_AUTOMATION)
+from rate_limiter import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from command_confirmation import ConfirmationResult
+from mqtt_broker import BrokerThread
+from ui_update_queue import UIUpdateQueue
+from log_view import LogStore, LogViewport, LEVEL_WARNING, LEVEL_ERROR
+from config import (GUI_CONFIG, MQTT_CONFIG, MQTT_TOPICS, DEVICE_COMMANDS, COMMAND_EXECUTOR_CONFIG,
+                    LOCAL_BROKER_CONFIG)
 
 class SmartHomeGUI:
     def __init__(self, root):
         self.root = root        
+        # 先加载配置存储，使后续组件读取到覆盖后的配置
+        self.config_store = get_config_store()
         self.setup_window()
         
+        # 系统日志存储与日志控件中显示的窗口
+        self.log_store = LogStore(GUI_CONFIG.get('log_capacity', 20000))
+        self.log_viewport = LogViewport(self.log_store, GUI_CONFIG.get('log_view_lines', 500),
+                                        GUI_CONFIG.get('log_page_size', 100))
+        self.log_paging = False
+        
+        # 后台线程的日志和状态更新经由此队列，在界面线程中批量刷新
+        self.ui_queue = UIUpdateQueue(
+            self.root.after, self.append_log_lines,
+            interval=GUI_CONFIG.get('update_interval', 0.05),
+            max_batch=GUI_CONFIG.get('update_batch', 500),
+            max_pending=GUI_CONFIG.get('update_max_pending', 5000))
+        
         # 初始化组件
         self.mqtt_client = None
         self.speech_recognizer = None
         self.intent_recognizer = IntentRecognizer()
         
+        # 设备指令执行器：同一设备按顺序执行，不同设备并行，完成回调回到界面线程
+        self.command_executor = CommandExecutor(
+            max_workers=COMMAND_EXECUTOR_CONFIG.get('max_workers', 4),
+            lane_capacity=COMMAND_EXECUTOR_CONFIG.get('lane_capacity', 16),
+            default_deadline=COMMAND_EXECUTOR_CONFIG.get('deadline', 5.0),
+            callback_scheduler=self.ui_queue.post)
+        
         # 状态变量
         self.is_speech_listening = False
         self.is_mqtt_connected = False
         
         # 创建界面
         self.create_widgets()
+        self.ui_queue.start()
         
         # 初始化组件（带错误处理）
         self.initialize_components()
+        
+        # 监视配置文件，修改后各组件只重建变化的部分
+        self.config_store.subscribe(self.on_config_changed)
+        self.config_store.start_watching()
     
     def initialize_components(self):
         """初始化系统组件"""
+        # 没有外网时在本机运行MQTT服务器，客户端连接本机
+        self.local_broker = None
+        if LOCAL_BROKER_CONFIG.get('enabled', False):
+            try:
+                self.local_broker = BrokerThread(LOCAL_BROKER_CONFIG.get('host', '0.0.0.0'),
+                                                 LOCAL_BROKER_CONFIG.get('port', 1883))
+                _, port = self.local_broker.start()
+                MQTT_CONFIG.update({'broker': '127.0.0.1', 'port': port})
+                self.log_message("系统", f"本地MQTT服务器已启动 (端口: {port})")
+            except OSError as e:
+                self.local_broker = None
+                self.log_message("错误", f"本地MQTT服务器启动失败: {e}")
+        
         # 初始化MQTT客户端
         try:
             self.mqtt_client = MQTTClient(on_message_callback=self.on_mqtt_message)
+            self.intent_recognizer.device_shadow = self.mqtt_client.device_shadow
             self.log_message("系统", "MQTT模块初始化成功")
             # 自动连接MQTT
             self.connect_mqtt()
@@ -67,6 +116,22 @@ class SmartHomeGUI:
         except Exception as e:
             self.speech_recognizer = None
             self.log_message("错误", f"AI语音识别初始化异常: {str(e)}")
+    
+    def on_config_changed(self, changes):
+        """配置变化回调（在监视线程中调用），转到界面线程处理"""
+        self.ui_queue.post(self.apply_config_changes, changes)
+    
+    def apply_config_changes(self, changes):
+        """把配置变化分发给各组件"""
+        self.intent_recognizer.apply_config_changes(changes)
+        if self.mqtt_client:
+            self.mqtt_client.apply_config_changes(changes)
+        if self.speech_recognizer:
+            self.speech_recognizer.apply_config_changes(changes)
+            if 'WAKE_WORD_CONFIG' in changes and hasattr(self, 'wake_word_var'):
+                self.wake_word_var.set(self.speech_recognizer.wake_word_enabled)
+        self.log_message("设置", f"配置已更新: {', '.join(changes)}")
+    
     def setup_window(self):
         """设置主窗口"""
         self.root.title(GUI_CONFIG["title"])
@@ -205,26 +270,49 @@ class SmartHomeGUI:
         message_frame = ttk.LabelFrame(parent, text="📝 系统日志", padding="10")
         message_frame.grid(row=0, column=0, sticky="nsew", pady=(0, 8))
         message_frame.columnconfigure(0, weight=1)
-        message_frame.rowconfigure(0, weight=1)
+        message_frame.rowconfigure(1, weight=1)
         
         # 创建工具栏
         toolbar_frame = ttk.Frame(message_frame)
         toolbar_frame.grid(row=0, column=0, sticky="ew", pady=(0, 5))
         toolbar_frame.columnconfigure(0, weight=1)
         
+        # 日志过滤：来源、级别、主题（只重新显示一屏匹配的日志）
+        log_filters = ttk.Frame(toolbar_frame)
+        log_filters.grid(row=0, column=0, sticky="w")
+        
+        self.log_sender_var = tk.StringVar(value="全部")
+        sender_combo = ttk.Combobox(log_filters, textvariable=self.log_sender_var, values=["全部"],
+                                    state="readonly", width=10,
+                                    postcommand=lambda: sender_combo.configure(
+                                        values=["全部"] + self.log_store.senders()))
+        sender_combo.grid(row=0, column=0, padx=(0, 5))
+        self.log_level_var = tk.StringVar(value="全部")
+        level_combo = ttk.Combobox(log_filters, textvariable=self.log_level_var,
+                                   values=["全部", "⚠️ 警告及以上", "❌ 错误"], state="readonly", width=12)
+        level_combo.grid(row=0, column=1, padx=(0, 5))
+        ttk.Label(log_filters, text="主题:", font=self.font).grid(row=0, column=2)
+        self.log_topic_var = tk.StringVar()
+        ttk.Entry(log_filters, textvariable=self.log_topic_var, width=12).grid(row=0, column=3, padx=(5, 0))
+        for var in (self.log_sender_var, self.log_level_var, self.log_topic_var):
+            var.trace_add("write", lambda *args: self.apply_log_filter())
+        
         # 日志控制按钮
         log_controls = ttk.Frame(toolbar_frame)
         log_controls.grid(row=0, column=1, sticky="e")
         
-        auto_scroll_var = tk.BooleanVar(value=True)
+        self.auto_scroll_var = tk.BooleanVar(value=True)
         auto_scroll_check = ttk.Checkbutton(log_controls, text="📜 自动滚动", 
-                                           variable=auto_scroll_var)
+                                           variable=self.auto_scroll_var)
         auto_scroll_check.grid(row=0, column=0, padx=(0, 5))
         
-        # 日志文本区域
+        # 日志文本区域（只显示有限行数，滚动到顶部或底部时翻页）
         self.message_text = scrolledtext.ScrolledText(message_frame, height=12, width=50, 
                                                     font=self.font, wrap=tk.WORD)
         self.message_text.grid(row=1, column=0, sticky="nsew")
+        self.message_text.configure(yscrollcommand=self.on_log_scroll)
+        self.message_text.tag_configure("warning", foreground="#fd7e14")
+        self.message_text.tag_configure("error", foreground="#dc3545")
         
         # 设置文本区域的样式
         self.message_text.configure(bg="#f8f9fa", fg="#212529", 
@@ -313,7 +401,11 @@ class SmartHomeGUI:
         self.mqtt_status_detailed.grid(row=0, column=1, sticky="w", padx=(10, 0))
     
     def update_speech_status(self, message):
-        """更新AI语音识别状态显示"""
+        """更新AI语音识别状态显示（可在任意线程调用，只显示最新状态）"""
+        self.ui_queue.set_status('speech', self.apply_speech_status, message)
+    
+    def apply_speech_status(self, message):
+        """在界面线程中更新语音状态标签"""
         if hasattr(self, 'speech_status_label'):
             # 根据消息类型设置不同颜色
             if "错误" in message or "❌" in message:
@@ -376,14 +468,14 @@ class SmartHomeGUI:
                     
                     if result:
                         # 在主线程中处理识别结果
-                        self.root.after(0, self.process_voice_command, result)
+                        self.ui_queue.post(self.process_voice_command, result)
                 else:
                     # 如果语音识别器未初始化，停止监听
-                    self.root.after(0, self.log_message, "错误", "语音识别器未初始化，停止监听")
+                    self.log_message("错误", "语音识别器未初始化，停止监听")
                     break
             except Exception as e:
-                self.root.after(0, self.log_message, "AI语音错误", f"语音识别异常: {str(e)}")
-                self.root.after(0, self.update_speech_status, f"❌ 识别异常: {str(e)}")
+                self.log_message("AI语音错误", f"语音识别异常: {str(e)}")
+                self.update_speech_status(f"❌ 识别异常: {str(e)}")
                 break
     
     def recognize_once(self):
@@ -397,12 +489,12 @@ class SmartHomeGUI:
                 self.log_message("AI语音", "开始单次AI语音识别...")
                 result = self.speech_recognizer.recognize_once() # type: ignore
                 if result:
-                    self.root.after(0, self.process_voice_command, result)
+                    self.ui_queue.post(self.process_voice_command, result)
                 else:
-                    self.root.after(0, self.log_message, "AI语音", "未识别到语音或识别失败")
+                    self.log_message("AI语音", "未识别到语音或识别失败")
             except Exception as e:
-                self.root.after(0, self.log_message, "AI语音错误", f"单次识别失败: {str(e)}")
-                self.root.after(0, self.update_speech_status, f"❌ 识别失败: {str(e)}")
+                self.log_message("AI语音错误", f"单次识别失败: {str(e)}")
+                self.update_speech_status(f"❌ 识别失败: {str(e)}")
         
         # 在新线程中执行语音识别
         threading.Thread(target=recognize, daemon=True).start()
@@ -413,17 +505,23 @@ class SmartHomeGUI:
         
         # 意图识别
         intent = self.intent_recognizer.recognize_intent(voice_text)
-        if intent:
+        if self.intent_recognizer.should_execute(intent):
             device = intent.get("device")
             action = intent.get("action")
+            room = intent.get("room")
             self.log_message("意图识别", f"设备: {device}, 操作: {action}")
             
             # 执行控制命令
             if self.mqtt_client and self.is_mqtt_connected:
-                self.execute_device_control(device, action)
+                self.execute_device_control(device, action, room, source=SOURCE_VOICE)
             else:
                 self.log_message("错误", "MQTT未连接，无法执行设备控制")
                 self.update_speech_status("⚠️ MQTT未连接")
+        elif intent.get("device") and intent.get("action"):
+            # 拼音模糊匹配的置信度不足，不执行
+            self.log_message("意图识别", f"置信度不足，未执行: 设备: {intent['device']}, "
+                                      f"操作: {intent['action']}, 置信度: {intent['confidence']:.2f}")
+            self.update_speech_status("⚠️ 未识别到有效指令")
         else:
             self.log_message("意图识别", "未识别到有效的控制意图")
             self.update_speech_status("⚠️ 未识别到有效指令")
@@ -449,10 +547,25 @@ class SmartHomeGUI:
                     if hasattr(self, 'mqtt_status_detailed'):
                         self.mqtt_status_detailed.config(text="🟢 已连接", foreground="green")
                     self.log_message("MQTT", "连接成功")
+                    self.root.after(2000, self.refresh_link_status)
                 else:
                     self.log_message("MQTT", "连接失败")
             except Exception as e:
                 self.log_message("MQTT错误", f"连接异常: {str(e)}")
+    def refresh_link_status(self):
+        """定时刷新连接状态与链路RTT"""
+        if not self.is_mqtt_connected or not self.mqtt_client:
+            return
+        stats = self.mqtt_client.get_link_stats()
+        if not self.mqtt_client.is_connected:
+            text, color = "🟡 重连中", "orange"
+        elif stats.get('last_rtt_ms') is not None:
+            text, color = f"🟢 已连接 RTT {stats['last_rtt_ms']:.0f}ms (p95 {stats['p95_rtt_ms']:.0f}ms)", "green"
+        else:
+            text, color = "🟢 已连接", "green"
+        if hasattr(self, 'mqtt_status_detailed'):
+            self.mqtt_status_detailed.config(text=text, foreground=color)
+        self.root.after(2000, self.refresh_link_status)
     def disconnect_mqtt(self):
         """断开MQTT连接"""
         if self.mqtt_client:
@@ -491,44 +604,111 @@ class SmartHomeGUI:
         else:
             self.log_message("错误", "MQTT未连接，无法执行设备控制")
     
-    def execute_device_control(self, device, action):
-        """执行设备控制"""
+    def execute_device_control(self, device, action, room=None, source=SOURCE_MANUAL, deadline=None):
+        """
+        提交设备控制指令（语音、手动和自动化都经由指令执行器）
+        发布在后台线程中执行，不阻塞界面；结果在界面线程中记录
+        """
+        topic, _ = self.intent_recognizer.get_device_command(device, action, room)
+        priority = PRIORITY_BACKGROUND if source == SOURCE_AUTOMATION else PRIORITY_INTERACTIVE
+        self.log_message("设备控制", f"准备执行: 设备={device}, 操作={action}")
+        self.command_executor.submit(
+            topic or device, control_device, self.mqtt_client, device, action, room, priority,
+            deadline=deadline, source=source,
+            callback=lambda future: self.on_device_control_done(future, device, action))
+    
+    def on_device_control_done(self, future, device, action):
+        """设备控制完成回调（界面线程）"""
         try:
-            self.log_message("设备控制", f"准备执行: 设备={device}, 操作={action}")
-            success = control_device(self.mqtt_client, device, action)
-            if success:
-                self.log_message("设备控制", f"✅ 成功执行: {device} {action}")
+            success = future.result()
+            if isinstance(success, ConfirmationResult) and success and not success.confirmed:
+                self.log_message("设备控制", f"⚠️ 已发送但设备未确认: {device} {action} (发送 {success.attempts} 次)")
+                self.update_speech_status(f"⚠️ {device} {action} 未确认")
+            elif success:
+                detail = f" (设备确认 {success.latency * 1000:.0f}ms)" if isinstance(success, ConfirmationResult) else ""
+                self.log_message("设备控制", f"✅ 成功执行: {device} {action}{detail}")
                 self.update_speech_status(f"✅ {device} {action} 成功")
             else:
                 self.log_message("设备控制", f"❌ 执行失败: {device} {action}")
                 self.update_speech_status(f"❌ {device} {action} 失败")
+        except (CommandRejected, CommandExpired) as e:
+            self.log_message("设备控制", f"⚠️ 指令未执行: {e}")
+            self.update_speech_status(f"⚠️ {device} {action} 未执行")
         except Exception as e:
             self.log_message("控制错误", f"设备控制异常: {str(e)}")
             self.update_speech_status(f"❌ 控制异常: {str(e)}")
     
-    def on_mqtt_message(self, client, userdata, message):
-        """MQTT消息回调"""
-        try:
-            topic = message.topic
-            payload = message.payload.decode('utf-8')
-            self.log_message("MQTT接收", f"主题: {topic}, 消息: {payload}")
-        except Exception as e:
-            self.log_message("MQTT错误", f"消息处理异常: {str(e)}")
+    def on_mqtt_message(self, record):
+        """MQTT消息回调（在消息分发线程中调用，经界面更新队列显示）"""
+        self.log_message("MQTT接收", f"主题: {record.topic}, 消息: {record.payload}", topic=record.topic)
     
-    def log_message(self, sender, message):
-        """记录消息到日志"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {sender}: {message}\n"
-        
-        # 在主线程中更新界面
+    def log_message(self, sender, message, topic=None):
+        """记录消息到日志（可在任意线程调用，由界面线程批量写入）"""
+        self.ui_queue.log(self.log_store.append(sender, message, topic=topic))
+    
+    def append_log_lines(self, entries):
+        """新日志到达时刷新日志控件（界面线程）；条目已在存储中，按当前窗口和过滤条件取出"""
         if hasattr(self, 'message_text'):
-            self.message_text.insert(tk.END, log_entry)
-            self.message_text.see(tk.END)
+            self.apply_log_change(self.log_viewport.on_new_entries())
+    
+    def apply_log_change(self, change):
+        """把日志窗口的变化应用到日志控件，一次插入一批日志"""
+        if change is None:
+            return
+        text = self.message_text
+        kind, entries = change[0], change[1]
+        chunks = []
+        for entry in entries:
+            chunks.append(entry.format())
+            chunks.append("error" if entry.level >= LEVEL_ERROR else "warning" if entry.level >= LEVEL_WARNING else ())
+        if kind == 'reset':
+            text.delete("1.0", tk.END)
+            if chunks:
+                text.insert("1.0", *chunks)
+            text.see(tk.END)
+        elif kind == 'append':
+            text.insert(tk.END, *chunks)
+            if change[2]:
+                text.delete("1.0", f"{change[2] + 1}.0")
+            if self.auto_scroll_var.get():
+                text.see(tk.END)
+        else:
+            text.insert("1.0", *chunks)
+            if change[2]:
+                text.delete(f"{self.log_viewport.lines + 1}.0", "end-1c")
+            # 保持原来显示的第一行位置不动
+            text.yview(f"{len(entries) + 1}.0")
+    
+    def on_log_scroll(self, first, last):
+        """日志控件滚动回调：到顶部时取出更早的日志，离开最新位置后到底部时取出较新的日志"""
+        self.message_text.vbar.set(first, last)
+        if self.log_paging:
+            return
+        if float(first) <= 0.0 and not self.log_viewport.at_oldest:
+            self.log_paging = True
+            self.root.after_idle(self.page_log, self.log_viewport.page_older)
+        elif float(last) >= 1.0 and not self.log_viewport.follow:
+            self.log_paging = True
+            self.root.after_idle(self.page_log, self.log_viewport.page_newer)
+    
+    def page_log(self, page):
+        try:
+            self.apply_log_change(page())
+        finally:
+            self.log_paging = False
+    
+    def apply_log_filter(self):
+        """按来源、级别和主题过滤日志，只重新显示最新一屏匹配的日志"""
+        sender = self.log_sender_var.get()
+        level = {"⚠️ 警告及以上": LEVEL_WARNING, "❌ 错误": LEVEL_ERROR}.get(self.log_level_var.get())
+        self.apply_log_change(self.log_viewport.set_filter(
+            None if sender == "全部" else sender, self.log_topic_var.get().strip(), level))
     
     def clear_message_log(self):
         """清除消息日志"""
         if hasattr(self, 'message_text'):
-            self.message_text.delete(1.0, tk.END)
+            self.log_store.clear()
+            self.apply_log_change(self.log_viewport.reset())
             self.log_message("系统", "日志已清除")
     
     def toggle_wake_word(self):
@@ -566,6 +746,9 @@ def main():
         print(f"程序异常: {e}")
     finally:
         # 清理资源
+        app.config_store.stop_watching()
+        app.ui_queue.stop()
+        app.command_executor.shutdown(wait=False)
         if hasattr(app, 'mqtt_client') and app.mqtt_client:
             app.mqtt_client.disconnect()
         root.quit()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+MQTT消息日志模块
+内存中只保留固定条数的紧凑记录（环形缓冲区），被覆盖的旧记录批量写入磁盘分段文件并轮转
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import threading
+from datetime import datetime
+
+DIRECTION_SENT = sys.intern('sent')
+DIRECTION_RECEIVED = sys.intern('received')
+
+
+class MessageRecord:
+    """一条消息记录（时间戳为epoch秒，主题与方向为驻留字符串）"""
+    __slots__ = ('timestamp', 'topic', 'payload', 'direction')
+
+    def __init__(self, timestamp, topic, payload, direction):
+        self.timestamp = timestamp
+        self.topic = topic
+        self.payload = payload
+        self.direction = direction
+
+    def to_dict(self):
+        """转换为旧版消息日志使用的字典格式"""
+        return {
+            'timestamp': datetime.fromtimestamp(self.timestamp).strftime('%H:%M:%S'),
+            'topic': self.topic,
+            'payload': self.payload,
+            'type': self.direction,
+        }
+
+    def matches(self, topic=None, direction=None, since=None, until=None):
+        return ((topic is None or self.topic == topic) and
+                (direction is None or self.direction == direction) and
+                (since is None or self.timestamp >= since) and
+                (until is None or self.timestamp < until))
+
+
+class MessageLog:
+    """固定容量的消息日志，溢出记录归档到轮转的JSON Lines分段文件"""
+
+    def __init__(self, capacity=10000, archive_dir=None, segment_size=50000, max_segments=10,
+                 flush_batch=500):
+        self.capacity = capacity
+        self.archive_dir = archive_dir
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.flush_batch = flush_batch
+        self.lock = threading.Lock()
+
+        self.records = [None] * capacity
+        self.head = 0  # 下一条写入的位置
+        self.count = 0
+        self.total = 0
+
+        self.spill = []  # 等待写入磁盘的溢出记录
+        self.segment_path = None
+        self.segment_records = 0
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+
+    def __len__(self):
+        return self.count
+
+    def append(self, topic, payload, direction, timestamp=None):
+        """追加一条记录，返回该记录"""
+        record = MessageRecord(time.time() if timestamp is None else timestamp,
+                               sys.intern(topic), payload, sys.intern(direction))
+        with self.lock:
+            evicted = self.records[self.head]
+            self.records[self.head] = record
+            self.head = (self.head + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+            elif self.archive_dir:
+                self.spill.append(evicted)
+            self.total += 1
+            if len(self.spill) >= self.flush_batch:
+                self._flush_spill()
+        return record
+
+    def _iter_newest(self):
+        """从新到旧遍历内存中的记录（调用方持有锁）"""
+        index = self.head
+        for _ in range(self.count):
+            index = (index - 1) % self.capacity
+            yield self.records[index]
+
+    def latest(self, limit=100):
+        """最近的若干条记录（从旧到新）"""
+        return self.query(limit=limit)
+
+    def query(self, topic=None, direction=None, since=None, until=None, limit=None, include_archived=False):
+        """
+        按主题、方向和时间范围查询（时间为epoch秒，until不含）
+        从最新的记录向前扫描，凑够limit条或早于since即停止，不复制整个历史
+        include_archived为True时继续查询磁盘上的归档
+        返回从旧到新的记录列表
+        """
+        results = []
+        with self.lock:
+            for record in self._iter_newest():
+                if since is not None and record.timestamp < since:
+                    break
+                if record.matches(topic, direction, since, until):
+                    results.append(record)
+                    if limit is not None and len(results) >= limit:
+                        break
+            else:
+                # 内存中的记录不够时才查询归档
+                if include_archived and self.archive_dir:
+                    self._flush_spill()
+                    remaining = None if limit is None else limit - len(results)
+                    if remaining is None or remaining > 0:
+                        results.extend(self._query_archive(topic, direction, since, until, remaining))
+        results.reverse()
+        return results
+
+    def clear(self):
+        """清空内存中的记录：启用归档时先把等待归档的记录和内存中的记录写入磁盘，归档保持完整"""
+        with self.lock:
+            if self.archive_dir:
+                self.spill.extend(reversed(list(self._iter_newest())))
+                self._flush_spill()
+            self.records = [None] * self.capacity
+            self.head = 0
+            self.count = 0
+
+    def flush(self):
+        """把等待归档的记录写入磁盘"""
+        with self.lock:
+            self._flush_spill()
+
+    # ---------------------------------------------------------------- 磁盘归档
+
+    def _segment_files(self):
+        """按时间顺序排列的分段文件"""
+        return sorted(glob.glob(os.path.join(self.archive_dir, 'messages-*.jsonl')))
+
+    def _flush_spill(self):
+        """批量写入溢出记录，写满一个分段后轮转（调用方持有锁）"""
+        spill, self.spill = self.spill, []
+        while spill:
+            if self.segment_path is None or self.segment_records >= self.segment_size:
+                self._rotate()
+            batch = spill[:self.segment_size - self.segment_records]
+            spill = spill[len(batch):]
+            with open(self.segment_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps([r.timestamp, r.topic, r.payload, r.direction], ensure_ascii=False) + '\n'
+                                for r in batch))
+            self.segment_records += len(batch)
+
+    def _rotate(self):
+        """新建分段文件并删除超出数量的旧分段"""
+        name = f"messages-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.jsonl"
+        self.segment_path = os.path.join(self.archive_dir, name)
+        self.segment_records = 0
+        segments = self._segment_files()
+        for path in segments[:max(0, len(segments) - self.max_segments + 1)]:
+            os.remove(path)
+
+    def _query_archive(self, topic, direction, since, until, limit):
+        """从新到旧扫描归档分段"""
+        results = []
+        for path in reversed(self._segment_files()):
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            for line in reversed(lines):
+                record = MessageRecord(*json.loads(line))
+                if since is not None and record.timestamp < since:
+                    return results
+                if record.matches(topic, direction, since, until):
+                    results.append(record)
+                    if limit is not None and len(results) >= limit:
+                        return results
+        return results
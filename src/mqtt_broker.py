@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+"""
+本地MQTT服务器模块
+基于asyncio的轻量MQTT 3.1.1服务器：支持QoS 0/1（收到的QoS2按QoS1转发）、保留消息、
+通配符订阅和遗嘱消息，可在程序内的后台线程运行（BrokerThread），也可作为独立进程运行（local_broker.py）；
+用于没有外网时的本地控制和测试。只支持 clean session，连接断开后不保留订阅和未确认的消息
+"""
+
+import asyncio
+import threading
+import itertools
+from datetime import datetime
+
+from topic_router import TopicRouter, validate_filter, has_wildcard, topic_matches
+
+# 报文类型
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+# CONNACK返回码
+CONNACK_ACCEPTED = 0
+CONNACK_BAD_PROTOCOL = 1
+CONNACK_IDENTIFIER_REJECTED = 2
+CONNACK_NOT_AUTHORIZED = 5
+
+MAX_PACKET_SIZE = 256 * 1024 * 1024
+PINGRESP_PACKET = bytes([PINGRESP << 4, 0])
+
+
+class ProtocolError(Exception):
+    """客户端发送了不合法的报文，服务器将断开连接"""
+
+
+def encode_length(length):
+    out = bytearray()
+    while True:
+        digit, length = length % 128, length // 128
+        out.append(digit | 0x80 if length else digit)
+        if not length:
+            return bytes(out)
+
+
+def publish_packet(topic, payload, qos=0, retain=False, mid=None):
+    """编码PUBLISH报文，topic 为已编码的字节串"""
+    body = len(topic).to_bytes(2, 'big') + topic
+    if qos:
+        body += mid.to_bytes(2, 'big')
+    body += payload
+    return bytes([PUBLISH << 4 | qos << 1 | int(retain)]) + encode_length(len(body)) + body
+
+
+def ack_packet(packet_type, mid, flags=0):
+    return bytes([packet_type << 4 | flags, 2]) + mid.to_bytes(2, 'big')
+
+
+class _Reader:
+    """从字节串中按MQTT格式读取字段"""
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def uint16(self):
+        if self.pos + 2 > len(self.data):
+            raise ProtocolError("报文长度不足")
+        value = int.from_bytes(self.data[self.pos:self.pos + 2], 'big')
+        self.pos += 2
+        return value
+
+    def byte(self):
+        if self.pos >= len(self.data):
+            raise ProtocolError("报文长度不足")
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def binary(self):
+        length = self.uint16()
+        if self.pos + length > len(self.data):
+            raise ProtocolError("报文长度不足")
+        value = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return value
+
+    def string(self):
+        try:
+            return self.binary().decode('utf-8')
+        except UnicodeDecodeError:
+            raise ProtocolError("字符串不是合法的UTF-8")
+
+    def rest(self):
+        value = self.data[self.pos:]
+        self.pos = len(self.data)
+        return value
+
+    def remaining(self):
+        return len(self.data) - self.pos
+
+
+class _Session:
+    """一个客户端连接"""
+
+    def __init__(self, writer, peer):
+        self.writer = writer
+        self.peer = peer
+        self.client_id = None
+        self.keepalive = 0
+        self.subscriptions = {}  # 过滤器 -> QoS
+        self.mids = itertools.cycle(range(1, 65536))
+        self.inflight = set()  # 等待PUBACK的报文标识符
+        self.incoming_qos2 = set()  # 已回复PUBREC、等待PUBREL的报文标识符
+        self.will = None  # (主题, 内容, QoS, 保留)
+        self.clean_disconnect = False
+        self.closed = False
+
+    def send(self, data):
+        if not self.closed:
+            self.writer.write(data)
+
+    def buffered(self):
+        transport = self.writer.transport
+        return transport.get_write_buffer_size() if transport is not None else 0
+
+
+class MQTTBroker:
+    """asyncio MQTT 3.1.1 服务器"""
+
+    def __init__(self, host='127.0.0.1', port=1883, authenticate=None, max_buffer=4 * 1024 * 1024):
+        """
+        authenticate(client_id, username, password): 返回是否允许连接，为None时接受所有客户端
+        max_buffer: 单个订阅者发送缓冲超过该字节数时丢弃发给它的QoS0消息（慢消费者保护）
+        """
+        self.host = host
+        self.port = port
+        self.authenticate = authenticate
+        self.max_buffer = max_buffer
+        self.server = None
+        self.sessions = {}  # 客户端ID -> _Session
+        self.connections = {}  # 所有连接（包括尚未发送CONNECT的）-> 处理任务
+        self.router = TopicRouter()
+        self.retained = {}  # 主题 -> (内容, QoS)
+        self.generated_ids = itertools.count(1)
+        self.total_connections = 0
+        self.messages_received = 0
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.bytes_received = 0
+
+    async def start(self):
+        """开始监听，返回实际端口（port 为0时由系统分配）"""
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        """停止监听并断开所有客户端"""
+        if self.server is not None:
+            self.server.close()
+        # 关闭连接后各处理任务读到EOF自行结束
+        for session in list(self.connections):
+            session.writer.close()
+        if self.connections:
+            await asyncio.wait(list(self.connections.values()), timeout=5)
+        if self.server is not None:
+            await self.server.wait_closed()
+
+    def get_stats(self):
+        return {
+            'clients': len(self.sessions),
+            'total_connections': self.total_connections,
+            'subscriptions': sum(len(session.subscriptions) for session in self.sessions.values()),
+            'retained': len(self.retained),
+            'messages_received': self.messages_received,
+            'messages_sent': self.messages_sent,
+            'messages_dropped': self.messages_dropped,
+            'bytes_received': self.bytes_received,
+        }
+
+    # ------------------------------------------------------------------ 连接处理
+
+    async def _handle_connection(self, reader, writer):
+        session = _Session(writer, writer.get_extra_info('peername'))
+        buffer = bytearray()
+        self.connections[session] = asyncio.current_task()
+        try:
+            # 第一个报文必须是CONNECT，限时等待
+            timeout = 10.0
+            while not session.closed:
+                try:
+                    data = await asyncio.wait_for(reader.read(65536), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not data:
+                    break
+                self.bytes_received += len(data)
+                buffer += data
+                self._process_buffer(session, buffer)
+                if session.client_id is not None:
+                    timeout = session.keepalive * 1.5 if session.keepalive else None
+                await writer.drain()
+        except (ProtocolError, ConnectionError) as e:
+            if isinstance(e, ProtocolError):
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] 本地MQTT服务器: 断开 {session.peer} ({e})")
+        finally:
+            self._close_session(session)
+            self.connections.pop(session, None)
+
+    def _process_buffer(self, session, buffer):
+        """解析缓冲区中所有完整的报文"""
+        while buffer and not session.closed:
+            length = 0
+            multiplier = 1
+            pos = 1
+            while True:
+                if pos >= len(buffer):
+                    return
+                byte = buffer[pos]
+                length += (byte & 0x7f) * multiplier
+                pos += 1
+                if not byte & 0x80:
+                    break
+                multiplier *= 128
+                if pos > 4:
+                    raise ProtocolError("剩余长度字段超过4字节")
+            if length > MAX_PACKET_SIZE:
+                raise ProtocolError("报文过大")
+            if len(buffer) < pos + length:
+                return
+            header = buffer[0]
+            body = bytes(buffer[pos:pos + length])
+            del buffer[:pos + length]
+            self._handle_packet(session, header, body)
+
+    def _handle_packet(self, session, header, body):
+        packet_type = header >> 4
+        if session.client_id is None and packet_type != CONNECT:
+            raise ProtocolError("第一个报文不是CONNECT")
+        if packet_type == PUBLISH:
+            self._on_publish(session, header, _Reader(body))
+        elif packet_type == PUBACK:
+            session.inflight.discard(_Reader(body).uint16())
+        elif packet_type == PUBREL:
+            mid = _Reader(body).uint16()
+            session.incoming_qos2.discard(mid)
+            session.send(ack_packet(PUBCOMP, mid))
+        elif packet_type == SUBSCRIBE:
+            self._on_subscribe(session, _Reader(body))
+        elif packet_type == UNSUBSCRIBE:
+            self._on_unsubscribe(session, _Reader(body))
+        elif packet_type == PINGREQ:
+            session.send(PINGRESP_PACKET)
+        elif packet_type == CONNECT:
+            if session.client_id is not None:
+                raise ProtocolError("重复的CONNECT")
+            self._on_connect(session, _Reader(body))
+        elif packet_type == DISCONNECT:
+            session.clean_disconnect = True
+            session.closed = True
+        elif packet_type in (PUBREC, PUBCOMP):
+            pass  # 服务器只以QoS0/1发出消息
+        else:
+            raise ProtocolError(f"不支持的报文类型 {packet_type}")
+
+    def _on_connect(self, session, reader):
+        protocol = reader.string()
+        level = reader.byte()
+        flags = reader.byte()
+        session.keepalive = reader.uint16()
+        if (protocol, level) not in (('MQTT', 4), ('MQIsdp', 3)):
+            session.send(bytes([CONNACK << 4, 2, 0, CONNACK_BAD_PROTOCOL]))
+            session.closed = True
+            return
+        client_id = reader.string()
+        if flags & 0x04:
+            will_topic = reader.string()
+            will_payload = reader.binary()
+            session.will = (will_topic, will_payload, min((flags >> 3) & 0x03, 1), bool(flags & 0x20))
+        username = reader.string() if flags & 0x80 else None
+        password = reader.binary() if flags & 0x40 else None
+        if not client_id:
+            if not flags & 0x02:
+                session.send(bytes([CONNACK << 4, 2, 0, CONNACK_IDENTIFIER_REJECTED]))
+                session.closed = True
+                return
+            client_id = f'auto-{next(self.generated_ids)}'
+        if self.authenticate is not None and not self.authenticate(client_id, username, password):
+            session.send(bytes([CONNACK << 4, 2, 0, CONNACK_NOT_AUTHORIZED]))
+            session.closed = True
+            return
+        # 同一客户端ID重复连接时断开旧连接
+        previous = self.sessions.get(client_id)
+        if previous is not None:
+            self._close_session(previous)
+        session.client_id = client_id
+        self.sessions[client_id] = session
+        self.total_connections += 1
+        session.send(bytes([CONNACK << 4, 2, 0, CONNACK_ACCEPTED]))
+
+    def _on_publish(self, session, header, reader):
+        qos = (header >> 1) & 0x03
+        if qos == 3:
+            raise ProtocolError("QoS不合法")
+        topic = reader.string()
+        if not topic or has_wildcard(topic):
+            raise ProtocolError(f"发布主题不合法: {topic!r}")
+        mid = reader.uint16() if qos else None
+        payload = reader.rest()
+        if qos == 2:
+            session.send(ack_packet(PUBREC, mid))
+            if mid in session.incoming_qos2:
+                return  # 重发的QoS2消息已经转发过
+            session.incoming_qos2.add(mid)
+        elif qos == 1:
+            session.send(ack_packet(PUBACK, mid))
+        self.messages_received += 1
+        self.publish(topic, payload, min(qos, 1), bool(header & 0x01))
+
+    def _on_subscribe(self, session, reader):
+        mid = reader.uint16()
+        granted = []
+        new_filters = []
+        while reader.remaining():
+            topic_filter = reader.string()
+            requested = reader.byte() & 0x03
+            try:
+                validate_filter(topic_filter)
+            except ValueError:
+                granted.append(0x80)
+                continue
+            qos = min(requested, 1)
+            old = session.subscriptions.get(topic_filter)
+            if old is not None:
+                self.router.remove(topic_filter, (session, old))
+            session.subscriptions[topic_filter] = qos
+            self.router.add(topic_filter, (session, qos))
+            granted.append(qos)
+            new_filters.append((topic_filter, qos))
+        if not granted:
+            raise ProtocolError("SUBSCRIBE没有主题")
+        session.send(bytes([SUBACK << 4]) + encode_length(2 + len(granted)) + mid.to_bytes(2, 'big') + bytes(granted))
+        # 发送匹配的保留消息
+        for topic_filter, qos in new_filters:
+            for topic, (payload, retained_qos) in list(self.retained.items()):
+                if topic_matches(topic_filter, topic):
+                    self._deliver(session, topic.encode('utf-8'), payload, min(qos, retained_qos), True)
+
+    def _on_unsubscribe(self, session, reader):
+        mid = reader.uint16()
+        while reader.remaining():
+            topic_filter = reader.string()
+            qos = session.subscriptions.pop(topic_filter, None)
+            if qos is not None:
+                self.router.remove(topic_filter, (session, qos))
+        session.send(ack_packet(UNSUBACK, mid))
+
+    def _close_session(self, session):
+        if session.client_id is not None and self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+            for topic_filter, qos in session.subscriptions.items():
+                self.router.remove(topic_filter, (session, qos))
+            if session.will is not None and not session.clean_disconnect:
+                self.publish(*session.will)
+        session.subscriptions = {}
+        session.closed = True
+        session.writer.close()
+
+    # ------------------------------------------------------------------ 消息转发
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """向订阅者转发消息（也可供同进程代码直接发布），返回投递的订阅者数"""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        matched = self.router.match(topic)
+        if not matched:
+            return 0
+        # 同一客户端的多个订阅匹配时只投递一次，取最高QoS
+        targets = {}
+        for session, sub_qos in matched:
+            targets[session] = max(targets.get(session, 0), min(qos, sub_qos))
+        topic_bytes = topic.encode('utf-8')
+        qos0_packet = None
+        for session, delivery_qos in targets.items():
+            if delivery_qos == 0:
+                if qos0_packet is None:
+                    qos0_packet = publish_packet(topic_bytes, payload)
+                if session.buffered() > self.max_buffer:
+                    self.messages_dropped += 1
+                    continue
+                session.send(qos0_packet)
+                self.messages_sent += 1
+            else:
+                self._deliver(session, topic_bytes, payload, delivery_qos, False)
+        return len(targets)
+
+    def _deliver(self, session, topic_bytes, payload, qos, retain):
+        if qos:
+            mid = next(session.mids)
+            session.inflight.add(mid)
+            session.send(publish_packet(topic_bytes, payload, qos, retain, mid))
+        else:
+            session.send(publish_packet(topic_bytes, payload, 0, retain))
+        self.messages_sent += 1
+
+
+class BrokerThread:
+    """在后台线程的事件循环中运行本地服务器，供同一进程中的程序和测试使用"""
+
+    def __init__(self, host='127.0.0.1', port=0, **options):
+        self.broker = MQTTBroker(host, port, **options)
+        self.loop = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+
+    @property
+    def address(self):
+        return self.broker.host, self.broker.port
+
+    def start(self, timeout=5.0):
+        """启动服务器线程，返回 (host, port)"""
+        if self.thread is not None:
+            return self.address
+        self.thread = threading.Thread(target=self._run, name='mqtt-broker', daemon=True)
+        self.thread.start()
+        if not self.ready.wait(timeout):
+            raise TimeoutError("本地MQTT服务器启动超时")
+        if self.error is not None:
+            raise self.error
+        return self.address
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.broker.start())
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            self.loop.close()
+            return
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.broker.stop())
+            self.loop.close()
+
+    def call(self, function, *args):
+        """在服务器线程中执行函数并返回结果（如 publish、get_stats）"""
+        async def run():
+            return function(*args)
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result(5)
+
+    def get_stats(self):
+        return self.call(self.broker.get_stats)
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.thread = None
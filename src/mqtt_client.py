@@ -4,17 +4,72 @@ MQTT通信模块
 用于与巴法云进行MQTT通信
 """
 
+import os
+import time
+import socket
+import random
+import threading
+from collections import deque
+from concurrent.futures import Future
 import paho.mqtt.client as mqtt
 from datetime import datetime
-from config import MQTT_CONFIG, MQTT_TOPICS
+from config import (MQTT_CONFIG, MQTT_TLS_CONFIG, MQTT_V5_CONFIG, MQTT_TOPICS, MQTT_PUBLISH_CONFIG, MQTT_RECONNECT_CONFIG, MESSAGE_LOG_CONFIG,
+                    DEVICE_SHADOW_CONFIG, COMMAND_COALESCE_CONFIG, RATE_LIMIT_CONFIG,
+                    INBOUND_DISPATCH_CONFIG, COMMAND_CONFIRM_CONFIG, LINK_MONITOR_CONFIG,
+                    DEVICE_COMMANDS)
+from outbound_queue import OutboundQueue
+from message_log import MessageLog, DIRECTION_SENT, DIRECTION_RECEIVED
+from device_shadow import DeviceShadow
+from command_dispatcher import CoalescingDispatcher
+from rate_limiter import PriorityRateLimiter, PRIORITY_INTERACTIVE
+from topic_router import TopicRouter, validate_filter
+from inbound_dispatcher import InboundDispatcher, OVERFLOW_POLICIES
+from command_confirmation import ConfirmationTracker, wait_for_confirmation
+from link_monitor import LinkMonitor
+from tls_session import create_tls_context
+from mqtt_v5 import TopicAliasTable, publish_properties
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EARLY_ACK_TTL = 5.0  # 未登记的发布确认保留时间（秒）
+
+
+class ReconnectBackoff:
+    """带随机抖动的指数退避"""
+
+    def __init__(self, min_delay=1.0, max_delay=60.0, jitter=0.5):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.attempts = 0
+
+    def next_delay(self):
+        """下一次重连前的等待时间：基础值按2倍增长，再随机减少至多 jitter 比例"""
+        base = min(self.max_delay, self.min_delay * (2 ** self.attempts))
+        self.attempts += 1
+        return base * (1 - self.jitter * random.random())
+
+    def reset(self):
+        self.attempts = 0
+
 
 class MQTTClient:
-    def __init__(self, on_message_callback=None):
+    def __init__(self, on_message_callback=None, queue_path=None, archive_dir=None):
+        """
+        queue_path: 离线指令队列的数据库路径，None表示使用配置，':memory:'表示不落盘
+        archive_dir: 消息日志的归档目录，None表示使用配置，空字符串表示不归档
+        """
         # 验证配置
         if not self._validate_config():
             raise ValueError("MQTT配置无效，请检查config.py中的配置信息")
         
-        self.client = mqtt.Client(MQTT_CONFIG['client_id'])
+        # MQTT v5：主题别名、消息有效期与关联数据
+        self.topic_aliases = None
+        if MQTT_V5_CONFIG.get('enabled', False):
+            self.client = mqtt.Client(MQTT_CONFIG['client_id'], protocol=mqtt.MQTTv5)
+            self.topic_aliases = TopicAliasTable(MQTT_V5_CONFIG.get('topic_alias_maximum', 16))
+            print("✅ 使用MQTT v5协议")
+        else:
+            self.client = mqtt.Client(MQTT_CONFIG['client_id'])
         
         # 根据配置决定是否设置用户名密码
         if self._should_use_credentials():
@@ -27,10 +82,118 @@ class MQTTClient:
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
+        self.client.on_publish = self.on_publish
+        self.client.on_subscribe = self.on_subscribe
+        
+        # TLS：重连时复用会话，握手耗时记录在上下文中
+        self.tls_context = None
+        if MQTT_TLS_CONFIG.get('enabled', False):
+            self.tls_context = create_tls_context(MQTT_TLS_CONFIG)
+            self.client.tls_set_context(self.tls_context)
+            if MQTT_TLS_CONFIG.get('insecure', False):
+                self.client.tls_insecure_set(True)
+            print(f"🔒 使用TLS连接 (端口: {MQTT_TLS_CONFIG.get('port', 9503)})")
+        self.client.max_inflight_messages_set(MQTT_PUBLISH_CONFIG.get('max_inflight', 20))
+        # 套接字只由网络线程写（SSL连接不能由两个线程同时写）：其它线程发布时只唤醒网络线程，由它统一写出
+        self.client.on_socket_register_write = lambda client, userdata, sock: None
+        self.client.on_socket_unregister_write = lambda client, userdata, sock: None
         
         self.on_message_callback = on_message_callback
         self.is_connected = False
-        self.message_log = []
+        
+        # 消息路由：订阅过滤器（支持 '+'/'#' 通配符）-> 处理函数，处理函数接收 MessageRecord
+        self.router = TopicRouter()
+        if on_message_callback:
+            self.router.add('#', on_message_callback)
+        self.subscriptions = {}  # MQTT_TOPICS 之外的订阅：过滤器 -> QoS
+        self.pending_subscribes = {}  # mid -> [(过滤器, QoS), ...]
+        self.batch_handlers = []  # 按批接收消息的处理函数：handler([MessageRecord, ...])
+        
+        # 接收消息在后台线程中批量处理，网络线程只负责入队
+        self.inbound = InboundDispatcher(self._handle_inbound_batch,
+                                         INBOUND_DISPATCH_CONFIG.get('queue_size', 5000),
+                                         INBOUND_DISPATCH_CONFIG.get('batch_size', 100),
+                                         INBOUND_DISPATCH_CONFIG.get('batch_interval', 0.02),
+                                         INBOUND_DISPATCH_CONFIG.get('overflow', 'drop_oldest'),
+                                         INBOUND_DISPATCH_CONFIG.get('block_timeout', 0.5))
+        self.log_each_message = INBOUND_DISPATCH_CONFIG.get('log_each_message', True)
+        self.loop_times = deque(maxlen=1000)  # 网络线程中每条消息的处理耗时（秒）
+        
+        # 链路探测：回显主题上的探测消息在网络线程中直接处理，不进入消息日志
+        self.link_topic = LINK_MONITOR_CONFIG.get('topic', 'linkping')
+        self.link_monitor = None
+        if LINK_MONITOR_CONFIG.get('enabled', False):
+            self.link_monitor = LinkMonitor(self._send_probe, LINK_MONITOR_CONFIG.get('interval', 2.0),
+                                            LINK_MONITOR_CONFIG.get('dead_after', 6.0))
+        
+        # 指令执行确认：订阅设备状态主题，等待上报与指令一致
+        self.confirmation = ConfirmationTracker(COMMAND_CONFIRM_CONFIG.get('state_topic', '{topic}/state'))
+        if COMMAND_CONFIRM_CONFIG.get('enabled', False):
+            self.subscribe(self.confirmation.subscription_filter(), self._on_state_report)
+        self.message_log = self._create_message_log(archive_dir)
+        self.device_shadow = DeviceShadow(DEVICE_SHADOW_CONFIG.get('max_age', 300))
+        self.suppressed_count = 0
+        
+        # 发布限速：连接和主题两级令牌桶，交互指令优先
+        self.rate_limiter = None
+        if RATE_LIMIT_CONFIG.get('enabled', True):
+            self.rate_limiter = PriorityRateLimiter(self._publish_now,
+                                                    RATE_LIMIT_CONFIG.get('connection_rate', 10.0),
+                                                    RATE_LIMIT_CONFIG.get('connection_burst', 20),
+                                                    RATE_LIMIT_CONFIG.get('topic_rate', 2.0),
+                                                    RATE_LIMIT_CONFIG.get('topic_burst', 5))
+        
+        # 指令合并：同一主题在窗口内只发送最后一条，再交给限速器
+        self.dispatcher = None
+        if COMMAND_COALESCE_CONFIG.get('enabled', True):
+            self.dispatcher = CoalescingDispatcher(self._rate_limited_publish,
+                                                   COMMAND_COALESCE_CONFIG.get('default_window', 0.2),
+                                                   COMMAND_COALESCE_CONFIG.get('topic_windows', {}))
+        
+        # 发布确认跟踪：mid -> (Future, 发布时间, 主题, QoS)
+        self.publish_lock = threading.RLock()
+        self.pending_publishes = {}
+        self.early_acks = {}  # 在publish()返回mid之前就触发的确认：mid -> 确认时间
+        self.probe_mids = set()  # 链路探测消息的mid，其发布完成回调不计入确认
+        self.ack_latencies = deque(maxlen=MQTT_PUBLISH_CONFIG.get('latency_samples', 1000))
+        
+        # 自动重连与离线指令队列
+        self.auto_reconnect = MQTT_RECONNECT_CONFIG.get('enabled', True)
+        self.backoff = ReconnectBackoff(MQTT_RECONNECT_CONFIG.get('min_delay', 1.0),
+                                        MQTT_RECONNECT_CONFIG.get('max_delay', 60.0),
+                                        MQTT_RECONNECT_CONFIG.get('jitter', 0.5))
+        self.outbound_queue = self._create_outbound_queue(queue_path) if self.auto_reconnect else None
+        self.network_thread = None
+        self.stop_event = threading.Event()
+        self.drain_lock = threading.Lock()
+        self.is_reconnecting = False
+        self.disconnected_at = None
+        self.reconnect_count = 0
+        self.reconnect_times = deque(maxlen=100)
+        
+    def _create_message_log(self, archive_dir=None):
+        """创建固定容量的消息日志"""
+        if archive_dir is None:
+            archive_dir = MESSAGE_LOG_CONFIG.get('archive_dir')
+        if archive_dir and not os.path.isabs(archive_dir):
+            archive_dir = os.path.join(PROJECT_ROOT, archive_dir)
+        return MessageLog(MESSAGE_LOG_CONFIG.get('capacity', 10000), archive_dir,
+                          MESSAGE_LOG_CONFIG.get('segment_size', 50000),
+                          MESSAGE_LOG_CONFIG.get('max_segments', 10))
+        
+    def _create_outbound_queue(self, queue_path=None):
+        """创建离线指令队列（失败时退化为内存队列）"""
+        if queue_path is None:
+            queue_path = MQTT_RECONNECT_CONFIG.get('queue_path', 'data/outbound.db')
+        if queue_path != ':memory:' and not os.path.isabs(queue_path):
+            queue_path = os.path.join(PROJECT_ROOT, queue_path)
+        max_size = MQTT_RECONNECT_CONFIG.get('queue_max_size', 1000)
+        ttl = MQTT_RECONNECT_CONFIG.get('command_ttl', 300)
+        try:
+            return OutboundQueue(queue_path, max_size, ttl)
+        except Exception as e:
+            print(f"⚠️ 离线指令队列打开失败，使用内存队列: {e}")
+            return OutboundQueue(':memory:', max_size, ttl)
         
     def _validate_config(self):
         """验证MQTT配置是否有效"""
@@ -74,53 +237,177 @@ class MQTTClient:
         # 否则使用私钥模式（不设置用户名密码）
         return False
         
-    def on_connect(self, client, userdata, flags, rc):
-        """连接回调"""
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        """连接回调（MQTT v5 时 properties 为CONNACK属性）"""
         if rc == 0:
             print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT连接成功")
             self.is_connected = True
-            # 订阅所有设备主题
-            for topic in MQTT_TOPICS.values():
-                client.subscribe(topic)
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] 订阅主题: {topic}")
+            self.is_reconnecting = False
+            self.backoff.reset()
+            if self.tls_context is not None:
+                # TLS 1.3 的会话票据在CONNACK之前到达，此时保存才能用于下次重连
+                self.tls_context.remember(client.socket())
+            if self.link_monitor is not None:
+                self.link_monitor.reset()
+                with self.publish_lock:
+                    self.probe_mids.clear()  # 断线时未发出的探测消息已被丢弃
+            if self.topic_aliases is not None:
+                # 别名只在当前连接有效，数量不能超过服务器通告的上限
+                self.topic_aliases.reset(getattr(properties, 'TopicAliasMaximum', 0))
+            if self.disconnected_at is not None:
+                elapsed = time.monotonic() - self.disconnected_at
+                self.disconnected_at = None
+                self.reconnect_count += 1
+                self.reconnect_times.append(elapsed)
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] 断线 {elapsed:.1f} 秒后重连成功")
+            # 用一个SUBSCRIBE报文订阅所有主题
+            self._subscribe_batch(self._subscription_list())
+            self.drain_outbound_queue()
         else:
             print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT连接失败，错误代码: {rc}")
             self.is_connected = False
     
     def on_message(self, client, userdata, msg):
-        """消息接收回调"""
-        try:
-            topic = msg.topic
-            payload = msg.payload.decode('utf-8')
-            timestamp = datetime.now().strftime('%H:%M:%S')
-            
-            message_info = {
-                'timestamp': timestamp,
-                'topic': topic,
-                'payload': payload,
-                'type': 'received'
-            }
-            
-            self.message_log.append(message_info)
-            print(f"[{timestamp}] 收到消息 - 主题: {topic}, 内容: {payload}")
-            
-            # 调用外部回调函数
-            # if self.on_message_callback:
-            #     self.on_message_callback(message_info)
-                
-        except Exception as e:
-            print(f"处理接收消息时出错: {e}")
+        """消息接收回调（网络线程）：只入队，不做解码和处理"""
+        start = time.perf_counter()
+        if self.link_monitor is not None and msg.topic == self.link_topic:
+            self.link_monitor.on_echo(msg.payload)
+            return
+        correlation = getattr(getattr(msg, 'properties', None), 'CorrelationData', None)
+        if correlation is not None:
+            # v5设备的回复按关联数据直接确认指令，不必等后台线程按主题匹配
+            self.confirmation.on_response(correlation, msg.payload.decode('utf-8', errors='replace'))
+        self.inbound.put((msg.topic, msg.payload, time.time()))
+        self.loop_times.append(time.perf_counter() - start)
+    
+    def _handle_inbound_batch(self, items):
+        """后台线程中处理一批接收到的消息"""
+        records = []
+        for topic, payload, received_at in items:
+            try:
+                payload = payload.decode('utf-8')
+            except UnicodeDecodeError:
+                payload = payload.decode('utf-8', errors='replace')
+            record = self.message_log.append(topic, payload, DIRECTION_RECEIVED, received_at)
+            self.device_shadow.update(topic, payload, 'reported')
+            if self.log_each_message:
+                print(f"[{datetime.fromtimestamp(received_at).strftime('%H:%M:%S')}] "
+                      f"收到消息 - 主题: {topic}, 内容: {payload}")
+            # 分发给匹配该主题的处理函数（包括外部回调）
+            self.router.dispatch(topic, record)
+            records.append(record)
+        for handler in self.batch_handlers:
+            try:
+                handler(records)
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] 批量消息处理函数出错: {e}")
+    
+    def add_batch_handler(self, handler):
+        """注册按批接收消息的处理函数 handler(records)，适合界面等需要合并刷新的消费者"""
+        if handler not in self.batch_handlers:
+            self.batch_handlers.append(handler)
+    
+    def remove_batch_handler(self, handler):
+        if handler in self.batch_handlers:
+            self.batch_handlers.remove(handler)
+    
+    def get_inbound_stats(self):
+        """接收队列统计与网络线程中每条消息的耗时（微秒）"""
+        stats = self.inbound.get_stats()
+        samples = sorted(self.loop_times)
+        stats.update({
+            'loop_avg_us': sum(samples) / len(samples) * 1e6 if samples else 0.0,
+            'loop_p95_us': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6 if samples else 0.0,
+            'loop_max_us': samples[-1] * 1e6 if samples else 0.0,
+        })
+        return stats
+    
+    def _subscription_list(self):
+        """需要订阅的 (过滤器, QoS) 列表：MQTT_TOPICS 中的设备主题加上额外订阅"""
+        topics = {topic: 0 for topic in MQTT_TOPICS.values()}
+        if self.link_monitor is not None:
+            topics[self.link_topic] = 0
+        for topic_filter, qos in self.subscriptions.items():
+            topics[topic_filter] = max(qos, topics.get(topic_filter, 0))
+        return list(topics.items())
+    
+    def _subscribe_batch(self, topics):
+        """在一个SUBSCRIBE报文中订阅多个主题"""
+        if not topics:
+            return None
+        result, mid = self.client.subscribe(topics)
+        if result == mqtt.MQTT_ERR_SUCCESS:
+            self.pending_subscribes[mid] = topics
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 订阅 {len(topics)} 个主题: "
+                  f"{', '.join(topic for topic, _ in topics)}")
+        else:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 订阅主题失败，错误代码: {result}")
+        return mid
+    
+    def _unsubscribe_batch(self, topics):
+        """在一个UNSUBSCRIBE报文中退订多个主题"""
+        if not topics:
+            return None
+        result, mid = self.client.unsubscribe(list(topics))
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] 退订主题: {', '.join(topics)}")
+        return mid
+    
+    def on_subscribe(self, client, userdata, mid, granted_qos, properties=None):
+        """订阅确认回调，记录被服务器拒绝的主题（MQTT v5 时 granted_qos 为原因码列表）"""
+        topics = self.pending_subscribes.pop(mid, [])
+        for (topic, _), qos in zip(topics, granted_qos):
+            if getattr(qos, 'value', qos) >= 0x80:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] 服务器拒绝订阅主题: {topic}")
     
-    def on_disconnect(self, client, userdata, rc):
+    def subscribe(self, topic_filter, handler=None, qos=0):
+        """
+        订阅主题（支持 '+' 单层和 '#' 多层通配符），可同时注册消息处理函数 handler(record)
+        已连接时立即订阅，重连后自动重新订阅
+        """
+        validate_filter(topic_filter)
+        if handler is not None:
+            self.router.add(topic_filter, handler)
+        new = topic_filter not in self.subscriptions and topic_filter not in MQTT_TOPICS.values()
+        self.subscriptions[topic_filter] = max(qos, self.subscriptions.get(topic_filter, 0))
+        if new and self.is_connected:
+            self._subscribe_batch([(topic_filter, qos)])
+    
+    def unsubscribe(self, topic_filter, handler=None):
+        """移除处理函数；handler为None时同时取消订阅"""
+        self.router.remove(topic_filter, handler)
+        if handler is None and self.subscriptions.pop(topic_filter, None) is not None:
+            if self.is_connected and topic_filter not in MQTT_TOPICS.values():
+                self._unsubscribe_batch([topic_filter])
+    
+    def add_message_handler(self, topic_filter, handler):
+        """只注册消息处理函数，不改变订阅（如在 'home/#' 订阅下单独处理 'home/+/light'）"""
+        self.router.add(topic_filter, handler)
+    
+    def remove_message_handler(self, topic_filter, handler=None):
+        self.router.remove(topic_filter, handler)
+    
+    def on_disconnect(self, client, userdata, rc, properties=None):
         """断开连接回调"""
         self.is_connected = False
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT连接断开")
+        if rc != 0 and self.auto_reconnect and not self.stop_event.is_set():
+            # 意外断开，由网络线程按退避策略重连
+            self.is_reconnecting = True
+            if self.disconnected_at is None:
+                self.disconnected_at = time.monotonic()
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT连接意外断开，将自动重连")
+        else:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT连接断开")
     
     def connect(self):
         """连接到MQTT服务器"""
+        if self.network_thread and self.network_thread.is_alive():
+            return True
         try:
-            self.client.connect(MQTT_CONFIG['broker'], MQTT_CONFIG['port'], MQTT_CONFIG['keep_alive'])
-            self.client.loop_start()
+            self.stop_event.clear()
+            port = MQTT_TLS_CONFIG.get('port', 9503) if self.tls_context is not None else MQTT_CONFIG['port']
+            self.client.connect(MQTT_CONFIG['broker'], port, MQTT_CONFIG['keep_alive'])
+            self.network_thread = threading.Thread(target=self._network_loop, daemon=True)
+            self.network_thread.start()
             return True
         except Exception as e:
             print(f"MQTT连接错误: {e}")
@@ -128,63 +415,469 @@ class MQTTClient:
     
     def disconnect(self):
         """断开MQTT连接"""
+        if self.dispatcher is not None:
+            self.dispatcher.flush()
+        self.stop_event.set()
+        self.is_reconnecting = False
+        self.disconnected_at = None
         if self.is_connected:
-            self.client.loop_stop()
             self.client.disconnect()
+        if self.network_thread and self.network_thread is not threading.current_thread():
+            self.network_thread.join(timeout=5)
+        self.network_thread = None
+        if self.client.want_write():
+            self.client.loop_write()  # 网络线程已退出，写出排队的DISCONNECT
+        self.inbound.flush()
+        self.message_log.flush()
+    
+    def _network_loop(self):
+        """网络线程：处理收发，意外断线后按退避策略重连"""
+        while not self.stop_event.is_set():
+            timeout = 1.0
+            if self.link_monitor is not None:
+                timeout = min(timeout, self.link_monitor.interval)
+            try:
+                rc = self.client.loop(timeout=timeout)
+            except OSError as e:
+                # 套接字异常时paho不会触发断开回调
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT网络异常: {e}")
+                rc = mqtt.MQTT_ERR_CONN_LOST
+                self.on_disconnect(self.client, None, rc)
+            if rc == mqtt.MQTT_ERR_SUCCESS and self.is_connected and self.link_monitor is not None:
+                if not self.link_monitor.tick():
+                    self._drop_dead_link()
+                    continue
+            if rc == mqtt.MQTT_ERR_SUCCESS or self.stop_event.is_set():
+                continue
+            if not self.auto_reconnect:
+                break
+            self._reconnect_with_backoff()
+    
+    def _send_probe(self, payload):
+        published_at = time.perf_counter()
+        result = self.client.publish(self.link_topic, payload, qos=0)
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            return False
+        # 探测消息不经过 publish_async，记录其mid以免发布完成回调留在 early_acks 中
+        with self.publish_lock:
+            acked_at = self.early_acks.pop(result.mid, None)
+            if acked_at is None or acked_at < published_at:
+                self.probe_mids.add(result.mid)
+        return True
+    
+    def _drop_dead_link(self):
+        """链路探测超时：关闭套接字，由网络线程走断线重连流程"""
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {self.link_monitor.dead_after:g} 秒未收到链路探测回显，"
+              f"判定连接已断开")
+        sock = self.client.socket()
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+    
+    def get_tls_stats(self):
+        """TLS握手统计：完整握手与会话复用握手的次数和耗时（毫秒）"""
+        if self.tls_context is None:
+            return {}
+        return self.tls_context.get_stats()
     
-    def publish_message(self, topic, message):
-        """发布消息"""
+    def get_link_stats(self):
+        """链路探测统计：RTT（毫秒）、直方图与断链次数"""
+        if self.link_monitor is None:
+            return {}
+        stats = self.link_monitor.get_stats()
+        stats['connected'] = self.is_connected
+        return stats
+    
+    def _reconnect_with_backoff(self):
+        """等待退避时间后重连，直到成功或被停止"""
+        self.is_reconnecting = True
+        if self.disconnected_at is None:
+            self.disconnected_at = time.monotonic()
+        while not self.stop_event.is_set():
+            delay = self.backoff.next_delay()
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] {delay:.1f} 秒后尝试第 {self.backoff.attempts} 次重连")
+            if self.stop_event.wait(delay):
+                return
+            try:
+                self.client.reconnect()
+                return
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT重连失败: {e}")
+    
+    def drain_outbound_queue(self):
+        """按顺序补发离线期间排队的指令"""
+        if self.outbound_queue is None or not len(self.outbound_queue):
+            return 0
+        
+        def send(topic, payload, qos):
+            future = self.publish_async(topic, payload, qos)
+            return self.is_connected and not (future.done() and future.exception())
+        
+        with self.drain_lock:
+            sent, expired = self.outbound_queue.drain(send)
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] 补发离线指令 {sent} 条，过期丢弃 {expired} 条")
+        return sent
+    
+    def get_connection_stats(self):
+        """获取连接统计：重连次数、重连耗时（秒）与离线队列深度"""
+        times = list(self.reconnect_times)
+        queue = self.outbound_queue
+        return {
+            'connected': self.is_connected,
+            'reconnecting': self.is_reconnecting,
+            'reconnect_count': self.reconnect_count,
+            'last_reconnect_seconds': times[-1] if times else None,
+            'avg_reconnect_seconds': sum(times) / len(times) if times else None,
+            'offline_seconds': time.monotonic() - self.disconnected_at if self.disconnected_at is not None else 0.0,
+            'queue_depth': len(queue) if queue is not None else 0,
+            'queue_dropped': queue.dropped if queue is not None else 0,
+            'queue_expired': queue.expired if queue is not None else 0,
+        }
+    
+    def apply_config_changes(self, changes):
+        """
+        应用配置热更新
+        主题变化时只订阅新增、退订移除的主题；服务器地址变化时重连
+        client_id和登录方式在客户端创建时确定，需重启程序生效
+        """
+        if 'MQTT_TOPICS' in changes and self.is_connected:
+            old, new = changes['MQTT_TOPICS']
+            old_topics, new_topics = set(old.values()), set(new.values())
+            self._unsubscribe_batch(sorted(old_topics - new_topics - set(self.subscriptions)))
+            self._subscribe_batch([(topic, 0) for topic in sorted(new_topics - old_topics)
+                                   if topic not in self.subscriptions])
+
+        if 'MQTT_CONFIG' in changes:
+            old, new = changes['MQTT_CONFIG']
+            if any(old.get(key) != new.get(key) for key in ('client_id', 'username', 'password', 'use_private_key')):
+                print("⚠️ MQTT登录信息已修改，将在重启程序后生效")
+            if any(old.get(key) != new.get(key) for key in ('broker', 'port', 'keep_alive')) and self.is_connected:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] MQTT服务器配置已修改，正在重新连接")
+                self.disconnect()
+                self.connect()
+
+        if 'COMMAND_COALESCE_CONFIG' in changes and self.dispatcher is not None:
+            old, new = changes['COMMAND_COALESCE_CONFIG']
+            self.dispatcher.default_window = new.get('default_window', 0.2)
+            self.dispatcher.topic_windows = dict(new.get('topic_windows', {}))
+
+        if 'INBOUND_DISPATCH_CONFIG' in changes:
+            old, new = changes['INBOUND_DISPATCH_CONFIG']
+            with self.inbound.condition:
+                self.inbound.capacity = new.get('queue_size', 5000)
+                self.inbound.batch_size = new.get('batch_size', 100)
+                self.inbound.batch_interval = new.get('batch_interval', 0.02)
+                if new.get('overflow') in OVERFLOW_POLICIES:
+                    self.inbound.overflow = new['overflow']
+                self.inbound.block_timeout = new.get('block_timeout', 0.5)
+            self.log_each_message = new.get('log_each_message', True)
+
+        if 'COMMAND_CONFIRM_CONFIG' in changes:
+            old, new = changes['COMMAND_CONFIRM_CONFIG']
+            old_filter = self.confirmation.subscription_filter()
+            if old.get('state_topic') != new.get('state_topic'):
+                self.unsubscribe(old_filter)
+                self.confirmation = ConfirmationTracker(new.get('state_topic', '{topic}/state'))
+            if new.get('enabled', False) and self.confirmation.subscription_filter() not in self.subscriptions:
+                self.subscribe(self.confirmation.subscription_filter(), self._on_state_report)
+
+        if 'LINK_MONITOR_CONFIG' in changes and self.link_monitor is not None:
+            old, new = changes['LINK_MONITOR_CONFIG']
+            self.link_monitor.interval = new.get('interval', 2.0)
+            self.link_monitor.dead_after = new.get('dead_after', 6.0)
+
+        if 'RATE_LIMIT_CONFIG' in changes and self.rate_limiter is not None:
+            old, new = changes['RATE_LIMIT_CONFIG']
+            self.rate_limiter.set_rates(new.get('connection_rate', 10.0), new.get('connection_burst', 20),
+                                        new.get('topic_rate', 2.0), new.get('topic_burst', 5))
+
+        if 'MQTT_PUBLISH_CONFIG' in changes:
+            old, new = changes['MQTT_PUBLISH_CONFIG']
+            if old.get('max_inflight') != new.get('max_inflight'):
+                self.client.max_inflight_messages_set(new.get('max_inflight', 20))
+
+    def on_publish(self, client, userdata, mid):
+        """发布完成回调：QoS0在消息写入网络后触发，QoS1在收到PUBACK后触发"""
+        now = time.perf_counter()
+        with self.publish_lock:
+            pending = self.pending_publishes.pop(mid, None)
+            if pending is None:
+                if mid in self.probe_mids:
+                    self.probe_mids.discard(mid)
+                    return
+                self._expire_early_acks(now)
+                self.early_acks[mid] = now
+                return
+        self._complete_publish(mid, pending, now)
+    
+    def _expire_early_acks(self, now):
+        """未登记的确认只在 publish() 返回前的一瞬间有效，清理过期的条目（调用方持有 publish_lock）"""
+        expired = now - EARLY_ACK_TTL
+        for mid in [mid for mid, acked_at in self.early_acks.items() if acked_at < expired]:
+            del self.early_acks[mid]
+    
+    def _complete_publish(self, mid, pending, acked_at):
+        future, published_at, topic, qos = pending
+        latency = acked_at - published_at
+        self.ack_latencies.append(latency)
+        future.set_result({'mid': mid, 'topic': topic, 'qos': qos, 'latency': latency})
+    
+    def get_qos(self, topic):
+        """按主题所属的设备类型查找QoS策略"""
+        device_qos = MQTT_PUBLISH_CONFIG.get('device_qos', {})
+        from device_registry import get_default_registry
+        registry = get_default_registry()
+        record = registry.find_by_topic(topic) if registry else None
+        if record and record.device_type in device_qos:
+            return device_qos[record.device_type]
+        for device_type, device_config in DEVICE_COMMANDS.items():
+            if topic in device_config.get('topics', []) and device_type in device_qos:
+                return device_qos[device_type]
+        return MQTT_PUBLISH_CONFIG.get('default_qos', 0)
+    
+    def publish_async(self, topic, message, qos=None):
+        """
+        异步发布消息，返回 concurrent.futures.Future
+        QoS1消息在收到服务器确认后完成，结果为 {'mid', 'topic', 'qos', 'latency'}
+        在途消息超过 max_inflight 时由paho在本地排队，排队时间计入延迟
+        """
+        if qos is None:
+            qos = self.get_qos(topic)
+        future = Future()
+        # 不能在持有 publish_lock 时调用paho：网络线程在paho内部锁中回调 on_publish 再获取 publish_lock，
+        # 会形成锁顺序死锁；确认先于登记到达时由 early_acks 处理
+        published_at = time.perf_counter()
+        if self.topic_aliases is not None:
+            result = self._publish_v5(topic, message, qos)
+        else:
+            result = self.client.publish(topic, message, qos=qos)
+        # 未连接时QoS1消息仍保留在paho队列中，重连后发送
+        queued = qos > 0 and result.rc == mqtt.MQTT_ERR_NO_CONN
+        if result.rc != mqtt.MQTT_ERR_SUCCESS and not queued:
+            future.set_exception(RuntimeError(f"发布失败，错误代码: {result.rc}"))
+            return future
+        pending = (future, published_at, topic, qos)
+        with self.publish_lock:
+            acked_at = self.early_acks.pop(result.mid, None)
+            if acked_at is not None and acked_at < published_at:
+                acked_at = None  # 早于本次发布的确认属于回绕前使用同一mid的消息
+            if self.early_acks:
+                self._expire_early_acks(published_at)
+            if acked_at is None:
+                self.probe_mids.discard(result.mid)
+                self.pending_publishes[result.mid] = pending
+        if acked_at is not None:
+            self._complete_publish(result.mid, pending, acked_at)
+        return future
+    
+    def _publish_v5(self, topic, message, qos):
+        """带v5属性发布：消息有效期、主题别名，等待确认的指令附带响应主题和关联数据"""
+        correlation = None
+        if MQTT_V5_CONFIG.get('response_correlation', True):
+            correlation = self.confirmation.correlation_for(topic, message)
+        with self.topic_aliases.lock:
+            alias, send_topic = self.topic_aliases.lookup(topic, qos)
+            properties = publish_properties(MQTT_V5_CONFIG.get('message_expiry', 0), alias,
+                                            self.confirmation.state_topic_for(topic), correlation)
+            return self.client.publish(send_topic, message, qos=qos, properties=properties)
+    
+    def get_v5_stats(self):
+        """MQTT v5统计：主题别名节省的字节数与按关联数据确认的指令数"""
+        if self.topic_aliases is None:
+            return {}
+        stats = self.topic_aliases.get_stats()
+        stats['correlated_confirmations'] = self.confirmation.get_stats()['correlated']
+        return stats
+    
+    def get_publish_stats(self):
+        """获取发布确认统计（延迟单位为毫秒）"""
+        with self.publish_lock:
+            latencies = sorted(self.ack_latencies)
+            in_flight = len(self.pending_publishes)
+        if not latencies:
+            return {'count': 0, 'in_flight': in_flight, 'avg_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'count': len(latencies),
+            'in_flight': in_flight,
+            'avg_ms': sum(latencies) / len(latencies) * 1000,
+            'p50_ms': latencies[len(latencies) // 2] * 1000,
+            'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+            'max_ms': latencies[-1] * 1000,
+        }
+    
+    def get_device_state(self, topic):
+        """查询设备状态影子（DeviceState），未知时返回None"""
+        return self.device_shadow.get(topic)
+    
+    def publish_message(self, topic, message, qos=None, coalesce=True, priority=PRIORITY_INTERACTIVE):
+        """
+        发布消息（不等待确认，需要确认时使用 publish_async）
+        启用指令合并时每个主题窗口内的第一条立即发送，其后窗口内只在结束时发送最后一条；
+        之后经限速器按优先级发送，自动化等后台指令使用 PRIORITY_BACKGROUND
+        未连接且不在重连中时直接返回False，不进入合并窗口
+        """
+        if not self.is_connected and not (self.is_reconnecting and self.outbound_queue is not None):
+            print("MQTT未连接，无法发送消息")
+            return False
+        if coalesce and self.dispatcher is not None:
+            return self.dispatcher.submit(topic, message, qos, priority)
+        return self._rate_limited_publish(topic, message, qos, priority)
+    
+    def _rate_limited_publish(self, topic, message, qos=None, priority=PRIORITY_INTERACTIVE):
+        if self.rate_limiter is not None:
+            return self.rate_limiter.submit(topic, message, qos, PRIORITY_INTERACTIVE if priority is None else priority)
+        return self._publish_now(topic, message, qos)
+    
+    def get_rate_limit_stats(self):
+        """获取各优先级通道的排队数与等待时间"""
+        return self.rate_limiter.get_stats() if self.rate_limiter is not None else {}
+    
+    def get_coalesce_stats(self):
+        """获取指令合并统计（被合并掉的指令数等）"""
+        return self.dispatcher.get_stats() if self.dispatcher is not None else {}
+    
+    def _publish_now(self, topic, message, qos=None):
+        """立即发布消息"""
+        # 设备已处于目标状态时跳过，避免重复指令冲击服务器和设备
+        if DEVICE_SHADOW_CONFIG.get('suppress_redundant', False) and \
+                not self.device_shadow.would_change(topic, message):
+            self.suppressed_count += 1
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 设备已处于目标状态，跳过发送 - 主题: {topic}, 内容: {message}")
+            return True
+        
+        # 断线重连期间，或仍有排队指令未补发时，加入离线队列以保持顺序
+        if self.outbound_queue is not None and (self.is_reconnecting or (self.is_connected and len(self.outbound_queue))):
+            if qos is None:
+                qos = self.get_qos(topic)
+            self.outbound_queue.put(topic, message, qos)
+            self.device_shadow.update(topic, message, 'desired')
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 指令已加入离线队列 - 主题: {topic}, 内容: {message}"
+                  f" (队列 {len(self.outbound_queue)} 条)")
+            if self.is_connected:
+                self.drain_outbound_queue()
+            return True
+        
         if not self.is_connected:
             print("MQTT未连接，无法发送消息")
             return False
         
         try:
-            result = self.client.publish(topic, message)
+            future = self.publish_async(topic, message, qos)
             timestamp = datetime.now().strftime('%H:%M:%S')
             
-            message_info = {
-                'timestamp': timestamp,
-                'topic': topic,
-                'payload': message,
-                'type': 'sent'
-            }
-            
-            self.message_log.append(message_info)
+            self.message_log.append(topic, str(message), DIRECTION_SENT)
+            if not (future.done() and future.exception()):
+                self.device_shadow.update(topic, message, 'desired')
             
-            if result.rc == 0:
+            if not (future.done() and future.exception()):
                 print(f"[{timestamp}] 发送消息成功 - 主题: {topic}, 内容: {message}")
                 return True
             else:
-                print(f"[{timestamp}] 发送消息失败 - 主题: {topic}, 错误代码: {result.rc}")
+                print(f"[{timestamp}] 发送消息失败 - 主题: {topic}, {future.exception()}")
                 return False
                 
         except Exception as e:
             print(f"发送消息时出错: {e}")
             return False
     
-    def get_message_log(self):
-        """获取消息日志"""
-        return self.message_log.copy()
+    def _on_state_report(self, record):
+        """设备状态上报：更新状态影子并确认等待中的指令"""
+        topic = self.confirmation.device_topic_for(record.topic)
+        if topic is None:
+            return
+        self.device_shadow.update(topic, record.payload, 'reported')
+        self.confirmation.on_report(topic, record.payload)
+    
+    def publish_confirmed(self, topic, message, priority=PRIORITY_INTERACTIVE, timeout=None, max_attempts=None):
+        """
+        发送指令并等待设备上报确认，超时重发（阻塞调用线程，应在指令执行器中调用）
+        返回 ConfirmationResult：sent 表示已发出，confirmed 表示设备已确认执行
+        """
+        state_filter = self.confirmation.subscription_filter()
+        if state_filter not in self.subscriptions:
+            self.subscribe(state_filter, self._on_state_report)
+        timeout = COMMAND_CONFIRM_CONFIG.get('timeout', 2.0) if timeout is None else timeout
+        max_attempts = COMMAND_CONFIRM_CONFIG.get('max_attempts', 3) if max_attempts is None else max_attempts
+        
+        def before_retry():
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 设备未确认，重发指令 - 主题: {topic}, 内容: {message}")
+            self.device_shadow.invalidate(topic)
+        
+        result = wait_for_confirmation(
+            self.confirmation, topic, message,
+            lambda: self._rate_limited_publish(topic, message, None, priority),
+            timeout, max_attempts, before_retry)
+        if result.sent and not result.confirmed:
+            self.device_shadow.invalidate(topic)
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 设备未确认执行 - 主题: {topic}, 内容: {message}"
+                  f" (发送 {result.attempts} 次)")
+        return result
+    
+    def get_confirmation_stats(self):
+        """指令确认统计：确认/未确认次数、重发次数及各自的执行耗时"""
+        return self.confirmation.get_stats()
+    
+    def get_message_log(self, limit=200):
+        """获取最近的消息日志（字典格式）"""
+        return [record.to_dict() for record in self.message_log.latest(limit)]
+    
+    def query_messages(self, topic=None, direction=None, since=None, until=None, limit=None,
+                       include_archived=False):
+        """按主题、方向（'sent'/'received'）和时间范围（epoch秒）查询消息记录"""
+        return self.message_log.query(topic, direction, since, until, limit, include_archived)
     
     def clear_message_log(self):
         """清空消息日志"""
         self.message_log.clear()
 
 # 设备控制函数
-def control_device(mqtt_client, device_type, action, room=None):
+def _publish_command(mqtt_client, topic, command, priority, confirm=None):
+    """发布控制指令，只在指定了优先级时才传递该参数；需要确认时等待设备上报"""
+    if confirm is None:
+        confirm = COMMAND_CONFIRM_CONFIG.get('enabled', False)
+    if confirm:
+        return mqtt_client.publish_confirmed(topic, command, PRIORITY_INTERACTIVE if priority is None else priority)
+    if priority is None:
+        return mqtt_client.publish_message(topic, command)
+    return mqtt_client.publish_message(topic, command, priority=priority)
+
+def control_device(mqtt_client, device_type, action, room=None, priority=None, confirm=None):
     """
     控制设备
     :param mqtt_client: MQTT客户端实例
     :param device_type: 设备类型 (支持中文和英文，如: '灯'/'light', '空调'/'aircon', '电视'/'tv')
     :param action: 操作 ('on' 或 'off')
     :param room: 房间 (可选，如: 'living_room', 'bedroom')
+    :param priority: 发布优先级 (可选，自动化指令使用 PRIORITY_BACKGROUND)
+    :param confirm: 是否等待设备上报确认 (默认按 COMMAND_CONFIRM_CONFIG)，确认时返回 ConfirmationResult
     """
-    if not mqtt_client.is_connected:
+    # 断线重连期间指令进入离线队列
+    if not (mqtt_client.is_connected or mqtt_client.is_reconnecting):
         return False
     
+    # 启用设备注册表时优先按注册表解析主题和指令
+    from device_registry import get_default_registry
+    registry = get_default_registry()
+    if registry:
+        record = registry.resolve(device_type, room)
+        command = record.command_for(action) if record else None
+        if command:
+            return _publish_command(mqtt_client, record.topic, command, priority, confirm)
+        if room and registry.find_by_type(device_type):
+            # 指定的房间没有此类设备：不回退到配置中其他房间的设备
+            print(f"❌ {room} 没有设备: {device_type}")
+            return False
+    
     # 导入设备配置
     from config import DEVICE_COMMANDS
     
+    if registry and not room and device_type not in DEVICE_COMMANDS and registry.find_by_type(device_type):
+        # 设备分布在多个房间且没有默认配置：需要指定房间
+        print(f"❌ 多个房间都有 {device_type}，请指定房间")
+        return False
+    
     # 中文设备名称到英文的映射
     device_name_map = {
         '灯': 'light',
@@ -216,7 +909,7 @@ def control_device(mqtt_client, device_type, action, room=None):
         if topics and commands:
             topic = topics[0]
             command = commands[0]
-            return mqtt_client.publish_message(topic, command)
+            return _publish_command(mqtt_client, topic, command, priority, confirm)
     
     # 回退到原来的英文映射逻辑
     topic_map = {
@@ -239,6 +932,6 @@ def control_device(mqtt_client, device_type, action, room=None):
         
         # 发送控制指令
         command = '1' if action == 'on' else '0'
-        return mqtt_client.publish_message(topic, command)
+        return _publish_command(mqtt_client, topic, command, priority, confirm)
     
     return False
@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+"""
+多家庭MQTT连接管理模块
+托管部署时每个家庭一条巴法云连接（各自的client_id/私钥），
+所有连接由一个selector线程驱动网络收发、心跳和重连，收到的消息由一个分发线程按家庭路由；
+阻塞的TCP连接由少量固定的连接线程执行，连接建立后交给selector线程，一个服务器不可达不会卡住其它家庭；
+线程数不随家庭数量增加，每个家庭只占用一个paho客户端对象和一个socket
+"""
+
+import time
+import heapq
+import queue
+import socket
+import selectors
+import threading
+from collections import deque
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+
+from config import MQTT_RECONNECT_CONFIG, INBOUND_DISPATCH_CONFIG
+from mqtt_client import ReconnectBackoff
+from topic_router import TopicRouter, validate_filter
+from inbound_dispatcher import InboundDispatcher
+
+# selector线程收到的socket操作请求
+_OP_OPEN = 'open'
+_OP_CLOSE = 'close'
+_OP_WRITE = 'write'
+_OP_NO_WRITE = 'no_write'
+
+
+class HomeMessage:
+    """一个家庭收到的消息"""
+    __slots__ = ('home_id', 'topic', 'payload', 'timestamp')
+
+    def __init__(self, home_id, topic, payload, timestamp):
+        self.home_id = home_id
+        self.topic = topic
+        self.payload = payload
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"HomeMessage(home_id={self.home_id!r}, topic={self.topic!r}, payload={self.payload!r})"
+
+
+class HomeConnection:
+    """一个家庭的连接"""
+
+    def __init__(self, home_id, client, topics, backoff):
+        self.home_id = home_id
+        self.client = client
+        self.topics = dict(topics)  # 过滤器 -> QoS
+        self.router = TopicRouter()
+        self.backoff = backoff
+        self.sock = None
+        self.connected = False
+        self.removed = False
+        self.connect_due = None  # 下一次连接尝试的时间（monotonic），None表示不需要连接
+        self.connecting = False  # 连接线程正在为该家庭建立连接
+        self.received = 0
+        self.sent = 0
+        self.reconnects = 0
+        self.last_error = None
+
+    def to_dict(self):
+        return {
+            'home_id': self.home_id,
+            'connected': self.connected,
+            'subscriptions': len(self.topics),
+            'received': self.received,
+            'sent': self.sent,
+            'reconnects': self.reconnects,
+            'last_error': self.last_error,
+        }
+
+
+class MultiHomeMQTTManager:
+    """在一个selector线程上驱动多个家庭的MQTT连接"""
+
+    def __init__(self, on_message=None, connect_timeout=5.0, misc_interval=1.0, connect_workers=2):
+        """
+        on_message(home_id, record): 所有家庭共用的消息处理函数（可选），各家庭还可单独注册处理函数
+        connect_timeout: 建立TCP连接的超时（秒）
+        misc_interval: 心跳检查间隔（秒）
+        connect_workers: 连接线程数，即同时进行的连接尝试上限（不可达的服务器最多占用一个连接线程 connect_timeout 秒）
+        """
+        self.on_message = on_message
+        self.connect_timeout = connect_timeout
+        self.misc_interval = misc_interval
+        self.connect_workers = connect_workers
+        self.connect_requests = queue.Queue()  # 到期需要连接的家庭，由连接线程取出
+        self.connect_threads = []
+        self.homes = {}
+        self.lock = threading.Lock()
+        self.selector = selectors.DefaultSelector()
+        self.ops = deque()  # 其它线程提交的socket操作，由selector线程执行
+        self.connect_queue = []  # (到期时间, 序号, home_id) 小顶堆
+        self.sequence = 0
+        self.thread = None
+        self.loop_ident = None
+        self.stopped = threading.Event()
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+        self.inbound = InboundDispatcher(self._handle_inbound_batch,
+                                         INBOUND_DISPATCH_CONFIG.get('queue_size', 5000),
+                                         INBOUND_DISPATCH_CONFIG.get('batch_size', 100),
+                                         INBOUND_DISPATCH_CONFIG.get('batch_interval', 0.02),
+                                         INBOUND_DISPATCH_CONFIG.get('overflow', 'drop_oldest'),
+                                         INBOUND_DISPATCH_CONFIG.get('block_timeout', 0.5))
+        self.loop_iterations = 0
+
+    # ---- 家庭管理 ----
+
+    def add_home(self, home_id, client_id, broker, port=9501, username=None, password=None,
+                 topics=(), keep_alive=60, handler=None):
+        """
+        添加一个家庭并开始连接
+        username/password 为空时使用私钥登录（client_id即私钥）
+        topics: 订阅的主题（支持通配符），可以是列表或 {过滤器: QoS} 字典
+        handler(home_id, record): 该家庭的消息处理函数
+        """
+        if isinstance(topics, dict):
+            topics = topics.items()
+        else:
+            topics = [(topic, 0) for topic in topics]
+        for topic, _ in topics:
+            validate_filter(topic)
+
+        client = mqtt.Client(client_id, clean_session=True)
+        if username:
+            client.username_pw_set(username, password)
+        client._connect_timeout = self.connect_timeout  # paho 1.6 没有公开的设置方法（2.x 的 connect_timeout 属性也读取它）
+        client.connect_async(broker, port, keep_alive)
+        backoff = ReconnectBackoff(MQTT_RECONNECT_CONFIG.get('min_delay', 1.0),
+                                   MQTT_RECONNECT_CONFIG.get('max_delay', 60.0),
+                                   MQTT_RECONNECT_CONFIG.get('jitter', 0.5))
+        home = HomeConnection(home_id, client, topics, backoff)
+        if handler is not None:
+            home.router.add('#', handler)
+        client.user_data_set(home)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+
+        with self.lock:
+            if home_id in self.homes:
+                raise ValueError(f"家庭 {home_id} 已存在")
+            self.homes[home_id] = home
+        self._schedule_connect(home, 0)
+        return home
+
+    def remove_home(self, home_id):
+        """断开并移除一个家庭，不影响其它家庭"""
+        with self.lock:
+            home = self.homes.pop(home_id, None)
+        if home is None:
+            return False
+        home.removed = True
+        home.connect_due = None
+        self._submit(_OP_CLOSE, home, None)
+        return True
+
+    def get_home(self, home_id):
+        return self.homes.get(home_id)
+
+    def subscribe(self, home_id, topic_filter, handler=None, qos=0):
+        """为家庭增加订阅，可同时注册处理函数 handler(home_id, record)"""
+        validate_filter(topic_filter)
+        home = self.homes[home_id]
+        if handler is not None:
+            home.router.add(topic_filter, handler)
+        new = topic_filter not in home.topics
+        home.topics[topic_filter] = qos
+        if new and home.connected:
+            home.client.subscribe(topic_filter, qos)
+
+    def publish(self, home_id, topic, payload, qos=0):
+        """向家庭发布消息（线程安全，实际写入由selector线程完成），返回是否已进入发送队列"""
+        home = self.homes.get(home_id)
+        if home is None or not home.connected:
+            return False
+        info = home.client.publish(topic, payload, qos)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            return False
+        home.sent += 1
+        return True
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name='mqtt-multiplexer', daemon=True)
+        self.thread.start()
+        self.connect_requests = queue.Queue()
+        self.connect_threads = [threading.Thread(target=self._connect_worker, args=(self.connect_requests,),
+                                                 name=f'mqtt-connect-{i}', daemon=True)
+                                for i in range(self.connect_workers)]
+        for thread in self.connect_threads:
+            thread.start()
+
+    def stop(self, timeout=5.0):
+        """断开所有家庭并停止线程"""
+        for home_id in list(self.homes):
+            self.remove_home(home_id)
+        self.stopped.set()
+        self._wake()
+        for _ in self.connect_threads:
+            self.connect_requests.put(None)
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        self.thread = None
+        # 连接线程可能正阻塞在TCP连接中，不等待其结束（守护线程，连接完成后发现家庭已移除会关闭socket）
+        self.connect_threads = []
+        self.inbound.stop()
+
+    def get_stats(self):
+        """连接总览与每个家庭的统计"""
+        homes = list(self.homes.values())
+        return {
+            'homes': len(homes),
+            'connected': sum(1 for home in homes if home.connected),
+            'threads': 2 + self.connect_workers,  # selector线程 + 消息分发线程 + 连接线程，与家庭数量无关
+            'connecting': sum(1 for home in homes if home.connecting),
+            'loop_iterations': self.loop_iterations,
+            'inbound': self.inbound.get_stats(),
+            'per_home': {home.home_id: home.to_dict() for home in homes},
+        }
+
+    # ---- paho回调（publish 触发的写注册和连接线程中的socket打开之外都在selector线程中调用）----
+
+    def _on_connect(self, client, home, flags, rc):
+        if rc != 0:
+            home.last_error = f"连接被拒绝: {mqtt.connack_string(rc)}"
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 家庭 {home.home_id} MQTT连接失败，错误代码: {rc}")
+            return
+        home.connected = True
+        home.backoff.reset()
+        home.last_error = None
+        if home.topics:
+            client.subscribe(list(home.topics.items()))
+
+    def _on_disconnect(self, client, home, rc):
+        was_connected = home.connected
+        home.connected = False
+        if home.removed:
+            return
+        if was_connected:
+            home.reconnects += 1
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 家庭 {home.home_id} MQTT连接断开 (rc={rc})")
+        self._schedule_connect(home, home.backoff.next_delay())
+
+    def _on_message(self, client, home, msg):
+        home.received += 1
+        self.inbound.put((home, msg.topic, msg.payload, time.time()))
+
+    def _on_socket_open(self, client, home, sock):
+        self._submit(_OP_OPEN, home, sock)
+
+    def _on_socket_close(self, client, home, sock):
+        self._submit(_OP_CLOSE, home, sock)
+
+    def _on_socket_register_write(self, client, home, sock):
+        self._submit(_OP_WRITE, home, sock)
+
+    def _on_socket_unregister_write(self, client, home, sock):
+        self._submit(_OP_NO_WRITE, home, sock)
+
+    # ---- selector线程 ----
+
+    def _submit(self, op, home, sock):
+        self.ops.append((op, home, sock))
+        if threading.get_ident() != self.loop_ident:
+            self._wake()
+
+    def _wake(self):
+        try:
+            self.wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _schedule_connect(self, home, delay):
+        due = time.monotonic() + delay
+        home.connect_due = due
+        with self.lock:
+            self.sequence += 1
+            heapq.heappush(self.connect_queue, (due, self.sequence, home.home_id))
+        self._wake()
+
+    def _apply_ops(self):
+        while self.ops:
+            op, home, sock = self.ops.popleft()
+            if op == _OP_OPEN:
+                home.sock = sock
+                self._register(sock, selectors.EVENT_READ, home)
+            elif op == _OP_CLOSE:
+                if sock is None:
+                    # 移除家庭：发送DISCONNECT后关闭socket
+                    if home.sock is not None:
+                        sock = home.sock
+                        home.client.disconnect()
+                        home.client.loop_write()
+                        self._unregister(sock)
+                        if home.client.socket() is not None:
+                            # DISCONNECT未能一次写完，直接关闭
+                            sock.close()
+                        home.sock = None
+                        home.connected = False
+                    continue
+                self._unregister(sock)
+                if home.sock is sock:
+                    home.sock = None
+            elif sock is home.sock and sock is not None:
+                events = selectors.EVENT_READ | (selectors.EVENT_WRITE if op == _OP_WRITE else 0)
+                self._register(sock, events, home)
+
+    def _register(self, sock, events, home):
+        try:
+            self.selector.modify(sock, events, home)
+        except KeyError:
+            try:
+                self.selector.register(sock, events, home)
+            except (ValueError, OSError):
+                pass
+        except (ValueError, OSError):
+            pass
+
+    def _unregister(self, sock):
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError, OSError):
+            pass
+
+    def _connect_due_homes(self, now):
+        """把到期的家庭交给连接线程，返回下一个到期时间"""
+        while True:
+            with self.lock:
+                if not self.connect_queue:
+                    return None
+                due, _, home_id = self.connect_queue[0]
+                if due > now:
+                    return due
+                heapq.heappop(self.connect_queue)
+                home = self.homes.get(home_id)
+            if home is None or home.connect_due != due or home.connected or home.connecting:
+                continue
+            home.connect_due = None
+            home.connecting = True
+            self.connect_requests.put(home)
+
+    def _connect_worker(self, requests):
+        """连接线程：执行阻塞的TCP连接，socket打开后由 on_socket_open 交给selector线程"""
+        while True:
+            home = requests.get()
+            if home is None:
+                return
+            try:
+                if not home.removed:
+                    home.client.reconnect()
+            except Exception as e:
+                home.last_error = str(e)
+                if not home.removed:
+                    delay = home.backoff.next_delay()
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] 家庭 {home.home_id} 连接失败: {e}，"
+                          f"{delay:.1f} 秒后重试")
+                    self._schedule_connect(home, delay)
+            finally:
+                home.connecting = False
+            if home.removed and home.client.socket() is not None:
+                # 连接期间家庭被移除：selector线程运行时由它发送DISCONNECT，否则直接关闭
+                if self.loop_ident is not None:
+                    self._submit(_OP_CLOSE, home, None)
+                else:
+                    home.client.socket().close()
+
+    def _run(self):
+        self.loop_ident = threading.get_ident()
+        next_misc = time.monotonic() + self.misc_interval
+        try:
+            while not self.stopped.is_set():
+                self._apply_ops()
+                now = time.monotonic()
+                next_connect = self._connect_due_homes(now)
+                self._apply_ops()
+                deadline = next_misc if next_connect is None else min(next_misc, next_connect)
+                timeout = max(0.0, deadline - time.monotonic())
+                for key, events in self.selector.select(timeout):
+                    home = key.data
+                    if home is None:
+                        try:
+                            while self.wake_r.recv(4096):
+                                pass
+                        except (BlockingIOError, OSError):
+                            pass
+                        continue
+                    try:
+                        if events & selectors.EVENT_READ:
+                            home.client.loop_read()
+                        if events & selectors.EVENT_WRITE and home.sock is not None:
+                            home.client.loop_write()
+                    except Exception as e:
+                        # 单个家庭的异常不能让selector线程退出
+                        home.last_error = str(e)
+                        print(f"[{datetime.now().strftime('%H:%M:%S')}] 家庭 {home.home_id} 网络处理出错: {e}")
+                        self._unregister(key.fileobj)
+                        home.sock = None
+                        self._on_disconnect(home.client, home, mqtt.MQTT_ERR_CONN_LOST)
+                self.loop_iterations += 1
+                now = time.monotonic()
+                if now >= next_misc:
+                    for home in list(self.homes.values()):
+                        if home.sock is not None:
+                            home.client.loop_misc()
+                    next_misc = now + self.misc_interval
+        finally:
+            self._apply_ops()
+            self.loop_ident = None
+
+    # ---- 消息分发线程 ----
+
+    def _handle_inbound_batch(self, items):
+        for home, topic, payload, received_at in items:
+            if home.removed:
+                continue
+            try:
+                payload = payload.decode('utf-8')
+            except UnicodeDecodeError:
+                payload = payload.decode('utf-8', errors='replace')
+            record = HomeMessage(home.home_id, topic, payload, received_at)
+            home.router.dispatch(topic, home.home_id, record)
+            if self.on_message is not None:
+                try:
+                    self.on_message(home.home_id, record)
+                except Exception as e:
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] 家庭 {home.home_id} 消息处理出错: {e}")
+
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+MQTT v5 发布属性模块
+主题别名：同一连接中重复发布的主题只在第一次发送完整主题，之后只发送2字节的别名；
+消息有效期：指令在服务器中超过有效期未投递即被丢弃，长时间断网后设备不会收到过时的指令
+"""
+
+import threading
+from collections import OrderedDict
+
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
+
+
+class TopicAliasTable:
+    """
+    发布方向的主题别名表（每个连接独立，重连后清空）
+    别名用满时复用最久未使用的别名，重新绑定时发送完整主题
+    """
+
+    def __init__(self, maximum=16):
+        self.maximum = maximum  # 本机允许使用的别名数
+        self.limit = 0  # 当前连接可用的别名数：min(本机, 服务器CONNACK通告)
+        self.aliases = OrderedDict()  # 主题 -> 别名
+        # 分配别名与写入paho发送队列必须在同一把锁内，保证绑定别名的报文先于只带别名的报文发出
+        self.lock = threading.Lock()
+        self.aliased = 0
+        self.bytes_saved = 0
+
+    def reset(self, server_maximum=0):
+        """新连接建立时调用，server_maximum 为服务器通告的 TopicAliasMaximum（未通告为0）"""
+        with self.lock:
+            self.aliases.clear()
+            self.limit = min(self.maximum, server_maximum)
+
+    def lookup(self, topic, qos=0):
+        """
+        返回 (别名, 实际发送的主题)；别名为None表示不使用别名
+        QoS>0 的消息可能在重连后由paho重发，而新连接上别名已失效，所以始终携带完整主题
+        调用方需持有 self.lock
+        """
+        if self.limit <= 0:
+            return None, topic
+        alias = self.aliases.get(topic)
+        if alias is not None:
+            self.aliases.move_to_end(topic)
+            if qos > 0:
+                return alias, topic
+            self.aliased += 1
+            self.bytes_saved += len(topic.encode('utf-8'))
+            return alias, ''
+        if len(self.aliases) < self.limit:
+            alias = len(self.aliases) + 1
+        else:
+            _, alias = self.aliases.popitem(last=False)
+        self.aliases[topic] = alias
+        return alias, topic
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'alias_limit': self.limit,
+                'aliases_in_use': len(self.aliases),
+                'aliased_publishes': self.aliased,
+                'alias_bytes_saved': self.bytes_saved,
+            }
+
+
+def publish_properties(expiry=0, alias=None, response_topic=None, correlation=None):
+    """构造PUBLISH报文属性"""
+    properties = Properties(PacketTypes.PUBLISH)
+    if expiry:
+        properties.MessageExpiryInterval = int(expiry)
+    if alias is not None:
+        properties.TopicAlias = alias
+    if correlation is not None:
+        properties.ResponseTopic = response_topic
+        properties.CorrelationData = correlation
+    return properties
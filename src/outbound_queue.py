@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+离线指令队列模块
+MQTT断线期间的控制指令保存在SQLite（WAL模式）中，重连后按顺序补发
+每条指令带有过期时间，过期的指令不再发送（例如半小时前的"开灯"）
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbound (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    qos INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class OutboundQueue:
+    """有界、持久化的离线指令队列"""
+
+    def __init__(self, db_path=':memory:', max_size=1000, default_ttl=300):
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COUNT(*) FROM outbound").fetchone()[0]
+
+        # 统计
+        self.dropped = 0
+        self.expired = 0
+
+    def __len__(self):
+        return self.size
+
+    def put(self, topic, payload, qos=0, ttl=None):
+        """
+        加入一条指令
+        队列已满时丢弃最旧的指令，返回被丢弃的条数
+        """
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO outbound (topic, payload, qos, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (topic, str(payload), qos, now, now + ttl))
+            self.size += 1
+            overflow = self.size - self.max_size
+            if overflow > 0:
+                self.conn.execute(
+                    "DELETE FROM outbound WHERE id IN (SELECT id FROM outbound ORDER BY id LIMIT ?)", (overflow,))
+                self.size -= overflow
+                self.dropped += overflow
+            self.conn.commit()
+        return max(overflow, 0)
+
+    def purge_expired(self):
+        """删除已过期的指令，返回删除的条数"""
+        with self.lock:
+            removed = self.conn.execute("DELETE FROM outbound WHERE expires_at <= ?", (time.time(),)).rowcount
+            self.conn.commit()
+            self.size -= removed
+            self.expired += removed
+        return removed
+
+    def peek(self, limit=100):
+        """按入队顺序查看最早的若干条指令: [(id, topic, payload, qos, created_at, expires_at)]"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT id, topic, payload, qos, created_at, expires_at FROM outbound ORDER BY id LIMIT ?",
+                (limit,)).fetchall()
+
+    def drain(self, send, batch_size=100):
+        """
+        按入队顺序补发指令
+        send(topic, payload, qos) 返回False时停止，未发送的指令保留在队列中
+        返回 (发送条数, 过期条数)
+        """
+        sent = expired = 0
+        while True:
+            rows = self.peek(batch_size)
+            if not rows:
+                break
+            done = []
+            stopped = False
+            now = time.time()
+            for row_id, topic, payload, qos, _, expires_at in rows:
+                if expires_at <= now:
+                    expired += 1
+                elif send(topic, payload, qos):
+                    sent += 1
+                else:
+                    stopped = True
+                    break
+                done.append((row_id,))
+            with self.lock:
+                self.conn.executemany("DELETE FROM outbound WHERE id = ?", done)
+                self.conn.commit()
+                self.size -= len(done)
+            if stopped:
+                break
+        self.expired += expired
+        return sent, expired
+
+    def clear(self):
+        """清空队列"""
+        with self.lock:
+            self.conn.execute("DELETE FROM outbound")
+            self.conn.commit()
+            self.size = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+拼音模糊匹配模块
+把设备/动作关键词按拼音音节建立BK树索引，
+用于容忍语音识别的同音字、近音字错误（如"打开等"、"关闭窗连"）
+"""
+
+from functools import lru_cache
+from config import DEVICE_COMMANDS, ACTION_KEYWORDS, PHONETIC_MATCH_CONFIG
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    # 未安装pypinyin时禁用拼音模糊匹配
+    lazy_pinyin = None
+
+# 模糊音归一化规则（南方口音及识别引擎常见混淆）
+FUZZY_INITIALS = [('zh', 'z'), ('ch', 'c'), ('sh', 's'), ('n', 'l')]
+FUZZY_FINALS = [('ing', 'in'), ('eng', 'en'), ('ang', 'an')]
+
+
+def is_available():
+    """拼音库是否可用"""
+    return lazy_pinyin is not None
+
+
+def normalize_syllable(syllable):
+    """
+    模糊音归一化，使zh/z、in/ing等近音视为同一音节
+    每个音节只应用一条规则（声母优先）：同时模糊声母和韵母会让 shang 与 san 这类差异较大的音节相撞
+    """
+    syllable = syllable.lower()
+    for source, target in FUZZY_INITIALS:
+        if syllable.startswith(source):
+            return target + syllable[len(source):]
+    for source, target in FUZZY_FINALS:
+        if syllable.endswith(source):
+            return syllable[:-len(source)] + target
+    return syllable
+
+
+@lru_cache(maxsize=4096)
+def to_syllables(text):
+    """把文本转换为归一化后的拼音音节元组（不带声调）"""
+    if lazy_pinyin is None or not text:
+        return ()
+    syllables = []
+    for chunk in lazy_pinyin(text, errors='default'):
+        chunk = chunk.strip()
+        if chunk:
+            syllables.append(normalize_syllable(chunk))
+    return tuple(syllables)
+
+
+def syllable_distance(a, b):
+    """音节序列的编辑距离（插入、删除、替换代价均为1）"""
+    if a == b:
+        return 0
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+
+    previous = list(range(len(b) + 1))
+    for i, syllable_a in enumerate(a, 1):
+        current = [i]
+        for j, syllable_b in enumerate(b, 1):
+            cost = 0 if syllable_a == syllable_b else 1
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost))
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """基于编辑距离的BK树，支持有界距离的近邻查询"""
+
+    def __init__(self, distance_func=syllable_distance):
+        self.distance_func = distance_func
+        self.root = None
+        self.size = 0
+
+    def add(self, key, value):
+        """添加键值，相同键的值合并到同一节点"""
+        if self.root is None:
+            self.root = [key, [value], {}]
+            self.size += 1
+            return
+
+        node = self.root
+        while True:
+            node_key, values, children = node
+            distance = self.distance_func(key, node_key)
+            if distance == 0:
+                values.append(value)
+                return
+            child = children.get(distance)
+            if child is None:
+                children[distance] = [key, [value], {}]
+                self.size += 1
+                return
+            node = child
+
+    def search(self, key, max_distance):
+        """查找与key距离不超过max_distance的所有节点，返回[(距离, 键, 值列表)]"""
+        results = []
+        if self.root is None:
+            return results
+
+        candidates = [self.root]
+        while candidates:
+            node_key, values, children = candidates.pop()
+            distance = self.distance_func(key, node_key)
+            if distance <= max_distance:
+                results.append((distance, node_key, values))
+            low = distance - max_distance
+            high = distance + max_distance
+            for child_distance, child in children.items():
+                if low <= child_distance <= high:
+                    candidates.append(child)
+        return results
+
+
+class PhoneticKeywordIndex:
+    """设备与动作关键词的拼音索引（按音节数分桶，每桶一棵BK树）"""
+
+    def __init__(self, device_commands=None, action_keywords=None, max_distance=None):
+        self.max_distance = (PHONETIC_MATCH_CONFIG.get('max_distance', 1)
+                             if max_distance is None else max_distance)
+        self.trees = {}
+        self.exact = {}
+        self.neighbors = {}
+        self.build(DEVICE_COMMANDS if device_commands is None else device_commands,
+                   ACTION_KEYWORDS if action_keywords is None else action_keywords)
+
+    def build(self, device_commands, action_keywords):
+        """根据关键词配置重建索引"""
+        self.trees = {}
+        self.exact = {}
+        self.neighbors = {}
+        if not is_available():
+            return
+
+        for device, config in device_commands.items():
+            for keyword in config['keywords']:
+                self._add_keyword('device', device, keyword)
+        for action, keywords in action_keywords.items():
+            for keyword in keywords:
+                self._add_keyword('action', action, keyword)
+
+    def _add_keyword(self, kind, label, keyword):
+        """添加单个关键词"""
+        syllables = to_syllables(keyword)
+        if not syllables:
+            return
+        value = (kind, label, keyword)
+        self.trees.setdefault(len(syllables), BKTree()).add(syllables, value)
+        values = self.exact.setdefault(syllables, [])
+        values.append(value)
+        # 等长序列编辑距离为1即恰好替换一个音节：把每个位置换成通配符建立邻域索引
+        for i in range(len(syllables)):
+            self.neighbors.setdefault(syllables[:i] + (None,) + syllables[i + 1:], {})[syllables] = values
+
+    def allowed_distance(self, length):
+        """
+        关键词允许的最大编辑距离：两个音节及以下只允许同音，更长的最多错一半
+        （两音节窗口错一个音节时，"开始"、"书关"等日常用语就会命中"电视"、"灯光"）
+        """
+        if length <= 2:
+            return 0
+        return min(self.max_distance, length // 2)
+
+    def _lookup(self, window, allowed):
+        """查找与音节窗口近似的同长度关键词"""
+        values = self.exact.get(window)
+        found = [(0, values)] if values else []
+        if allowed == 0:
+            return found
+        if allowed == 1:
+            # 距离1只需查询每个位置的替换邻域，不遍历BK树
+            near = {}
+            for i in range(len(window)):
+                near.update(self.neighbors.get(window[:i] + (None,) + window[i + 1:], ()))
+            near.pop(window, None)
+            return found + [(1, values) for values in near.values()]
+        return [(distance, values) for distance, _, values
+                in self.trees[len(window)].search(window, allowed)]
+
+    def match(self, text):
+        """
+        在文本中查找拼音近似的关键词
+        返回: {
+            'device': [(设备, 编辑距离, 关键词, 起始音节位置), ...],
+            'action': [(动作, 编辑距离, 关键词, 起始音节位置), ...]
+        }
+        每类结果按 (距离, -关键词长度, 位置) 排序，最可信的排在最前
+        """
+        syllables = to_syllables(text)
+        if not syllables or not self.trees:
+            return {'device': [], 'action': []}
+
+        matches = {'device': {}, 'action': {}}
+        for length in self.trees:
+            allowed = self.allowed_distance(length)
+            for start in range(len(syllables) - length + 1):
+                window = syllables[start:start + length]
+                for distance, values in self._lookup(window, allowed):
+                    rank = (distance, -length, start)
+                    for kind, label, keyword in values:
+                        current = matches[kind].get(label)
+                        if current is None or rank < current[0]:
+                            matches[kind][label] = (rank, keyword)
+
+        result = {}
+        for kind, found in matches.items():
+            ordered = sorted(found.items(), key=lambda item: item[1][0])
+            result[kind] = [(label, rank[0], keyword, rank[2]) for label, (rank, keyword) in ordered]
+        return result
+
+    def penalty(self, text, keyword, distance):
+        """计算拼音匹配的置信度惩罚：同音替换有固定惩罚，每个编辑距离额外惩罚"""
+        if distance == 0 and keyword in text:
+            return 0.0
+        penalty = PHONETIC_MATCH_CONFIG.get('homophone_penalty', 0.1)
+        penalty += distance * PHONETIC_MATCH_CONFIG.get('edit_penalty', 0.15)
+        return penalty
+
+
+def substring_distance(pattern, text):
+    """pattern与text任意子串之间的最小编辑距离（半全局对齐）"""
+    if not pattern:
+        return 0
+    if not text:
+        return len(pattern)
+
+    previous = list(range(len(pattern) + 1))
+    best = previous[-1]
+    for syllable_t in text:
+        current = [0]
+        for j, syllable_p in enumerate(pattern, 1):
+            cost = 0 if syllable_p == syllable_t else 1
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost))
+        previous = current
+        best = min(best, current[-1])
+    return best
+
+
+class WakeWordMatcher:
+    """
+    唤醒词拼音匹配器
+    把转写文本及引擎返回的所有候选结果与唤醒词的拼音序列比较，
+    使"小志"、"晓智"、"小知"等同音/近音结果也能唤醒
+    """
+
+    # 敏感度为1.0时最多容忍的音节错误比例
+    MAX_ERROR_RATIO = 0.5
+
+    def __init__(self, wake_words, sensitivity=0.8):
+        self.sensitivity = sensitivity
+        self.set_wake_words(wake_words)
+
+    def set_wake_words(self, wake_words):
+        """预先计算唤醒词的拼音序列"""
+        self.wake_words = list(wake_words)
+        self.patterns = [(word, to_syllables(word)) for word in self.wake_words]
+        self.pattern_lengths = {word: max(1, len(pattern)) for word, pattern in self.patterns}
+
+    def allowed_errors(self, length, sensitivity=None):
+        """唤醒词允许的音节错误数，敏感度越高容忍度越大"""
+        sensitivity = self.sensitivity if sensitivity is None else sensitivity
+        sensitivity = max(0.0, min(1.0, sensitivity))
+        return int(length * sensitivity * self.MAX_ERROR_RATIO + 1e-9)
+
+    def score(self, text):
+        """
+        计算文本与各唤醒词的最佳匹配
+        返回: (唤醒词, 音节编辑距离, 相似度)，无唤醒词时返回 (None, None, 0.0)
+        """
+        best = (None, None, 0.0)
+        if not text:
+            return best
+
+        text_lower = text.lower()
+        syllables = to_syllables(text)
+        for word, pattern in self.patterns:
+            if word.lower() in text_lower:
+                return word, 0, 1.0
+            if not pattern or not syllables:
+                continue
+            distance = substring_distance(pattern, syllables)
+            similarity = 1.0 - distance / len(pattern)
+            if similarity > best[2]:
+                best = (word, distance, similarity)
+        return best
+
+    def match(self, hypotheses, sensitivity=None):
+        """
+        在转写结果（字符串或n-best候选列表）中查找唤醒词
+        返回: {
+            'wake_word': 匹配的唤醒词,
+            'text': 命中的候选文本,
+            'hypothesis_index': 候选序号,
+            'distance': 音节编辑距离,
+            'similarity': 相似度
+        }，未命中时返回None
+        """
+        if isinstance(hypotheses, str):
+            hypotheses = [hypotheses]
+
+        best = None
+        for index, text in enumerate(hypotheses):
+            word, distance, similarity = self.score(text)
+            if word is None:
+                continue
+            if distance > self.allowed_errors(self.pattern_lengths[word], sensitivity):
+                continue
+            if best is None or similarity > best['similarity']:
+                best = {
+                    'wake_word': word,
+                    'text': text,
+                    'hypothesis_index': index,
+                    'distance': distance,
+                    'similarity': similarity
+                }
+                if similarity == 1.0:
+                    break
+        return best
+
+
+def evaluate_wake_word_matcher(matcher, samples, sensitivity=None):
+    """
+    在标注数据集上评估唤醒词匹配器
+    samples中每条为 {'hypotheses': [候选文本...] 或 'text': 文本, 'label': 是否包含唤醒词}
+    返回检测率与误报率
+    """
+    stats = {'positives': 0, 'negatives': 0, 'detected': 0, 'false_positives': 0}
+    for sample in samples:
+        hypotheses = sample.get('hypotheses') or [sample.get('text', '')]
+        matched = matcher.match(hypotheses, sensitivity) is not None
+        if sample['label']:
+            stats['positives'] += 1
+            stats['detected'] += int(matched)
+        else:
+            stats['negatives'] += 1
+            stats['false_positives'] += int(matched)
+
+    stats['detection_rate'] = stats['detected'] / max(1, stats['positives'])
+    stats['false_positive_rate'] = stats['false_positives'] / max(1, stats['negatives'])
+    return stats
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+发布限速模块
+令牌桶分别限制整个连接和单个主题的发布速率，避免被巴法云限流断线；
+语音和手动指令走交互通道，优先于后台自动化指令发送
+"""
+
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+# 优先级通道（数值越小越优先）
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+LANE_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BACKGROUND: 'background'}
+
+
+class TokenBucket:
+    """令牌桶：rate为每秒补充的令牌数，burst为桶容量"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now):
+        """还需等待多久才有一个令牌（秒）"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class PriorityRateLimiter:
+    """带优先级通道的发布限速器"""
+
+    def __init__(self, send, connection_rate=10.0, connection_burst=20, topic_rate=2.0, topic_burst=5,
+                 sample_size=1000):
+        """send(topic, payload, qos): 实际发送函数"""
+        self.send = send
+        self.connection_bucket = TokenBucket(connection_rate, connection_burst)
+        self.topic_rate = topic_rate
+        self.topic_burst = topic_burst
+        self.topic_buckets = {}
+        self.lanes = {priority: deque() for priority in LANE_NAMES}
+        self.wait_samples = {priority: deque(maxlen=sample_size) for priority in LANE_NAMES}
+        self.condition = threading.Condition()
+        self.worker = None
+        self.stopped = False
+
+    def _topic_bucket(self, topic):
+        bucket = self.topic_buckets.get(topic)
+        if bucket is None:
+            bucket = self.topic_buckets[topic] = TokenBucket(self.topic_rate, self.topic_burst)
+        return bucket
+
+    def _wait_time(self, topic, now):
+        """发送该主题的一条消息还需等待的时间（调用方持有锁）"""
+        return max(self.connection_bucket.wait_time(now), self._topic_bucket(topic).wait_time(now))
+
+    def _consume(self, topic, now):
+        self.connection_bucket.consume(now)
+        self._topic_bucket(topic).consume(now)
+
+    def submit(self, topic, payload, qos=None, priority=PRIORITY_INTERACTIVE):
+        """
+        提交一条消息
+        没有排队且令牌充足时直接在调用线程中发送并返回发送结果，否则排队并返回True
+        """
+        if priority not in self.lanes:
+            priority = PRIORITY_BACKGROUND
+        now = time.monotonic()
+        with self.condition:
+            queued = any(self.lanes.values())
+            if not queued and self._wait_time(topic, now) == 0:
+                self._consume(topic, now)
+                self.wait_samples[priority].append(0.0)
+                send_now = True
+            else:
+                self.lanes[priority].append((topic, payload, qos, now))
+                self._ensure_worker()
+                self.condition.notify()
+                send_now = False
+        if send_now:
+            return self.send(topic, payload, qos)
+        return True
+
+    def _next_sendable(self, now):
+        """
+        选出下一条可发送的消息（调用方持有锁）
+        按优先级查看各通道队首；返回 (消息, 优先级) 或 (None, 最短等待时间)
+        """
+        shortest = None
+        for priority in sorted(self.lanes):
+            lane = self.lanes[priority]
+            if not lane:
+                continue
+            wait = self._wait_time(lane[0][0], now)
+            if wait == 0:
+                return lane.popleft(), priority
+            shortest = wait if shortest is None else min(shortest, wait)
+            if self.connection_bucket.wait_time(now) > 0:
+                # 整个连接都没有令牌时，低优先级通道也不能发送
+                break
+        return None, shortest
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and not any(self.lanes.values()):
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                now = time.monotonic()
+                item, result = self._next_sendable(now)
+                if item is None:
+                    self.condition.wait(result)
+                    continue
+                topic, payload, qos, enqueued_at = item
+                self._consume(topic, now)
+                self.wait_samples[result].append(now - enqueued_at)
+            try:
+                self.send(topic, payload, qos)
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] 限速发送出错: {e}")
+
+    def _ensure_worker(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.stopped = False
+            self.worker = threading.Thread(target=self._run, daemon=True)
+            self.worker.start()
+
+    def set_rates(self, connection_rate, connection_burst, topic_rate, topic_burst):
+        """修改限速参数（已有的主题令牌桶同步更新）"""
+        with self.condition:
+            self.connection_bucket.rate, self.connection_bucket.burst = connection_rate, connection_burst
+            self.topic_rate, self.topic_burst = topic_rate, topic_burst
+            for bucket in self.topic_buckets.values():
+                bucket.rate, bucket.burst = topic_rate, topic_burst
+            self.condition.notify()
+
+    def get_stats(self):
+        """各通道排队数与等待时间（毫秒）"""
+        stats = {}
+        with self.condition:
+            for priority, name in LANE_NAMES.items():
+                samples = sorted(self.wait_samples[priority])
+                stats[name] = {
+                    'queued': len(self.lanes[priority]),
+                    'samples': len(samples),
+                    'avg_wait_ms': sum(samples) / len(samples) * 1000 if samples else 0.0,
+                    'p95_wait_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000 if samples else 0.0,
+                    'max_wait_ms': samples[-1] * 1000 if samples else 0.0,
+                }
+        return stats
+
+    def stop(self):
+        """停止后台线程（排队中的消息被丢弃）"""
+        with self.condition:
+            self.stopped = True
+            for lane in self.lanes.values():
+                lane.clear()
+            self.condition.notify()
+        if self.worker and self.worker is not threading.current_thread():
+            self.worker.join(timeout=2)
+        self.worker = None
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+主题路由模块
+用前缀树保存订阅过滤器（支持MQTT通配符 '+' 和 '#'），
+收到消息时按主题层级逐级匹配，查找处理函数的开销只与主题层数有关，与已注册的过滤器数量无关
+"""
+
+import threading
+from datetime import datetime
+
+SINGLE_LEVEL = '+'
+MULTI_LEVEL = '#'
+
+
+def validate_filter(topic_filter):
+    """检查订阅过滤器是否合法：'+' 和 '#' 必须独占一层，'#' 只能在最后一层"""
+    if not topic_filter:
+        raise ValueError("订阅主题不能为空")
+    levels = topic_filter.split('/')
+    for index, level in enumerate(levels):
+        if MULTI_LEVEL in level and (level != MULTI_LEVEL or index != len(levels) - 1):
+            raise ValueError(f"通配符 '#' 只能单独出现在最后一层: {topic_filter}")
+        if SINGLE_LEVEL in level and level != SINGLE_LEVEL:
+            raise ValueError(f"通配符 '+' 必须单独占一层: {topic_filter}")
+    return levels
+
+
+def has_wildcard(topic_filter):
+    return SINGLE_LEVEL in topic_filter or MULTI_LEVEL in topic_filter
+
+
+def topic_matches(topic_filter, topic):
+    """判断主题是否匹配订阅过滤器（单次判断用，批量匹配请使用 TopicRouter）"""
+    filter_levels = validate_filter(topic_filter)
+    topic_levels = topic.split('/')
+    if topic.startswith('$') and filter_levels[0] in (SINGLE_LEVEL, MULTI_LEVEL):
+        return False
+    for index, level in enumerate(filter_levels):
+        if level == MULTI_LEVEL:
+            return True
+        if index >= len(topic_levels) or (level != SINGLE_LEVEL and level != topic_levels[index]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class _Node:
+    __slots__ = ('children', 'handlers')
+
+    def __init__(self):
+        self.children = {}
+        self.handlers = []
+
+
+class TopicRouter:
+    """按订阅过滤器分发消息的前缀树"""
+
+    def __init__(self):
+        self.root = _Node()
+        self.lock = threading.Lock()
+        self.filters = {}  # 过滤器 -> 处理函数数量
+
+    def __len__(self):
+        return len(self.filters)
+
+    def __contains__(self, topic_filter):
+        return topic_filter in self.filters
+
+    def add(self, topic_filter, handler):
+        """注册处理函数，同一过滤器可以注册多个处理函数"""
+        levels = validate_filter(topic_filter)
+        with self.lock:
+            node = self.root
+            for level in levels:
+                child = node.children.get(level)
+                if child is None:
+                    child = node.children[level] = _Node()
+                node = child
+            if handler not in node.handlers:
+                # 复制后替换，匹配时无需加锁
+                node.handlers = node.handlers + [handler]
+                self.filters[topic_filter] = len(node.handlers)
+
+    def remove(self, topic_filter, handler=None):
+        """移除处理函数（handler为None时移除该过滤器的全部处理函数），返回过滤器是否已无处理函数"""
+        levels = validate_filter(topic_filter)
+        with self.lock:
+            path = [self.root]
+            for level in levels:
+                child = path[-1].children.get(level)
+                if child is None:
+                    return topic_filter not in self.filters
+                path.append(child)
+            node = path[-1]
+            if handler is None:
+                node.handlers = []
+            else:
+                node.handlers = [h for h in node.handlers if h != handler]
+            if node.handlers:
+                self.filters[topic_filter] = len(node.handlers)
+                return False
+            self.filters.pop(topic_filter, None)
+            # 清理不再使用的分支
+            for depth in range(len(levels), 0, -1):
+                child = path[depth]
+                if child.children or child.handlers:
+                    break
+                del path[depth - 1].children[levels[depth - 1]]
+            return True
+
+    def match(self, topic):
+        """返回与主题匹配的全部处理函数（按注册顺序去重）"""
+        levels = topic.split('/')
+        matched = []
+        # '$' 开头的系统主题不匹配首层通配符
+        wildcard_first = not topic.startswith('$')
+        nodes = [self.root]
+        for depth, level in enumerate(levels):
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+                if not children:
+                    continue
+                if wildcard_first or depth > 0:
+                    multi = children.get(MULTI_LEVEL)
+                    if multi is not None:
+                        matched.extend(multi.handlers)
+                    single = children.get(SINGLE_LEVEL)
+                    if single is not None:
+                        next_nodes.append(single)
+                exact = children.get(level)
+                if exact is not None:
+                    next_nodes.append(exact)
+            if not next_nodes:
+                break
+            nodes = next_nodes
+        else:
+            for node in nodes:
+                matched.extend(node.handlers)
+                # 'a/#' 同时匹配 'a' 本身
+                multi = node.children.get(MULTI_LEVEL)
+                if multi is not None:
+                    matched.extend(multi.handlers)
+        if len(matched) > 1:
+            unique = []
+            for handler in matched:
+                if handler not in unique:
+                    unique.append(handler)
+            return unique
+        return matched
+
+    def dispatch(self, topic, *args):
+        """把消息分发给所有匹配的处理函数，返回调用的处理函数数量"""
+        handlers = self.match(topic)
+        for handler in handlers:
+            try:
+                handler(*args)
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] 主题 {topic} 的消息处理函数出错: {e}")
+        return len(handlers)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+界面更新队列模块
+语音线程、MQTT网络线程和指令执行线程都不直接操作Tk控件，只把更新放入队列；
+界面线程用 after() 定时取出：日志行合并成一次插入，状态更新只保留每个状态的最新值；
+日志行、函数调用和状态更新按提交顺序执行（状态在其第一次未处理的更新所在位置应用最新值）
+"""
+
+import threading
+from collections import deque
+
+# 队列中的条目类型
+ITEM_LOG = 0
+ITEM_CALL = 1
+ITEM_STATUS = 2
+
+
+class UIUpdateQueue:
+    """线程安全的界面更新队列，由界面线程定时批量处理"""
+
+    def __init__(self, scheduler, append_lines, interval=0.05, max_batch=500, max_pending=5000):
+        """
+        scheduler(ms, callback): 在界面线程中延迟调用，通常为 root.after
+        append_lines(lines): 一次追加多行日志（界面线程中调用）
+        interval: 处理间隔（秒）
+        max_batch: 每次最多处理的条目数，其余留到下一次，避免一次卡住界面
+        max_pending: 积压日志行的上限，超出时丢弃最早的日志行
+        """
+        self.scheduler = scheduler
+        self.append_lines = append_lines
+        self.interval = interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.items = deque()  # (类型, 内容)，日志行、函数调用与状态更新保持提交顺序
+        self.statuses = {}  # 状态名 -> (callback, args)，只保留最新值；队列中有对应的 ITEM_STATUS 条目
+        self.pending_logs = 0
+        self.lock = threading.Lock()
+        self.running = False
+        # 统计
+        self.logs_posted = 0
+        self.logs_dropped = 0
+        self.statuses_posted = 0
+        self.statuses_applied = 0
+        self.ticks = 0
+        self.inserts = 0
+
+    def log(self, line):
+        """追加一行日志（任意线程）"""
+        with self.lock:
+            self.logs_posted += 1
+            if self.pending_logs >= self.max_pending:
+                self._drop_oldest_log()
+            self.items.append((ITEM_LOG, line))
+            self.pending_logs += 1
+
+    def _drop_oldest_log(self):
+        for index, (kind, _) in enumerate(self.items):
+            if kind == ITEM_LOG:
+                del self.items[index]
+                self.pending_logs -= 1
+                self.logs_dropped += 1
+                return
+
+    def set_status(self, name, callback, *args):
+        """更新名为 name 的状态（任意线程）；处理前的多次更新只在第一次的位置应用最后一次的值"""
+        with self.lock:
+            self.statuses_posted += 1
+            if name not in self.statuses:
+                self.items.append((ITEM_STATUS, name))
+            self.statuses[name] = (callback, args)
+
+    def post(self, callback, *args):
+        """在界面线程中调用 callback(*args)（任意线程），与日志行按提交顺序执行"""
+        with self.lock:
+            self.items.append((ITEM_CALL, (callback, args)))
+
+    def start(self):
+        """开始定时处理（界面线程）"""
+        if not self.running:
+            self.running = True
+            self.scheduler(int(self.interval * 1000), self._tick)
+
+    def stop(self):
+        self.running = False
+
+    def _tick(self):
+        if not self.running:
+            return
+        try:
+            self.drain()
+        finally:
+            self.scheduler(int(self.interval * 1000), self._tick)
+
+    def drain(self):
+        """处理积压的更新（界面线程），返回处理的日志行数"""
+        with self.lock:
+            count = min(len(self.items), self.max_batch)
+            items = []
+            for _ in range(count):
+                kind, payload = self.items.popleft()
+                if kind == ITEM_STATUS:
+                    # 取出状态的最新值，之后的更新重新排队
+                    kind, payload = ITEM_CALL, self.statuses.pop(payload)
+                    self.statuses_applied += 1
+                elif kind == ITEM_LOG:
+                    self.pending_logs -= 1
+                items.append((kind, payload))
+            self.ticks += 1
+        lines = []
+        logged = 0
+        for kind, payload in items:
+            if kind == ITEM_LOG:
+                lines.append(payload)
+                continue
+            if lines:
+                logged += self._flush(lines)
+                lines = []
+            self._call(*payload)
+        if lines:
+            logged += self._flush(lines)
+        return logged
+
+    @staticmethod
+    def _call(callback, args):
+        # 单个更新出错不影响同一批的其他更新
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"界面更新失败: {e}")
+
+    def _flush(self, lines):
+        # 与 _call 相同：插入出错不影响同一批的其他更新，也不中断定时处理
+        try:
+            self.append_lines(lines)
+            self.inserts += 1
+        except Exception as e:
+            print(f"界面更新失败: {e}")
+        return len(lines)
+
+    def get_stats(self):
+        """队列统计"""
+        with self.lock:
+            return {
+                'pending': len(self.items),
+                'pending_logs': self.pending_logs,
+                'pending_statuses': len(self.statuses),
+                'logs_posted': self.logs_posted,
+                'logs_dropped': self.logs_dropped,
+                'statuses_posted': self.statuses_posted,
+                'statuses_applied': self.statuses_applied,
+                'ticks': self.ticks,
+                'inserts': self.inserts,
+            }
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio MQTT客户端测试脚本
+使用进程内的本地MQTT服务器（可通过环境变量 MQTT_TEST_BROKER=host:port 指定外部服务器）
+"""
+
+import sys
+import os
+import time
+import socket
+import asyncio
+import threading
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from async_mqtt_client import AsyncMQTTClient
+from mqtt_broker import BrokerThread
+from test_mqtt_publish import broker_address, require_broker
+
+
+def make_client(name, topics=()):
+    host, port = broker_address()
+    return AsyncMQTTClient(client_id=f'test_async_{name}_{os.getpid()}', broker=host, port=port,
+                           topics=list(topics))
+
+
+def test_publish_and_iterate():
+    """测试发布确认与异步迭代接收消息"""
+    print("=== 测试发布与接收 ===")
+    require_broker()
+
+    async def scenario():
+        threads = threading.active_count()
+        client = make_client('pubsub', ['async/+/light'])
+        await client.connect()
+        try:
+            # 连接后订阅在后台完成，这里再订阅一次以等待SUBACK
+            granted = await client.subscribe('async/+/light', 'async/fan', qos=0)
+            assert granted == [0, 0], granted
+            result = await client.publish('async/bedroom/light', 'on', qos=1)
+            assert result['qos'] == 1 and result['latency'] >= 0
+            await client.publish('async/fan', 'off', qos=0)
+
+            received = []
+            async for record in client:
+                received.append((record.topic, record.payload))
+                if len(received) == 2:
+                    break
+            assert received == [('async/bedroom/light', 'on'), ('async/fan', 'off')], received
+            assert threading.active_count() <= threads + 1  # 只有连接时用到的线程池线程
+        finally:
+            await client.disconnect()
+
+    asyncio.run(scenario())
+    print("✅ QoS1发布收到确认，消息按顺序异步迭代")
+
+
+def test_pipelined_publish():
+    """测试大量并发发布在一个事件循环上完成"""
+    print("=== 测试并发发布 ===")
+    require_broker()
+
+    async def scenario():
+        client = make_client('pipeline')
+        await client.connect()
+        try:
+            start = time.perf_counter()
+            results = await asyncio.gather(*(client.publish('async/pipeline', str(i), qos=1) for i in range(500)))
+            elapsed = time.perf_counter() - start
+            assert len({result['mid'] for result in results}) == 500
+            stats = client.get_stats()
+            assert stats['in_flight'] == 0 and stats['ack_count'] >= 500
+            return elapsed, stats
+
+        finally:
+            await client.disconnect()
+
+    elapsed, stats = asyncio.run(scenario())
+    print(f"✅ 500条QoS1消息 {elapsed * 1000:.0f} ms 全部确认，p95 {stats['p95_ms']:.1f} ms")
+
+
+def test_reconnect():
+    """测试断线后自动重连并恢复订阅"""
+    print("=== 测试自动重连 ===")
+    require_broker()
+
+    async def scenario():
+        client = make_client('reconnect', ['async/reconnect'])
+        client.backoff.min_delay = 0.05
+        await client.connect()
+        try:
+            await client.subscribe('async/reconnect')
+            client.client.socket().shutdown(socket.SHUT_RDWR)
+            await asyncio.sleep(0.05)
+            # 重连期间的发布等待连接恢复
+            await client.publish('async/reconnect', 'after', qos=1, timeout=5)
+            record = await client.next_message(timeout=5)
+            assert record.payload == 'after'
+            assert client.reconnect_count == 1
+        finally:
+            await client.disconnect()
+
+    asyncio.run(scenario())
+    print("✅ 断线后自动重连，订阅恢复")
+
+
+class DroppingServer:
+    """接受TCP连接后立即关闭、从不发送CONNACK的服务器（模拟正在重启的服务器）"""
+
+    def __init__(self, host, port):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen()
+        self.sock.settimeout(0.1)
+        self.accepted = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                continue
+            self.accepted += 1
+            conn.close()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
+
+
+def test_reconnect_after_dropped_connack():
+    """测试服务器在CONNACK之前关闭连接时重连不会卡住，服务器恢复后重新连上"""
+    print("=== 测试CONNACK前断开 ===")
+
+    async def scenario():
+        broker = BrokerThread('127.0.0.1', 0)
+        host, port = broker.start()
+        client = AsyncMQTTClient(client_id=f'test_async_drop_{os.getpid()}', broker=host, port=port,
+                                 topics=[], connect_timeout=1.0)
+        client.backoff.min_delay = 0.05
+        client.backoff.max_delay = 0.2
+        await client.connect()
+        fake = None
+        try:
+            broker.stop()
+            fake = DroppingServer(host, port)
+            deadline = time.monotonic() + 5
+            while fake.accepted < 3 and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            # 每次重连都在CONNACK之前被断开，重连任务仍在按退避策略继续
+            assert fake.accepted >= 3 and not client.is_connected
+            fake.stop()
+            fake = None
+
+            broker = BrokerThread(host, port)
+            broker.start()
+            await client.wait_connected(timeout=5)
+            assert client.reconnect_count == 1
+            result = await client.publish('async/drop', 'back', qos=1, timeout=5)
+            assert result['qos'] == 1
+
+            # 首次连接遇到同样的服务器时直接报错，不会一直等待
+            other = AsyncMQTTClient(client_id=f'test_async_drop2_{os.getpid()}', broker=host, port=port,
+                                    topics=[], auto_reconnect=False)
+            broker.stop()
+            fake = DroppingServer(host, port)
+            started = time.monotonic()
+            try:
+                await other.connect(timeout=5)
+                assert False, "应连接失败"
+            except ConnectionError:
+                pass
+            assert time.monotonic() - started < 1.0
+        finally:
+            await client.disconnect()
+            if fake is not None:
+                fake.stop()
+            broker.stop()
+
+    asyncio.run(scenario())
+    print("✅ CONNACK前被断开时继续重连，服务器恢复后重新连上")
+
+
+def main():
+    """主测试函数"""
+    print("⚡ asyncio MQTT客户端测试")
+    print("=" * 50)
+
+    tests = [
+        test_publish_and_iterate,
+        test_pipelined_publish,
+        test_reconnect,
+        test_reconnect_after_dropped_connack,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+指令执行确认测试脚本
+带模拟设备的测试使用进程内的本地MQTT服务器（可通过环境变量 MQTT_TEST_BROKER=host:port 指定外部服务器）
+"""
+
+import sys
+import os
+import time
+import threading
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import paho.mqtt.client as mqtt
+from command_confirmation import ConfirmationTracker, wait_for_confirmation
+from test_mqtt_publish import broker_address, require_broker, connected_client
+
+
+class SimulatedDevice:
+    """模拟ESP8266设备：收到指令后延迟一段时间在状态主题上报，可设置忽略前几条指令"""
+
+    def __init__(self, topic, delay=0.05, ignore_first=0):
+        self.topic = topic
+        self.delay = delay
+        self.ignore_first = ignore_first
+        self.commands = []
+        self.client = mqtt.Client(f'test_device_{os.getpid()}_{topic}')
+        self.client.on_message = self.on_message
+        subscribed = threading.Event()
+        self.client.on_subscribe = lambda *args: subscribed.set()
+        self.client.on_connect = lambda client, *args: client.subscribe(topic)
+        host, port = broker_address()
+        self.client.connect(host, port)
+        self.client.loop_start()
+        assert subscribed.wait(5), "模拟设备订阅失败"
+
+    def on_message(self, client, userdata, msg):
+        payload = msg.payload.decode('utf-8')
+        self.commands.append(payload)
+        if len(self.commands) <= self.ignore_first:
+            return
+        threading.Timer(self.delay, client.publish, (f'{self.topic}/state', payload)).start()
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+def test_tracker_matching():
+    """测试上报与指令目标状态的匹配"""
+    print("=== 测试上报匹配 ===")
+    tracker = ConfirmationTracker('{topic}/state')
+    assert tracker.subscription_filter() == '+/state'
+    assert tracker.device_topic_for('light001/state') == 'light001'
+    assert tracker.device_topic_for('light001') is None
+
+    pending = tracker.expect('aircon001', 'on#26')
+    assert tracker.on_report('aircon001', 'off') == 0
+    assert tracker.on_report('aircon001', 'on#24') == 0
+    assert tracker.on_report('aircon001', 'on#26') == 1
+    assert pending.event.is_set() and pending.reported == 'on#26'
+
+    # 开关指令只比较电源状态，'1' 与 'on' 等价
+    pending = tracker.expect('light001', '1')
+    assert tracker.on_report('light001', 'on#80') == 1
+    print("✅ 电源状态和参数一致才确认")
+
+
+def test_retry_until_deadline():
+    """测试未确认时重发，达到次数后放弃"""
+    print("=== 测试重发 ===")
+    tracker = ConfirmationTracker()
+    sends = []
+    retries = []
+
+    def send():
+        sends.append(time.perf_counter())
+        if len(sends) == 2:
+            threading.Timer(0.01, tracker.on_report, ('fan001', 'on')).start()
+        return True
+
+    result = wait_for_confirmation(tracker, 'fan001', 'on', send, timeout=0.05, max_attempts=3,
+                                   before_retry=lambda: retries.append(True))
+    assert result.confirmed and result.attempts == 2 and len(retries) == 1
+
+    result = wait_for_confirmation(tracker, 'fan001', 'off', lambda: True, timeout=0.02, max_attempts=3)
+    assert result.sent and not result.confirmed and result.attempts == 3
+    assert bool(result)
+
+    result = wait_for_confirmation(tracker, 'fan001', 'off', lambda: False, timeout=0.02, max_attempts=3)
+    assert not result.sent and result.attempts == 1 and not bool(result)
+
+    stats = tracker.get_stats()
+    assert stats['confirmed'] == 1 and stats['unconfirmed'] == 1 and stats['retries'] == 3
+    assert stats['waiting'] == 0
+    print(f"✅ 第2次发送后确认，未确认时发送 3 次后放弃")
+
+
+def test_simulated_device():
+    """测试通过本地服务器与模拟设备确认执行"""
+    print("=== 测试模拟设备确认 ===")
+    require_broker()
+    device = SimulatedDevice('light001', delay=0.05)
+    flaky = SimulatedDevice('fan001', delay=0.02, ignore_first=1)
+    client = connected_client()
+    try:
+        client.subscribe(client.confirmation.subscription_filter(), client._on_state_report)
+        time.sleep(0.2)
+
+        result = client.publish_confirmed('light001', 'on', timeout=1.0, max_attempts=2)
+        assert result.confirmed and result.attempts == 1, result
+        assert result.latency >= 0.05
+        assert client.device_shadow.power('light001') is True
+        assert client.device_shadow.get('light001').source == 'reported'
+
+        # 设备丢掉第一条指令，重发后确认
+        result = client.publish_confirmed('fan001', 'on', timeout=0.3, max_attempts=3)
+        assert result.confirmed and result.attempts == 2, result
+        assert flaky.commands == ['on', 'on']
+
+        # 没有设备的主题不会被确认
+        result = client.publish_confirmed('tv001', 'on', timeout=0.1, max_attempts=2)
+        assert result.sent and not result.confirmed and result.attempts == 2
+
+        stats = client.get_confirmation_stats()
+        assert stats['confirmed'] == 2 and stats['unconfirmed'] == 1
+        print(f"✅ 确认耗时 {stats['confirmed_latency']['avg_ms']:.0f}ms，"
+              f"未确认放弃耗时 {stats['unconfirmed_latency']['max_ms']:.0f}ms")
+    finally:
+        client.disconnect()
+        device.close()
+        flaky.close()
+
+
+def main():
+    """主测试函数"""
+    print("📬 指令执行确认测试")
+    print("=" * 50)
+
+    tests = [
+        test_tracker_matching,
+        test_retry_until_deadline,
+        test_simulated_device,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
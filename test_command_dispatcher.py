@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+指令合并分发测试脚本
+"""
+
+import sys
+import os
+import time
+import threading
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from command_dispatcher import CoalescingDispatcher
+from config import MQTT_CONFIG
+from mqtt_client import MQTTClient
+
+
+class RecordingSender:
+    """记录实际发送的指令"""
+
+    def __init__(self, result=True):
+        self.sent = []
+        self.result = result
+        self.event = threading.Event()
+
+    def __call__(self, topic, payload, qos, priority=None):
+        self.sent.append((topic, payload))
+        self.event.set()
+        return self.result
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.005)
+    return predicate()
+
+
+def test_collapse_within_window():
+    """测试第一条立即发送，窗口内其余指令只发送最后一条"""
+    print("=== 测试窗口内合并 ===")
+    sender = RecordingSender()
+    dispatcher = CoalescingDispatcher(sender, default_window=0.05)
+    dispatcher.submit('light001', 'on')
+    assert sender.sent == [('light001', 'on')]
+    for payload in ['off', 'on', 'off', 'on']:
+        dispatcher.submit('light001', payload)
+    assert wait_until(lambda: len(sender.sent) == 2)
+    time.sleep(0.1)
+    assert sender.sent == [('light001', 'on'), ('light001', 'on')]
+    stats = dispatcher.get_stats()
+    assert stats['collapsed'] == 3 and stats['collapsed_by_topic'] == {'light001': 3}
+    assert stats['sent'] == 2 and stats['pending'] == 0
+
+    # 窗口结束后的新指令在调用线程中直接发送
+    dispatcher.submit('light001', 'off')
+    assert len(sender.sent) == 3
+    dispatcher.stop()
+    print("✅ 5条连续指令发送2条（首条与窗口结束时的最后一条），合并数 3")
+
+
+def test_cross_topic_order():
+    """测试排队指令按首次进入队列的顺序发送，合并不改变顺序"""
+    print("\n=== 测试跨主题顺序 ===")
+    sender = RecordingSender()
+    dispatcher = CoalescingDispatcher(sender, default_window=0.05, topic_windows={'fan001': 0})
+    dispatcher.submit('light001', 'on')
+    dispatcher.submit('light001', 'off')  # 窗口内，排队
+    dispatcher.submit('tv001', 'on')  # 前面有排队指令，不能越过
+    dispatcher.submit('fan001', 'on')  # 无合并窗口，同样排在后面
+    dispatcher.submit('light001', 'on')  # 合并到已排队的指令，位置不变
+    assert wait_until(lambda: len(sender.sent) == 4)
+    assert sender.sent == [('light001', 'on'), ('light001', 'on'), ('tv001', 'on'), ('fan001', 'on')], sender.sent
+    dispatcher.stop()
+    print("✅ 发送顺序: " + " -> ".join(f"{t}:{p}" for t, p in sender.sent))
+
+
+def test_zero_window_immediate():
+    """测试无合并窗口且无排队时直接发送"""
+    print("\n=== 测试直接发送 ===")
+    sender = RecordingSender()
+    dispatcher = CoalescingDispatcher(sender, default_window=0)
+    assert dispatcher.submit('tv001', 'on')
+    assert sender.sent == [('tv001', 'on')]
+    assert dispatcher.worker is None
+    print("✅ 窗口为0时在调用线程中直接发送")
+
+
+def test_leading_result():
+    """测试窗口内第一条返回实际发送结果"""
+    print("\n=== 测试发送结果 ===")
+    dispatcher = CoalescingDispatcher(RecordingSender(result=False), default_window=0.05)
+    assert dispatcher.submit('tv001', 'on') is False
+    dispatcher.stop(flush=False)
+
+    saved = dict(MQTT_CONFIG)
+    MQTT_CONFIG.update({'broker': '127.0.0.1', 'port': 1, 'client_id': f'test_dispatch_{os.getpid()}',
+                        'use_private_key': True, 'username': '', 'password': ''})
+    try:
+        client = MQTTClient(queue_path=':memory:', archive_dir='')
+    finally:
+        MQTT_CONFIG.clear()
+        MQTT_CONFIG.update(saved)
+    # 未连接且不在重连中：拒绝指令，不进入合并窗口
+    assert client.publish_message('tv001', 'on') is False
+    assert client.get_coalesce_stats()['submitted'] == 0
+    print("✅ 发送失败和未连接时返回False")
+
+
+def test_flush():
+    """测试立即发送全部待发送指令"""
+    print("\n=== 测试立即发送 ===")
+    sender = RecordingSender()
+    dispatcher = CoalescingDispatcher(sender, default_window=10)
+    dispatcher.submit('light001', 'on')
+    dispatcher.submit('light001', 'off')
+    dispatcher.submit('light002', 'on')
+    assert sender.sent == [('light001', 'on')]
+    dispatcher.flush()
+    assert sender.sent == [('light001', 'on'), ('light001', 'off'), ('light002', 'on')]
+    dispatcher.stop()
+    print("✅ flush 按顺序发送所有待发送指令")
+
+
+def main():
+    """主测试函数"""
+    print("🧹 指令合并分发测试")
+    print("=" * 50)
+
+    tests = [
+        test_collapse_within_window,
+        test_cross_topic_order,
+        test_zero_window_immediate,
+        test_leading_result,
+        test_flush,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
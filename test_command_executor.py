@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+设备指令执行器测试脚本
+"""
+
+import sys
+import os
+import time
+import threading
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from command_executor import CommandExecutor, CommandExpired, CommandRejected
+
+
+def test_ordered_per_device():
+    """测试同一设备按顺序执行，不同设备并行"""
+    print("=== 测试通道顺序与并行 ===")
+    executor = CommandExecutor(max_workers=4)
+    order = []
+    lock = threading.Lock()
+
+    def slow_publish(topic, payload):
+        time.sleep(0.05)
+        with lock:
+            order.append((topic, payload))
+        return True
+
+    start = time.perf_counter()
+    futures = [executor.submit(topic, slow_publish, topic, str(i))
+               for i in range(3) for topic in ('light001', 'tv001', 'fan001')]
+    assert all(future.result(timeout=2) for future in futures)
+    elapsed = time.perf_counter() - start
+    for topic in ('light001', 'tv001', 'fan001'):
+        assert [p for t, p in order if t == topic] == ['0', '1', '2']
+    # 3个设备各3条，每条50ms，并行时约150ms
+    assert elapsed < 0.35, f"耗时 {elapsed:.2f}s，设备之间没有并行"
+    executor.shutdown()
+    print(f"✅ 9条指令耗时 {elapsed * 1000:.0f} ms，每个设备内部保持顺序")
+
+
+def test_capacity_and_deadline():
+    """测试队列上限与截止时间"""
+    print("\n=== 测试队列上限与截止时间 ===")
+    executor = CommandExecutor(max_workers=1, lane_capacity=2)
+    gate = threading.Event()
+    blocker = executor.submit('aircon001', gate.wait)
+    time.sleep(0.02)
+    queued = executor.submit('aircon001', lambda: True, deadline=0.01)
+    also_queued = executor.submit('aircon001', lambda: True)
+    rejected = executor.submit('aircon001', lambda: True)
+    assert isinstance(rejected.exception(timeout=1), CommandRejected)
+
+    time.sleep(0.05)
+    gate.set()
+    assert blocker.result(timeout=1)
+    assert isinstance(queued.exception(timeout=1), CommandExpired)
+    assert also_queued.result(timeout=1) is True
+    stats = executor.get_stats()
+    assert stats['rejected'] == 1 and stats['expired'] == 1 and stats['completed'] == 2
+    executor.shutdown()
+    print("✅ 队列满时拒绝，超时未执行的指令被丢弃")
+
+
+def test_callback_scheduler():
+    """测试完成回调经调度函数执行（界面中为 root.after）"""
+    print("\n=== 测试完成回调 ===")
+    scheduled = []
+    executor = CommandExecutor(callback_scheduler=scheduled.append)
+    results = []
+    future = executor.submit('tv001', lambda: 'ok', callback=lambda f: results.append(f.result()))
+    future.result(timeout=1)
+    deadline = time.time() + 1
+    while not scheduled and time.time() < deadline:
+        time.sleep(0.005)
+    assert results == [], "回调不应在执行线程中直接运行"
+    for callback in scheduled:
+        callback()
+    assert results == ['ok']
+    executor.shutdown()
+    print("✅ 完成回调交给调度函数在界面线程执行")
+
+
+def main():
+    """主测试函数"""
+    print("⚙️ 设备指令执行器测试")
+    print("=" * 50)
+
+    tests = [
+        test_ordered_per_device,
+        test_capacity_and_deadline,
+        test_callback_scheduler,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -98,7 +98,7 @@ def test_mqtt_client():
         
         # 测试配置验证
         try:
-            client = MQTTClient()
+            client = MQTTClient(queue_path=':memory:', archive_dir='')
             print("❌ 应该检测到配置错误，但没有")
             return False
         except ValueError as e:
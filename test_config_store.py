@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+配置热更新测试脚本
+"""
+
+import sys
+import os
+import json
+import time
+import tempfile
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from config import DEVICE_COMMANDS, WAKE_WORD_CONFIG
+from config_store import ConfigStore
+from intent_recognition import IntentRecognizer
+
+
+def make_store(tmp_dir):
+    """在临时目录中创建配置存储"""
+    store = ConfigStore(os.path.join(tmp_dir, 'settings.json'), watch_interval=0.05)
+    store.load()
+    return store
+
+
+def test_update_in_place():
+    """测试写入后原地更新配置并通知订阅者"""
+    print("=== 测试配置写入 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = make_store(tmp_dir)
+        received = []
+        store.subscribe(received.append, sections=['WAKE_WORD_CONFIG'])
+        try:
+            store.update('WAKE_WORD_CONFIG', {'sensitivity': 0.9, 'fallback_detection': None})
+            # 通过 from config import 得到的引用也能看到新值
+            assert WAKE_WORD_CONFIG['sensitivity'] == 0.9
+            assert 'fallback_detection' not in WAKE_WORD_CONFIG
+            assert len(received) == 1
+            old, new = received[0]['WAKE_WORD_CONFIG']
+            assert old['sensitivity'] != 0.9 and new['sensitivity'] == 0.9
+
+            with open(store.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            assert saved == {'WAKE_WORD_CONFIG': {'sensitivity': 0.9, 'fallback_detection': None}}
+            assert os.listdir(tmp_dir) == ['settings.json'], "不应残留临时文件"
+        finally:
+            store.reset('WAKE_WORD_CONFIG')
+        assert WAKE_WORD_CONFIG['sensitivity'] == store.defaults['WAKE_WORD_CONFIG']['sensitivity']
+        assert 'fallback_detection' in WAKE_WORD_CONFIG
+    print("✅ 配置原地更新，删除标记生效")
+
+
+def test_external_edit():
+    """测试检测到外部修改后重新加载"""
+    print("\n=== 测试外部修改 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = make_store(tmp_dir)
+        received = []
+        store.subscribe(received.append)
+        store.start_watching()
+        try:
+            with open(store.path, 'w', encoding='utf-8') as f:
+                json.dump({'ACTION_KEYWORDS': {'on': ['打开', '开启', '启动', '开', '亮起']}}, f, ensure_ascii=False)
+            deadline = time.time() + 2
+            while not received and time.time() < deadline:
+                time.sleep(0.05)
+            assert received and 'ACTION_KEYWORDS' in received[0]
+
+            # 写坏的文件不影响当前配置
+            with open(store.path, 'w', encoding='utf-8') as f:
+                f.write('{"ACTION_KEYWORDS": ')
+            os.utime(store.path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+            assert store.check_for_changes() == {}
+        finally:
+            store.stop_watching()
+            store.reset('ACTION_KEYWORDS')
+    print("✅ 外部修改被自动加载")
+
+
+def test_incremental_rebuild():
+    """测试意图识别只重建变化的部分"""
+    print("\n=== 测试增量重建 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = make_store(tmp_dir)
+        recognizer = IntentRecognizer()
+        recognizer.classifier = None
+        store.subscribe(recognizer.apply_config_changes)
+        light_pattern = recognizer.device_patterns['灯']
+        tv_pattern = recognizer.device_patterns['电视']
+        try:
+            tv_keywords = DEVICE_COMMANDS['电视']['keywords'] + ['荧幕']
+            store.update('DEVICE_COMMANDS', {'电视': {'keywords': tv_keywords}})
+            assert recognizer.device_patterns['灯'] is light_pattern
+            assert recognizer.device_patterns['电视'] is not tv_pattern
+            intent = recognizer.recognize_intent("打开荧幕")
+            assert intent['device'] == '电视'
+        finally:
+            store.reset('DEVICE_COMMANDS')
+        assert recognizer.recognize_intent("打开荧幕")['device'] != '电视'
+    print("✅ 只重新编译修改过的设备关键词")
+
+
+def test_overrides_applied_on_import():
+    """测试导入配置模块时应用配置文件中保存的覆盖项"""
+    print("\n=== 测试导入时应用覆盖项 ===")
+    import types
+    import config
+    from config_store import apply_saved_overrides
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'settings.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'MQTT_CONFIG': {'client_id': 'saved_key', 'username': None}, 'UNKNOWN': {}}, f)
+        module = types.ModuleType('config_copy')
+        module.CONFIG_STORE = {'path': path}
+        module.MQTT_CONFIG = {'broker': 'bemfa.com', 'client_id': '', 'username': 'user'}
+        mqtt_config = module.MQTT_CONFIG
+        apply_saved_overrides(module)
+        # 原地更新，已导入的引用也能看到保存的值；默认值保留应用前的内容
+        assert mqtt_config == {'broker': 'bemfa.com', 'client_id': 'saved_key'}
+        assert module.CONFIG_DEFAULTS['MQTT_CONFIG']['client_id'] == ''
+        # 配置存储以导入前记录的默认值为基准
+        assert ConfigStore(path).defaults == config.CONFIG_DEFAULTS
+    print("✅ 直接导入 config 的程序也读到保存的配置")
+
+
+def test_speech_engine_reload():
+    """测试只有引擎相关配置变化时才重新初始化语音引擎"""
+    print("\n=== 测试语音引擎热更新 ===")
+    from ai_speech_recognition import AISpeechRecognizer
+    # 不打开麦克风：只构造对象并记录引擎初始化
+    recognizer = AISpeechRecognizer.__new__(AISpeechRecognizer)
+    recognizer.status_callback = None
+    recognizer.engine = 'google'  # 百度未配置时已回退到google
+    reloads = []
+    recognizer._init_ai_engine = lambda: reloads.append(recognizer.engine)
+
+    old = {'engine': 'baidu', 'baidu': {'app_id': ''}, 'whisper': {'model_size': 'base'}}
+    recognizer.apply_config_changes({'AI_SPEECH_CONFIG': (old, dict(old, whisper={'model_size': 'small'}))})
+    assert reloads == [] and recognizer.engine == 'google'
+
+    recognizer.apply_config_changes({'AI_SPEECH_CONFIG': (old, dict(old, baidu={'app_id': '123'}))})
+    recognizer.apply_config_changes({'AI_SPEECH_CONFIG': (old, dict(old, engine='whisper'))})
+    assert reloads == ['baidu', 'whisper']
+    print("✅ 修改无关配置不重建已回退的引擎")
+
+
+def main():
+    """主测试函数"""
+    print("🔄 配置热更新测试")
+    print("=" * 50)
+
+    tests = [
+        test_update_in_place,
+        test_external_edit,
+        test_incremental_rebuild,
+        test_overrides_applied_on_import,
+        test_speech_engine_reload,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+设备注册表测试脚本
+"""
+
+import sys
+import os
+import csv
+import copy
+import json
+import time
+import tempfile
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from device_registry import DeviceRegistry, DeviceRecord, KeywordAutomaton
+from intent_recognition import IntentRecognizer
+from config import DEVICE_COMMANDS
+
+ROOMS = ['living_room', 'bedroom', 'kitchen', 'bathroom', 'study']
+
+
+def write_building_csv(path, floors=20, units=25):
+    """生成一栋楼的设备清单：每户若干房间，每个房间灯和空调"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['device_id', 'device_type', 'room', 'topic', 'on_command', 'off_command', 'keywords'])
+        for floor in range(1, floors + 1):
+            for unit in range(1, units + 1):
+                for room in ROOMS[:2]:
+                    for device_type, prefix, keywords in (('灯', 'light', '灯|灯光'), ('空调', 'aircon', '空调')):
+                        device_id = f"{prefix}_{floor:02d}{unit:02d}_{room}"
+                        writer.writerow([device_id, device_type, room, device_id, 'on', 'off', keywords])
+    return floors * units * 4
+
+
+def test_import_from_config():
+    """测试从配置导入"""
+    print("=== 测试从配置导入 ===")
+    registry = DeviceRegistry()
+    assert registry.import_from_config() == 6
+    assert registry.resolve('灯', 'bedroom').topic == 'light002'
+    assert registry.resolve('空调').topic == 'aircon001'
+    assert registry.find_by_topic('tv001').device_type == '电视'
+    print("✅ 配置中的设备已导入")
+
+
+def test_bulk_import_and_lookup():
+    """测试大批量导入与索引查询"""
+    print("\n=== 测试批量导入 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'devices.csv')
+        expected = write_building_csv(csv_path)
+        registry = DeviceRegistry(os.path.join(tmp_dir, 'devices.db'))
+        start = time.perf_counter()
+        assert registry.import_csv(csv_path) == expected
+        print(f"   导入 {expected} 个设备耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        assert len(registry.find_by_type('灯')) == expected // 2
+        assert len(registry.find_by_room('bedroom')) == expected // 2
+        record = registry.find_by_topic('aircon_0512_bedroom')
+        assert record.device_type == '空调' and record.room == 'bedroom'
+
+        # 相同设备类型的字符串被驻留
+        types = {id(r.device_type) for r in registry.find_by_type('灯')}
+        assert len(types) == 1
+        registry.conn.close()
+
+        json_path = os.path.join(tmp_dir, 'devices.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump([{'device_id': 'fan_x', 'device_type': '风扇', 'topic': 'fan_x', 'keywords': ['风扇']}], f)
+        reopened = DeviceRegistry(os.path.join(tmp_dir, 'devices.db'))
+        assert reopened.import_json(json_path) == 1
+        assert len(reopened) == expected + 1
+        reopened.conn.close()
+    print("✅ 批量导入与查询正常")
+
+
+def test_automaton_cache():
+    """测试关键词自动机的序列化缓存"""
+    print("\n=== 测试自动机缓存 ===")
+    automaton = KeywordAutomaton.build([('he', 'k', 'he'), ('she', 'k', 'she'), ('hers', 'k', 'hers')])
+    restored = KeywordAutomaton.loads(automaton.dumps())
+    assert restored.find_all('ushers') == automaton.find_all('ushers')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'devices.db')
+        registry = DeviceRegistry(db_path)
+        registry.import_from_config()
+        registry.conn.close()
+
+        original_build = KeywordAutomaton.build
+        builds = []
+        KeywordAutomaton.build = classmethod(lambda cls, keywords: builds.append(1) or original_build(keywords))
+        try:
+            reopened = DeviceRegistry(db_path)
+        finally:
+            KeywordAutomaton.build = original_build
+        assert not builds, "关键词未变化时不应重建自动机"
+        assert reopened.match_text('打开卧室的灯') == {'devices': ['灯'], 'rooms': ['bedroom']}
+        reopened.conn.close()
+    print("✅ 启动时复用缓存的自动机")
+
+
+def test_intent_with_registry():
+    """测试意图识别通过注册表解析主题"""
+    print("\n=== 测试注册表意图识别 ===")
+    registry = DeviceRegistry()
+    registry.import_from_config()
+    registry.add_records([DeviceRecord('light_kitchen', '灯', 'kitchen', 'light003', keywords=['灯'])])
+    recognizer = IntentRecognizer(registry=registry)
+    analysis = recognizer.analyze_speech_text("打开厨房的灯")
+    assert analysis['intent']['room'] == 'kitchen'
+    assert (analysis['device_topic'], analysis['command']) == ('light003', 'on')
+    print("✅ '打开厨房的灯' -> light003 on")
+
+
+def test_room_without_device():
+    """测试指定房间没有此类设备时不控制其他房间的设备"""
+    print("\n=== 测试房间内无此设备 ===")
+    registry = DeviceRegistry()
+    registry.add_records([DeviceRecord('light_101', '灯', 'bedroom', 'light_101', keywords=['灯']),
+                          DeviceRecord('aircon_102', '空调', 'study', 'aircon_102', keywords=['空调'])])
+    assert registry.resolve('灯', 'bedroom').topic == 'light_101'
+    assert registry.resolve('灯', 'study') is None
+    assert registry.resolve('灯').topic == 'light_101'
+    assert registry.resolve('风扇') is None
+
+    recognizer = IntentRecognizer(registry=registry)
+    recognizer.classifier = None
+    analysis = recognizer.analyze_speech_text("打开书房的灯")
+    assert analysis['intent']['room'] == 'study'
+    assert (analysis['device_topic'], analysis['command']) == (None, None)
+    print("✅ 书房没有灯时不回退到卧室的灯")
+
+
+def test_ambiguous_without_room():
+    """测试未指定房间且设备分布在多个房间时不猜测目标设备"""
+    print("\n=== 测试多房间设备歧义 ===")
+    registry = DeviceRegistry()
+    registry.add_records([DeviceRecord('light_101', '灯', 'bedroom', 'light_101', keywords=['灯']),
+                          DeviceRecord('light_102', '灯', 'study', 'light_102', keywords=['灯']),
+                          DeviceRecord('heater_101', '暖气', 'bedroom', 'heater_101', keywords=['暖气']),
+                          DeviceRecord('heater_102', '暖气', 'study', 'heater_102', keywords=['暖气'])])
+    assert registry.resolve('灯') is None
+    assert registry.resolve('灯', 'study').topic == 'light_102'
+
+    recognizer = IntentRecognizer(registry=registry)
+    recognizer.classifier = None
+    # 有默认配置的设备类型使用默认主题，否则不返回指令
+    assert recognizer.get_device_command('灯', 'on') == (DEVICE_COMMANDS['灯']['topics'][0], 'on')
+    assert recognizer.get_device_command('暖气', 'on') == (None, None)
+    assert recognizer.get_device_command('暖气', 'on', 'study') == ('heater_102', 'on')
+    print("✅ 多个房间都有此设备时不随意选择其中一个")
+
+
+def test_config_hot_reload():
+    """测试设备配置热更新后注册表同步"""
+    print("\n=== 测试配置热更新 ===")
+    registry = DeviceRegistry()
+    registry.import_from_config()
+    registry.add_records([DeviceRecord('light_kitchen', '灯', 'kitchen', 'light003', keywords=['灯'])])
+    recognizer = IntentRecognizer(registry=registry)
+    recognizer.classifier = None
+    old = copy.deepcopy(DEVICE_COMMANDS)
+    new = copy.deepcopy(DEVICE_COMMANDS)
+    new['电视']['topics'] = ['tv002']
+    new['电视']['keywords'] = new['电视']['keywords'] + ['荧幕']
+    recognizer.apply_config_changes({'DEVICE_COMMANDS': (old, new)})
+    assert registry.get('tv001') is None and registry.get('tv002').device_type == '电视'
+    assert recognizer.get_device_command('电视', 'on')[0] == 'tv002'
+    assert registry.match_text("打开荧幕")['devices'] == ['电视']
+    # 未变化的设备类型和单独导入的设备保持不变
+    assert registry.get('light_kitchen').topic == 'light003' and registry.get('light001')
+    print("✅ 配置修改后注册表中的设备与关键词同步更新")
+
+
+def main():
+    """主测试函数"""
+    print("🏢 设备注册表测试")
+    print("=" * 50)
+
+    tests = [
+        test_import_from_config,
+        test_bulk_import_and_lookup,
+        test_automaton_cache,
+        test_intent_with_registry,
+        test_room_without_device,
+        test_ambiguous_without_room,
+        test_config_hot_reload,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
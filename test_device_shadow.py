@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+设备状态影子测试脚本
+"""
+
+import sys
+import os
+import time
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import config
+from device_shadow import DeviceShadow, parse_payload
+from intent_recognition import IntentRecognizer
+from test_mqtt_publish import require_broker, connected_client
+
+
+def test_parse_payload():
+    """测试巴法云消息解析"""
+    print("=== 测试消息解析 ===")
+    assert parse_payload('on') == (True, ())
+    assert parse_payload('off') == (False, ())
+    assert parse_payload('on#26') == (True, ('26',))
+    assert parse_payload('ON#2#26') == (True, ('2', '26'))
+    assert parse_payload('close') == (False, ())
+    assert parse_payload('hello') == (None, ())
+    print("✅ on/off/on#26 等格式解析正确")
+
+
+def test_shadow_updates():
+    """测试状态更新与重复指令判断"""
+    print("\n=== 测试状态影子 ===")
+    shadow = DeviceShadow(max_age=60)
+    assert shadow.would_change('light001', 'on'), "未知状态时不应跳过"
+
+    shadow.update('light001', 'on#80', 'reported')
+    assert shadow.power('light001') is True
+    assert not shadow.would_change('light001', 'on')
+    assert not shadow.would_change('light001', '1')
+    assert shadow.would_change('light001', 'on#50')
+    assert shadow.would_change('light001', 'off')
+
+    # 只开关不带参数时保留原来的亮度
+    shadow.update('light001', 'off')
+    shadow.update('light001', 'on')
+    assert shadow.get('light001').values == ()
+    shadow.update('light001', 'on#30')
+    shadow.update('light001', 'on')
+    assert shadow.get('light001').values == ('30',)
+
+    assert shadow.update('light001', 'garbage') is None
+    assert shadow.power('light001') is True
+
+    # 过期状态不再用于跳过指令
+    shadow.get('light001').updated_at = time.time() - 120
+    assert shadow.would_change('light001', 'on')
+    print("✅ 状态更新与重复判断正确")
+
+
+def test_intent_analysis_state():
+    """测试意图分析附带设备当前状态"""
+    print("\n=== 测试意图分析 ===")
+    recognizer = IntentRecognizer()
+    recognizer.classifier = None
+    recognizer.device_shadow = DeviceShadow()
+    recognizer.device_shadow.update('tv001', 'on')
+    analysis = recognizer.analyze_speech_text("打开电视")
+    assert analysis['current_power'] is True and analysis['redundant']
+    assert not recognizer.analyze_speech_text("关闭电视")['redundant']
+    print("✅ '打开电视' 时电视已开启，标记为重复指令")
+
+
+def test_suppress_redundant_publish():
+    """测试开启抑制后跳过重复指令"""
+    print("\n=== 测试重复指令抑制 ===")
+    require_broker()
+    client = connected_client()
+    config.DEVICE_SHADOW_CONFIG['suppress_redundant'] = True
+    try:
+        client.device_shadow.update('fan001', 'on', 'reported')
+        assert client.publish_message('fan001', 'on', coalesce=False)
+        assert client.suppressed_count == 1
+        assert client.publish_message('fan001', 'off', coalesce=False)
+        assert client.suppressed_count == 1
+        assert client.get_device_state('fan001').power is False
+    finally:
+        config.DEVICE_SHADOW_CONFIG['suppress_redundant'] = False
+        client.disconnect()
+    print("✅ 风扇已开启时跳过 'on'，'off' 正常发送")
+
+
+def main():
+    """主测试函数"""
+    print("🪞 设备状态影子测试")
+    print("=" * 50)
+
+    tests = [
+        test_parse_payload,
+        test_shadow_updates,
+        test_intent_analysis_state,
+        test_suppress_redundant_publish,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
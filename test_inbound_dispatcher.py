@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+接收消息分发测试脚本
+"""
+
+import sys
+import os
+import time
+import threading
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from inbound_dispatcher import (InboundDispatcher, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST,
+                                OVERFLOW_BLOCK)
+
+
+class BatchRecorder:
+    """记录每一批收到的消息，可选地模拟处理缓慢的消费者"""
+
+    def __init__(self, delay=0.0, gate=None):
+        self.batches = []
+        self.delay = delay
+        self.gate = gate
+
+    def __call__(self, items):
+        if self.gate is not None:
+            self.gate.wait()
+        if self.delay:
+            time.sleep(self.delay)
+        self.batches.append(list(items))
+
+    @property
+    def items(self):
+        return [item for batch in self.batches for item in batch]
+
+
+def test_batching_preserves_order():
+    """测试按批处理且保持顺序"""
+    print("=== 测试批量处理 ===")
+    recorder = BatchRecorder()
+    dispatcher = InboundDispatcher(recorder, capacity=1000, batch_size=50, batch_interval=0.05)
+    for i in range(230):
+        dispatcher.put(i)
+    assert dispatcher.flush()
+    assert recorder.items == list(range(230))
+    assert all(len(batch) <= 50 for batch in recorder.batches)
+    assert len(recorder.batches) < 230
+    stats = dispatcher.get_stats()
+    assert stats['processed'] == 230 and stats['dropped'] == 0
+    dispatcher.stop()
+    print(f"✅ 230 条消息分 {len(recorder.batches)} 批处理，顺序不变")
+
+
+def test_slow_consumer_does_not_block_producer():
+    """测试处理缓慢时生产者（网络线程）不被阻塞"""
+    print("=== 测试慢消费者 ===")
+    recorder = BatchRecorder(delay=0.05)
+    dispatcher = InboundDispatcher(recorder, capacity=10000, batch_size=10, batch_interval=0.0)
+    start = time.perf_counter()
+    for i in range(1000):
+        dispatcher.put(i)
+    elapsed = time.perf_counter() - start
+    assert elapsed < 0.2, elapsed
+    dispatcher.stop(flush=False)
+    print(f"✅ 入队 1000 条耗时 {elapsed * 1000:.1f}ms")
+
+
+def test_overflow_policies():
+    """测试队列满时的三种处理方式"""
+    print("=== 测试溢出策略 ===")
+    for policy, expected in ((OVERFLOW_DROP_OLDEST, [5, 6, 7, 8, 9]),
+                             (OVERFLOW_DROP_NEWEST, [0, 1, 2, 3, 4]),
+                             (OVERFLOW_BLOCK, [0, 1, 2, 3, 4])):
+        gate = threading.Event()
+        recorder = BatchRecorder(gate=gate)
+        dispatcher = InboundDispatcher(recorder, capacity=5, batch_size=100, batch_interval=10,
+                                       overflow=policy, block_timeout=0.01)
+        # 后台线程在凑批等待中，消息留在队列里
+        accepted = [dispatcher.put(i) for i in range(10)]
+        assert list(dispatcher.queue) == expected, (policy, list(dispatcher.queue))
+        assert dispatcher.get_stats()['dropped'] == 5
+        if policy != OVERFLOW_DROP_OLDEST:
+            assert accepted == [True] * 5 + [False] * 5
+        gate.set()
+        dispatcher.stop()
+        assert recorder.items == expected
+    print("✅ drop_oldest / drop_newest / block 行为正确")
+
+
+def test_block_waits_for_space():
+    """测试阻塞策略在消费者腾出空间后继续入队"""
+    print("=== 测试阻塞等待 ===")
+    recorder = BatchRecorder(delay=0.02)
+    dispatcher = InboundDispatcher(recorder, capacity=5, batch_size=5, batch_interval=0.0,
+                                   overflow=OVERFLOW_BLOCK, block_timeout=2.0)
+    for i in range(50):
+        assert dispatcher.put(i)
+    assert dispatcher.flush()
+    assert recorder.items == list(range(50))
+    dispatcher.stop()
+    print("✅ 队列满时等待消费者，未丢消息")
+
+
+def main():
+    """主测试函数"""
+    print("📥 接收消息分发测试")
+    print("=" * 50)
+
+    tests = [
+        test_batching_preserves_order,
+        test_slow_consumer_does_not_block_producer,
+        test_overflow_policies,
+        test_block_waits_for_space,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
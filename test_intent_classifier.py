@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+本地意图分类器测试脚本
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import intent_recognition
+from intent_recognition import IntentClassifier, IntentRecognizer
+from command_corpus import CommandCorpusGenerator
+
+_classifier = None
+
+
+def trained_classifier():
+    """在合成语料上训练一个小模型（测试间共享）"""
+    global _classifier
+    if _classifier is None:
+        generator = CommandCorpusGenerator(seed=0, noise_rate=0.2, implicit_rate=0.25, negative_rate=0.1)
+        samples = list(generator.iter_samples(6000))
+        _classifier = IntentClassifier(n_features=2 ** 12)
+        _classifier.fit([s['text'] for s in samples],
+                        [IntentClassifier.make_label(s['device'], s['action']) for s in samples])
+    return _classifier
+
+
+def skip_without_numpy():
+    """未安装numpy时跳过当前测试（显示为skipped而不是passed）"""
+    if intent_recognition.np is None:
+        pytest.skip("未安装numpy")
+
+
+class FixedClassifier:
+    """总是返回固定预测的分类器"""
+
+    def __init__(self, label, confidence):
+        self.label = label
+        self.confidence = confidence
+
+    def predict(self, text):
+        return self.label, self.confidence
+
+    def predict_batch(self, texts):
+        return [self.label] * len(texts), [self.confidence] * len(texts)
+
+
+def test_paraphrases():
+    """测试隐含意图表达"""
+    print("=== 测试隐含意图 ===")
+    skip_without_numpy()
+    classifier = trained_classifier()
+    for text, label in [("屋里太黑了", '灯:on'), ("有点热", '空调:on'), ("今天天气怎么样", 'none')]:
+        predicted, confidence = classifier.predict(text)
+        assert predicted == label, f"{text} -> {predicted}"
+        print(f"✅ '{text}' -> {predicted} ({confidence:.2f})")
+
+
+def test_batch_throughput():
+    """测试批量推理"""
+    print("\n=== 测试批量推理 ===")
+    skip_without_numpy()
+    classifier = trained_classifier()
+    texts = [sample['text'] for sample in CommandCorpusGenerator(seed=9).iter_samples(5000)]
+    start = time.perf_counter()
+    labels, confidences = classifier.predict_batch(texts)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    assert len(labels) == len(confidences) == 5000
+    assert labels == [classifier.predict(text)[0] for text in texts[:50]] + labels[50:]
+    print(f"✅ 5000条文本批量推理耗时 {elapsed_ms:.1f} ms")
+
+
+def test_save_and_load():
+    """测试模型保存与加载"""
+    print("\n=== 测试模型保存与加载 ===")
+    skip_without_numpy()
+    classifier = trained_classifier()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'model.npz')
+        classifier.save(path)
+        loaded = IntentClassifier.load(path)
+    texts = ["打开客厅的灯", "关闭空调", "太亮了"]
+    assert loaded.predict_batch(texts)[0] == classifier.predict_batch(texts)[0]
+    print("✅ 加载后的模型预测一致")
+
+
+def test_keyword_fallback():
+    """测试低置信度时回退到关键词匹配"""
+    print("\n=== 测试关键词回退 ===")
+    skip_without_numpy()
+    recognizer = IntentRecognizer()
+    recognizer.classifier = IntentClassifier(n_features=2 ** 8, classes=['none', '灯:on', '灯:off'])
+    intent = recognizer.recognize_intent("打开客厅的灯")
+    assert intent['match_type'] == 'exact'
+    assert (intent['device'], intent['action']) == ('灯', 'on')
+
+    recognizer.classifier = trained_classifier()
+    results = recognizer.recognize_batch(["屋里太黑了", "打开电视"])
+    assert results[0]['match_type'] == 'classifier'
+    assert (results[1]['device'], results[1]['action']) == ('电视', 'on')
+    print("✅ 未训练模型回退到关键词匹配，训练后使用分类器")
+
+
+def test_confident_rejection():
+    """测试分类器有把握地判定无意图时不回退到关键词匹配"""
+    print("\n=== 测试无意图判定 ===")
+    recognizer = IntentRecognizer()
+    recognizer.classifier = FixedClassifier('none', 0.95)
+    intent = recognizer.recognize_intent("打开客厅的灯")
+    assert intent['device'] is None and intent['action'] is None
+    assert intent['match_type'] == 'classifier' and not recognizer.should_execute(intent)
+    assert [result['device'] for result in recognizer.recognize_batch(["打开客厅的灯", "关闭空调"])] == [None, None]
+
+    # 置信度不足时才回退到关键词匹配
+    recognizer.classifier = FixedClassifier('none', 0.3)
+    intent = recognizer.recognize_intent("打开客厅的灯")
+    assert (intent['device'], intent['action'], intent['match_type']) == ('灯', 'on', 'exact')
+    print("✅ 有把握的无意图判定不被关键词匹配覆盖")
+
+
+def main():
+    """主测试函数"""
+    print("🧠 本地意图分类器测试")
+    print("=" * 50)
+
+    tests = [
+        test_paraphrases,
+        test_batch_throughput,
+        test_save_and_load,
+        test_keyword_fallback,
+        test_confident_rejection,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
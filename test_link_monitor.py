@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+链路探测测试脚本
+断链重连测试使用进程内的本地MQTT服务器（可通过环境变量 MQTT_TEST_BROKER=host:port 指定外部服务器）
+"""
+
+import sys
+import os
+import time
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from config import LINK_MONITOR_CONFIG
+from link_monitor import LinkMonitor, bucket_label
+from test_mqtt_publish import require_broker, connected_client
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def probing_client():
+    """创建开启链路探测的客户端（链路探测默认关闭）"""
+    saved = dict(LINK_MONITOR_CONFIG)
+    LINK_MONITOR_CONFIG['enabled'] = True
+    try:
+        return connected_client()
+    finally:
+        LINK_MONITOR_CONFIG.clear()
+        LINK_MONITOR_CONFIG.update(saved)
+
+
+def test_probe_and_rtt():
+    """测试按间隔发送探测并根据回显计算RTT"""
+    print("=== 测试RTT测量 ===")
+    sent = []
+    monitor = LinkMonitor(sent.append, interval=0.05, dead_after=1.0)
+    assert monitor.tick() and len(sent) == 1
+    assert monitor.tick() and len(sent) == 1  # 未到间隔不重复发送
+    time.sleep(0.01)
+    rtt = monitor.on_echo(sent[0].encode('utf-8'))
+    assert rtt is not None and 0.01 <= rtt < 0.5, rtt
+    assert monitor.on_echo(sent[0]) is None  # 重复回显不计入
+
+    # 其它客户端的探测和无效内容被忽略
+    assert monitor.on_echo('other:1') is None
+    assert monitor.on_echo('garbage') is None
+
+    time.sleep(0.06)
+    assert monitor.tick() and len(sent) == 2
+    stats = monitor.get_stats()
+    assert stats['verified'] and stats['echoes'] == 1 and stats['probes_sent'] == 2
+    assert sum(stats['histogram'].values()) == 1
+    assert stats['histogram'][bucket_label(monitor._bucket(rtt))] == 1, stats['histogram']
+    print(f"✅ RTT {stats['last_rtt_ms']:.1f} ms，直方图 {stats['histogram']}")
+
+
+def test_dead_detection():
+    """测试回显超时判定断链，从未收到回显时不判定"""
+    print("=== 测试断链判定 ===")
+    sent = []
+    monitor = LinkMonitor(sent.append, interval=0.02, dead_after=0.1)
+    # 回显主题不可用（从未收到回显）时只发送探测
+    for _ in range(10):
+        assert monitor.tick()
+        time.sleep(0.02)
+    assert monitor.get_stats()['dead_count'] == 0
+
+    monitor.reset()
+    monitor.tick()
+    monitor.on_echo(sent[-1])
+    start = time.monotonic()
+    while monitor.tick():
+        assert time.monotonic() - start < 1.0, "未判定断链"
+        time.sleep(0.01)
+    elapsed = time.monotonic() - start
+    assert 0.1 <= elapsed < 0.3, elapsed
+    assert monitor.get_stats()['dead_count'] == 1
+    print(f"✅ 回显中断 {elapsed * 1000:.0f} ms 后判定断链")
+
+
+def test_half_open_reconnect():
+    """测试服务器不再回显（半开连接）时主动断开并重连"""
+    print("=== 测试半开连接重连 ===")
+    require_broker()
+    client = probing_client()
+    try:
+        monitor = client.link_monitor
+        assert monitor is not None
+        monitor.interval = 0.1
+        monitor.dead_after = 0.5
+        client.backoff.min_delay = 0.05
+        assert wait_until(lambda: client.get_link_stats()['echoes'] >= 3), client.get_link_stats()
+
+        # 模拟链路静默：退订回显主题后探测不再返回
+        client.client.unsubscribe(client.link_topic)
+        start = time.monotonic()
+        assert wait_until(lambda: client.reconnect_count == 1 and client.is_connected, timeout=5)
+        elapsed = time.monotonic() - start
+        stats = client.get_link_stats()
+        assert stats['dead_count'] == 1
+        # 重连后恢复订阅，探测继续
+        echoes = stats['echoes']
+        assert wait_until(lambda: client.get_link_stats()['echoes'] > echoes)
+        print(f"✅ {elapsed:.2f} 秒发现断链并重连，p50 RTT {client.get_link_stats()['p50_rtt_ms']:.1f} ms")
+    finally:
+        client.disconnect()
+
+
+def test_probe_acks_not_kept():
+    """测试探测消息的发布回调不留在 early_acks 中，过期的确认不会匹配回绕后的mid"""
+    print("=== 测试探测确认清理 ===")
+    require_broker()
+    client = probing_client()
+    try:
+        client.link_monitor.interval = 0.02
+        assert wait_until(lambda: client.get_link_stats()['probes_sent'] >= 20)
+        with client.publish_lock:
+            assert not client.early_acks and len(client.probe_mids) <= 1
+
+        # 模拟mid回绕：所有mid都留有很早以前的确认
+        stale = time.perf_counter() - 60
+        with client.publish_lock:
+            client.early_acks.update((mid, stale) for mid in range(1, 65536))
+        result = client.publish_async('light001', 'on', qos=1).result(timeout=5)
+        assert result['latency'] >= 0, result
+        with client.publish_lock:
+            assert not client.early_acks, len(client.early_acks)
+        print(f"✅ 发送 {client.get_link_stats()['probes_sent']} 次探测后 early_acks 为空，"
+              f"回绕后的确认延迟 {result['latency'] * 1000:.1f} ms")
+    finally:
+        client.disconnect()
+
+
+def main():
+    """主测试函数"""
+    print("📶 链路探测测试")
+    print("=" * 50)
+
+    tests = [
+        test_probe_and_rtt,
+        test_dead_detection,
+        test_half_open_reconnect,
+        test_probe_acks_not_kept,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
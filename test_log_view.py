@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+系统日志视图测试脚本
+用列表模拟日志控件执行视图返回的修改，不需要图形界面
+"""
+
+import sys
+import os
+import time
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from log_view import LogStore, LogViewport, LogFilter, LEVEL_INFO, LEVEL_WARNING, LEVEL_ERROR
+
+
+class FakeLogWidget:
+    """按视图返回的修改维护显示的行"""
+
+    def __init__(self):
+        self.lines = []
+        self.inserted = 0
+
+    def apply(self, change):
+        if change is None:
+            return
+        kind, entries = change[0], [entry.format() for entry in change[1]]
+        self.inserted += len(entries)
+        if kind == 'reset':
+            self.lines = entries
+        elif kind == 'append':
+            self.lines = (self.lines + entries)[change[2]:]
+        else:
+            self.lines = entries + self.lines[:len(self.lines) - change[2]]
+
+
+def expected(store, log_filter, first, last):
+    """存储中序号在 [first, last] 内的匹配条目"""
+    entries, _ = store.after(first - 1, len(store), log_filter)
+    return [entry.format() for entry in entries if entry.seq <= last]
+
+
+def fill(store, start, count):
+    for i in range(start, start + count):
+        if i % 10 == 0:
+            store.append("MQTT错误", f"连接异常 {i}")
+        elif i % 3 == 0:
+            store.append("MQTT接收", f"主题: light00{i % 4}, 消息: on {i}", topic=f"light00{i % 4}")
+        else:
+            store.append("设备控制", f"✅ 成功执行 {i}" if i % 7 else f"⚠️ 已发送但设备未确认 {i}")
+
+
+def test_store_paging():
+    """测试环形存储按序号分页与来源统计"""
+    print("=== 测试日志存储 ===")
+    store = LogStore(capacity=100)
+    fill(store, 0, 250)
+    assert len(store) == 100 and store.oldest_seq == 151
+    older = store.before(200, 5)
+    assert [entry.seq for entry in older] == [195, 196, 197, 198, 199]
+    newer, checked = store.after(240, 100)
+    assert [entry.seq for entry in newer] == list(range(241, 251)) and checked == 250
+    # 早于存储范围的序号从最早的条目开始
+    assert store.after(0, 1)[0][0].seq == 151
+    assert store.before(151, 10) == []
+
+    errors, _ = store.tail(3, LogFilter(level=LEVEL_ERROR))
+    assert [entry.message for entry in errors] == ["连接异常 220", "连接异常 230", "连接异常 240"]
+    assert {entry.level for entry in store.before(251, 100)} == {LEVEL_INFO, LEVEL_WARNING, LEVEL_ERROR}
+    assert store.senders() == ["MQTT接收", "MQTT错误", "设备控制"]
+
+    store.clear()
+    assert store.tail(10) == ([], 250) and store.senders() == []
+    assert store.append("系统", "日志已清除").seq == 251
+    print("✅ 按序号直接定位，查询范围限于存储内的条目")
+
+
+def test_follow_caps_widget_lines():
+    """测试跟随最新时控件行数有上限"""
+    print("=== 测试行数上限 ===")
+    store = LogStore(capacity=5000)
+    viewport = LogViewport(store, max_lines=50, page_size=20)
+    widget = FakeLogWidget()
+    widget.apply(viewport.reset())
+    for start in range(0, 1000, 7):
+        fill(store, start, 7)
+        widget.apply(viewport.on_new_entries())
+        assert len(widget.lines) <= 50
+    assert widget.lines == expected(store, LogFilter(), 951, 1001)[-50:]
+    assert viewport.on_new_entries() is None
+
+    # 一次到达的日志超过一屏时直接显示最新一屏
+    fill(store, 1001, 300)
+    change = viewport.on_new_entries()
+    assert change[0] == 'reset' and len(change[1]) == 50
+    widget.apply(change)
+    assert widget.lines == expected(store, LogFilter(), 1, 1301)[-50:]
+    print(f"✅ 1300 条日志控件只保留 {len(widget.lines)} 行")
+
+
+def test_scroll_paging():
+    """测试向上翻页、离开最新位置时不追加、向下翻页后恢复跟随"""
+    print("=== 测试翻页 ===")
+    store = LogStore(capacity=5000)
+    fill(store, 0, 1000)
+    viewport = LogViewport(store, max_lines=50, page_size=20)
+    widget = FakeLogWidget()
+    widget.apply(viewport.reset())
+    everything = expected(store, LogFilter(), 1, 1000)
+
+    for _ in range(3):
+        change = viewport.page_older()
+        assert change[0] == 'prepend'
+        widget.apply(change)
+    # 向上翻了60行：控件显示第891-940条
+    assert widget.lines == everything[890:940] and not viewport.follow
+
+    # 查看旧日志时新日志不进入控件
+    fill(store, 1000, 30)
+    assert viewport.on_new_entries() is None
+    everything = expected(store, LogFilter(), 1, 1030)
+
+    while not viewport.follow:
+        widget.apply(viewport.page_newer())
+        assert len(widget.lines) <= 50
+    assert widget.lines == everything[-50:]
+
+    # 一直翻到最早的条目
+    pages = 0
+    while (change := viewport.page_older()) is not None:
+        widget.apply(change)
+        pages += 1
+    assert viewport.at_oldest and widget.lines == everything[:50]
+    assert pages == (1030 - 50 + 19) // 20
+    print(f"✅ 翻页 {pages} 次回到最早的日志，控件始终不超过 50 行")
+
+
+def test_filters():
+    """测试按来源、主题和级别过滤"""
+    print("=== 测试过滤 ===")
+    store = LogStore(capacity=20000)
+    fill(store, 0, 20000)
+    viewport = LogViewport(store, max_lines=100, page_size=50)
+    widget = FakeLogWidget()
+
+    start = time.perf_counter()
+    widget.apply(viewport.set_filter(topic="light002"))
+    elapsed = time.perf_counter() - start
+    assert widget.lines and all("light002" in line for line in widget.lines)
+    assert widget.lines == expected(store, LogFilter(topic="light002"), 1, 20000)[-100:]
+    assert len(widget.lines) == 100 and widget.inserted == 100
+
+    widget.apply(viewport.set_filter(sender="MQTT错误"))
+    assert all("MQTT错误" in line for line in widget.lines)
+    widget.apply(viewport.page_older())
+    assert widget.lines == expected(store, LogFilter(sender="MQTT错误"), 1, 20000)[-150:-50]
+
+    widget.apply(viewport.set_filter(level=LEVEL_WARNING))
+    assert all("⚠️" in line or "MQTT错误" in line for line in widget.lines)
+
+    # 过滤后只追加匹配的新日志
+    widget.apply(viewport.set_filter(sender="设备控制", level=LEVEL_WARNING))
+    fill(store, 20000, 100)
+    widget.apply(viewport.on_new_entries())
+    assert widget.lines == expected(store, LogFilter("设备控制", level=LEVEL_WARNING), 1, 20100)[-100:]
+
+    widget.apply(viewport.set_filter(sender="不存在"))
+    assert widget.lines == [] and viewport.page_older() is None
+    widget.apply(viewport.set_filter())
+    assert len(widget.lines) == 100
+    print(f"✅ 20000 条日志中按主题过滤并渲染一屏耗时 {elapsed * 1000:.1f} ms")
+
+
+def main():
+    """主测试函数"""
+    print("📝 系统日志视图测试")
+    print("=" * 50)
+
+    tests = [
+        test_store_paging,
+        test_follow_caps_widget_lines,
+        test_scroll_paging,
+        test_filters,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
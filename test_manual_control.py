@@ -5,6 +5,7 @@
 
 import sys
 import os
+import time
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from mqtt_client import control_device
@@ -54,5 +55,34 @@ def test_manual_control():
         topics = config['topics']
         print(f"   {device}: 主题={topics}")
 
+def test_manual_control_local_broker():
+    """通过本地MQTT服务器测试手动控制指令的实际收发"""
+    print("=== 测试本地服务器上的手动控制 ===\n")
+    from test_mqtt_publish import require_broker, connected_client
+    require_broker()
+    client = connected_client()
+    try:
+        received = []
+        client.add_message_handler('#', lambda record: received.append((record.topic, record.payload)))
+        time.sleep(0.2)
+        assert control_device(client, "灯", "on")
+        assert control_device(client, "风扇", "off")
+
+        def delivered():
+            lights = [(topic, payload) for topic, payload in received
+                      if topic in DEVICE_COMMANDS['灯']['topics'] and payload in DEVICE_COMMANDS['灯']['on_commands']]
+            fans = [(topic, payload) for topic, payload in received
+                    if topic == 'fan001' and payload in DEVICE_COMMANDS['风扇']['off_commands']]
+            return lights and fans
+
+        deadline = time.time() + 5
+        while not delivered() and time.time() < deadline:
+            time.sleep(0.02)
+        assert delivered(), received
+        print(f"✅ 服务器转发了指令: {received}")
+    finally:
+        client.disconnect()
+
 if __name__ == "__main__":
     test_manual_control()
+    test_manual_control_local_broker()
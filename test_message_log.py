@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+MQTT消息日志测试脚本
+"""
+
+import sys
+import os
+import time
+import tempfile
+import tracemalloc
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from message_log import MessageLog, DIRECTION_SENT, DIRECTION_RECEIVED
+
+
+def test_ring_buffer():
+    """测试固定容量与查询"""
+    print("=== 测试环形缓冲区 ===")
+    log = MessageLog(capacity=100)
+    base = 1_700_000_000
+    for i in range(250):
+        direction = DIRECTION_SENT if i % 2 else DIRECTION_RECEIVED
+        log.append(f"light{i % 3:03d}", str(i), direction, timestamp=base + i)
+    assert len(log) == 100
+    assert [r.payload for r in log.latest(3)] == ['247', '248', '249']
+
+    sent = log.query(topic='light001', direction=DIRECTION_SENT)
+    assert sent and all(r.topic == 'light001' and r.direction == 'sent' for r in sent)
+    assert [r.timestamp for r in sent] == sorted(r.timestamp for r in sent)
+
+    window = log.query(since=base + 200, until=base + 210)
+    assert [r.payload for r in window] == [str(i) for i in range(200, 210)]
+    assert log.query(since=base + 300) == []
+
+    # 相同主题共享同一个字符串对象
+    assert len({id(r.topic) for r in log.query(topic='light002')}) == 1
+    assert log.latest(1)[0].to_dict()['type'] == 'sent'
+    print("✅ 只保留最近100条，按主题/方向/时间过滤正常")
+
+
+def test_archive_rotation():
+    """测试溢出记录归档与分段轮转"""
+    print("\n=== 测试归档轮转 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log = MessageLog(capacity=50, archive_dir=tmp_dir, segment_size=100, max_segments=3, flush_batch=20)
+        for i in range(500):
+            log.append('tv001', str(i), DIRECTION_RECEIVED, timestamp=1000 + i)
+        log.flush()
+        segments = sorted(os.listdir(tmp_dir))
+        assert len(segments) == 3, segments
+
+        # 450条溢出记录写成5个分段（最后一个未写满），只保留最新的3个，再加上内存中的50条
+        records = log.query(include_archived=True)
+        assert [r.payload for r in records] == [str(i) for i in range(200, 500)]
+        recent = log.query(limit=60, include_archived=True)
+        assert [r.payload for r in recent] == [str(i) for i in range(440, 500)]
+        assert [r.payload for r in log.query(since=1000 + 445, include_archived=True)][0] == '445'
+    print("✅ 溢出记录写入分段文件，超出数量的旧分段被删除")
+
+
+def test_clear_keeps_archive():
+    """测试清空日志前等待归档和内存中的记录都写入磁盘"""
+    print("\n=== 测试清空日志 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log = MessageLog(capacity=50, archive_dir=tmp_dir, flush_batch=100)
+        for i in range(80):
+            log.append('tv001', str(i), DIRECTION_RECEIVED, timestamp=1000 + i)
+        assert len(log.spill) == 30
+        log.clear()
+        assert len(log) == 0 and log.latest(10) == []
+        log.append('tv001', 'after', DIRECTION_SENT, timestamp=2000)
+        records = log.query(include_archived=True)
+        assert [r.payload for r in records] == [str(i) for i in range(80)] + ['after']
+
+    # 未启用归档时只清空内存
+    log = MessageLog(capacity=10)
+    log.append('tv001', 'on', DIRECTION_SENT)
+    log.clear()
+    assert len(log) == 0 and log.query(include_archived=True) == []
+    print("✅ 清空后归档中仍有全部 80 条旧记录")
+
+
+def test_memory_bounded():
+    """测试长时间运行时内存不增长，且查询不随历史长度变慢"""
+    print("\n=== 测试内存占用 ===")
+    log = MessageLog(capacity=1000)
+    for i in range(1000):
+        log.append('fan001', 'on', DIRECTION_SENT)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    for i in range(100000):
+        log.append('fan001', 'on', DIRECTION_SENT)
+    elapsed = time.perf_counter() - start
+    growth = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+    tracemalloc.stop()
+    assert growth < 200_000, f"内存增长 {growth} 字节"
+
+    start = time.perf_counter()
+    latest = log.latest(50)
+    query_ms = (time.perf_counter() - start) * 1000
+    assert len(latest) == 50
+    print(f"✅ 追加10万条耗时 {elapsed * 1000:.0f} ms，内存增长 {growth / 1024:.1f} KB，"
+          f"查询最近50条 {query_ms:.2f} ms")
+
+
+def main():
+    """主测试函数"""
+    print("🗂️ MQTT消息日志测试")
+    print("=" * 50)
+
+    tests = [
+        test_ring_buffer,
+        test_archive_rotation,
+        test_clear_keeps_archive,
+        test_memory_bounded,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+本地MQTT服务器测试脚本
+每个测试在后台线程启动独立的服务器实例（随机端口），不依赖外部服务器
+"""
+
+import sys
+import os
+import time
+import socket
+import threading
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import paho.mqtt.client as mqtt
+from mqtt_broker import BrokerThread
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class RecordingClient:
+    """记录收到消息的paho客户端"""
+
+    def __init__(self, address, client_id, subscriptions=(), will=None):
+        self.messages = []
+        self.client = mqtt.Client(client_id)
+        self.client.on_message = lambda client, userdata, msg: self.messages.append(
+            (msg.topic, msg.payload.decode('utf-8'), msg.qos, bool(msg.retain)))
+        subscribed = threading.Event()
+        self.client.on_subscribe = lambda *args: subscribed.set()
+        if will is not None:
+            self.client.will_set(*will)
+        self.client.connect(*address)
+        self.client.loop_start()
+        if subscriptions:
+            self.client.subscribe(list(subscriptions))
+            assert subscribed.wait(5), "订阅超时"
+
+    def close(self, clean=True):
+        if clean:
+            self.client.disconnect()
+        else:
+            self.client.socket().shutdown(socket.SHUT_RDWR)
+        self.client.loop_stop()
+
+
+def with_broker(test):
+    def run():
+        broker = BrokerThread('127.0.0.1', 0)
+        address = broker.start()
+        try:
+            test(broker, address)
+        finally:
+            broker.stop()
+    run.__name__ = test.__name__
+    run.__doc__ = test.__doc__
+    return run
+
+
+@with_broker
+def test_wildcard_routing(broker, address):
+    """测试通配符订阅与QoS"""
+    print("=== 测试通配符订阅 ===")
+    subscriber = RecordingClient(address, 'sub', [('home/+/light', 1), ('home/#', 0), ('#', 1)])
+    publisher = RecordingClient(address, 'pub')
+    try:
+        publisher.client.publish('home/bedroom/light', 'on', qos=1).wait_for_publish(5)
+        publisher.client.publish('home/fan', 'off', qos=0)
+        publisher.client.publish('$SYS/info', 'x', qos=0)
+        publisher.client.publish('office/light', 'on', qos=2).wait_for_publish(5)
+        assert wait_until(lambda: len(subscriber.messages) == 3)
+        time.sleep(0.1)
+        # 多个过滤器匹配时只投递一次，QoS取发布QoS与最高订阅QoS的较小者；'$' 主题不匹配首层通配符；QoS2按QoS1转发
+        assert subscriber.messages == [('home/bedroom/light', 'on', 1, False), ('home/fan', 'off', 0, False),
+                                       ('office/light', 'on', 1, False)], subscriber.messages
+        print("✅ 通配符匹配正确，每个客户端只收到一次")
+    finally:
+        subscriber.close()
+        publisher.close()
+
+
+@with_broker
+def test_retained_messages(broker, address):
+    """测试保留消息的保存、投递与清除"""
+    print("=== 测试保留消息 ===")
+    publisher = RecordingClient(address, 'pub')
+    try:
+        publisher.client.publish('light001/state', 'on', qos=1, retain=True).wait_for_publish(5)
+        publisher.client.publish('fan001/state', 'off', qos=1, retain=True).wait_for_publish(5)
+        late = RecordingClient(address, 'late', [('+/state', 1)])
+        assert wait_until(lambda: len(late.messages) == 2)
+        assert sorted(late.messages) == [('fan001/state', 'off', 1, True), ('light001/state', 'on', 1, True)]
+        late.close()
+
+        # 空内容清除保留消息
+        publisher.client.publish('fan001/state', '', qos=1, retain=True).wait_for_publish(5)
+        assert wait_until(lambda: broker.get_stats()['retained'] == 1)
+        later = RecordingClient(address, 'later', [('fan001/state', 0)])
+        time.sleep(0.2)
+        assert later.messages == []
+        later.close()
+        print("✅ 新订阅者收到保留消息，空内容清除")
+    finally:
+        publisher.close()
+
+
+@with_broker
+def test_will_and_takeover(broker, address):
+    """测试遗嘱消息与相同客户端ID的连接接管"""
+    print("=== 测试遗嘱与连接接管 ===")
+    watcher = RecordingClient(address, 'watcher', [('status/#', 0)])
+    try:
+        clean = RecordingClient(address, 'clean', will=('status/clean', 'offline'))
+        clean.close(clean=True)
+        dropped = RecordingClient(address, 'dropped', will=('status/dropped', 'offline'))
+        dropped.close(clean=False)
+        assert wait_until(lambda: watcher.messages == [('status/dropped', 'offline', 0, False)]), watcher.messages
+
+        first = RecordingClient(address, 'same-id')
+        assert wait_until(lambda: broker.get_stats()['clients'] == 2)
+        second = RecordingClient(address, 'same-id')
+        assert wait_until(lambda: broker.get_stats()['total_connections'] == 5)
+        assert broker.get_stats()['clients'] == 2
+        first.client.loop_stop()
+        second.close()
+        print("✅ 异常断开时发布遗嘱，重复客户端ID断开旧连接")
+    finally:
+        watcher.close()
+
+
+@with_broker
+def test_protocol_errors(broker, address):
+    """测试不合法的连接被拒绝"""
+    print("=== 测试协议错误 ===")
+    # 不支持的协议版本返回CONNACK 1
+    with socket.create_connection(address, timeout=2) as sock:
+        body = b'\x00\x04MQTT\x05\x02\x00\x3c\x00\x01x'
+        sock.sendall(bytes([0x10, len(body)]) + body)
+        assert sock.recv(4) == b'\x20\x02\x00\x01'
+        assert sock.recv(1) == b''
+    # 第一个报文不是CONNECT时断开
+    with socket.create_connection(address, timeout=2) as sock:
+        sock.sendall(b'\xc0\x00')
+        assert sock.recv(1) == b''
+    assert broker.get_stats()['clients'] == 0
+    print("✅ 不合法的连接被断开")
+
+
+@with_broker
+def test_throughput(broker, address):
+    """测试本机吞吐量"""
+    print("=== 测试吞吐量 ===")
+    count = 5000
+    done = threading.Event()
+    received = [0]
+    subscriber = mqtt.Client('bench-sub')
+
+    def on_message(client, userdata, msg):
+        received[0] += 1
+        if received[0] == count:
+            done.set()
+
+    subscriber.on_message = on_message
+    subscribed = threading.Event()
+    subscriber.on_subscribe = lambda *args: subscribed.set()
+    subscriber.connect(*address)
+    subscriber.loop_start()
+    subscriber.subscribe('bench/#')
+    assert subscribed.wait(5)
+    publisher = mqtt.Client('bench-pub')
+    publisher.max_inflight_messages_set(100)
+    publisher.connect(*address)
+    publisher.loop_start()
+    try:
+        start = time.perf_counter()
+        infos = [publisher.publish('bench/load', str(i), qos=i % 2) for i in range(count)]
+        assert done.wait(30), received[0]
+        elapsed = time.perf_counter() - start
+        for info in infos:
+            info.wait_for_publish(5)
+        rate = count / elapsed
+        assert rate > 1000, rate
+        print(f"✅ {count} 条消息（QoS0/1各半）{elapsed:.2f} 秒，{rate:.0f} 条/秒")
+    finally:
+        subscriber.disconnect()
+        subscriber.loop_stop()
+        publisher.disconnect()
+        publisher.loop_stop()
+
+
+def main():
+    """主测试函数"""
+    print("📡 本地MQTT服务器测试")
+    print("=" * 50)
+
+    tests = [
+        test_wildcard_routing,
+        test_retained_messages,
+        test_will_and_takeover,
+        test_protocol_errors,
+        test_throughput,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+多家庭MQTT连接管理测试脚本
+使用进程内的本地MQTT服务器（可通过环境变量 MQTT_TEST_BROKER=host:port 指定外部服务器）
+"""
+
+import sys
+import os
+import time
+import socket
+import threading
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import paho.mqtt.client as mqtt
+from mqtt_multiplexer import MultiHomeMQTTManager
+from test_mqtt_publish import broker_address, require_broker
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def add_homes(manager, start, count, received):
+    host, port = broker_address()
+    for i in range(start, start + count):
+        manager.add_home(f'home{i}', f'test_home_{os.getpid()}_{i}', host, port,
+                         topics=[f'home{i}/+'],
+                         handler=lambda home_id, record: received.append((home_id, record.topic, record.payload)))
+
+
+def test_thread_count_flat():
+    """测试家庭数量增加时线程数不变"""
+    print("=== 测试线程数 ===")
+    require_broker()
+    received = []
+    manager = MultiHomeMQTTManager()
+    manager.start()
+    try:
+        add_homes(manager, 0, 5, received)
+        assert wait_until(lambda: manager.get_stats()['connected'] == 5)
+        threads_small = threading.active_count()
+        add_homes(manager, 5, 95, received)
+        assert wait_until(lambda: manager.get_stats()['connected'] == 100), manager.get_stats()['connected']
+        threads_large = threading.active_count()
+        assert threads_large == threads_small, (threads_small, threads_large)
+        print(f"✅ 5 个和 100 个家庭都使用 {threads_large} 个线程")
+    finally:
+        manager.stop()
+
+
+def test_per_home_routing():
+    """测试消息只分发给对应家庭，且一个家庭出错不影响其它家庭"""
+    print("=== 测试按家庭路由 ===")
+    require_broker()
+    received = []
+    manager = MultiHomeMQTTManager()
+    manager.start()
+    host, port = broker_address()
+    try:
+        add_homes(manager, 0, 3, received)
+
+        def broken(home_id, record):
+            raise RuntimeError("boom")
+
+        manager.add_home('broken', f'test_home_{os.getpid()}_broken', host, port,
+                         topics=['broken/+'], handler=broken)
+        assert wait_until(lambda: manager.get_stats()['connected'] == 4)
+        time.sleep(0.1)
+
+        assert manager.publish('broken', 'broken/light', 'on')
+        assert manager.publish('home0', 'home1/light', 'on')
+        assert manager.publish('home2', 'home2/fan', 'off')
+        assert wait_until(lambda: len(received) == 2)
+        time.sleep(0.1)
+        assert sorted(received) == [('home1', 'home1/light', 'on'), ('home2', 'home2/fan', 'off')], received
+
+        # 移除一个家庭后其它家庭继续收发
+        assert manager.remove_home('home1')
+        assert manager.publish('home0', 'home1/light', 'off') is True
+        assert manager.publish('home1', 'home1/light', 'off') is False
+        assert manager.publish('home0', 'home0/light', 'on')
+        assert wait_until(lambda: ('home0', 'home0/light', 'on') in received)
+        assert not [item for item in received if item[2] == 'off' and item[0] == 'home1']
+        stats = manager.get_stats()
+        assert stats['homes'] == 3 and stats['per_home']['home0']['sent'] == 3
+        print("✅ 消息只到达订阅的家庭，家庭之间互不影响")
+    finally:
+        manager.stop()
+
+
+def test_reconnect_after_broker_drop():
+    """测试单个家庭断线后按退避重连"""
+    print("=== 测试单个家庭重连 ===")
+    require_broker()
+    manager = MultiHomeMQTTManager()
+    manager.start()
+    host, port = broker_address()
+    try:
+        manager.add_home('a', f'test_home_{os.getpid()}_a', host, port)
+        manager.add_home('b', f'test_home_{os.getpid()}_b', host, port)
+        assert wait_until(lambda: manager.get_stats()['connected'] == 2)
+        home = manager.get_home('a')
+        home.backoff.min_delay = 0.05
+        home.sock.shutdown(socket.SHUT_RDWR)
+        assert wait_until(lambda: home.reconnects == 1 and home.connected)
+        assert manager.get_home('b').connected and manager.get_home('b').reconnects == 0
+        print("✅ 断线的家庭自动重连，其它家庭不受影响")
+    finally:
+        manager.stop()
+
+
+def test_unreachable_home_isolated():
+    """测试一个家庭的服务器不可达（TCP连接挂起）时其它家庭照常收发"""
+    print("=== 测试不可达服务器隔离 ===")
+    require_broker()
+    # 黑洞地址：监听队列已满的socket，新的TCP连接既不成功也不失败，直到超时
+    blackhole = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    blackhole.bind(('127.0.0.1', 0))
+    blackhole.listen(0)
+    filler = socket.create_connection(blackhole.getsockname(), timeout=1)
+    received = []
+    manager = MultiHomeMQTTManager(connect_timeout=2.0)
+    manager.start()
+    host, port = broker_address()
+    try:
+        dead = manager.add_home('dead', f'test_home_{os.getpid()}_dead', *blackhole.getsockname())
+        dead.backoff.min_delay = dead.backoff.max_delay = 0.05
+        time.sleep(0.1)
+        started = time.monotonic()
+        manager.add_home('live', f'test_home_{os.getpid()}_live', host, port, topics=['live/+'],
+                         handler=lambda home_id, record: received.append(time.monotonic()))
+        assert wait_until(lambda: manager.get_home('live').connected, timeout=1.0)
+        connect_elapsed = time.monotonic() - started
+        time.sleep(0.1)
+
+        # 不可达的家庭反复尝试连接期间，测量其它家庭每条消息的往返时间
+        round_trips = []
+        deadline = time.monotonic() + 3.0
+        while time.monotonic() < deadline:
+            sent_at = time.monotonic()
+            count = len(received)
+            assert manager.publish('live', 'live/light', 'on')
+            assert wait_until(lambda: len(received) > count, timeout=3.0)
+            round_trips.append(received[-1] - sent_at)
+        assert not dead.connected and dead.last_error is not None, dead.to_dict()
+        assert max(round_trips) < 0.5, max(round_trips)
+        print(f"✅ 不可达家庭连接超时期间，其它家庭 {connect_elapsed * 1000:.0f} ms 连上，"
+              f"{len(round_trips)} 条消息最大往返 {max(round_trips) * 1000:.0f} ms")
+    finally:
+        manager.stop()
+        filler.close()
+        blackhole.close()
+
+
+def main():
+    """主测试函数"""
+    print("🏘️ 多家庭MQTT连接管理测试")
+    print("=" * 50)
+
+    tests = [
+        test_thread_count_flat,
+        test_per_home_routing,
+        test_reconnect_after_broker_drop,
+        test_unreachable_home_isolated,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
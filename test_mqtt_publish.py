@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+MQTT异步发布与QoS确认测试脚本
+使用进程内的本地MQTT服务器（mqtt_broker），可通过环境变量 MQTT_TEST_BROKER=host:port 指定外部服务器
+"""
+
+import sys
+import os
+import time
+import socket
+from concurrent.futures import wait
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from config import MQTT_CONFIG, MQTT_PUBLISH_CONFIG
+from mqtt_client import MQTTClient
+from mqtt_broker import BrokerThread
+import paho.mqtt.client as mqtt
+
+BROKER = os.environ.get('MQTT_TEST_BROKER', '')
+_local_broker = None
+
+
+def broker_address():
+    """测试服务器地址：未指定外部服务器时启动进程内的本地服务器（所有测试共用）"""
+    global _local_broker
+    if not BROKER:
+        if _local_broker is None:
+            _local_broker = BrokerThread('127.0.0.1', 0)
+            _local_broker.start()
+        return _local_broker.address
+    host, _, port = BROKER.partition(':')
+    return host, int(port or 1883)
+
+
+def broker_available():
+    """检查MQTT服务器是否可用"""
+    try:
+        with socket.create_connection(broker_address(), timeout=0.5):
+            return True
+    except OSError:
+        print(f"⚠️ MQTT服务器 {BROKER} 不可用，跳过测试")
+        return False
+
+
+def require_broker():
+    """MQTT服务器不可用时跳过当前测试（显示为skipped而不是passed）"""
+    if not broker_available():
+        pytest.skip(f"MQTT服务器 {BROKER or '本地'} 不可用")
+
+
+def connected_client():
+    """创建连接到本地服务器的客户端（临时修改MQTT配置）"""
+    saved = dict(MQTT_CONFIG)
+    host, port = broker_address()
+    MQTT_CONFIG.update({'broker': host, 'port': port, 'client_id': f'test_publish_{os.getpid()}',
+                        'use_private_key': True, 'username': '', 'password': ''})
+    try:
+        client = MQTTClient(queue_path=':memory:', archive_dir='')
+        client.connect()
+    finally:
+        MQTT_CONFIG.clear()
+        MQTT_CONFIG.update(saved)
+    deadline = time.time() + 5
+    while not client.is_connected and time.time() < deadline:
+        time.sleep(0.01)
+    assert client.is_connected, "连接本地MQTT服务器失败"
+    return client
+
+
+def test_qos_policy():
+    """测试按设备类型选择QoS"""
+    print("=== 测试QoS策略 ===")
+    require_broker()
+    client = connected_client()
+    try:
+        assert client.get_qos('aircon001') == MQTT_PUBLISH_CONFIG['device_qos']['空调']
+        assert client.get_qos('light001') == MQTT_PUBLISH_CONFIG['default_qos']
+        result = client.publish_async('aircon001', 'on').result(timeout=5)
+        assert result['qos'] == 1 and result['latency'] >= 0
+        print(f"✅ 空调指令使用QoS1，确认延迟 {result['latency'] * 1000:.1f} ms")
+    finally:
+        client.disconnect()
+
+
+def test_pipelined_publish():
+    """测试流水线发布：多条QoS1消息同时在途，逐条确认"""
+    print("\n=== 测试流水线发布 ===")
+    require_broker()
+    client = connected_client()
+    try:
+        client.client.max_inflight_messages_set(8)
+        start = time.perf_counter()
+        futures = [client.publish_async('test/pipeline', str(i), qos=1) for i in range(200)]
+        done, not_done = wait(futures, timeout=10)
+        elapsed = time.perf_counter() - start
+        assert not not_done, f"{len(not_done)} 条消息未确认"
+        mids = {future.result()['mid'] for future in done}
+        assert len(mids) == 200
+
+        stats = client.get_publish_stats()
+        assert stats['count'] >= 200 and stats['in_flight'] == 0
+        print(f"✅ 200条QoS1消息 {elapsed * 1000:.0f} ms 全部确认，"
+              f"p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms")
+    finally:
+        client.disconnect()
+
+
+def test_subscribe_and_route():
+    """测试批量订阅与按通配符分发收到的消息"""
+    print("\n=== 测试订阅与消息路由 ===")
+    require_broker()
+    client = connected_client()
+    try:
+        deadline = time.time() + 5
+        while client.pending_subscribes and time.time() < deadline:
+            time.sleep(0.01)
+        assert not client.pending_subscribes, "订阅未确认"
+
+        received = []
+        client.subscribe('home/+/light', lambda record: received.append(record.topic))
+        message = mqtt.MQTTMessage(topic=b'home/bedroom/light')
+        message.payload = b'on'
+        client.on_message(client.client, None, message)
+        message = mqtt.MQTTMessage(topic=b'home/bedroom/fan')
+        message.payload = b'on'
+        client.on_message(client.client, None, message)
+        assert client.inbound.flush()
+        assert received == ['home/bedroom/light']
+        stats = client.get_inbound_stats()
+        assert stats['processed'] == 2 and stats['loop_max_us'] > 0
+        assert ('home/+/light', 0) in client._subscription_list()
+        print("✅ 设备主题一次订阅，通配符处理函数只收到匹配的消息，"
+              f"网络线程每条耗时 {stats['loop_avg_us']:.1f}µs")
+    finally:
+        client.disconnect()
+
+
+def main():
+    """主测试函数"""
+    print("📨 MQTT异步发布测试")
+    print("=" * 50)
+
+    tests = [
+        test_qos_policy,
+        test_pipelined_publish,
+        test_subscribe_and_route,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+MQTT TLS连接测试脚本
+用openssl生成自签名CA和服务器证书，在测试用MQTT服务器（默认为进程内的本地服务器，
+可通过环境变量 MQTT_TEST_BROKER=host:port 指定）前面启动一个TLS代理进行测试
+"""
+
+import sys
+import os
+import time
+import socket
+import shutil
+import tempfile
+import threading
+import subprocess
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import ssl
+from config import MQTT_CONFIG, MQTT_TLS_CONFIG
+from mqtt_client import MQTTClient
+from tls_session import create_tls_context, ResumableTLSContext
+from test_mqtt_publish import broker_address, require_broker
+
+
+def make_certificates(directory):
+    """生成自签名CA以及由它签发的 127.0.0.1 服务器证书"""
+    def openssl(*args):
+        subprocess.run(['openssl', *args], cwd=directory, check=True, capture_output=True)
+
+    openssl('req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=Test CA',
+            '-keyout', 'ca.key', '-out', 'ca.pem')
+    openssl('req', '-newkey', 'rsa:2048', '-nodes', '-subj', '/CN=127.0.0.1',
+            '-keyout', 'server.key', '-out', 'server.csr')
+    with open(os.path.join(directory, 'san.cnf'), 'w') as f:
+        f.write('subjectAltName=IP:127.0.0.1,DNS:localhost\n')
+    openssl('x509', '-req', '-in', 'server.csr', '-CA', 'ca.pem', '-CAkey', 'ca.key', '-CAcreateserial',
+            '-days', '1', '-extfile', 'san.cnf', '-out', 'server.pem')
+    return os.path.join(directory, 'ca.pem')
+
+
+class TLSProxy:
+    """TLS终结代理：解密后转发到本地明文MQTT服务器"""
+
+    def __init__(self, directory):
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(os.path.join(directory, 'server.pem'), os.path.join(directory, 'server.key'))
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen()
+        self.port = self.listener.getsockname()[1]
+        self.connections = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                raw, _ = self.listener.accept()
+            except OSError:
+                return
+            try:
+                client = self.context.wrap_socket(raw, server_side=True)
+            except (ssl.SSLError, OSError):
+                raw.close()
+                continue
+            upstream = socket.create_connection(broker_address())
+            self.connections.append(client)
+            threading.Thread(target=self._pipe, args=(client, upstream), daemon=True).start()
+            threading.Thread(target=self._pipe, args=(upstream, client), daemon=True).start()
+
+    @staticmethod
+    def _pipe(source, target):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                target.sendall(data)
+        except OSError:
+            pass
+        for sock in (source, target):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        self.listener.close()
+
+
+def tls_client(port, ca_certs, **tls_options):
+    """创建通过TLS连接代理的客户端（临时修改MQTT配置）"""
+    saved, saved_tls = dict(MQTT_CONFIG), dict(MQTT_TLS_CONFIG)
+    MQTT_CONFIG.update({'broker': '127.0.0.1', 'client_id': f'test_tls_{os.getpid()}',
+                        'use_private_key': True, 'username': '', 'password': ''})
+    MQTT_TLS_CONFIG.update({'enabled': True, 'port': port, 'ca_certs': ca_certs, **tls_options})
+    try:
+        client = MQTTClient(queue_path=':memory:', archive_dir='')
+        client.connect()
+    finally:
+        MQTT_CONFIG.clear()
+        MQTT_CONFIG.update(saved)
+        MQTT_TLS_CONFIG.clear()
+        MQTT_TLS_CONFIG.update(saved_tls)
+    return client
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_context_options():
+    """测试TLS配置项"""
+    print("=== 测试TLS配置 ===")
+    context = create_tls_context({'min_version': 'TLSv1.3', 'insecure': True})
+    assert isinstance(context, ResumableTLSContext)
+    assert context.minimum_version == ssl.TLSVersion.TLSv1_3
+    assert context.verify_mode == ssl.CERT_NONE and not context.check_hostname
+    context = create_tls_context({'session_resumption': False})
+    assert context.verify_mode == ssl.CERT_REQUIRED and context.check_hostname and not context.resume
+    try:
+        create_tls_context({'min_version': 'SSLv3'})
+        assert False, "不支持的版本应报错"
+    except ValueError:
+        pass
+    print("✅ 默认校验证书与主机名，可限制最低TLS版本")
+
+
+def run_with_proxy(test):
+    """准备证书与TLS代理，openssl或本地服务器不可用时跳过"""
+    require_broker()
+    if shutil.which('openssl') is None:
+        print("⚠️ 未找到openssl，跳过测试")
+        return
+    directory = tempfile.mkdtemp()
+    try:
+        ca_certs = make_certificates(directory)
+        proxy = TLSProxy(directory)
+        try:
+            test(proxy, ca_certs)
+        finally:
+            proxy.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def test_resumed_reconnect():
+    """测试TLS连接收发消息，断线重连时复用会话"""
+    print("=== 测试TLS会话复用 ===")
+
+    def scenario(proxy, ca_certs):
+        client = tls_client(proxy.port, ca_certs)
+        try:
+            assert wait_until(lambda: client.is_connected), "TLS连接失败"
+            received = []
+            client.subscribe('tls/test', lambda record: received.append(record.payload))
+            time.sleep(0.1)
+            client._publish_now('tls/test', 'hello', 0)
+            assert wait_until(lambda: received == ['hello']), received
+
+            client.backoff.min_delay = 0.05
+            for count in range(1, 4):
+                client.client.socket().shutdown(socket.SHUT_RDWR)
+                assert wait_until(lambda: client.reconnect_count == count and client.is_connected)
+            stats = client.get_tls_stats()
+            assert stats['full_handshakes'] == 1, stats
+            assert stats['resumed_handshakes'] == 3, stats
+            print(f"✅ {stats['tls_version']} 完整握手 {stats['full_avg_ms']:.2f} ms，"
+                  f"复用握手 {stats['resumed_avg_ms']:.2f} ms")
+        finally:
+            client.disconnect()
+
+    run_with_proxy(scenario)
+
+
+def test_resumption_disabled():
+    """测试关闭会话复用时每次都是完整握手"""
+    print("=== 测试关闭会话复用 ===")
+
+    def scenario(proxy, ca_certs):
+        client = tls_client(proxy.port, ca_certs, session_resumption=False)
+        try:
+            assert wait_until(lambda: client.is_connected)
+            client.backoff.min_delay = 0.05
+            client.client.socket().shutdown(socket.SHUT_RDWR)
+            assert wait_until(lambda: client.reconnect_count == 1 and client.is_connected)
+            stats = client.get_tls_stats()
+            assert stats['full_handshakes'] == 2 and stats['resumed_handshakes'] == 0, stats
+        finally:
+            client.disconnect()
+        print("✅ 重连进行完整握手")
+
+    run_with_proxy(scenario)
+
+
+def test_untrusted_certificate():
+    """测试服务器证书不受信任时拒绝连接"""
+    print("=== 测试证书校验 ===")
+
+    def scenario(proxy, ca_certs):
+        client = tls_client(proxy.port, '')  # 系统证书不信任自签名CA
+        try:
+            assert not client.is_connected and client.network_thread is None
+        finally:
+            client.disconnect()
+        print("✅ 自签名证书未配置CA时连接失败")
+
+    run_with_proxy(scenario)
+
+
+def main():
+    """主测试函数"""
+    print("🔒 MQTT TLS连接测试")
+    print("=" * 50)
+
+    tests = [
+        test_context_options,
+        test_resumed_reconnect,
+        test_resumption_disabled,
+        test_untrusted_certificate,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+MQTT v5 功能测试脚本
+测试主题别名分配、消息有效期、关联数据确认，以及MQTTClient在v5模式下生成的PUBLISH属性
+"""
+
+import sys
+import os
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import paho.mqtt.client as mqtt
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
+from config import MQTT_CONFIG, MQTT_V5_CONFIG
+from mqtt_client import MQTTClient
+from mqtt_v5 import TopicAliasTable, publish_properties
+from command_confirmation import ConfirmationTracker
+
+
+class RecordingPublisher:
+    """记录paho发布调用的参数，代替网络发送"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, topic, payload=None, qos=0, retain=False, properties=None):
+        self.calls.append((topic, payload, qos, properties))
+        return mqtt.MQTTMessageInfo(len(self.calls))
+
+
+def v5_client():
+    """创建v5模式的客户端（临时修改MQTT配置，不连接服务器）"""
+    saved, saved_v5 = dict(MQTT_CONFIG), dict(MQTT_V5_CONFIG)
+    MQTT_CONFIG.update({'broker': '127.0.0.1', 'port': 1883, 'client_id': f'test_v5_{os.getpid()}',
+                        'use_private_key': True, 'username': '', 'password': ''})
+    MQTT_V5_CONFIG.update({'enabled': True, 'topic_alias_maximum': 2})
+    try:
+        return MQTTClient(queue_path=':memory:', archive_dir='')
+    finally:
+        MQTT_CONFIG.clear()
+        MQTT_CONFIG.update(saved)
+        MQTT_V5_CONFIG.clear()
+        MQTT_V5_CONFIG.update(saved_v5)
+
+
+def test_topic_alias_table():
+    """测试别名分配、复用与重连清空"""
+    print("=== 测试主题别名 ===")
+    table = TopicAliasTable(maximum=2)
+    assert table.lookup('light001') == (None, 'light001')  # 服务器未通告别名上限
+
+    table.reset(server_maximum=10)
+    assert table.limit == 2
+    assert table.lookup('light001') == (1, 'light001')
+    assert table.lookup('light001') == (1, '')
+    assert table.lookup('light001', qos=1) == (1, 'light001')  # QoS1始终带完整主题
+    assert table.lookup('fan001') == (2, 'fan001')
+    # 别名用满时复用最久未使用的别名并重新绑定
+    assert table.lookup('tv001') == (1, 'tv001')
+    assert table.lookup('fan001') == (2, '')
+    stats = table.get_stats()
+    assert stats['aliased_publishes'] == 2 and stats['alias_bytes_saved'] == len('light001') + len('fan001')
+
+    table.reset(server_maximum=5)
+    assert table.lookup('tv001') == (1, 'tv001')
+    print("✅ 重复主题只发送别名，重连后重新绑定")
+
+
+def test_publish_properties():
+    """测试PUBLISH属性编码"""
+    print("=== 测试发布属性 ===")
+    properties = publish_properties(30, 3, 'light001/state', b'42')
+    assert properties.MessageExpiryInterval == 30 and properties.TopicAlias == 3
+    assert properties.ResponseTopic == 'light001/state' and properties.CorrelationData == b'42'
+    decoded = Properties(PacketTypes.PUBLISH)
+    decoded.unpack(properties.pack())
+    assert decoded.CorrelationData == b'42' and decoded.MessageExpiryInterval == 30
+
+    empty = publish_properties()
+    assert not hasattr(empty, 'TopicAlias') and not hasattr(empty, 'CorrelationData')
+    print(f"✅ 属性编码 {len(properties.pack())} 字节")
+
+
+def test_correlation_tracking():
+    """测试按关联数据确认指令"""
+    print("=== 测试关联数据确认 ===")
+    tracker = ConfirmationTracker()
+    first = tracker.expect('light001', 'on')
+    second = tracker.expect('light001', 'off')
+    assert first.correlation != second.correlation
+    assert tracker.correlation_for('light001', 'off') == second.correlation
+    assert tracker.correlation_for('light001', 'dim') is None
+    assert tracker.correlation_for('fan001', 'on') is None
+
+    assert not tracker.on_response(first.correlation, 'off')  # 内容与指令不符
+    assert tracker.on_response(bytearray(first.correlation), 'on')
+    assert first.event.is_set() and first.reported == 'on' and not second.event.is_set()
+    assert not tracker.on_response(b'unknown', 'on')
+
+    tracker.cancel('light001', first)
+    tracker.cancel('light001', second)
+    assert not tracker.correlations and not tracker.waiters
+    assert tracker.get_stats()['correlated'] == 1
+    print("✅ 设备回复按关联数据直接匹配")
+
+
+def test_client_v5_publish():
+    """测试v5模式下客户端发布的属性与关联回复"""
+    print("=== 测试v5客户端 ===")
+    client = v5_client()
+    recorder = RecordingPublisher()
+    client.client.publish = recorder
+    connack = Properties(PacketTypes.CONNACK)
+    connack.TopicAliasMaximum = 8
+    client.on_connect(client.client, None, {}, 0, connack)
+    try:
+        assert client.topic_aliases.limit == 2
+        client.publish_async('light001', 'on', qos=0)
+        client.publish_async('light001', 'off', qos=0)
+        assert [call[0] for call in recorder.calls] == ['light001', '']
+        assert recorder.calls[1][3].TopicAlias == recorder.calls[0][3].TopicAlias == 1
+        assert recorder.calls[0][3].MessageExpiryInterval == MQTT_V5_CONFIG.get('message_expiry', 0)
+        assert not hasattr(recorder.calls[0][3], 'CorrelationData')
+
+        # 等待确认的指令附带响应主题与关联数据，设备按关联数据回复
+        pending = client.confirmation.expect('aircon001', 'on#26')
+        client.publish_async('aircon001', 'on#26', qos=1)
+        properties = recorder.calls[-1][3]
+        assert recorder.calls[-1][0] == 'aircon001'
+        assert properties.ResponseTopic == 'aircon001/state'
+        assert properties.CorrelationData == pending.correlation
+
+        reply = mqtt.MQTTMessage(topic=b'aircon001/state')
+        reply.payload = b'on#26'
+        reply.properties = Properties(PacketTypes.PUBLISH)
+        reply.properties.CorrelationData = properties.CorrelationData
+        client.on_message(client.client, None, reply)
+        assert pending.event.is_set()
+        client.confirmation.cancel('aircon001', pending)
+        stats = client.get_v5_stats()
+        assert stats['correlated_confirmations'] == 1 and stats['alias_bytes_saved'] == len('light001')
+        print(f"✅ v5发布属性正确: {stats}")
+    finally:
+        client.disconnect()
+
+
+def main():
+    """主测试函数"""
+    print("5️⃣ MQTT v5 功能测试")
+    print("=" * 50)
+
+    tests = [
+        test_topic_alias_table,
+        test_publish_properties,
+        test_correlation_tracking,
+        test_client_v5_publish,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
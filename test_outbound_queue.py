@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+离线指令队列与自动重连测试脚本
+重连测试使用进程内的本地MQTT服务器（可通过环境变量 MQTT_TEST_BROKER=host:port 指定外部服务器）
+"""
+
+import sys
+import os
+import time
+import socket
+import tempfile
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from outbound_queue import OutboundQueue
+from mqtt_client import ReconnectBackoff
+from test_mqtt_publish import require_broker, connected_client
+
+
+def test_queue_order_and_ttl():
+    """测试队列顺序、容量上限与过期"""
+    print("=== 测试离线队列 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'outbound.db')
+        queue = OutboundQueue(db_path, max_size=5, default_ttl=60)
+        for i in range(7):
+            queue.put('light001', f'cmd{i}')
+        queue.put('fan001', 'stale', ttl=0)
+        assert len(queue) == 5 and queue.dropped == 3
+        queue.close()
+
+        # 重新打开后数据仍在
+        reopened = OutboundQueue(db_path, max_size=5, default_ttl=60)
+        assert len(reopened) == 5
+        sent = []
+        assert reopened.drain(lambda topic, payload, qos: sent.append(payload) or True) == (4, 1)
+        assert sent == ['cmd3', 'cmd4', 'cmd5', 'cmd6']
+        assert len(reopened) == 0
+
+        # 发送失败时停止，剩余指令保留
+        for i in range(3):
+            reopened.put('light001', f'retry{i}')
+        assert reopened.drain(lambda topic, payload, qos: payload != 'retry1') == (1, 0)
+        assert [row[2] for row in reopened.peek()] == ['retry1', 'retry2']
+        reopened.close()
+    print("✅ 队列按顺序补发，超出容量丢弃最旧，过期指令跳过")
+
+
+def test_backoff():
+    """测试指数退避与抖动"""
+    print("\n=== 测试退避策略 ===")
+    backoff = ReconnectBackoff(min_delay=1, max_delay=30, jitter=0.5)
+    delays = [backoff.next_delay() for _ in range(8)]
+    for attempt, delay in enumerate(delays):
+        base = min(30, 2 ** attempt)
+        assert base * 0.5 <= delay <= base
+    backoff.reset()
+    assert backoff.next_delay() <= 1
+    print("✅ 等待时间: " + ", ".join(f"{d:.1f}" for d in delays))
+
+
+def test_reconnect_and_drain():
+    """测试意外断线后自动重连并补发离线指令"""
+    print("\n=== 测试自动重连 ===")
+    require_broker()
+    client = connected_client()
+    client.backoff = ReconnectBackoff(min_delay=0.05, max_delay=0.2)
+    try:
+        # 模拟网络中断
+        client.client.socket().shutdown(socket.SHUT_RDWR)
+        deadline = time.time() + 2
+        while not client.is_reconnecting and time.time() < deadline:
+            time.sleep(0.01)
+        assert client.is_reconnecting
+        for i in range(3):
+            assert client.publish_message('light001', f'offline{i}', coalesce=False)
+
+        deadline = time.time() + 5
+        while (not client.is_connected or len(client.outbound_queue)) and time.time() < deadline:
+            time.sleep(0.01)
+        stats = client.get_connection_stats()
+        assert stats['connected'] and stats['reconnect_count'] == 1
+        assert stats['queue_depth'] == 0
+        print(f"✅ {stats['last_reconnect_seconds'] * 1000:.0f} ms 后重连，离线指令已补发")
+    finally:
+        client.disconnect()
+
+
+def main():
+    """主测试函数"""
+    print("📦 离线指令队列测试")
+    print("=" * 50)
+
+    tests = [
+        test_queue_order_and_ttl,
+        test_backoff,
+        test_reconnect_and_drain,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+拼音模糊匹配测试脚本
+测试同音字/近音字指令的设备与动作识别
+"""
+
+import sys
+import os
+import time
+
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import phonetic_index
+from phonetic_index import (PhoneticKeywordIndex, BKTree, WakeWordMatcher, syllable_distance,
+                            evaluate_wake_word_matcher)
+from intent_recognition import IntentRecognizer
+
+
+def requires_pinyin(test):
+    """未安装pypinyin时跳过测试"""
+    def wrapper():
+        if not phonetic_index.is_available():
+            pytest.skip("未安装pypinyin")
+        test()
+    wrapper.__name__ = test.__name__
+    wrapper.__doc__ = test.__doc__
+    return wrapper
+
+
+def test_bk_tree():
+    """测试BK树有界距离查询"""
+    print("=== 测试BK树 ===")
+    tree = BKTree()
+    for key in [('kong', 'tiao'), ('dian', 'si'), ('den',), ('fen', 'san')]:
+        tree.add(key, key)
+    found = [key for _, key, _ in tree.search(('kong', 'diao'), 1)]
+    assert found == [('kong', 'tiao')]
+    assert syllable_distance(('a', 'b', 'c'), ('a', 'c')) == 1
+    print("✅ BK树查询正常")
+
+
+@requires_pinyin
+def test_homophone_commands():
+    """测试同音字指令识别"""
+    print("\n=== 测试同音字指令 ===")
+    recognizer = IntentRecognizer()
+    cases = [
+        ("打开等", '灯', 'on'),
+        ("关掉空挑", '空调', 'off'),
+        ("关闭窗连", '窗帘', 'off'),
+        ("凯电视", '电视', 'on'),
+        ("打开店吃机", '电视', 'on'),  # 三音节关键词允许错一个音节
+    ]
+    for text, device, action in cases:
+        intent = recognizer.recognize_intent(text)
+        assert (intent['device'], intent['action']) == (device, action), text
+        assert intent['match_type'] == 'phonetic'
+        print(f"✅ '{text}' -> {device} {action} (置信度 {intent['confidence']:.2f})")
+
+
+@requires_pinyin
+def test_confidence_penalty():
+    """测试模糊匹配的置信度低于精确匹配"""
+    print("\n=== 测试置信度惩罚 ===")
+    recognizer = IntentRecognizer()
+    exact = recognizer.recognize_intent("关闭空调")
+    homophone = recognizer.recognize_intent("关闭空跳")
+    edited = recognizer.recognize_intent("关闭店吃机")
+    assert exact['match_type'] == 'exact'
+    assert exact['confidence'] > homophone['confidence'] >= edited['confidence']
+    print(f"✅ 精确 {exact['confidence']:.2f} > 同音 {homophone['confidence']:.2f} >= 近音 {edited['confidence']:.2f}")
+
+
+@requires_pinyin
+def test_no_false_match():
+    """测试无关文本不会被误识别"""
+    print("\n=== 测试无关文本 ===")
+    recognizer = IntentRecognizer()
+    for text in ["今天天气不错", "等一下", "你好"]:
+        intent = recognizer.recognize_intent(text)
+        assert intent['device'] is None or intent['action'] is None, text
+    print("✅ 无关文本未被误识别")
+
+
+@requires_pinyin
+def test_everyday_speech_not_commands():
+    """测试含"开/关"的日常用语不会被拼音匹配补全成设备指令"""
+    print("\n=== 测试日常用语 ===")
+    recognizer = IntentRecognizer()
+    recognizer.classifier = None  # 只测试关键词与拼音匹配
+    for text in ["开始学习吧", "我要开始上班了", "关上门", "打开三", "把书关上"]:
+        intent = recognizer.recognize_intent(text)
+        assert intent['device'] is None, (text, intent)
+        assert not recognizer.should_execute(intent), text
+    # 两音节窗口只允许同音，声母和韵母不会同时模糊（shang 与 shan 不同音）
+    assert phonetic_index.normalize_syllable('shang') != phonetic_index.normalize_syllable('shan')
+    assert PhoneticKeywordIndex().allowed_distance(2) == 0
+    print("✅ 日常用语未被识别为设备指令")
+
+
+@requires_pinyin
+def test_phonetic_confidence_gate():
+    """测试拼音匹配的结果达到最低置信度才执行"""
+    print("\n=== 测试执行门槛 ===")
+    recognizer = IntentRecognizer()
+    recognizer.classifier = None
+    assert recognizer.should_execute(recognizer.recognize_intent("关闭空调"))
+    assert recognizer.should_execute(recognizer.recognize_intent("打开等"))
+    # 有编辑距离的匹配缺少房间等佐证时不执行
+    edited = recognizer.recognize_intent("打开店吃机")
+    assert edited['device'] == '电视' and not recognizer.should_execute(edited)
+    assert not recognizer.should_execute(recognizer.recognize_intent("你好"))
+    print(f"✅ 近音匹配置信度 {edited['confidence']:.2f} 低于门槛，不执行")
+
+
+@requires_pinyin
+def test_match_latency():
+    """测试模糊匹配耗时"""
+    print("\n=== 测试匹配耗时 ===")
+    index = PhoneticKeywordIndex()
+    texts = [f"帮我把客厅的登打开一下{i}" for i in range(500)]
+    start = time.perf_counter()
+    for text in texts:
+        index.match(text)
+    per_match_ms = (time.perf_counter() - start) / len(texts) * 1000
+    print(f"   平均耗时: {per_match_ms:.3f} ms/条")
+    assert per_match_ms < 1, per_match_ms
+    print("✅ 匹配耗时正常")
+
+
+# 唤醒词标注数据集：n-best候选列表及是否真的说了唤醒词
+WAKE_WORD_SAMPLES = [
+    {'hypotheses': ['小智'], 'label': True},
+    {'hypotheses': ['小志'], 'label': True},
+    {'hypotheses': ['晓智'], 'label': True},
+    {'hypotheses': ['小知打开灯'], 'label': True},
+    {'hypotheses': ['笑死', '小智'], 'label': True},
+    {'hypotheses': ['你好小至'], 'label': True},
+    {'hypotheses': ['你好小七'], 'label': True},
+    {'hypotheses': ['智能注手'], 'label': True},
+    {'hypotheses': ['今天天气不错'], 'label': False},
+    {'hypotheses': ['打开客厅的灯'], 'label': False},
+    {'hypotheses': ['小时'], 'label': False},
+    {'hypotheses': ['你好'], 'label': False},
+]
+
+
+@requires_pinyin
+def test_wake_word_homophones():
+    """测试唤醒词同音匹配与n-best候选"""
+    print("\n=== 测试唤醒词拼音匹配 ===")
+    matcher = WakeWordMatcher(['小智', '智能助手', '你好小智'], sensitivity=0.8)
+    for text in ["小志", "晓智", "小知"]:
+        match = matcher.match(text)
+        assert match and match['wake_word'] == '小智', text
+    match = matcher.match(["笑死", "小智啊"])
+    assert match['hypothesis_index'] == 1
+    assert matcher.match("今天天气不错") is None
+    print("✅ 同音唤醒词及n-best候选匹配正常")
+
+
+@requires_pinyin
+def test_wake_word_sensitivity():
+    """测试敏感度对检测率和误报率的影响"""
+    print("\n=== 测试唤醒词敏感度 ===")
+    matcher = WakeWordMatcher(['小智', '智能助手', '你好小智'])
+    strict = evaluate_wake_word_matcher(matcher, WAKE_WORD_SAMPLES, sensitivity=0.0)
+    loose = evaluate_wake_word_matcher(matcher, WAKE_WORD_SAMPLES, sensitivity=1.0)
+    for name, stats in (("严格", strict), ("宽松", loose)):
+        print(f"   {name}: 检测率 {stats['detection_rate']:.2%}, 误报率 {stats['false_positive_rate']:.2%}")
+    assert strict['detection_rate'] < loose['detection_rate']
+    assert strict['false_positive_rate'] == 0
+    print("✅ 敏感度调节检测率正常")
+
+
+def main():
+    """主测试函数"""
+    print("🔤 拼音模糊匹配测试")
+    print("=" * 50)
+
+    if not phonetic_index.is_available():
+        print("⚠️ 未安装pypinyin，请运行: pip install pypinyin")
+        return
+
+    tests = [
+        test_bk_tree,
+        test_homophone_commands,
+        test_confidence_penalty,
+        test_no_false_match,
+        test_everyday_speech_not_commands,
+        test_phonetic_confidence_gate,
+        test_match_latency,
+        test_wake_word_homophones,
+        test_wake_word_sensitivity,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
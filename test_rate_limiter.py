@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+发布限速测试脚本
+"""
+
+import sys
+import os
+import time
+import threading
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from rate_limiter import TokenBucket, PriorityRateLimiter, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+
+class RecordingSender:
+    """记录实际发送的消息及发送时间"""
+
+    def __init__(self):
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def __call__(self, topic, payload, qos):
+        with self.lock:
+            self.sent.append((topic, payload, time.monotonic()))
+        return True
+
+
+def wait_until(predicate, timeout=3.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.005)
+    return predicate()
+
+
+def test_token_bucket():
+    """测试令牌桶突发与补充"""
+    print("=== 测试令牌桶 ===")
+    bucket = TokenBucket(rate=10, burst=3)
+    now = bucket.updated_at
+    for _ in range(3):
+        assert bucket.wait_time(now) == 0
+        bucket.consume(now)
+    assert abs(bucket.wait_time(now) - 0.1) < 1e-6
+    assert bucket.wait_time(now + 0.11) == 0
+    # 长时间空闲后令牌数不超过桶容量
+    bucket.wait_time(now + 100)
+    assert bucket.tokens == 3
+    print("✅ 突发 3 条后按 10 条/秒补充")
+
+
+def test_topic_rate_limit():
+    """测试单个主题的发布速率"""
+    print("=== 测试主题限速 ===")
+    sender = RecordingSender()
+    limiter = PriorityRateLimiter(sender, connection_rate=1000, connection_burst=1000, topic_rate=20, topic_burst=2)
+    start = time.monotonic()
+    for i in range(6):
+        limiter.submit('light001', f'on#{i}')
+    limiter.submit('aircon001', 'on')
+    assert wait_until(lambda: len(sender.sent) == 7)
+    light = [t for topic, _, t in sender.sent if topic == 'light001']
+    assert [p for topic, p, _ in sender.sent if topic == 'light001'] == [f'on#{i}' for i in range(6)]
+    # 突发2条后每条间隔约50ms
+    assert light[-1] - start >= 0.18, light[-1] - start
+    limiter.stop()
+    print(f"✅ 6 条消息耗时 {(light[-1] - start) * 1000:.0f}ms，顺序不变")
+
+
+def test_interactive_overtakes_background():
+    """测试交互指令优先于后台指令"""
+    print("=== 测试优先级通道 ===")
+    sender = RecordingSender()
+    limiter = PriorityRateLimiter(sender, connection_rate=20, connection_burst=1, topic_rate=1000, topic_burst=1000)
+    for i in range(10):
+        limiter.submit(f'sensor{i:03d}', 'on', priority=PRIORITY_BACKGROUND)
+    limiter.submit('light001', 'on', priority=PRIORITY_INTERACTIVE)
+    assert wait_until(lambda: len(sender.sent) == 11)
+    order = [topic for topic, _, _ in sender.sent]
+    # 第一条后台消息用掉了突发令牌，交互指令排在下一个
+    assert order.index('light001') == 1, order
+    stats = limiter.get_stats()
+    assert stats['interactive']['samples'] == 1
+    assert stats['background']['samples'] == 10
+    assert stats['background']['max_wait_ms'] > stats['interactive']['max_wait_ms']
+    limiter.stop()
+    print(f"✅ 交互指令等待 {stats['interactive']['max_wait_ms']:.0f}ms，"
+          f"后台最长等待 {stats['background']['max_wait_ms']:.0f}ms")
+
+
+def test_set_rates():
+    """测试运行中修改限速参数"""
+    print("=== 测试修改限速 ===")
+    sender = RecordingSender()
+    limiter = PriorityRateLimiter(sender, connection_rate=0.5, connection_burst=1, topic_rate=1000, topic_burst=1000)
+    limiter.submit('light001', 'on')
+    limiter.submit('light002', 'on')
+    time.sleep(0.1)
+    assert len(sender.sent) == 1
+    limiter.set_rates(100, 10, 100, 10)
+    assert wait_until(lambda: len(sender.sent) == 2, timeout=0.5)
+    limiter.stop()
+    print("✅ 提高速率后排队消息立即发送")
+
+
+def main():
+    """主测试函数"""
+    print("🚦 发布限速测试")
+    print("=" * 50)
+
+    tests = [
+        test_token_bucket,
+        test_topic_rate_limit,
+        test_interactive_overtakes_background,
+        test_set_rates,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
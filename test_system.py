@@ -61,25 +61,43 @@ def test_microphone():
         return False
 
 def test_mqtt_connection():
-    """测试MQTT连接 (使用测试配置)"""
+    """测试MQTT连接 (使用进程内的本地MQTT服务器，不依赖外网)"""
     print("\n" + "=" * 50)
     print("测试MQTT连接...")
     
     try:
+        import threading
         import paho.mqtt.client as mqtt
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+        from mqtt_broker import BrokerThread
+        
+        broker = BrokerThread('127.0.0.1', 0)
+        host, port = broker.start()
+        connected = threading.Event()
+        received = threading.Event()
         
         def on_connect(client, userdata, flags, rc):
             if rc == 0:
+                client.subscribe('test/system')
                 print("✓ MQTT连接测试成功")
             else:
                 print(f"✗ MQTT连接失败，错误代码: {rc}")
         
-        # 使用公共测试服务器
         client = mqtt.Client("test_client")
         client.on_connect = on_connect
-        
-        # 这里只是测试连接能力，不连接真实服务器
-        print("✓ MQTT客户端创建成功")
+        client.on_subscribe = lambda *args: connected.set()
+        client.on_message = lambda *args: received.set()
+        try:
+            client.connect(host, port)
+            client.loop_start()
+            assert connected.wait(5), "订阅超时"
+            client.publish('test/system', 'ping')
+            assert received.wait(5), "未收到消息"
+            print("✓ MQTT消息收发成功")
+        finally:
+            client.disconnect()
+            client.loop_stop()
+            broker.stop()
         return True
         
     except Exception as e:
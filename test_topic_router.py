@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+主题路由测试脚本
+"""
+
+import sys
+import os
+import time
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from topic_router import TopicRouter, topic_matches, validate_filter
+
+
+def test_exact_and_wildcards():
+    """测试精确主题与通配符匹配"""
+    print("=== 测试通配符匹配 ===")
+    router = TopicRouter()
+    router.add('home/living/light', 'exact')
+    router.add('home/+/light', 'single')
+    router.add('home/#', 'multi')
+    router.add('#', 'all')
+
+    assert router.match('home/living/light') == ['all', 'multi', 'single', 'exact']
+    assert router.match('home/bedroom/light') == ['all', 'multi', 'single']
+    assert router.match('home') == ['all', 'multi']
+    assert router.match('office/light') == ['all']
+    assert router.match('$SYS/uptime') == []
+    print("✅ '+'、'#' 与精确主题匹配正确")
+
+
+def test_topic_matches():
+    """测试单次匹配函数与路由结果一致"""
+    print("=== 测试 topic_matches ===")
+    cases = [
+        ('light001', 'light001', True),
+        ('light001', 'light002', False),
+        ('+', 'light001', True),
+        ('+', 'home/light', False),
+        ('home/+', 'home', False),
+        ('home/#', 'home', True),
+        ('home/#', 'home/a/b', True),
+        ('#', '$SYS/uptime', False),
+    ]
+    for topic_filter, topic, expected in cases:
+        assert topic_matches(topic_filter, topic) == expected, (topic_filter, topic)
+        router = TopicRouter()
+        router.add(topic_filter, 'h')
+        assert bool(router.match(topic)) == expected, (topic_filter, topic)
+    print("✅ 两种匹配方式结果一致")
+
+
+def test_invalid_filters():
+    """测试非法过滤器"""
+    print("=== 测试非法过滤器 ===")
+    for topic_filter in ('', 'home/#/light', 'home/li#', 'home/li+'):
+        try:
+            validate_filter(topic_filter)
+        except ValueError:
+            continue
+        raise AssertionError(f"应拒绝: {topic_filter!r}")
+    print("✅ 非法过滤器被拒绝")
+
+
+def test_remove_prunes_branches():
+    """测试移除处理函数后清理空分支"""
+    print("=== 测试移除 ===")
+    router = TopicRouter()
+    router.add('home/+/light', 'a')
+    router.add('home/+/light', 'b')
+    assert router.remove('home/+/light', 'a') is False
+    assert router.match('home/x/light') == ['b']
+    assert router.remove('home/+/light') is True
+    assert router.match('home/x/light') == []
+    assert router.root.children == {}
+    assert len(router) == 0
+    print("✅ 空分支被清理")
+
+
+def test_dispatch_scales():
+    """测试大量主题下的分发"""
+    print("=== 测试大规模分发 ===")
+    router = TopicRouter()
+    received = []
+    for i in range(5000):
+        router.add(f'home/room{i}/device{i}', lambda record, i=i: received.append(i))
+    router.add('home/+/device42', lambda record: received.append('wildcard'))
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        router.match('home/room4999/device4999')
+    elapsed = time.perf_counter() - start
+
+    assert router.dispatch('home/room42/device42', None) == 2
+    assert received == [42, 'wildcard'] or received == ['wildcard', 42]
+    assert len(router) == 5001
+    print(f"✅ 5001 个过滤器，单次匹配 {elapsed * 1000:.3f}µs")
+
+
+def test_handler_error_isolated():
+    """测试处理函数出错不影响其它处理函数"""
+    print("=== 测试处理函数出错 ===")
+    router = TopicRouter()
+    received = []
+
+    def broken(record):
+        raise RuntimeError("boom")
+
+    router.add('light001', broken)
+    router.add('+', received.append)
+    assert router.dispatch('light001', 'on') == 2
+    assert received == ['on']
+    print("✅ 出错的处理函数被隔离")
+
+
+def main():
+    """主测试函数"""
+    print("🌲 主题路由测试")
+    print("=" * 50)
+
+    tests = [
+        test_exact_and_wildcards,
+        test_topic_matches,
+        test_invalid_filters,
+        test_remove_prunes_branches,
+        test_dispatch_scales,
+        test_handler_error_isolated,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
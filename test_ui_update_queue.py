@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+界面更新队列测试脚本
+用记录调用的调度器代替 root.after，不需要图形界面
+"""
+
+import sys
+import os
+import threading
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from ui_update_queue import UIUpdateQueue
+
+
+class ManualScheduler:
+    """记录 after() 调用，由测试手动触发"""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def __call__(self, ms, callback):
+        self.scheduled.append((ms, callback))
+
+    def run_next(self):
+        _, callback = self.scheduled.pop(0)
+        callback()
+
+
+class LineRecorder:
+    """记录每次追加的日志行"""
+
+    def __init__(self):
+        self.inserts = []
+
+    def __call__(self, lines):
+        self.inserts.append(list(lines))
+
+    @property
+    def lines(self):
+        return [line for insert in self.inserts for line in insert]
+
+
+def test_batched_log_lines():
+    """测试日志行合并插入且与函数调用保持顺序"""
+    print("=== 测试日志批量插入 ===")
+    recorder = LineRecorder()
+    queue = UIUpdateQueue(ManualScheduler(), recorder)
+    calls = []
+    for i in range(300):
+        queue.log(f"line {i}\n")
+    queue.post(lambda: calls.append(len(recorder.lines)))
+    queue.log("after call\n")
+    assert queue.drain() == 301
+    assert recorder.lines == [f"line {i}\n" for i in range(300)] + ["after call\n"]
+    # 300行一次插入；调用执行时之前的日志已经写入
+    assert len(recorder.inserts) == 2 and calls == [300]
+    assert queue.drain() == 0 and len(recorder.inserts) == 2
+    print(f"✅ 301 行日志 {len(recorder.inserts)} 次插入")
+
+
+def test_status_coalescing():
+    """测试状态更新只应用最新值"""
+    print("=== 测试状态合并 ===")
+    queue = UIUpdateQueue(ManualScheduler(), LineRecorder())
+    applied = []
+    for i in range(100):
+        queue.set_status('speech', applied.append, f"状态 {i}")
+    queue.set_status('mqtt', applied.append, "已连接")
+    queue.drain()
+    assert applied == ["状态 99", "已连接"]
+    queue.drain()
+    assert len(applied) == 2
+    stats = queue.get_stats()
+    assert stats['statuses_posted'] == 101 and stats['statuses_applied'] == 2
+    print("✅ 101 次状态更新只刷新 2 次")
+
+
+def test_status_order():
+    """测试状态更新与函数调用按提交顺序执行"""
+    print("=== 测试状态顺序 ===")
+    queue = UIUpdateQueue(ManualScheduler(), LineRecorder())
+    applied = []
+    queue.set_status('speech', lambda text: applied.append(('status', text)), "正在识别")
+    queue.post(applied.append, ('call', "执行指令"))
+    queue.set_status('speech', lambda text: applied.append(('status', text)), "识别完成")
+    queue.post(applied.append, ('call', "清空输入"))
+    queue.drain()
+    # 状态在第一次更新的位置应用最新值，不会被推迟到之后的调用后面
+    assert applied == [('status', "识别完成"), ('call', "执行指令"), ('call', "清空输入")], applied
+
+    applied.clear()
+    queue.post(applied.append, ('call', "执行指令"))
+    queue.set_status('speech', lambda text: applied.append(('status', text)), "待命")
+    queue.drain()
+    assert applied == [('call', "执行指令"), ('status', "待命")], applied
+    print("✅ 状态更新与函数调用保持提交顺序")
+
+
+def test_periodic_drain_and_limits():
+    """测试定时处理、每次处理上限与积压上限"""
+    print("=== 测试定时处理与上限 ===")
+    scheduler = ManualScheduler()
+    recorder = LineRecorder()
+    queue = UIUpdateQueue(scheduler, recorder, interval=0.05, max_batch=100, max_pending=250)
+    queue.start()
+    queue.start()
+    assert [ms for ms, _ in scheduler.scheduled] == [50]
+
+    for i in range(300):
+        queue.log(f"{i}\n")
+    stats = queue.get_stats()
+    assert stats['logs_dropped'] == 50 and stats['pending_logs'] == 250
+    scheduler.run_next()
+    assert recorder.lines == [f"{i}\n" for i in range(50, 150)]
+    assert len(scheduler.scheduled) == 1
+    scheduler.run_next()
+    scheduler.run_next()
+    assert len(recorder.lines) == 250 and queue.get_stats()['pending'] == 0
+
+    # 单个更新出错不影响其他更新，也不中断定时处理
+    queue.post(lambda: 1 / 0)
+    queue.log("still here\n")
+    scheduler.run_next()
+    assert recorder.lines[-1] == "still here\n" and len(scheduler.scheduled) == 1
+
+    # 插入日志出错时同样不影响之后的更新
+    def failing_insert(lines):
+        raise RuntimeError("控件已销毁")
+    queue.append_lines = failing_insert
+    calls = []
+    queue.log("lost\n")
+    queue.post(calls.append, "after error")
+    scheduler.run_next()
+    assert calls == ["after error"] and len(scheduler.scheduled) == 1
+    queue.append_lines = recorder
+    queue.stop()
+    scheduler.run_next()
+    assert not scheduler.scheduled
+    print("✅ 每次最多处理 100 条，积压超限丢弃最早的日志")
+
+
+def test_concurrent_producers():
+    """测试多个后台线程同时提交"""
+    print("=== 测试多线程提交 ===")
+    recorder = LineRecorder()
+    queue = UIUpdateQueue(ManualScheduler(), recorder, max_pending=100000)
+    statuses = []
+
+    def produce(index):
+        for i in range(1000):
+            queue.log(f"{index}:{i}\n")
+            queue.set_status('speech', statuses.append, (index, i))
+
+    threads = [threading.Thread(target=produce, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    drained = 0
+    while any(thread.is_alive() for thread in threads):
+        drained += queue.drain()
+    for thread in threads:
+        thread.join()
+    while queue.get_stats()['pending']:
+        drained += queue.drain()
+    assert drained == 8000 and len(recorder.lines) == 8000
+    for index in range(8):
+        own = [int(line.split(':')[1]) for line in recorder.lines if line.startswith(f"{index}:")]
+        assert own == list(range(1000))
+    assert statuses and len(statuses) <= queue.get_stats()['ticks']
+    print(f"✅ 8000 行日志 {len(recorder.inserts)} 次插入，状态刷新 {len(statuses)} 次")
+
+
+def main():
+    """主测试函数"""
+    print("🖥️ 界面更新队列测试")
+    print("=" * 50)
+
+    tests = [
+        test_batched_log_lines,
+        test_status_coalescing,
+        test_status_order,
+        test_periodic_drain_and_limits,
+        test_concurrent_producers,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print(f"\n总计: {passed}/{len(tests)} 个测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,9 @@ from datetime import datetime
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from ai_speech_recognition import AISpeechRecognizer
+from phonetic_index import WakeWordMatcher, evaluate_wake_word_matcher
 from config import WAKE_WORD_CONFIG
+from config_store import get_config_store
 
 class WakeWordOptimizer:
     """唤醒词配置优化器"""
@@ -228,43 +230,47 @@ class WakeWordOptimizer:
         except Exception as e:
             print(f"❌ 导出失败: {e}")
     
+    def evaluate_labelled_set(self, filename, sensitivities=(0.6, 0.7, 0.8, 0.9, 1.0)):
+        """
+        在标注数据集上离线评估唤醒词拼音匹配
+        数据集为JSON Lines，每行 {"hypotheses": [候选文本...], "label": true/false}
+        """
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                samples = [json.loads(line) for line in f if line.strip()]
+        except Exception as e:
+            print(f"❌ 读取数据集失败: {e}")
+            return None
+        
+        matcher = WakeWordMatcher(WAKE_WORD_CONFIG.get('keywords', ['小智']))
+        print(f"📋 共 {len(samples)} 条标注样本")
+        print("敏感度    检测率    误报率")
+        
+        results = []
+        for sensitivity in sensitivities:
+            stats = evaluate_wake_word_matcher(matcher, samples, sensitivity)
+            stats['sensitivity'] = sensitivity
+            results.append(stats)
+            print(f"{sensitivity:<9} {stats['detection_rate']:<9.2%} {stats['false_positive_rate']:.2%}")
+        
+        return results
+    
     def apply_best_config(self):
-        """应用最佳配置到配置文件"""
+        """应用最佳配置（写入配置存储）"""
         if not self.best_config:
             print("❌ 没有找到最佳配置")
             return
         
         try:
-            config_file = os.path.join('src', 'config.py')
-            
-            # 读取当前配置文件
-            with open(config_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 备份原配置
-            backup_file = f"{config_file}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            print(f"📁 原配置已备份到: {backup_file}")
-            
-            # 更新配置
             best_config = self.best_config['config']
+            values = {key: value for key, value in best_config.items()
+                      if key in ['energy_threshold', 'timeout', 'sensitivity']}
             
-            # 简单的文本替换（实际项目中可能需要更复杂的解析）
-            for key, value in best_config.items():
-                if key in ['energy_threshold', 'timeout', 'sensitivity']:
-                    pattern = f"'{key}': [\d\.]+" # type: ignore
-                    replacement = f"'{key}': {value}"
-                    import re
-                    content = re.sub(pattern, replacement, content)
-            
-            # 写入更新后的配置
-            with open(config_file, 'w', encoding='utf-8') as f:
-                f.write(content)
+            store = get_config_store()
+            store.update('WAKE_WORD_CONFIG', values)
             
-            print(f"✅ 最佳配置已应用到 {config_file}")
-            print("重启程序以使用新配置")
+            print(f"✅ 最佳配置已应用到 {store.path}")
+            print("运行中的程序会自动应用新配置")
             
         except Exception as e:
             print(f"❌ 应用配置失败: {e}")
@@ -286,9 +292,10 @@ def main():
             print("2. 开始配置优化 (完整测试)")
             print("3. 导出结果")
             print("4. 应用最佳配置")
-            print("5. 退出")
+            print("5. 离线评估唤醒词匹配 (标注数据集)")
+            print("6. 退出")
             
-            choice = input("\n请选择功能 (1-5): ").strip()
+            choice = input("\n请选择功能 (1-6): ").strip()
             
             if choice == '1':
                 optimizer.run_optimization(configs_per_batch=5, test_duration=15)
@@ -304,6 +311,11 @@ def main():
                 optimizer.apply_best_config()
                 
             elif choice == '5':
+                filename = input("标注数据集文件 (JSON Lines): ").strip()
+                if filename:
+                    optimizer.evaluate_labelled_set(filename)
+                
+            elif choice == '6':
                 print("👋 优化完成！")
                 break
                 